@@ -11,7 +11,7 @@ from django.db.models import Q
 from dateutil.relativedelta import relativedelta
 
 from accounts.models import ArchivedDisclaimer, NonRegisteredDisclaimer, OnlineDisclaimer
-from activitylog.models import ActivityLog
+from activitylog.buffer import activity_log_buffer, log_activity
 
 
 logger = logging.getLogger(__name__)
@@ -20,6 +20,7 @@ logger = logging.getLogger(__name__)
 class Command(BaseCommand):
     help = "Delete any disclaimers over 6 years old"
 
+    @activity_log_buffer()
     def handle(self, *args, **options):
 
         # get relevant users
@@ -53,28 +54,29 @@ class Command(BaseCommand):
         old_archieved_disclaimers_to_delete.delete()
 
         if online_disclaimer_users:
-            ActivityLog.objects.create(
-                log='Online disclaimers more than 6 yrs old deleted for '
-                    'users: {}'.format(
-                        ', '.join(online_disclaimer_users)
-                    )
+            log_activity(
+                'Online disclaimers more than 6 yrs old deleted for '
+                'users: {}'.format(
+                    ', '.join(online_disclaimer_users)
+                ),
+                action="deleted"
             )
         if non_registered_disclaimer_users:
-            ActivityLog.objects.create(
-                log='Non-registered disclaimers more than 6 yrs old deleted for '
-                    'users: {}'.format(
-                        ', '.join(non_registered_disclaimer_users)
-                    )
+            log_activity(
+                'Non-registered disclaimers more than 6 yrs old deleted for '
+                'users: {}'.format(
+                    ', '.join(non_registered_disclaimer_users)
+                ),
+                action="deleted"
             )
         if archive_disclaimer_users:
-            ActivityLog.objects.create(
-                log='Archived disclaimers more than 6 yrs old deleted for '
-                    'users: {}'.format(
-                        ', '.join(archive_disclaimer_users)
-                    )
+            log_activity(
+                'Archived disclaimers more than 6 yrs old deleted for '
+                'users: {}'.format(
+                    ', '.join(archive_disclaimer_users)
+                ),
+                action="deleted"
             )
         if not (online_disclaimer_users or non_registered_disclaimer_users or archive_disclaimer_users):
             self.stdout.write('No disclaimers to delete')
-            ActivityLog.objects.create(
-                log='Delete disclaimers job run; no expired disclaimers'
-            )
+            log_activity('Delete disclaimers job run; no expired disclaimers')
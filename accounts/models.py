@@ -19,6 +19,7 @@ from django.utils import timezone
 from dynamic_forms.models import FormField, ResponseField
 
 from activitylog.models import ActivityLog
+from common.reference_data import reference_data
 
 
 logger = logging.getLogger(__name__)
@@ -104,10 +105,7 @@ class CookiePolicy(models.Model):
 
     @classmethod
     def current_version(cls):
-        current_policy = CookiePolicy.current()
-        if current_policy is None:
-            return 0
-        return current_policy.version
+        return current_cookie_policy_version()
 
     @classmethod
     def current(cls):
@@ -145,10 +143,7 @@ class DataPrivacyPolicy(models.Model):
 
     @classmethod
     def current_version(cls):
-        current_policy = DataPrivacyPolicy.current()
-        if current_policy is None:
-            return 0
-        return current_policy.version
+        return current_data_privacy_policy_version()
 
     @classmethod
     def current(cls):
@@ -226,10 +221,7 @@ class DisclaimerContent(models.Model):
 
     @classmethod
     def current_version(cls):
-        current_content = DisclaimerContent.current()
-        if current_content is None:
-            return 0
-        return current_content.version
+        return current_disclaimer_content_version()
 
     @classmethod
     def current(cls):
@@ -414,6 +406,25 @@ class ArchivedDisclaimer(BaseOnlineDisclaimer):
 
 # CACHING
 
+# Current policy versions are checked on most page views; cache them (see common.reference_data)
+@reference_data("cookie_policy_version", models=[CookiePolicy])
+def current_cookie_policy_version():
+    current_policy = CookiePolicy.current()
+    return 0 if current_policy is None else current_policy.version
+
+
+@reference_data("data_privacy_policy_version", models=[DataPrivacyPolicy])
+def current_data_privacy_policy_version():
+    current_policy = DataPrivacyPolicy.current()
+    return 0 if current_policy is None else current_policy.version
+
+
+@reference_data("disclaimer_content_version", models=[DisclaimerContent])
+def current_disclaimer_content_version():
+    current_content = DisclaimerContent.current()
+    return 0 if current_content is None else current_content.version
+
+
 def active_disclaimer_cache_key(user):
     return f'user_{user.id}_active_disclaimer_v{DisclaimerContent.current_version()}'
 
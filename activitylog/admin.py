@@ -1,9 +1,113 @@
+from datetime import datetime, time, timedelta
+
+from django import forms
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.postgres.search import SearchQuery
+from django.utils import timezone
+
 from activitylog.models import ActivityLog
 
+
+class _DateRangeForm(forms.Form):
+    start = forms.DateField(required=False)
+    end = forms.DateField(required=False)
+
+
+class TimestampRangeFilter(admin.FieldListFilter):
+    """Filter a datetime field by a from/to date range (both inclusive)"""
+    template = "admin/activitylog/timestamp_range_filter.html"
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.start_param = f"{field_path}__from"
+        self.end_param = f"{field_path}__to"
+        super().__init__(field, request, params, model, model_admin, field_path)
+
+    def expected_parameters(self):
+        return [self.start_param, self.end_param]
+
+    def queryset(self, request, queryset):
+        form = _DateRangeForm(
+            {"start": self.used_parameters.get(self.start_param), "end": self.used_parameters.get(self.end_param)}
+        )
+        if not form.is_valid():
+            raise IncorrectLookupParameters(form.errors)
+        # filter on the datetimes themselves (not __date) so the timestamp index is used
+        start, end = form.cleaned_data["start"], form.cleaned_data["end"]
+        if start:
+            queryset = queryset.filter(**{f"{self.field_path}__gte": timezone.make_aware(datetime.combine(start, time.min))})
+        if end:
+            queryset = queryset.filter(
+                **{f"{self.field_path}__lt": timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))}
+            )
+        return queryset
+
+    def choices(self, changelist):
+        yield {
+            "start_param": self.start_param,
+            "start_value": self.used_parameters.get(self.start_param, ""),
+            "end_param": self.end_param,
+            "end_value": self.used_parameters.get(self.end_param, ""),
+            # keep the search and other filters when the form is submitted; go back to the first page
+            "hidden_params": [
+                (key, value) for key, value in changelist.params.items()
+                if key not in self.expected_parameters() and key != "p"
+            ],
+            "clear_query_string": changelist.get_query_string(remove=self.expected_parameters()),
+        }
+
+
+class _FixedChoicesFilter(admin.SimpleListFilter):
+    """
+    Filter on one of a fixed list of values; the default field filter would get its choices with
+    a SELECT DISTINCT over the whole table on every changelist page
+    """
+    choices_list = ()
+
+    def lookups(self, request, model_admin):
+        return [(value, value) for value in self.choices_list]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{self.parameter_name: self.value()})
+        return queryset
+
+
+class ObjectTypeFilter(_FixedChoicesFilter):
+    title = "object type"
+    parameter_name = "object_type"
+    # the models logged with log_activity(obj=...)
+    choices_list = (
+        "booking.booking", "booking.block", "booking.course", "booking.event", "payments.invoice",
+        "payments.seller",
+    )
+
+
+class ActionFilter(_FixedChoicesFilter):
+    title = "action"
+    parameter_name = "action"
+    # the actions passed to log_activity
+    choices_list = (
+        "booked", "cancelled", "deleted", "disconnected", "expired", "opened", "paid", "reconciled",
+        "reminder_sent", "reopened", "unenrolled", "updated", "waiting_list_emailed", "waiting_list_removed",
+    )
+
+
 class ActivityLogAdmin(admin.ModelAdmin):
-    list_display = ('timestamp_formatted', 'log')
+    list_display = ('timestamp_formatted', 'log', 'action', 'object_type', 'object_id', 'actor_id')
+    list_filter = (('timestamp', TimestampRangeFilter), ObjectTypeFilter, ActionFilter)
     search_fields = ('log',)
+    search_help_text = "Searches whole words in the log, e.g. 'cancelled course'; use quotes for a phrase"
+    # counting the whole table is slow, and not needed for the search results
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        # full text search on the indexed search_vector, rather than the default icontains on log
+        if not search_term:
+            return queryset, False
+        return queryset.filter(
+            search_vector=SearchQuery(search_term, config="english", search_type="websearch")
+        ), False
 
     def timestamp_formatted(self, obj):
         return obj.timestamp.strftime('%d-%b-%Y %H:%M:%S (%Z)')
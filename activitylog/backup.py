@@ -0,0 +1,31 @@
+"""
+Where delete_old_activitylogs uploads its backups; set by settings.ACTIVITYLOG_BACKUP_BACKEND.
+A backend has an upload(local_path, filename) method, and a description for the command's report.
+"""
+import os
+import shutil
+import subprocess
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class S3Backup:
+    """Upload to settings.S3_LOG_BACKUP_PATH with the aws cli"""
+    description = "s3"
+
+    def upload(self, local_path, filename):
+        subprocess.run(["aws", "s3", "cp", local_path, os.path.join(settings.S3_LOG_BACKUP_PATH, filename)], check=True)
+
+
+class LocalBackup:
+    """Copy to settings.ACTIVITYLOG_BACKUP_LOCAL_DIR; for testing and development"""
+    description = "local storage"
+
+    def upload(self, local_path, filename):
+        os.makedirs(settings.ACTIVITYLOG_BACKUP_LOCAL_DIR, exist_ok=True)
+        shutil.copyfile(local_path, os.path.join(settings.ACTIVITYLOG_BACKUP_LOCAL_DIR, filename))
+
+
+def get_backup_backend():
+    return import_string(settings.ACTIVITYLOG_BACKUP_BACKEND)()
@@ -0,0 +1,88 @@
+"""
+Buffered ActivityLog writes
+
+Most requests and jobs write several activity logs (Course.save writes one for each of its events),
+and each ActivityLog.objects.create is a separate INSERT.  Inside activity_log_buffer(), log_activity
+collects the logs instead, and they're all written with one bulk_create when the buffer is closed.
+ActivityLogBufferMiddleware buffers each request; management commands can decorate their handle
+method with @activity_log_buffer().  Outside a buffer, log_activity writes straight away.
+
+Buffers nest; only the outermost one writes.  Logs are written even if the request or command
+fails, but logs added inside a transaction (or savepoint) that's rolled back before the buffer is
+closed are dropped, as they would have been rolled back if they'd been written straight away
+(e.g. the attempts retried by retry_on_lock_contention).
+"""
+from contextlib import contextmanager
+import contextvars
+
+from django.db import transaction
+
+from .models import ActivityLog
+
+
+class _Buffer:
+    def __init__(self, actor):
+        self.actor = actor
+        self.entries = []
+        self.committed = set()
+
+    def add(self, entry):
+        # An on_commit callback for each entry: Django runs it straight away outside a transaction,
+        # and drops it if the transaction or savepoint it was registered in is rolled back
+        def committed():
+            self.committed.add(committed)
+        self.entries.append((entry, committed))
+        transaction.on_commit(committed)
+
+    def entries_to_write(self):
+        # committed, or in a transaction that's still open (they're written in it, so they're
+        # rolled back with it)
+        pending = {callback for _, callback in transaction.get_connection().run_on_commit}
+        return [
+            entry for entry, callback in self.entries if callback in self.committed or callback in pending
+        ]
+
+
+_current_buffer = contextvars.ContextVar("activity_log_buffer", default=None)
+
+
+def log_activity(log, actor=None, obj=None, action=""):
+    """
+    Write an ActivityLog, or add it to the current buffer.
+    actor: the user who did it; defaults to the buffer's actor (the request user)
+    obj: the model instance it's about, saved as object_type ("app_label.modelname") and object_id
+    action: a short verb, e.g. "created", "cancelled", for filtering
+    (new object types and actions need adding to the admin filters, in activitylog.admin)
+    """
+    buffer = _current_buffer.get()
+    if actor is None and buffer is not None:
+        actor = buffer.actor
+    entry = ActivityLog(
+        log=log,
+        action=action,
+        # anonymous users have no id
+        actor_id=getattr(actor, "id", None),
+        object_type=obj._meta.label_lower if obj is not None else "",
+        object_id=obj.pk if obj is not None else None,
+    )
+    if buffer is None:
+        entry.save()
+    else:
+        buffer.add(entry)
+    return entry
+
+
+@contextmanager
+def activity_log_buffer(actor=None):
+    if _current_buffer.get() is not None:
+        yield
+        return
+    buffer = _Buffer(actor)
+    token = _current_buffer.set(buffer)
+    try:
+        yield
+    finally:
+        _current_buffer.reset(token)
+        entries = buffer.entries_to_write()
+        if entries:
+            ActivityLog.objects.bulk_create(entries)
@@ -1,21 +1,23 @@
 import csv
+import gzip
 import os
-import subprocess
+import tempfile
+import time
 
 from dateutil.relativedelta import relativedelta
 
 from django.conf import settings
-from django.core import management
 from django.core.management.base import BaseCommand
+from django.db.models import Max
 from django.utils import timezone
-from django.utils.encoding import smart_str
 
+from ...backup import get_backup_backend
 from ...models import ActivityLog
 
 
 class Command(BaseCommand):
 
-    help = "Delete old ActivityLogs"
+    help = "Back up and delete old ActivityLogs"
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -24,34 +26,69 @@ class Command(BaseCommand):
             type=int,
             help='Age (in years) of logs to delete.  Defaults to 1 yr, i.e. will delete all logs older than 1 year old'
         )
+        parser.add_argument(
+            '--batch-size',
+            default=5000,
+            type=int,
+            help='Number of logs to read and delete at a time'
+        )
 
     def handle(self, *args, **options):
         age = options.get('age')
+        batch_size = options.get('batch_size')
         now = timezone.now()
         # set cutoff to beginning of this day <age> years ago
         cutoff = (now-relativedelta(years=age)).replace(hour=0, minute=0, second=0, microsecond=0)
-        filename = f"{settings.S3_LOG_BACKUP_ROOT_FILENAME}_{cutoff.strftime('%Y-%m-%d')}_{now.strftime('%Y%m%d%H%M%S')}.csv"
-        s3_upload_path = os.path.join(settings.S3_LOG_BACKUP_PATH, filename)
-
-        old_logs = ActivityLog.objects.filter(timestamp__lt=cutoff)
-        old_logs_count = old_logs.count()
-        if old_logs_count > 0:
-            with open(filename, "w") as outfile:
-                wr = csv.writer(outfile)
-                wr.writerow([
-                    smart_str(u"Timestamp"),
-                    smart_str(u"Log")
-                ])
-                for activitylog in old_logs:
-                    wr.writerow([
-                        smart_str(activitylog.timestamp.isoformat()),
-                        smart_str(activitylog.log)
-                    ])
-
-            subprocess.run(["aws", "s3", "cp", filename, s3_upload_path], check=True)
-            os.unlink(filename)
-
-            old_logs.delete()
-            message = f"{old_logs_count} activitylogs older than {cutoff.strftime('%Y-%m-%d')} backed up to s3 and deleted"
-            self.stdout.write(message)
-            ActivityLog.objects.create(log=message)
+        filename = f"{settings.S3_LOG_BACKUP_ROOT_FILENAME}_{cutoff.strftime('%Y-%m-%d')}_{now.strftime('%Y%m%d%H%M%S')}.csv.gz"
+
+        # only back up and delete the logs that are there now, so nothing's deleted without being backed up
+        max_id = ActivityLog.objects.filter(timestamp__lt=cutoff).aggregate(max_id=Max("id"))["max_id"]
+        if max_id is None:
+            return
+        old_logs = ActivityLog.objects.filter(timestamp__lt=cutoff, id__lte=max_id)
+
+        backend = get_backup_backend()
+        start = time.monotonic()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            local_path = os.path.join(tmpdir, filename)
+            old_logs_count = self.write_backup(old_logs, local_path, batch_size)
+            backend.upload(local_path, filename)
+        backed_up = time.monotonic()
+
+        self.delete_in_batches(old_logs, batch_size)
+        deleted = time.monotonic()
+
+        message = (
+            f"{old_logs_count} activitylogs older than {cutoff.strftime('%Y-%m-%d')} backed up to "
+            f"{backend.description} and deleted"
+        )
+        self.stdout.write(message)
+        self.stdout.write(
+            f"Backed up {self.rate(old_logs_count, backed_up - start)} rows/s, "
+            f"deleted {self.rate(old_logs_count, deleted - backed_up)} rows/s"
+        )
+        ActivityLog.objects.create(log=message)
+
+    def write_backup(self, logs, path, batch_size):
+        # stream the logs into the compressed file, rather than loading them all at once
+        count = 0
+        with gzip.open(path, "wt", newline="", encoding="utf-8") as outfile:
+            wr = csv.writer(outfile)
+            wr.writerow(["Timestamp", "Log"])
+            for timestamp, log in logs.order_by("id").values_list("timestamp", "log").iterator(chunk_size=batch_size):
+                wr.writerow([timestamp.isoformat(), log])
+                count += 1
+        return count
+
+    def delete_in_batches(self, logs, batch_size):
+        # delete by id range, a batch at a time, so each delete only locks a bounded number of rows
+        last_id = 0
+        while True:
+            ids = list(logs.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[:batch_size])
+            if not ids:
+                break
+            logs.filter(id__gte=ids[0], id__lte=ids[-1]).delete()
+            last_id = ids[-1]
+
+    def rate(self, count, seconds):
+        return round(count / seconds) if seconds else count
@@ -0,0 +1,14 @@
+from .buffer import activity_log_buffer
+
+
+class ActivityLogBufferMiddleware:
+    """
+    Collect the activity logs written during a request and write them in one go at the end
+    (see activitylog/buffer.py)
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with activity_log_buffer(actor=request.user):
+            return self.get_response(request)
@@ -0,0 +1,21 @@
+# Generated by Django 4.1.2 on 2026-10-17 11:31
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # the activity log is large and written on most requests; build the index without locking it
+    atomic = False
+
+    dependencies = [
+        ('activitylog', '0001_initial'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='activitylog',
+            index=models.Index(fields=['timestamp'], name='activitylog_timestamp_idx'),
+        ),
+    ]
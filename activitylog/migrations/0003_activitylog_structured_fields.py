@@ -0,0 +1,49 @@
+# Generated by Django 4.1.2 on 2026-10-17 11:54
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # build the indexes without locking the activity log (see 0002)
+    atomic = False
+
+    dependencies = [
+        ('activitylog', '0002_activitylog_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activitylog',
+            name='action',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='activitylog',
+            name='actor_id',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='activitylog',
+            name='object_id',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='activitylog',
+            name='object_type',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        AddIndexConcurrently(
+            model_name='activitylog',
+            index=models.Index(fields=['actor_id'], name='activitylog_actor_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='activitylog',
+            index=models.Index(fields=['object_type', 'object_id'], name='activitylog_object_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='activitylog',
+            index=models.Index(fields=['action'], name='activitylog_action_idx'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 4.1.2 on 2026-10-17 12:18
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+import django.contrib.postgres.search
+from django.db import migrations
+from django.db.models import Max
+
+
+BACKFILL_BATCH_SIZE = 10000
+
+# Keep search_vector current in the database rather than in save(), so it's also set for
+# bulk_create (used by activitylog.buffer) and queryset updates
+CREATE_TRIGGER = """
+CREATE FUNCTION activitylog_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := to_tsvector('pg_catalog.english', COALESCE(NEW.log, ''));
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER activitylog_search_vector_trigger
+BEFORE INSERT OR UPDATE OF log, search_vector ON activitylog_activitylog
+FOR EACH ROW EXECUTE FUNCTION activitylog_search_vector_update();
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS activitylog_search_vector_trigger ON activitylog_activitylog;
+DROP FUNCTION IF EXISTS activitylog_search_vector_update();
+"""
+
+
+def backfill_search_vectors(apps, schema_editor):
+    # The migration isn't atomic, so each batch is committed as it goes and only locks
+    # its own rows.  Touching log fires the trigger, which sets the vector.
+    ActivityLog = apps.get_model("activitylog", "ActivityLog")
+    max_id = ActivityLog.objects.aggregate(max_id=Max("id"))["max_id"] or 0
+    with schema_editor.connection.cursor() as cursor:
+        for start in range(0, max_id + 1, BACKFILL_BATCH_SIZE):
+            cursor.execute(
+                "UPDATE activitylog_activitylog SET log = log "
+                "WHERE id >= %s AND id < %s AND search_vector IS NULL",
+                [start, start + BACKFILL_BATCH_SIZE]
+            )
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('activitylog', '0003_activitylog_structured_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activitylog',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER),
+        migrations.RunPython(backfill_search_vectors, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='activitylog',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='activitylog_search_vector_idx'),
+        ),
+    ]
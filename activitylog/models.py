@@ -1,3 +1,5 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.utils import timezone
 
@@ -5,6 +7,24 @@ class ActivityLog(models.Model):
 
     timestamp = models.DateTimeField(default=timezone.now)
     log = models.TextField()
+    # optional structured fields, so logs can be filtered by who did what to which object
+    # (see activitylog.buffer.log_activity); not foreign keys, so logs outlive the users and objects
+    actor_id = models.PositiveIntegerField(null=True, blank=True)
+    object_type = models.CharField(max_length=100, blank=True, default="")
+    object_id = models.PositiveIntegerField(null=True, blank=True)
+    action = models.CharField(max_length=50, blank=True, default="")
+    # full text search vector for log, for the admin search; set by a database trigger on insert and
+    # update (see migration 0004), so it's kept current for bulk_create too
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["timestamp"], name="activitylog_timestamp_idx"),
+            models.Index(fields=["actor_id"], name="activitylog_actor_idx"),
+            models.Index(fields=["object_type", "object_id"], name="activitylog_object_idx"),
+            models.Index(fields=["action"], name="activitylog_action_idx"),
+            GinIndex(fields=["search_vector"], name="activitylog_search_vector_idx"),
+        ]
 
     def __str__(self):
         return '{} - {}'.format(
@@ -1,4 +1,8 @@
+import csv
+import gzip
+from io import StringIO
 import os
+import tempfile
 from unittest.mock import patch
 
 from datetime import datetime
@@ -8,9 +12,13 @@ from model_bakery import baker
 from dateutil.relativedelta import relativedelta
 
 from django.conf import settings
+from django.contrib.auth.models import User
 from django.contrib.admin.sites import AdminSite
 from django.core import management
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.utils import timezone
 
 from activitylog import admin
@@ -52,6 +60,61 @@ class ActivityLogAdminTests(TestCase):
         al_query = activitylog_admin.get_queryset(None)[0]
         assert  activitylog_admin.timestamp_formatted(al_query) =='15-Sep-2016 13:45:10 (UTC)'
 
+    def test_search_vector_set_on_insert_and_update(self):
+        ActivityLog.objects.bulk_create([ActivityLog(log="Booking 1 cancelled for Pole Level 1")])
+        activitylog = ActivityLog.objects.create(log="Block 2 deleted")
+        assert ActivityLog.objects.filter(search_vector="cancel").count() == 1
+        activitylog.log = "Block 2 expired"
+        activitylog.save()
+        assert ActivityLog.objects.filter(search_vector="expire").get() == activitylog
+
+    def test_search(self):
+        ActivityLog.objects.bulk_create(
+            [
+                ActivityLog(log="Booking 1 cancelled for Pole Level 1 by user test"),
+                ActivityLog(log="Course Pole Level 1 cancelled; linked events have been cancelled also"),
+                ActivityLog(log="Booking 2 opened for Aerial Hoop by user test"),
+            ]
+        )
+        activitylog_admin = admin.ActivityLogAdmin(ActivityLog, AdminSite())
+        queryset, _ = activitylog_admin.get_search_results(None, ActivityLog.objects.all(), "cancel booking")
+        assert [log.log for log in queryset] == ["Booking 1 cancelled for Pole Level 1 by user test"]
+        queryset, _ = activitylog_admin.get_search_results(None, ActivityLog.objects.all(), '"pole level" -course')
+        assert queryset.count() == 1
+        queryset, _ = activitylog_admin.get_search_results(None, ActivityLog.objects.all(), "")
+        assert queryset.count() == 3
+
+    def test_timestamp_range_filter(self):
+        superuser = User.objects.create_superuser(username="admin", email="admin@test.com", password="test")
+        for day in [1, 2, 3, 4]:
+            baker.make(ActivityLog, log=f"Log day {day}", timestamp=datetime(2023, 1, day, 23, 30, tzinfo=dt_timezone.utc))
+        self.client.force_login(superuser)
+        url = reverse("admin:activitylog_activitylog_changelist")
+        resp = self.client.get(url, {"timestamp__from": "2023-01-02", "timestamp__to": "2023-01-03"})
+        assert sorted(log.log for log in resp.context_data["cl"].result_list) == ["Log day 2", "Log day 3"]
+
+        resp = self.client.get(url, {"timestamp__from": "2023-01-03", "q": "day"})
+        assert sorted(log.log for log in resp.context_data["cl"].result_list) == ["Log day 3", "Log day 4"]
+        assert 'name="q" value="day"' in resp.content.decode()
+
+        # invalid dates redirect with an error, like other invalid admin filters
+        resp = self.client.get(url, {"timestamp__from": "not-a-date"})
+        assert resp.status_code == 302
+
+    def test_object_type_and_action_filters(self):
+        superuser = User.objects.create_superuser(username="admin", email="admin@test.com", password="test")
+        baker.make(ActivityLog, log="Booking cancelled", object_type="booking.booking", action="cancelled")
+        baker.make(ActivityLog, log="Event cancelled", object_type="booking.event", action="cancelled")
+        baker.make(ActivityLog, log="Booking reopened", object_type="booking.booking", action="reopened")
+        self.client.force_login(superuser)
+        url = reverse("admin:activitylog_activitylog_changelist")
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(url, {"object_type": "booking.booking", "action": "cancelled"})
+        assert [log.log for log in resp.context_data["cl"].result_list] == ["Booking cancelled"]
+        # the filter choices are fixed, not looked up in the table
+        assert not [query for query in queries.captured_queries if "DISTINCT" in query["sql"]]
+        assert "waiting_list_emailed" in resp.content.decode()
+
 
 class DeleteOldActivityLogsTests(TestCase):
 
@@ -63,43 +126,76 @@ class DeleteOldActivityLogsTests(TestCase):
         self.log_25monthsold = baker.make(ActivityLog, log='message', timestamp=self.mock_now-relativedelta(months=25))
         self.log_37monthsold = baker.make(ActivityLog, log='message', timestamp=self.mock_now-relativedelta(months=37))
 
-    @patch('activitylog.management.commands.delete_old_activitylogs.subprocess.run')
+    def assert_uploaded_to_s3(self, mock_run, age):
+        assert mock_run.call_count == 1
+        cutoff = (self.mock_now-relativedelta(years=age)).strftime('%Y-%m-%d')
+        filename = f"{settings.S3_LOG_BACKUP_ROOT_FILENAME}_{cutoff}_{self.mock_now.strftime('%Y%m%d%H%M%S')}.csv.gz"
+        command, = mock_run.call_args.args
+        assert command[:3] == ['aws', 's3', 'cp']
+        assert os.path.basename(command[3]) == filename
+        assert command[4] == os.path.join(settings.S3_LOG_BACKUP_PATH, filename)
+
+    @patch('activitylog.backup.subprocess.run')
     @patch('activitylog.management.commands.delete_old_activitylogs.timezone.now')
     def test_delete_default_old_logs(self, mock_now, mock_run):
         mock_now.return_value = self.mock_now
         assert ActivityLog.objects.count() == 3
         # no age, defaults to 1 yr
-        management.call_command('delete_old_activitylogs')
+        management.call_command('delete_old_activitylogs', stdout=StringIO())
         # 2 logs left - the one that's < 1 yrs old plus the new one to log this activity
         assert ActivityLog.objects.count() == 2
         all_log_ids = ActivityLog.objects.values_list("id", flat=True)
         for log in [self.log_25monthsold, self.log_37monthsold]:
             self.assertNotIn(log.id, all_log_ids)
         self.assertIn(self.log_11monthsold.id, all_log_ids)
+        self.assert_uploaded_to_s3(mock_run, age=1)
 
-        assert mock_run.call_count == 1
-        cutoff = (self.mock_now-relativedelta(years=1)).strftime('%Y-%m-%d')
-        filename = f"{settings.S3_LOG_BACKUP_ROOT_FILENAME}_{cutoff}_{self.mock_now.strftime('%Y%m%d%H%M%S')}.csv"
-        mock_run.assert_called_once_with(
-            ['aws', 's3', 'cp', filename, os.path.join(settings.S3_LOG_BACKUP_PATH, filename)], check=True
-        )
-
-    @patch('activitylog.management.commands.delete_old_activitylogs.subprocess.run')
+    @patch('activitylog.backup.subprocess.run')
     @patch('activitylog.management.commands.delete_old_activitylogs.timezone.now')
     def test_delete_old_logs_with_args(self, mock_now, mock_run):
         mock_now.return_value = self.mock_now
         assert ActivityLog.objects.count() == 3
-        management.call_command('delete_old_activitylogs', age=3)
+        management.call_command('delete_old_activitylogs', age=3, stdout=StringIO())
         # 3 logs left - the 2 that are < 3 yrs old plus the new one to log this activity
         assert ActivityLog.objects.count() == 3
         all_log_ids = ActivityLog.objects.values_list("id", flat=True)
         for log in [self.log_11monthsold, self.log_25monthsold]:
             self.assertIn(log.id, all_log_ids)
         self.assertNotIn(self.log_37monthsold.id, all_log_ids)
+        self.assert_uploaded_to_s3(mock_run, age=3)
 
-        assert mock_run.call_count == 1
-        cutoff = (self.mock_now-relativedelta(years=3)).strftime('%Y-%m-%d')
-        filename = f"{settings.S3_LOG_BACKUP_ROOT_FILENAME}_{cutoff}_{self.mock_now.strftime('%Y%m%d%H%M%S')}.csv"
-        mock_run.assert_called_once_with(
-            ['aws', 's3', 'cp', filename, os.path.join(settings.S3_LOG_BACKUP_PATH, filename)], check=True
-        )
+    @patch('activitylog.backup.subprocess.run')
+    @patch('activitylog.management.commands.delete_old_activitylogs.timezone.now')
+    def test_nothing_to_delete(self, mock_now, mock_run):
+        mock_now.return_value = self.mock_now
+        management.call_command('delete_old_activitylogs', age=5, stdout=StringIO())
+        assert ActivityLog.objects.count() == 3
+        assert mock_run.call_count == 0
+
+    @patch('activitylog.management.commands.delete_old_activitylogs.timezone.now')
+    def test_local_backup_in_batches(self, mock_now):
+        mock_now.return_value = self.mock_now
+        old_logs = [
+            baker.make(ActivityLog, log=f'old message {i}', timestamp=self.mock_now-relativedelta(months=13, days=i))
+            for i in range(7)
+        ]
+        with tempfile.TemporaryDirectory() as backup_dir:
+            with override_settings(
+                ACTIVITYLOG_BACKUP_BACKEND="activitylog.backup.LocalBackup", ACTIVITYLOG_BACKUP_LOCAL_DIR=backup_dir
+            ):
+                stdout = StringIO()
+                management.call_command('delete_old_activitylogs', batch_size=3, stdout=stdout)
+            backup_file, = os.listdir(backup_dir)
+            assert backup_file.endswith(".csv.gz")
+            with gzip.open(os.path.join(backup_dir, backup_file), "rt") as infile:
+                rows = list(csv.reader(infile))
+
+        assert rows[0] == ["Timestamp", "Log"]
+        # backed up in id order
+        expected = [self.log_25monthsold, self.log_37monthsold, *old_logs]
+        assert rows[1:] == [[log.timestamp.isoformat(), log.log] for log in expected]
+        assert not ActivityLog.objects.filter(id__in=[log.id for log in expected]).exists()
+        assert ActivityLog.objects.filter(id=self.log_11monthsold.id).exists()
+        output = stdout.getvalue()
+        assert "9 activitylogs older than 2018-10-01 backed up to local storage and deleted" in output
+        assert "rows/s" in output
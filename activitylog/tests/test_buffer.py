@@ -0,0 +1,126 @@
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+
+import pytest
+
+from activitylog.buffer import activity_log_buffer, log_activity
+from activitylog.middleware import ActivityLogBufferMiddleware
+from activitylog.models import ActivityLog
+
+
+pytestmark = pytest.mark.django_db
+
+
+def _activitylog_inserts(queries):
+    return [query for query in queries if query["sql"].startswith('INSERT INTO "activitylog_activitylog"')]
+
+
+def test_log_activity_without_buffer(student_user, event):
+    log_activity("Event updated", actor=student_user, obj=event, action="updated")
+    activitylog = ActivityLog.objects.get(log="Event updated")
+    assert activitylog.log == "Event updated"
+    assert activitylog.actor_id == student_user.id
+    assert activitylog.object_type == "booking.event"
+    assert activitylog.object_id == event.id
+    assert activitylog.action == "updated"
+
+
+def test_buffered_logs_written_in_one_query(student_user):
+    with CaptureQueriesContext(connection) as queries:
+        with activity_log_buffer(actor=student_user):
+            for i in range(5):
+                log_activity(f"buffered log {i}")
+            assert not ActivityLog.objects.filter(log__startswith="buffered log").exists()
+    assert len(_activitylog_inserts(queries.captured_queries)) == 1
+    buffered_logs = ActivityLog.objects.filter(log__startswith="buffered log")
+    assert buffered_logs.count() == 5
+    assert set(buffered_logs.values_list("actor_id", flat=True)) == {student_user.id}
+
+
+def test_nested_buffers_write_at_outermost():
+    with activity_log_buffer():
+        log_activity("outer")
+        with activity_log_buffer():
+            log_activity("inner")
+        assert ActivityLog.objects.count() == 0
+    assert ActivityLog.objects.count() == 2
+
+
+def test_buffered_logs_written_on_error():
+    with pytest.raises(ValueError):
+        with activity_log_buffer():
+            log_activity("before error")
+            raise ValueError
+    assert ActivityLog.objects.filter(log="before error").exists()
+
+
+def test_logs_in_rolled_back_transaction_dropped():
+    with activity_log_buffer():
+        log_activity("before transaction")
+        with pytest.raises(ValueError):
+            with transaction.atomic():
+                log_activity("rolled back")
+                with transaction.atomic():
+                    log_activity("rolled back inner")
+                raise ValueError
+        with transaction.atomic():
+            log_activity("committed")
+            with pytest.raises(ValueError):
+                with transaction.atomic():
+                    log_activity("rolled back savepoint")
+                    raise ValueError
+    assert sorted(ActivityLog.objects.values_list("log", flat=True)) == ["before transaction", "committed"]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_logs_in_committed_and_rolled_back_transactions():
+    # without the test transaction around it, so the outer atomic blocks really commit and roll back
+    with activity_log_buffer():
+        with transaction.atomic():
+            log_activity("committed")
+        with pytest.raises(ValueError):
+            with transaction.atomic():
+                log_activity("rolled back")
+                raise ValueError
+    assert list(ActivityLog.objects.values_list("log", flat=True)) == ["committed"]
+
+    # a buffer closed inside a transaction writes its logs in it
+    with transaction.atomic():
+        with activity_log_buffer():
+            log_activity("written in open transaction")
+        assert ActivityLog.objects.filter(log="written in open transaction").exists()
+    assert ActivityLog.objects.filter(log="written in open transaction").exists()
+
+
+def test_buffer_decorator():
+    @activity_log_buffer()
+    def job():
+        log_activity("job run")
+        return ActivityLog.objects.filter(log="job run").count()
+
+    # each call flushes its own logs when it returns
+    assert job() == 0
+    assert job() == 1
+    assert ActivityLog.objects.filter(log="job run").count() == 2
+
+
+@pytest.mark.parametrize("logged_in", [True, False])
+def test_middleware_sets_actor(rf, student_user, logged_in):
+    def get_response(request):
+        log_activity("request log")
+        return HttpResponse()
+
+    request = rf.get("/")
+    request.user = student_user if logged_in else AnonymousUser()
+    ActivityLogBufferMiddleware(get_response)(request)
+    assert ActivityLog.objects.get(log="request log").actor_id == (student_user.id if logged_in else None)
+
+
+def test_course_save_writes_logs_in_one_query(course):
+    course.cancelled = True
+    with CaptureQueriesContext(connection) as queries:
+        course.save()
+    assert len(_activitylog_inserts(queries.captured_queries)) == 1
+    assert ActivityLog.objects.filter(object_type="booking.course", object_id=course.id, action="cancelled").exists()
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class BookingConfig(AppConfig):
     name = 'booking'
+
+    def ready(self):
+        import booking.schedule_cache
+        import booking.conditional_get
@@ -0,0 +1,111 @@
+"""
+Batched course availability for lists of events and courses
+
+Event.spaces_left and Event.full read the denormalized booking counters on the event, but
+Course.full, Course.booking_count, Course.start and Event.course_order each query the course's
+events, so a page of 10 course events or 20 courses still runs dozens of queries.
+get_course_occupancy fetches the events for a whole page of courses in a single query, and
+prefetch_course_occupancy/prefetch_availability attach the results to the course instances so
+that the model properties read the precomputed values instead of querying again.
+"""
+from django.db.models import Exists, OuterRef
+
+from .models import Booking, Event
+
+
+def get_course_occupancy(courses):
+    """
+    Return occupancy for the given courses, from one query.
+    courses: iterable of Course instances
+    returns: {course_id: {
+        "events": uncancelled events, in order,
+        "event_counts": {event_id: open booking count},
+        "event_order": {event_id: 1-based position in the course},
+        "booking_count": max open booking count on any one uncancelled event,
+        "spaces_left": int,
+        "start": datetime or None,
+        "last_event_date": datetime or None,
+        "total_event_count": number of linked events, including cancelled ones,
+        "has_bookings": True if any linked event has bookings (of any status),
+    }}
+    Booking counts include no-shows, matching the Course model methods.
+    """
+    courses = {course.id: course for course in courses}
+    if not courses:
+        return {}
+
+    course_events = {course_id: [] for course_id in courses}
+    total_event_counts = {course_id: 0 for course_id in courses}
+    courses_with_bookings = set()
+    events = Event.objects.filter(course_id__in=courses).select_related("event_type__track").annotate(
+        has_bookings=Exists(Booking.objects.filter(event_id=OuterRef("id")))
+    ).order_by("start", "id")
+    for event in events:
+        total_event_counts[event.course_id] += 1
+        if event.has_bookings:
+            courses_with_bookings.add(event.course_id)
+        if not event.cancelled:
+            # so event.course_order etc don't need to fetch the course again
+            event.course = courses[event.course_id]
+            course_events[event.course_id].append(event)
+
+    course_occupancy = {}
+    for course_id, course in courses.items():
+        events = course_events[course_id]
+        event_counts = {event.id: event.open_booking_count for event in events}
+        booking_count = max(event_counts.values(), default=0)
+        course_occupancy[course_id] = {
+            "events": events,
+            "event_counts": event_counts,
+            "event_order": {event.id: order for order, event in enumerate(events, start=1)},
+            "booking_count": booking_count,
+            "spaces_left": course.max_participants - booking_count,
+            "start": events[0].start if events else None,
+            "last_event_date": events[-1].start if events else None,
+            "total_event_count": total_event_counts[course_id],
+            "has_bookings": course_id in courses_with_bookings,
+        }
+    return course_occupancy
+
+
+def prefetch_course_occupancy(courses):
+    """
+    Calculate occupancy for a page of courses and set it on the course instances, so that
+    full, spaces_left, start, all_events_full etc, and course_order on their events, don't query.
+    Returns the same course_occupancy dict as get_course_occupancy
+    """
+    courses = list(courses)
+    course_occupancy = get_course_occupancy(courses)
+    for course in courses:
+        course._occupancy = course_occupancy[course.id]
+    return course_occupancy
+
+
+def get_availability(events):
+    """
+    Return booking counts for the courses of the given events, from one query.
+    events: iterable of Event instances; use select_related("course")
+    returns: {course_id: {"booking_count": int, "start": datetime or None}}
+    Booking counts include no-shows, matching the Course model methods.
+    """
+    courses = {event.course_id: event.course for event in events if event.course_id}
+    return {
+        course_id: {"booking_count": occupancy["booking_count"], "start": occupancy["start"]}
+        for course_id, occupancy in get_course_occupancy(courses.values()).items()
+    }
+
+
+def prefetch_availability(events):
+    """
+    Calculate course availability for a page of events and set it on the course instances,
+    so that full, has_space, is_bookable and course_order don't need to query bookings or course events.
+    Use select_related("course") on the events queryset to avoid fetching each course separately.
+    Returns the same course_occupancy dict as get_course_occupancy
+    """
+    events = list(events)
+    courses = {event.course_id: event.course for event in events if event.course_id}
+    course_occupancy = get_course_occupancy(courses.values())
+    for event in events:
+        if event.course_id:
+            event.course._occupancy = course_occupancy[event.course_id]
+    return course_occupancy
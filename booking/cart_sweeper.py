@@ -0,0 +1,67 @@
+"""
+Deletes expired cart items (unpaid blocks with bookings, and unpaid product purchases) so they're
+released back to events/stock.  Run by the sweep_expired_cart_items command, or by a thread in each web
+process (started in wsgi.py if CART_SWEEPER_INTERVAL_SECONDS is set).  Pages that show cart items just
+filter out expired ones, so they don't need to wait for the sweep.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections, connection, transaction
+
+from merchandise.models import ProductPurchase
+from .models import Block
+
+
+logger = logging.getLogger(__name__)
+
+# arbitrary id for the postgres advisory lock that stops sweeps running at the same time
+SWEEPER_LOCK_ID = 74201
+
+_sweeper_thread = None
+
+
+def sweep_expired_cart_items():
+    """
+    Delete all expired cart items, under a db lock so only one process sweeps at a time.
+    Returns the number of blocks and purchases deleted, or None if another sweep was already running
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", [SWEEPER_LOCK_ID])
+            locked = cursor.fetchone()[0]
+        if not locked:
+            logger.info("Expired cart items are already being cleaned up by another process")
+            return None
+        deleted_blocks = Block.cleanup_expired_blocks()
+        deleted_purchases = ProductPurchase.cleanup_expired_purchases()
+    if deleted_blocks or deleted_purchases:
+        logger.info("Deleted %s expired blocks and %s expired product purchases", deleted_blocks, deleted_purchases)
+    return deleted_blocks, deleted_purchases
+
+
+def _run_sweeper(interval):
+    while True:
+        time.sleep(interval)
+        # every web process runs a sweeper thread; only sweep if no other process has in this interval
+        if caches["shared"].add("cart_sweeper_last_run", True, timeout=interval):
+            try:
+                sweep_expired_cart_items()
+            except Exception:
+                logger.exception("Error cleaning up expired cart items")
+            finally:
+                close_old_connections()
+
+
+def start_sweeper_thread(interval=None):
+    global _sweeper_thread
+    interval = interval or settings.CART_SWEEPER_INTERVAL_SECONDS
+    if _sweeper_thread is None:
+        _sweeper_thread = threading.Thread(
+            target=_run_sweeper, args=(interval,), name="cart-sweeper", daemon=True
+        )
+        _sweeper_thread.start()
+    return _sweeper_thread
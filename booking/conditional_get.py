@@ -0,0 +1,166 @@
+"""
+Conditional GET (ETag) for the public listing pages
+
+The schedule, course list, event and merchandise pages (and the studioadmin timetable) change far less
+often than they're requested, so views using ConditionalGetMixin send an ETag, and a request with a
+matching If-None-Match gets a 304 without the page being rendered.
+
+None of these models have updated timestamps, so the ETag is built from version counters in the
+shared cache rather than from a Last-Modified date:
+- the view's own versions (get_etag_versions), e.g. the track's schedule version (see schedule_cache)
+- the site-wide parts of the base template (menu tracks, notices)
+- the user: ETags are per user (and user viewed as), and include a per-user version that's bumped when
+  anything that changes their booking buttons or cart is saved (bookings, including bulk updates, waiting
+  lists, blocks, subscriptions, disclaimers, cart items)
+
+Pages with messages waiting to be shown are always rendered.
+"""
+import hashlib
+import time
+
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from common.reference_data import shared_cache
+from merchandise.models import merchandise_available
+from .models import (
+    Block, Booking, EventType, GiftVoucher, Subscription, Track, WaitingListUser, bookings_updated,
+    gift_vouchers_available, upcoming_tracks
+)
+
+
+def _version_key(name):
+    return f"page_version_{name}"
+
+
+def version(name):
+    version = shared_cache().get(_version_key(name))
+    if version is None:
+        # a timestamp, so a cleared cache can't restart at a version that's already been used
+        shared_cache().add(_version_key(name), time.time_ns(), timeout=None)
+        version = shared_cache().get(_version_key(name))
+    return version
+
+
+def bump_version(*names):
+    def _bump():
+        shared_cache().delete_many([_version_key(name) for name in names])
+    _bump()
+    if transaction.get_connection().in_atomic_block:
+        # and again once it's committed, in case another request got the new version with the old data
+        transaction.on_commit(_bump)
+
+
+def versioned_by(name, models):
+    """Bump the named version when any of models (or "app_label.ModelName" strings) is saved or deleted"""
+    def _changed(sender, **kwargs):
+        bump_version(name)
+    for model in models:
+        model_name = model if isinstance(model, str) else model._meta.label
+        for signal, action in [(post_save, "save"), (post_delete, "delete")]:
+            signal.connect(_changed, sender=model, weak=False, dispatch_uid=f"page_version_{name}_{model_name}_{action}")
+
+
+versioned_by("merchandise", ["merchandise.Product", "merchandise.ProductVariant", "merchandise.ProductCategory"])
+versioned_by("timetable", ["timetable.TimetableSession", EventType, Track])
+versioned_by("notices", ["notices.Notice"])
+
+
+def time_bucket(seconds):
+    # for pages that also change with time (events drop off the schedule once they've started)
+    return int(time.time() // seconds)
+
+
+def site_versions():
+    """The parts of the base template that are the same for every page"""
+    return [
+        [track.id for track in upcoming_tracks()], gift_vouchers_available(), merchandise_available(),
+        version("notices"),
+    ]
+
+
+def user_versions(request):
+    if not request.user.is_authenticated:
+        # anonymous users' cart (gift vouchers) is in the session
+        return [None, request.session.get("purchases")]
+    # the user whose bookings are shown; set on the session by the first page view
+    view_as_user_id = request.session.get("user_id")
+    if view_as_user_id is None:
+        # imported here as booking.utils imports the studioadmin views, which use this module
+        from .utils import get_view_as_user
+        view_as_user_id = get_view_as_user(request).id
+    user_ids = sorted({request.user.id, view_as_user_id})
+    return [request.user.id, view_as_user_id, *(version(f"user_{user_id}") for user_id in user_ids)]
+
+
+class ConditionalGetMixin:
+    """
+    Send an ETag with GET responses, and return 304 for requests that already have the current one.
+    get_etag_versions returns versions of whatever (besides the user and the base template) the page
+    is built from; by default, the versions named in etag_versions, and the time bucket if the page also
+    changes with time (etag_max_age, in seconds).
+    """
+    etag_versions = ()
+    etag_max_age = None
+
+    def get_etag_versions(self):
+        versions = [version(name) for name in self.etag_versions]
+        if self.etag_max_age is not None:
+            versions.append(time_bucket(self.etag_max_age))
+        return versions
+
+    def get_etag(self):
+        if get_messages(self.request):
+            return None
+        versions = [self.get_etag_versions(), site_versions(), user_versions(self.request)]
+        return hashlib.md5(repr(versions).encode()).hexdigest()
+
+    def get(self, request, *args, **kwargs):
+        etag_func = lambda request, *args, **kwargs: self.get_etag()
+        response = condition(etag_func=etag_func)(super().get)(request, *args, **kwargs)
+        # always revalidate; user pages aren't to be stored by shared caches
+        if request.user.is_authenticated:
+            patch_cache_control(response, no_cache=True, private=True)
+        else:
+            patch_cache_control(response, no_cache=True)
+        return response
+
+
+@receiver([post_save, post_delete], sender=Booking)
+@receiver([post_save, post_delete], sender=WaitingListUser)
+@receiver([post_save, post_delete], sender=Block)
+@receiver([post_save, post_delete], sender=Subscription)
+@receiver([post_save, post_delete], sender="merchandise.ProductPurchase")
+@receiver([post_save, post_delete], sender="accounts.OnlineDisclaimer")
+@receiver([post_save, post_delete], sender="accounts.UserProfile")
+def user_data_changed(sender, instance, **kwargs):
+    # managers' pages include their managed users' items
+    bump_version(*[f"user_{user.id}" for user in [instance.user, instance.user.manager_user] if user is not None])
+
+
+@receiver(bookings_updated, sender=Booking)
+def bookings_bulk_updated(sender, user_ids, **kwargs):
+    users = User.objects.filter(id__in=user_ids).select_related("childuserprofile__parent_user_profile__user")
+    bump_version(*{
+        f"user_{user.id}" for booking_user in users for user in [booking_user, booking_user.manager_user]
+        if user is not None
+    })
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, **kwargs):
+    # includes logging in (last_login), which also changes the csrf token in the page
+    bump_version(*[f"user_{user.id}" for user in [instance, instance.manager_user] if user is not None])
+
+
+@receiver([post_save, post_delete], sender=GiftVoucher)
+def gift_voucher_changed(sender, instance, **kwargs):
+    # gift vouchers are in the cart of the user with the purchaser's email
+    if instance.purchaser_email:
+        user_ids = User.objects.filter(email=instance.purchaser_email).values_list("id", flat=True)
+        bump_version(*[f"user_{user_id}" for user_id in user_ids])
@@ -2,11 +2,11 @@ import os
 
 from django.conf import settings
 from django.contrib.sites.models import Site
-from django.core.mail import send_mail
 from django.core.mail.message import EmailMultiAlternatives
 from django.template.loader import get_template
 
-from activitylog.models import ActivityLog
+from activitylog.buffer import log_activity
+from emails.utils import queue_bulk_email, queue_email
 
 
 def send_waiting_list_email(event, waiting_list_users, host):
@@ -31,10 +31,11 @@ def send_waiting_list_email(event, waiting_list_users, host):
             ),
             "text/html"
         )
-        msg.send(fail_silently=False)
+        queue_email(msg)
 
-        ActivityLog.objects.create(
-            log=f'Waiting list email sent to user(s) {", ".join(user_emails)} for event {event}'
+        log_activity(
+            f'Waiting list email sent to user(s) {", ".join(user_emails)} for event {event}', obj=event,
+            action="waiting_list_emailed"
         )
 
 
@@ -45,7 +46,6 @@ def send_bcc_emails(context, bcc_user_emails, subject, template_without_ext, rep
         subject,
         get_template(f"{template_without_ext}.txt").render(context),
         settings.DEFAULT_FROM_EMAIL,
-        bcc=bcc_user_emails,
     )
     if reply_to:
         msg.reply_to = [reply_to]
@@ -55,7 +55,8 @@ def send_bcc_emails(context, bcc_user_emails, subject, template_without_ext, rep
         get_template(f"{template_without_ext}.html").render(context),
         "text/html"
     )
-    msg.send(fail_silently=False)
+    # rendered once, sent in chunks of bcc recipients
+    return queue_bulk_email(msg, bcc_user_emails)
 
 
 def send_user_and_studio_emails(
@@ -66,21 +67,25 @@ def send_user_and_studio_emails(
         context["host"] = f"https://{Site.objects.get_current().domain}"
     context.update({"studio_email": settings.DEFAULT_STUDIO_EMAIL})
     # send email to user
-    send_mail(
+    msg = EmailMultiAlternatives(
         f'{settings.ACCOUNT_EMAIL_SUBJECT_PREFIX} {subjects["user"]}',
         get_template(os.path.join(template_dir, f"{template_short_name}.txt")).render(context),
         settings.DEFAULT_FROM_EMAIL,
         [user_email if user_email is not None else user.email],
-        html_message=get_template(os.path.join(template_dir, f"{template_short_name}.html")).render(context),
-        fail_silently=False
     )
+    msg.attach_alternative(
+        get_template(os.path.join(template_dir, f"{template_short_name}.html")).render(context),
+        "text/html"
+    )
+    queue_email(msg)
 
     # send email to studio if flagged for the course
     if send_to_studio:
-        send_mail(
-            f'{settings.ACCOUNT_EMAIL_SUBJECT_PREFIX} {subjects["studio"]}',
-            get_template(os.path.join(template_dir, f"to_studio_{template_short_name}.txt")).render(context),
-            settings.DEFAULT_FROM_EMAIL,
-            [settings.DEFAULT_STUDIO_EMAIL],
-            fail_silently=False
+        queue_email(
+            EmailMultiAlternatives(
+                f'{settings.ACCOUNT_EMAIL_SUBJECT_PREFIX} {subjects["studio"]}',
+                get_template(os.path.join(template_dir, f"to_studio_{template_short_name}.txt")).render(context),
+                settings.DEFAULT_FROM_EMAIL,
+                [settings.DEFAULT_STUDIO_EMAIL],
+            )
         )
@@ -0,0 +1,191 @@
+"""
+Per-request snapshot of what a user can book with
+
+The booking buttons on the schedule, course and bookings pages check the viewing user's
+blocks, subscriptions, bookings and waiting list entries separately for every event on the
+page.  UserEntitlements loads the user's data once, and the button/booking info utils answer
+from memory.
+
+A snapshot is only valid for as long as the user's data doesn't change, so create one per
+request (or per ajax action, after the booking has been updated).
+"""
+from collections import defaultdict
+
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from .models import Block, Booking, Subscription, WaitingListUser
+
+
+def _nulls_last(value):
+    # sort key to match postgres ordering of NULLs last in ascending order
+    return value is None, value
+
+
+def _with_booked_course_ids(blocks):
+    # set the courses that each course block has been used for, from one query
+    blocks = list(blocks)
+    booked_course_ids = defaultdict(set)
+    course_blocks = [block for block in blocks if block.block_config.course]
+    if course_blocks:
+        block_bookings = Booking.objects.filter(block__in=course_blocks).order_by().values_list(
+            "block_id", "event__course_id"
+        )
+        for block_id, course_id in block_bookings:
+            booked_course_ids[block_id].add(course_id)
+    for block in blocks:
+        block._booked_course_ids = booked_course_ids[block.id]
+    return blocks
+
+
+def _sorted_blocks(blocks):
+    return sorted(blocks, key=lambda block: (_nulls_last(block.expiry_date), block.purchase_date))
+
+
+def _sorted_subscriptions(subscriptions):
+    return sorted(
+        subscriptions,
+        key=lambda subscription: (
+            _nulls_last(subscription.expiry_date), _nulls_last(subscription.start_date), subscription.purchase_date
+        )
+    )
+
+
+class UserEntitlements:
+
+    def __init__(self, user, events=None):
+        self.user = user
+        self._bookings_by_event = defaultdict(list)
+        self._bookings_by_course = defaultdict(list)
+        self._waiting_list_event_ids = set()
+        self._loaded_event_ids = set()
+        self._loaded_course_ids = set()
+        self._subscription_usage = {}
+        if events:
+            self.load_events(events)
+
+    @classmethod
+    def for_users(cls, users):
+        """
+        Entitlements for several users (e.g. everyone on a register), with all their blocks and
+        subscriptions fetched in the same few queries.  Returns {user id: UserEntitlements}
+        """
+        entitlements = {user.id: cls(user) for user in users}
+        blocks = defaultdict(list)
+        for block in _with_booked_course_ids(
+            Block.objects.active().filter(user_id__in=entitlements).select_related("block_config")
+        ):
+            blocks[block.user_id].append(block)
+        subscriptions = defaultdict(list)
+        for subscription in Subscription.objects.filter(user_id__in=entitlements, paid=True).select_related("config"):
+            subscriptions[subscription.user_id].append(subscription)
+        for user_id, user_entitlements in entitlements.items():
+            # set the cached properties
+            user_entitlements.blocks = _sorted_blocks(blocks[user_id])
+            user_entitlements.subscriptions = _sorted_subscriptions(subscriptions[user_id])
+        return entitlements
+
+    @cached_property
+    def blocks(self):
+        """
+        The user's active blocks, with the courses they've been used for set on each one.
+        Ordered by expiry date and purchase date, so the first valid block is the one to use next
+        """
+        return _sorted_blocks(_with_booked_course_ids(self.user.blocks.active().select_related("block_config")))
+
+    @cached_property
+    def subscriptions(self):
+        """The user's paid subscriptions, in the order they should be used"""
+        return _sorted_subscriptions(self.user.subscriptions.filter(paid=True).select_related("config"))
+
+    def load_events(self, events):
+        """Fetch the user's bookings and waiting list entries for these events and their courses in one go"""
+        event_ids = {event.id for event in events} - self._loaded_event_ids
+        course_ids = {event.course_id for event in events if event.course_id} - self._loaded_course_ids
+        self._load(event_ids, course_ids)
+
+    def load_courses(self, courses):
+        """Fetch the user's bookings for all events on these courses in one go"""
+        self._load(set(), {course.id for course in courses} - self._loaded_course_ids)
+
+    def _load(self, event_ids, course_ids):
+        if not (event_ids or course_ids):
+            return
+        bookings = self.user.bookings.filter(
+            Q(event_id__in=event_ids) | Q(event__course_id__in=course_ids)
+        ).select_related("event", "block__block_config")
+        for booking in bookings:
+            if booking.event_id in event_ids:
+                self._bookings_by_event[booking.event_id].append(booking)
+            if booking.event.course_id in course_ids:
+                self._bookings_by_course[booking.event.course_id].append(booking)
+        self._waiting_list_event_ids.update(
+            WaitingListUser.objects.filter(user=self.user, event_id__in=event_ids).values_list("event_id", flat=True)
+        )
+        self._loaded_event_ids.update(event_ids)
+        self._loaded_course_ids.update(course_ids)
+
+    def event_bookings(self, event):
+        """The user's bookings for this event (any status); there will be at most one"""
+        if event.id not in self._loaded_event_ids:
+            self._load({event.id}, set())
+        return self._bookings_by_event[event.id]
+
+    def course_bookings(self, course):
+        """The user's bookings for events on this course (any status), ordered by event start"""
+        if course.id not in self._loaded_course_ids:
+            self._load(set(), {course.id})
+        return self._bookings_by_course[course.id]
+
+    def on_waiting_list(self, event):
+        if event.id not in self._loaded_event_ids:
+            self._load({event.id}, set())
+        return event.id in self._waiting_list_event_ids
+
+    def has_available_block(self, event, dropin_only=False):
+        if event.course and not event.course.allow_drop_in and not dropin_only:
+            return self.has_available_course_block(event.course)
+        return any(
+            block.valid_for_event(event) for block in self.blocks
+            if not (dropin_only and block.block_config.course)
+        )
+
+    def has_available_course_block(self, course):
+        return any(block.valid_for_course(course) for block in self.blocks)
+
+    def get_active_course_block(self, course):
+        return next(
+            (
+                block for block in self.blocks
+                if block.block_config.course and block.valid_for_course(course)
+            ),
+            None
+        )
+
+    def subscription_usage(self, subscription):
+        """Usage ledger for one of the user's subscriptions; its bookings are only fetched once"""
+        if subscription.id not in self._subscription_usage:
+            self._subscription_usage[subscription.id] = subscription.usage_ledger()
+        return self._subscription_usage[subscription.id]
+
+    def iter_available_subscriptions(self, event):
+        event_type_key = str(event.event_type_id)
+        for subscription in self.subscriptions:
+            if event_type_key in (subscription.config.bookable_event_types or {}) \
+                    and self.subscription_usage(subscription).valid_for_event(event):
+                yield subscription
+
+    def has_available_subscription(self, event):
+        return any(self.iter_available_subscriptions(event))
+
+    def course_booking_type(self, course):
+        """
+        "course" or "dropin", determined from PAID bookings only.  If there are no paid bookings,
+        bookings with no block are single bookings added by admins, so are considered dropin.
+        """
+        open_bookings = [booking for booking in self.course_bookings(course) if booking.status == "OPEN"]
+        paid_bookings = [booking for booking in open_bookings if booking.block and booking.block.paid]
+        if paid_bookings:
+            return "course" if paid_bookings[0].block.block_config.course else "dropin"
+        if any(booking.block_id is None for booking in open_bookings):
+            return "dropin"
@@ -0,0 +1,129 @@
+import calendar
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from delorean import Delorean
+from dateutil.relativedelta import relativedelta
+import pytz
+
+from common import date_utils
+
+
+# The Delorean/pytz implementations that common.date_utils replaced; kept here to benchmark against,
+# and as the reference implementation for booking/tests/test_date_utils.py
+
+def legacy_start_of_day_in_utc(input_datetime):
+    return Delorean(input_datetime, timezone="utc").start_of_day
+
+
+def legacy_end_of_day_in_utc(input_datetime):
+    return Delorean(input_datetime, timezone="utc").end_of_day
+
+
+def legacy_end_of_day_in_local_time(input_datetime, local_timezone="Europe/London"):
+    end_of_day_utc = legacy_end_of_day_in_utc(input_datetime)
+    utc_offset_at_input_datetime = Delorean(input_datetime, timezone="utc").shift(local_timezone).datetime.utcoffset()
+    return end_of_day_utc - utc_offset_at_input_datetime
+
+
+def legacy_utc_adjusted_datetime(naive_target_datetime):
+    naive_datetime_in_utc = Delorean(naive_target_datetime, timezone="UTC")
+    uk_datetime = naive_datetime_in_utc.shift("Europe/London")
+    utcoffset = uk_datetime.datetime.utcoffset()
+    return naive_datetime_in_utc.datetime - utcoffset
+
+
+def legacy_local_strftime(input_datetime):
+    return input_datetime.astimezone(pytz.timezone('Europe/London')).strftime('%d %b %Y, %H:%M')
+
+
+def legacy_subscription_period_start_date(config_start_date, duration, duration_units, now, next=False):
+    """SubscriptionConfig.get_subscription_period_start_date for a recurring, start_date config, as of `now`"""
+    naive_now = now.replace(tzinfo=None)
+    if duration_units == "weeks":
+        weekday = config_start_date.weekday()
+        if now.weekday() == weekday:
+            if next:
+                calculated_start = getattr(
+                    Delorean(naive_now, timezone="utc"), f"{'next'}_{calendar.day_name[weekday].lower()}"
+                )()
+                calculated_start = legacy_start_of_day_in_utc(calculated_start.datetime)
+            else:
+                calculated_start = legacy_start_of_day_in_utc(Delorean(now.replace(tzinfo=pytz.utc), timezone="utc").datetime)
+        else:
+            weekday_method = f"{'next' if next else 'last'}_{calendar.day_name[weekday].lower()}"
+            calculated_start = getattr(Delorean(naive_now, timezone="utc"), weekday_method)()
+            calculated_start = legacy_start_of_day_in_utc(calculated_start.datetime)
+        time_diff = (calculated_start - config_start_date).days / 7
+        remainder = time_diff % duration
+        if next:
+            if duration > 1:
+                remainder = duration - remainder
+            result = calculated_start + timedelta(weeks=remainder)
+        else:
+            result = calculated_start - timedelta(weeks=remainder)
+    else:
+        day_of_month = config_start_date.day
+        datetime_this_month = datetime(day=day_of_month, month=now.month, year=now.year, tzinfo=dt_timezone.utc)
+        if now.day >= day_of_month:
+            calculated_start = datetime_this_month + relativedelta(months=1) if next else datetime_this_month
+        else:
+            calculated_start = datetime_this_month if next else datetime_this_month - relativedelta(months=1)
+        calculated_start = legacy_start_of_day_in_utc(calculated_start)
+        time_diff = relativedelta(calculated_start, config_start_date)
+        remainder = time_diff.months % duration
+        if next:
+            result = calculated_start + relativedelta(months=remainder)
+        else:
+            result = calculated_start - relativedelta(months=remainder)
+    return result if result >= config_start_date else None
+
+
+class Command(BaseCommand):
+    help = "Time the date/timezone helpers in common.date_utils against the Delorean/pytz versions they replaced"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=10000, help='Calls per function (default 10000)')
+
+    def handle(self, *args, **options):
+        number = options["number"]
+        now = datetime(2021, 3, 28, 0, 30, tzinfo=dt_timezone.utc)
+        naive = now.replace(tzinfo=None)
+        config_start = datetime(2020, 1, 8, tzinfo=dt_timezone.utc)
+        today = now.date()
+
+        comparisons = [
+            ("start of day", lambda: legacy_start_of_day_in_utc(now), lambda: date_utils.start_of_day(now)),
+            ("end of day", lambda: legacy_end_of_day_in_utc(now), lambda: date_utils.end_of_day(now)),
+            (
+                "end of day in local time",
+                lambda: legacy_end_of_day_in_local_time(now), lambda: date_utils.end_of_day_in_local_time(now)
+            ),
+            (
+                "utc adjusted datetime",
+                lambda: legacy_utc_adjusted_datetime(naive), lambda: date_utils.local_adjusted_datetime(naive)
+            ),
+            (
+                "local strftime",
+                lambda: legacy_local_strftime(now),
+                lambda: now.astimezone(date_utils.get_timezone('Europe/London')).strftime('%d %b %Y, %H:%M'),
+            ),
+            (
+                "weekly period start",
+                lambda: legacy_subscription_period_start_date(config_start, 2, "weeks", now),
+                lambda: date_utils.subscription_period_start_date(config_start, 2, "weeks", today),
+            ),
+            (
+                "monthly period start",
+                lambda: legacy_subscription_period_start_date(config_start, 1, "months", now, next=True),
+                lambda: date_utils.subscription_period_start_date(config_start, 1, "months", today, next=True),
+            ),
+        ]
+        self.stdout.write(f"{'':<28}{'legacy (us)':>14}{'new (us)':>14}{'speedup':>10}")
+        for name, legacy, new in comparisons:
+            legacy_time = timeit.timeit(legacy, number=number) / number * 1e6
+            new_time = timeit.timeit(new, number=number) / number * 1e6
+            self.stdout.write(f"{name:<28}{legacy_time:>14.2f}{new_time:>14.2f}{legacy_time / new_time:>9.1f}x")
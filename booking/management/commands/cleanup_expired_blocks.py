@@ -1,11 +1,14 @@
 
 from django.core.management.base import BaseCommand
 
+from activitylog.buffer import activity_log_buffer
+
 from booking.models import Block
 
 
 class Command(BaseCommand):
     help = "Delete unpaid blocks with bookings that have expired"
 
+    @activity_log_buffer()
     def handle(self, *args, **options):
         Block.cleanup_expired_blocks()
@@ -0,0 +1,435 @@
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import (
+    ChildUserProfile, DataPrivacyPolicy, DisclaimerContent, OnlineDisclaimer, SignedDataPrivacy, UserProfile
+)
+from activitylog.models import ActivityLog
+from booking.models import (
+    Block, BlockConfig, BlockVoucher, Booking, Course, Event, EventType, GiftVoucher, GiftVoucherConfig,
+    Subscription, SubscriptionConfig, TotalVoucher, Track, recount_block_used_counts,
+    recount_event_booking_counters,
+)
+from common import reference_data
+from common.date_utils import get_timezone
+from payments.models import Invoice
+from timetable.models import TimetableSession
+
+
+BATCH_SIZE = 2000
+PASSWORD = "benchmark"
+
+# (track, event type, session name, day, time, max participants, course)
+TIMETABLE = [
+    ("Adults", "aerial", "Aerial 1", "0", time(18, 0), 10, False),
+    ("Adults", "aerial", "Aerial 2", "0", time(19, 30), 10, True),
+    ("Adults", "aerial", "Aerial 1", "1", time(18, 0), 10, False),
+    ("Adults", "aerial", "Aerial 3", "1", time(19, 30), 8, True),
+    ("Adults", "floor", "Stretch", "2", time(12, 0), 15, False),
+    ("Adults", "aerial", "Aerial 2", "2", time(18, 0), 10, False),
+    ("Adults", "aerial", "Open training", "2", time(19, 30), 12, False),
+    ("Adults", "floor", "Conditioning", "3", time(18, 0), 15, False),
+    ("Adults", "aerial", "Aerial 4", "3", time(19, 30), 8, True),
+    ("Adults", "floor", "Stretch", "4", time(18, 0), 15, False),
+    ("Adults", "aerial", "Aerial 1", "5", time(10, 0), 10, False),
+    ("Adults", "aerial", "Aerial 2", "5", time(11, 30), 10, False),
+    ("Adults", "floor", "Handstands", "5", time(13, 0), 12, False),
+    ("Adults", "aerial", "Open training", "6", time(10, 0), 12, False),
+    ("Kids", "aerial", "Kids aerial", "1", time(16, 30), 8, True),
+    ("Kids", "aerial", "Kids aerial", "3", time(16, 30), 8, True),
+    ("Kids", "floor", "Kids acro", "4", time(16, 30), 12, False),
+    ("Kids", "aerial", "Kids aerial", "5", time(9, 0), 8, False),
+    ("Kids", "floor", "Kids acro", "5", time(14, 30), 12, False),
+]
+
+LOG_TEMPLATES = [
+    "Booking {id} for {event} (user {user}) opened",
+    "Booking {id} for {event} (user {user}) cancelled",
+    "Block {id} purchased by user {user}",
+    "Invoice {id} paid by {user}",
+    "User {user} signed disclaimer",
+    "Emails sent to users for {event}",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a deterministic, production-sized dataset for benchmarking (see the run_benchmarks command). "
+        "Only use this on an empty database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=1, help='Random seed (default 1)')
+        parser.add_argument('--users', type=int, default=20000, help='Number of adult users (default 20000)')
+        parser.add_argument(
+            '--weeks', type=int, default=52,
+            help='Weeks of timetabled events, half of them in the past (default 52)'
+        )
+        parser.add_argument('--activity-logs', type=int, default=200000, help='Number of activity logs (default 200000)')
+        parser.add_argument(
+            '--force', action='store_true', help='Add the data even if the database already has events in it'
+        )
+
+    def handle(self, *args, **options):
+        if Event.objects.exists() and not options["force"]:
+            raise CommandError("The database already has events; use an empty database, or --force")
+
+        self.random = random.Random(options["seed"])
+        # events start from the Monday of the current week, so the schedule always has future events;
+        # everything else about the data only depends on the seed
+        today = timezone.now().date()
+        self.week_start = today - timedelta(days=today.weekday())
+        self.now = timezone.now()
+
+        with transaction.atomic():
+            self.create_policies()
+            event_types = self.create_tracks_and_event_types()
+            sessions = self.create_timetable(event_types)
+            events = self.create_events(sessions, options["weeks"])
+            users, children = self.create_users(options["users"])
+            block_configs, subscription_configs = self.create_configs(event_types)
+            self.create_bookings(events, users + children, block_configs, subscription_configs)
+            self.create_vouchers(block_configs)
+            self.create_activity_logs(options["activity_logs"], events, users)
+            recount_event_booking_counters(Event.objects.all())
+            recount_block_used_counts(Block.objects.all())
+        reference_data.clear()
+
+        for model in [
+            User, Event, Course, Booking, Block, Subscription, Invoice, BlockVoucher, TotalVoucher, GiftVoucher,
+            ActivityLog
+        ]:
+            self.stdout.write(f"{model.__name__}: {model.objects.count()}")
+
+    def _bulk_create(self, model, objects):
+        return model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+
+    def _local_datetime(self, date, time_of_day):
+        local_start = datetime.combine(date, time_of_day, tzinfo=get_timezone("Europe/London"))
+        return local_start.astimezone(dt_timezone.utc)
+
+    def create_policies(self):
+        # checked in the db rather than with the cached current_version(), which may be out of date here
+        if DataPrivacyPolicy.current() is None:
+            DataPrivacyPolicy.objects.create(content="Data privacy policy", version=Decimal("1.0"))
+        if DisclaimerContent.current() is None:
+            DisclaimerContent.objects.create(disclaimer_terms="Disclaimer terms", version=Decimal("1.0"), form=[])
+
+    def create_tracks_and_event_types(self):
+        adults, _ = Track.objects.get_or_create(name="Adults", defaults={"default": True})
+        kids, _ = Track.objects.get_or_create(name="Kids")
+        event_types = {}
+        for track in [adults, kids]:
+            for name in ["aerial", "floor"]:
+                event_types[(track.name, name)], _ = EventType.objects.get_or_create(
+                    track=track, name=name, defaults={"label": "class"}
+                )
+        return event_types
+
+    def create_timetable(self, event_types):
+        return [
+            (
+                TimetableSession.objects.create(
+                    name=name, event_type=event_types[(track, event_type)], day=day, time=session_time,
+                    max_participants=max_participants,
+                ),
+                course
+            )
+            for track, event_type, name, day, session_time, max_participants, course in TIMETABLE
+        ]
+
+    def create_events(self, sessions, weeks):
+        """Events for each timetable session, every week; course sessions run as 4-week courses"""
+        events = []
+        courses = []
+        first_week = -(weeks // 2)
+        for session, is_course in sessions:
+            course = None
+            for week in range(first_week, first_week + weeks):
+                if is_course and (week - first_week) % 4 == 0:
+                    course = Course(
+                        name=f"{session.name} {session.get_day_name()} wk{week - first_week + 1}",
+                        event_type=session.event_type, number_of_events=4, max_participants=session.max_participants,
+                        show_on_site=True, allow_drop_in=self.random.random() < 0.3,
+                    )
+                    courses.append(course)
+                date = self.week_start + timedelta(weeks=week, days=int(session.day))
+                events.append(
+                    Event(
+                        name=session.name, event_type=session.event_type, start=self._local_datetime(date, session.time),
+                        duration=session.duration, max_participants=session.max_participants, show_on_site=True,
+                        cancelled=self.random.random() < 0.01, course=course if is_course else None,
+                    )
+                )
+        self._bulk_create(Course, courses)
+        return self._bulk_create(Event, events)
+
+    def create_users(self, number_of_users):
+        """Adult users, of whom 1 in 10 manage 1 or 2 child users, plus staff and instructor users"""
+        password = make_password(PASSWORD)
+        users = [
+            User(
+                username=f"user{i:06d}@example.com", email=f"user{i:06d}@example.com", password=password,
+                first_name=f"First{i}", last_name=f"Last{i}", date_joined=self.now - timedelta(days=self.random.randrange(1500)),
+            )
+            for i in range(number_of_users)
+        ]
+        users = self._bulk_create(User, users)
+        managers = [user for user in users if self.random.random() < 0.1]
+        manager_ids = {user.id for user in managers}
+        unusable_password = make_password(None)
+        children = []
+        child_parents = []
+        for manager in managers:
+            for _ in range(self.random.choice([1, 1, 2])):
+                children.append(
+                    User(
+                        username=f"child{len(children):06d}", first_name=f"Child{len(children)}",
+                        last_name=manager.last_name, password=unusable_password,
+                    )
+                )
+                child_parents.append(manager)
+        children = self._bulk_create(User, children)
+
+        staff = User.objects.create_user(
+            username="staff@example.com", email="staff@example.com", password=PASSWORD, is_staff=True,
+            first_name="Staff", last_name="User",
+        )
+        instructor = User.objects.create_user(
+            username="instructor@example.com", email="instructor@example.com", password=PASSWORD,
+            first_name="Instructor", last_name="User",
+        )
+        instructor.groups.add(Group.objects.get_or_create(name="instructors")[0])
+
+        profiles = self._bulk_create(
+            UserProfile,
+            [
+                UserProfile(
+                    user=user, address="1 Test Street", postcode="AB1 2CD", phone="0123456789",
+                    date_of_birth=date(1960 + self.random.randrange(45), 1, 1), student=True,
+                    manager=user.id in manager_ids,
+                )
+                for user in [*users, staff, instructor]
+            ]
+        )
+        profiles = {profile.user_id: profile for profile in profiles}
+        self._bulk_create(
+            ChildUserProfile,
+            [
+                ChildUserProfile(
+                    user=child, address="1 Test Street", postcode="AB1 2CD", phone="0123456789",
+                    date_of_birth=date(2008 + self.random.randrange(10), 1, 1),
+                    parent_user_profile=profiles[parent.id],
+                )
+                for child, parent in zip(children, child_parents)
+            ]
+        )
+
+        data_privacy_version = DataPrivacyPolicy.current_version()
+        disclaimer_version = DisclaimerContent.current_version()
+        self._bulk_create(
+            SignedDataPrivacy,
+            [SignedDataPrivacy(user=user, version=data_privacy_version) for user in [*users, staff, instructor]]
+        )
+        # most users have a current disclaimer
+        self._bulk_create(
+            OnlineDisclaimer,
+            [
+                OnlineDisclaimer(
+                    user=user, version=disclaimer_version, health_questionnaire_responses={}, terms_accepted=True,
+                    emergency_contact_name="Contact", emergency_contact_relationship="Friend",
+                    emergency_contact_phone="0123456789", date=self.now - timedelta(days=self.random.randrange(300)),
+                )
+                for user in [*users, *children, staff, instructor] if self.random.random() < 0.9
+            ]
+        )
+        return users, children
+
+    def create_configs(self, event_types):
+        block_configs = {}
+        for (track, name), event_type in event_types.items():
+            block_configs[(event_type.id, "dropin")] = [
+                BlockConfig.objects.create(
+                    name=f"{track} {name} {size} class block", event_type=event_type, size=size, duration=duration,
+                    cost=Decimal(size * 12), active=True,
+                )
+                for size, duration in [(1, 2), (5, 8), (10, 12)]
+            ]
+            block_configs[(event_type.id, "course")] = [
+                BlockConfig.objects.create(
+                    name=f"{track} {name} course", event_type=event_type, size=4, duration=6, course=True,
+                    cost=Decimal(40), active=True,
+                )
+            ]
+        start_date = datetime.combine(self.week_start - timedelta(weeks=52), time(0), tzinfo=dt_timezone.utc)
+        subscription_configs = [
+            SubscriptionConfig.objects.create(
+                name=name, cost=Decimal(cost), duration=1, duration_units="months", start_date=start_date,
+                start_options="start_date", recurring=True,
+                bookable_event_types={
+                    str(event_type.id): {"allowed_number": allowed_number, "allowed_unit": "week"}
+                    for (track, _), event_type in event_types.items() if track == "Adults"
+                },
+            )
+            for name, cost, allowed_number in [("Monthly unlimited", 90, ""), ("Monthly 2 per week", 60, 2)]
+        ]
+        return block_configs, subscription_configs
+
+    def create_bookings(self, events, users, block_configs, subscription_configs):
+        """
+        Fill events from a pool of regular students, using blocks (bought as needed, each with a paid invoice)
+        and subscriptions.  A few users have unpaid items in their cart.
+        """
+        regulars = self.random.sample(users, max(1, len(users) // 3))
+        subscribers = set(user.id for user in self.random.sample(regulars, len(regulars) // 10))
+        subscriptions = self._bulk_create(
+            Subscription,
+            [
+                Subscription(
+                    user_id=user_id, config=self.random.choice(subscription_configs), paid=True, status="active",
+                    purchase_date=self.now - timedelta(days=20), start_date=self.now - timedelta(days=15),
+                    expiry_date=self.now + timedelta(days=15),
+                )
+                for user_id in sorted(subscribers)
+            ]
+        )
+        user_subscriptions = {subscription.user_id: subscription for subscription in subscriptions}
+        subscription_event_types = {
+            subscription.user_id: set(subscription.config.bookable_event_types) for subscription in subscriptions
+        }
+
+        invoices = []
+        blocks = []
+        bookings = []
+        # (user id, block config id) -> [block index, uses left]
+        open_blocks = {}
+        course_blocks = {}
+        course_users = defaultdict(list)
+        for event in sorted(events, key=lambda event: event.start):
+            is_past = event.start < self.now
+            if event.course_id:
+                if event.course_id not in course_users:
+                    course_users[event.course_id] = self.random.sample(
+                        regulars, min(len(regulars), self.random.randint(event.max_participants // 2, event.max_participants))
+                    )
+                attendees = course_users[event.course_id]
+            else:
+                fill = self.random.uniform(0.5, 1) if is_past else self.random.uniform(0.1, 1)
+                attendees = self.random.sample(regulars, min(len(regulars), int(event.max_participants * fill)))
+            for user in attendees:
+                # course bookings aren't cancelled, and cancelled drop-in bookings have no payment method
+                status = "CANCELLED" if not event.course_id and self.random.random() < 0.08 else "OPEN"
+                block_index = None
+                subscription = None
+                if event.course_id:
+                    key = (user.id, event.course_id)
+                    if key not in course_blocks:
+                        config = block_configs[(event.event_type_id, "course")][0]
+                        course_blocks[key] = self._new_block(user, config, event, invoices, blocks)
+                    block_index = course_blocks[key]
+                elif status == "CANCELLED":
+                    pass
+                elif str(event.event_type_id) in subscription_event_types.get(user.id, ()):
+                    subscription = user_subscriptions[user.id]
+                else:
+                    config = self.random.choice(block_configs[(event.event_type_id, "dropin")])
+                    key = (user.id, event.event_type_id)
+                    if key not in open_blocks or open_blocks[key][1] == 0:
+                        open_blocks[key] = [self._new_block(user, config, event, invoices, blocks), config.size]
+                    block_index = open_blocks[key][0]
+                    open_blocks[key][1] -= 1
+                bookings.append(
+                    (
+                        block_index,
+                        Booking(
+                            user=user, event=event, status=status, subscription=subscription,
+                            no_show=status == "OPEN" and self.random.random() < 0.05,
+                            attended=is_past and status == "OPEN" and self.random.random() < 0.9,
+                            date_booked=event.start - timedelta(days=self.random.randrange(1, 21)),
+                        )
+                    )
+                )
+
+        # items left in carts: unpaid blocks, some of them created a while ago
+        cart_users = self.random.sample(users, max(1, len(users) // 50))
+        for user in cart_users:
+            config = self.random.choice(self.random.choice(list(block_configs.values())))
+            blocks.append(
+                Block(
+                    user=user, block_config=config, paid=False,
+                    created_date=self.now - timedelta(minutes=self.random.randrange(60 * 24)),
+                )
+            )
+
+        self._bulk_create(Invoice, invoices)
+        blocks = self._bulk_create(Block, blocks)
+        for block_index, booking in bookings:
+            if block_index is not None:
+                booking.block = blocks[block_index]
+        self._bulk_create(Booking, [booking for _, booking in bookings])
+
+    def _new_block(self, user, config, first_event, invoices, blocks):
+        purchase_date = first_event.start - timedelta(days=self.random.randrange(1, 30))
+        invoice = Invoice(
+            username=user.email or user.username, invoice_id=f"BENCH{len(invoices):08d}", amount=config.cost,
+            paid=True, date_created=purchase_date, date_paid=purchase_date,
+        )
+        invoices.append(invoice)
+        blocks.append(
+            Block(
+                user=user, block_config=config, paid=True, invoice=invoice, purchase_date=purchase_date,
+                created_date=purchase_date, start_date=first_event.start,
+                expiry_date=first_event.start + timedelta(weeks=config.duration),
+            )
+        )
+        return len(blocks) - 1
+
+    def create_vouchers(self, block_configs):
+        # vouchers are multi-table models, so they can't be bulk created
+        dropin_configs = [configs[-1] for (_, block_type), configs in block_configs.items() if block_type == "dropin"]
+        for i in range(300):
+            voucher = BlockVoucher.objects.create(
+                code=f"bench-block-{i:04d}", discount=self.random.choice([10, 20, 50]),
+                start_date=self.now - timedelta(days=self.random.randrange(365)),
+                expiry_date=self.now + timedelta(days=self.random.randrange(-100, 365)),
+                max_per_user=self.random.choice([None, 1]),
+            )
+            voucher.block_configs.add(*self.random.sample(dropin_configs, 2))
+        for i in range(100):
+            TotalVoucher.objects.create(
+                code=f"bench-total-{i:04d}", discount_amount=Decimal(self.random.choice([5, 10, 20])),
+                start_date=self.now - timedelta(days=self.random.randrange(365)),
+            )
+        gift_voucher_config = GiftVoucherConfig.objects.create(discount_amount=Decimal(25))
+        for i in range(200):
+            voucher = TotalVoucher.objects.create(
+                code=f"bench-gift-{i:04d}", discount_amount=Decimal(25), is_gift_voucher=True, max_vouchers=1,
+                max_per_user=1, activated=i % 10 != 0, purchaser_email=f"user{i:06d}@example.com",
+            )
+            GiftVoucher.objects.create(gift_voucher_config=gift_voucher_config, total_voucher=voucher, paid=voucher.activated)
+
+    def create_activity_logs(self, number_of_logs, events, users):
+        # two years of logs, so about half are old enough for delete_old_activitylogs to back up and delete
+        first_log = self.now - timedelta(days=365 * 2)
+        seconds = int((self.now - first_log).total_seconds())
+        self._bulk_create(
+            ActivityLog,
+            [
+                ActivityLog(
+                    timestamp=first_log + timedelta(seconds=self.random.randrange(seconds)),
+                    log=self.random.choice(LOG_TEMPLATES).format(
+                        id=i, event=self.random.choice(events).name, user=self.random.choice(users).username
+                    ),
+                )
+                for i in range(number_of_logs)
+            ]
+        )
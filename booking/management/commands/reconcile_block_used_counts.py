@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F
+
+from activitylog.buffer import log_activity
+from booking.models import Block, recount_block_used_counts
+
+
+class Command(BaseCommand):
+    help = "Check the denormalized used counts on blocks against their actual bookings, and fix any that have drifted"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report blocks with wrong used counts, but do not fix them'
+        )
+
+    def handle(self, *args, **options):
+        drifted_blocks = Block.objects.annotate(
+            actual_used_count=Count("bookings")
+        ).exclude(used_count=F("actual_used_count")).select_related("user", "block_config").order_by("id")
+
+        drifted_block_ids = []
+        for block in drifted_blocks:
+            drifted_block_ids.append(block.id)
+            self.stdout.write(f"Block {block.id} ({block}): used {block.used_count} (actual {block.actual_used_count})")
+
+        if not drifted_block_ids:
+            self.stdout.write("All block used counts are correct")
+            return
+
+        if options["dry_run"]:
+            self.stdout.write(f"{len(drifted_block_ids)} block(s) with incorrect used counts found (dry run)")
+            return
+
+        recount_block_used_counts(Block.objects.filter(id__in=drifted_block_ids))
+        log = f"Used counts fixed for {len(drifted_block_ids)} block(s) (ids {', '.join(map(str, drifted_block_ids))})"
+        log_activity(log, action="reconciled")
+        self.stdout.write(log)
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, Q
+
+from activitylog.buffer import log_activity
+from booking.models import Event, recount_event_booking_counters
+
+
+class Command(BaseCommand):
+    help = "Check the denormalized booking counters on events against their actual bookings, and fix any that have drifted"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report events with wrong counters, but do not fix them'
+        )
+
+    def handle(self, *args, **options):
+        drifted_events = Event.objects.annotate(
+            actual_open_booking_count=Count("bookings", filter=Q(bookings__status="OPEN")),
+            actual_open_no_show_count=Count("bookings", filter=Q(bookings__status="OPEN", bookings__no_show=True)),
+        ).exclude(
+            open_booking_count=F("actual_open_booking_count"), open_no_show_count=F("actual_open_no_show_count")
+        ).order_by("id")
+
+        drifted_event_ids = []
+        for event in drifted_events:
+            drifted_event_ids.append(event.id)
+            self.stdout.write(
+                f"Event {event.id} ({event}): open bookings {event.open_booking_count} (actual "
+                f"{event.actual_open_booking_count}), no-shows {event.open_no_show_count} (actual "
+                f"{event.actual_open_no_show_count})"
+            )
+
+        if not drifted_event_ids:
+            self.stdout.write("All event booking counters are correct")
+            return
+
+        if options["dry_run"]:
+            self.stdout.write(f"{len(drifted_event_ids)} event(s) with incorrect booking counters found (dry run)")
+            return
+
+        recount_event_booking_counters(Event.objects.filter(id__in=drifted_event_ids))
+        log = f"Booking counters fixed for {len(drifted_event_ids)} event(s) (ids {', '.join(map(str, drifted_event_ids))})"
+        log_activity(log, action="reconciled")
+        self.stdout.write(log)
@@ -0,0 +1,198 @@
+from io import StringIO
+import json
+import statistics
+import tempfile
+import time
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from activitylog.models import ActivityLog
+from booking.entitlements import UserEntitlements
+from booking.models import Block, Booking, Course, Event, SubscriptionConfig, Track
+
+
+class Benchmark:
+
+    def __init__(self, name, func):
+        self.name = name
+        self.func = func
+
+    def run(self, repeat):
+        # one untimed run first, to fill process caches
+        self._run_once()
+        timings = []
+        queries = None
+        for _ in range(repeat):
+            duration, queries = self._run_once()
+            timings.append(duration)
+        return {
+            "min_ms": round(min(timings) * 1000, 2),
+            "median_ms": round(statistics.median(timings) * 1000, 2),
+            "mean_ms": round(statistics.mean(timings) * 1000, 2),
+            "max_ms": round(max(timings) * 1000, 2),
+            "queries": queries,
+            "repeat": repeat,
+        }
+
+    def _run_once(self):
+        # roll back anything the benchmark changes, so every run (and every benchmark) sees the same data
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                self.func()
+                duration = time.perf_counter() - start
+            transaction.set_rollback(True)
+        return duration, len(context)
+
+
+class Command(BaseCommand):
+    help = (
+        "Time key views, model methods and cleanup commands against the data from generate_benchmark_data, "
+        "and save the results as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per benchmark (default 5)')
+        parser.add_argument('--output', help='File to save the results to (default benchmark-<timestamp>.json)')
+        parser.add_argument('--compare', help='Results file from a previous run to compare against')
+        parser.add_argument('--only', nargs='+', help='Only run the benchmarks with these names')
+
+    def handle(self, *args, **options):
+        if not Event.objects.exists():
+            raise CommandError("No data to benchmark; run generate_benchmark_data first")
+        benchmarks = self.get_benchmarks()
+        if options["only"]:
+            benchmarks = [benchmark for benchmark in benchmarks if benchmark.name in options["only"]]
+
+        # allow the test client's host, and use the locmem email backend so nothing is sent
+        try:
+            setup_test_environment()
+            test_environment = True
+        except RuntimeError:
+            # already set up (e.g. running under the test runner)
+            test_environment = False
+        try:
+            results = {}
+            for benchmark in benchmarks:
+                results[benchmark.name] = benchmark.run(options["repeat"])
+                self.stdout.write(
+                    f"{benchmark.name:<32}{results[benchmark.name]['median_ms']:>10.2f} ms"
+                    f"{results[benchmark.name]['queries']:>8} queries"
+                )
+        finally:
+            if test_environment:
+                teardown_test_environment()
+
+        output = {
+            "run_at": timezone.now().isoformat(),
+            "dataset": {
+                model.__name__: model.objects.count()
+                for model in [User, Event, Course, Booking, Block, ActivityLog]
+            },
+            "results": results,
+        }
+        output_path = options["output"] or f"benchmark-{timezone.now().strftime('%Y%m%d-%H%M%S')}.json"
+        with open(output_path, "w") as output_file:
+            json.dump(output, output_file, indent=2)
+        self.stdout.write(f"Results saved to {output_path}")
+
+        if options["compare"]:
+            self.compare(options["compare"], results)
+
+    def compare(self, previous_path, results):
+        with open(previous_path) as previous_file:
+            previous = json.load(previous_file)["results"]
+        self.stdout.write(f"Compared with {previous_path} (median time, queries):")
+        for name, result in results.items():
+            if name not in previous:
+                continue
+            before = previous[name]
+            change = (result["median_ms"] - before["median_ms"]) / before["median_ms"] * 100 if before["median_ms"] else 0
+            self.stdout.write(
+                f"{name:<32}{before['median_ms']:>10.2f} -> {result['median_ms']:.2f} ms ({change:+.0f}%)"
+                f"{before['queries']:>8} -> {result['queries']} queries"
+            )
+
+    def get_benchmarks(self):
+        now = timezone.now()
+        track = Track.objects.filter(default=True).first() or Track.objects.first()
+        # the busiest student, a user with items in their cart, and the busiest recent event
+        student = User.objects.filter(bookings__event__start__gte=now).annotate(
+            count=Count("bookings")
+        ).order_by("-count", "id").first()
+        cart_user = User.objects.filter(blocks__paid=False, userprofile__isnull=False).order_by("id").first() or student
+        register_event = Event.objects.filter(start__lt=now).order_by("-open_booking_count", "-start").first()
+        staff_user = User.objects.filter(is_staff=True).order_by("id").first()
+        if not (track and student and register_event and staff_user):
+            raise CommandError("The data is incomplete; run generate_benchmark_data first")
+
+        student_client = Client()
+        student_client.force_login(student)
+        cart_client = Client()
+        cart_client.force_login(cart_user)
+        staff_client = Client()
+        staff_client.force_login(staff_user)
+        schedule_events = list(
+            Event.objects.filter(event_type__track=track, start__gt=now, show_on_site=True, cancelled=False).order_by(
+                "start", "id"
+            )[:20]
+        )
+        subscription_configs = list(SubscriptionConfig.objects.filter(active=True))
+
+        def get(client, url):
+            def request():
+                response = client.get(url)
+                assert response.status_code == 200, f"{url}: {response.status_code}"
+            return request
+
+        def command(name, *args):
+            return lambda: call_command(name, *args, stdout=StringIO())
+
+        def delete_old_activitylogs():
+            # back up to a temporary local directory; the rollback after each run can't undo an upload to s3
+            with tempfile.TemporaryDirectory() as backup_dir, override_settings(
+                ACTIVITYLOG_BACKUP_BACKEND="activitylog.backup.LocalBackup", ACTIVITYLOG_BACKUP_LOCAL_DIR=backup_dir
+            ):
+                call_command("delete_old_activitylogs", stdout=StringIO())
+
+        return [
+            Benchmark("schedule_page", get(student_client, reverse("booking:events", args=(track.slug,)))),
+            Benchmark("schedule_page_anonymous", get(Client(), reverse("booking:events", args=(track.slug,)))),
+            Benchmark("course_list", get(student_client, reverse("booking:courses", args=(track.slug,)))),
+            Benchmark("bookings_list", get(student_client, reverse("booking:bookings"))),
+            Benchmark("basket", get(cart_client, reverse("booking:shopping_basket"))),
+            Benchmark("checkout_total", get(cart_client, reverse("booking:check_total"))),
+            Benchmark("register", get(staff_client, reverse("studioadmin:register", args=(register_event.id,)))),
+            Benchmark("user_list", get(staff_client, reverse("studioadmin:users"))),
+            Benchmark("voucher_list", get(staff_client, reverse("studioadmin:vouchers"))),
+            Benchmark("admin_course_list", get(staff_client, reverse("studioadmin:courses"))),
+            Benchmark(
+                "user_entitlements",
+                lambda: [
+                    (entitlements.has_available_block(event), entitlements.has_available_subscription(event))
+                    for entitlements in [UserEntitlements(student, events=schedule_events)]
+                    for event in schedule_events
+                ]
+            ),
+            Benchmark(
+                "subscription_period_dates",
+                lambda: [
+                    (config.get_subscription_period_start_date(), config.get_subscription_period_start_date(next=True))
+                    for config in subscription_configs
+                ]
+            ),
+            Benchmark("cleanup_expired_blocks", command("cleanup_expired_blocks")),
+            Benchmark("sweep_expired_cart_items", command("sweep_expired_cart_items")),
+            Benchmark("cleanup_expired_product_purchases", command("cleanup_expired_product_purchases")),
+            Benchmark("delete_unused_invoices", command("delete_unused_invoices")),
+            Benchmark("delete_old_activitylogs", delete_old_activitylogs),
+            Benchmark("reconcile_event_counters", command("reconcile_event_counters", "--dry-run")),
+        ]
@@ -3,7 +3,7 @@ from django.utils import timezone
 from django.contrib.sites.models import Site
 from django.core.management.base import BaseCommand
 
-from activitylog.models import ActivityLog
+from activitylog.buffer import log_activity
 from booking.email_helpers import send_user_and_studio_emails
 from booking.models import Subscription, SubscriptionConfig
 from common.utils import full_name
@@ -56,7 +56,7 @@ class Command(BaseCommand):
 
         if subscriptions_for_reminders:
             log = f"Subscription reminders sent to {', '.join([full_name(subscription.user) for subscription in subscriptions_for_reminders])}"
-            ActivityLog.objects.create(log=log)
+            log_activity(log, action="reminder_sent")
             self.stdout.write(log)
         else:
             self.stdout.write("No reminders to send")
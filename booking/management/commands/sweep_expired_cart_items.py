@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from activitylog.buffer import activity_log_buffer
+from booking.cart_sweeper import sweep_expired_cart_items
+
+
+class Command(BaseCommand):
+    help = "Delete expired cart items (unpaid blocks with bookings and product purchases).  " \
+           "Run it regularly (e.g. every minute), or use --poll to keep it running"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--poll',
+            type=int,
+            help='Keep running, sweeping every POLL seconds'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            # flush each sweep's logs, since with --poll the command doesn't finish
+            with activity_log_buffer():
+                deleted = sweep_expired_cart_items()
+            if deleted is None:
+                self.stdout.write("Another sweep is already running")
+            elif any(deleted):
+                self.stdout.write(f"{deleted[0]} expired block(s) and {deleted[1]} product purchase(s) deleted")
+            if not options["poll"]:
+                break
+            time.sleep(options["poll"])
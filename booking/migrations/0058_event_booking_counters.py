@@ -0,0 +1,40 @@
+# Generated by Django 4.1.2 on 2026-10-17 04:42
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_bookings(apps, schema_editor):
+    Event = apps.get_model('booking', 'Event')
+    Booking = apps.get_model('booking', 'Booking')
+
+    def _count(bookings):
+        return Coalesce(Subquery(bookings.order_by().values("event").annotate(count=Count("id")).values("count")), 0)
+
+    open_bookings = Booking.objects.filter(event=OuterRef("pk"), status="OPEN")
+    Event.objects.update(
+        open_booking_count=_count(open_bookings),
+        open_no_show_count=_count(open_bookings.filter(no_show=True)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0057_disabledblockconfig'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='open_booking_count',
+            field=models.IntegerField(default=0, editable=False, help_text='Open bookings, including no-shows'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='open_no_show_count',
+            field=models.IntegerField(default=0, editable=False, help_text='Open bookings that are no-shows'),
+        ),
+        migrations.RunPython(count_bookings, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.1.2 on 2026-10-17 05:44
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_block_bookings(apps, schema_editor):
+    Block = apps.get_model('booking', 'Block')
+    Booking = apps.get_model('booking', 'Booking')
+    block_bookings = Booking.objects.filter(block=OuterRef("pk")).order_by().values("block").annotate(
+        count=Count("id")
+    ).values("count")
+    Block.objects.update(used_count=Coalesce(Subquery(block_bookings), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0058_event_booking_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='block',
+            name='used_count',
+            field=models.IntegerField(default=0, editable=False, help_text='Bookings made with this block'),
+        ),
+        migrations.RunPython(count_block_bookings, reverse_code=migrations.RunPython.noop),
+    ]
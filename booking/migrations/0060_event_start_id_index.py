@@ -0,0 +1,21 @@
+# Generated by Django 4.1.2 on 2026-10-17 10:41
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # every booking updates its event's booking counters; build the index without locking the table
+    atomic = False
+
+    dependencies = [
+        ('booking', '0059_block_used_count'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='event',
+            index=models.Index(fields=['start', 'id'], name='booking_eve_start_e59896_idx'),
+        ),
+    ]
@@ -1,34 +1,34 @@
 # -*- coding: utf-8 -*-
-import calendar
-from datetime import datetime, timedelta
-from datetime import timezone as dt_timezone
+from datetime import timedelta
 from decimal import Decimal
 import logging
-import pytz
 from shortuuid import ShortUUID
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, Max, Min, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.text import slugify
 from django.utils.translation import gettext_lazy as _
-from django.db.models.signals import post_delete
-from django.dispatch import receiver
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
 
-from delorean import Delorean
 from django_extensions.db.fields import AutoSlugField
 from dateutil.relativedelta import relativedelta
 
-from activitylog.models import ActivityLog
+from activitylog.buffer import activity_log_buffer, log_activity
+from common.date_utils import get_timezone, subscription_period_start_date
+from common.reference_data import reference_data, shared_cache
 from common.utils import start_of_day_in_utc, end_of_day_in_utc, end_of_day_in_local_time
 from payments.models import Invoice
 
 from .email_helpers import send_user_and_studio_emails
+from .subscription_usage import SubscriptionUsage
 
 
 logger = logging.getLogger(__name__)
@@ -53,12 +53,7 @@ class Track(models.Model):
 
     @classmethod
     def get_default(cls):
-        default = Track.objects.filter(default=True)
-        if default:
-            return default[0]
-        else:
-            # returns the first one, or None
-            return Track.objects.first()
+        return default_track()
 
     @property
     def event_type_label(self):
@@ -156,6 +151,22 @@ class EventType(models.Model):
         super().save()
 
 
+class CourseQuerySet(models.QuerySet):
+
+    def with_event_dates(self):
+        """
+        Annotate the first and last uncancelled event start, and the booking count (max open bookings on
+        any one uncancelled event), so courses can be filtered and sorted by date in the db.
+        Course.start, last_event_date and booking_count use the annotations instead of querying
+        """
+        uncancelled = models.Q(events__cancelled=False)
+        return self.annotate(
+            first_event_start=Min("events__start", filter=uncancelled),
+            last_event_start=Max("events__start", filter=uncancelled),
+            max_open_booking_count=Coalesce(Max("events__open_booking_count", filter=uncancelled), 0),
+        )
+
+
 class Course(models.Model):
     """A collection of specific Events of the same EventType"""
     name = models.CharField(
@@ -173,6 +184,8 @@ class Course(models.Model):
         help_text="Users can book individual events with a drop-in credit block valid for this event type"
     )
 
+    objects = CourseQuerySet.as_manager()
+
     @property
     def full(self):
         # A course is full if its events are full, INCLUDING no-shows and cancellations (although
@@ -182,10 +195,16 @@ class Course(models.Model):
 
     @property
     def all_events_full(self):
+        occupancy = getattr(self, "_occupancy", None)
+        if occupancy is not None:
+            return all(event.full for event in occupancy["events"] if not event.is_past)
         return not any(not event.full for event in self.events_left)
 
     @property
     def spaces_left(self):
+        occupancy = getattr(self, "_occupancy", None)
+        if occupancy is not None:
+            return occupancy["spaces_left"]
         return self.max_participants - self.booking_count()
 
     @property
@@ -193,6 +212,13 @@ class Course(models.Model):
         return valid_course_block_configs(self) is not None
 
     def booking_count(self):
+        # Use the count calculated by booking.availability.prefetch_course_occupancy, if we have it
+        occupancy = getattr(self, "_occupancy", None)
+        if occupancy is not None:
+            return occupancy["booking_count"]
+        # or annotated by CourseQuerySet.with_event_dates
+        if hasattr(self, "max_open_booking_count"):
+            return self.max_open_booking_count
         # Find the distinct users from all booking on this course.  We don't just look at the first event, in case
         # a course's events have been updated after start
         # Only count open bookings, which will inlcude no-shows but not fully cancelled ones
@@ -201,14 +227,17 @@ class Course(models.Model):
 
         # Find the max count of open bookings against any single event
         # There may be drop in bookings by different users
-        if not self.uncancelled_events.exists():
-            return 0
-        return max([
-            event.bookings.filter(status="OPEN").count() for event in self.uncancelled_events
-        ])
+        return self.uncancelled_events.aggregate(
+            booking_count=Coalesce(Max("open_booking_count"), 0)
+        )["booking_count"]
 
     @property
     def start(self):
+        occupancy = getattr(self, "_occupancy", None)
+        if occupancy is not None:
+            return occupancy["start"]
+        if hasattr(self, "first_event_start"):
+            return self.first_event_start
         if self.uncancelled_events:
             return self.uncancelled_events.first().start
 
@@ -218,13 +247,33 @@ class Course(models.Model):
 
     @property
     def last_event_date(self):
+        occupancy = getattr(self, "_occupancy", None)
+        if occupancy is not None:
+            return occupancy["last_event_date"]
+        if hasattr(self, "last_event_start"):
+            return self.last_event_start
         last_event = self.uncancelled_events.last()
         if last_event:
             return last_event.start
 
     @property
     def uncancelled_events(self):
-        return self.events.filter(cancelled=False).order_by("start")
+        return self.events.filter(cancelled=False).order_by("start", "id")
+
+    @property
+    def has_bookings(self):
+        occupancy = getattr(self, "_occupancy", None)
+        if occupancy is not None:
+            return occupancy["has_bookings"]
+        return Booking.objects.filter(event__course=self).exists()
+
+    @property
+    def uncancelled_event_list(self):
+        """uncancelled_events as a list, from the prefetched occupancy if we have it"""
+        occupancy = getattr(self, "_occupancy", None)
+        if occupancy is not None:
+            return occupancy["events"]
+        return list(self.uncancelled_events)
 
     @property
     def events_left(self):
@@ -235,6 +284,9 @@ class Course(models.Model):
 
     def is_configured(self):
         """A course is configured if it has the right number of un-cancelled events"""
+        occupancy = getattr(self, "_occupancy", None)
+        if occupancy is not None:
+            return len(occupancy["events"]) == self.number_of_events
         return self.uncancelled_events.count() == self.number_of_events
 
     def can_be_visible(self):
@@ -242,6 +294,9 @@ class Course(models.Model):
         A course can be visible if it has at least the required number of events (it could have more if some are
         cancelled)
         """
+        occupancy = getattr(self, "_occupancy", None)
+        if occupancy is not None:
+            return occupancy["total_event_count"] >= self.number_of_events
         return self.events.count() >= self.number_of_events
 
     def __str__(self):
@@ -249,27 +304,31 @@ class Course(models.Model):
 
     def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
         super().save()
-        for event in self.events.all():
-            if event.max_participants != self.max_participants:
-                event.max_participants = self.max_participants
-            if self.show_on_site != event.show_on_site:
-                event.show_on_site = self.show_on_site
-                ActivityLog.objects.create(
-                    log=f"Course {self} updated; show_on_site for linked events has been adjusted to match"
-                )
-            if self.cancelled and not event.cancelled:
-                # Only cancel events if course is cancelled.  Don't reset cancelled events to the course status if the
-                # course is still open
-                event.cancelled = True
-            event.save()
-        if self.events.exists():
-            ActivityLog.objects.create(
-                log=f"Course {self} updated; show_on_site and max participants for linked events have been adjusted to match"
-            )
-            if self.cancelled:
-                ActivityLog.objects.create(
-                    log=f"Course {self} cancelled; linked events have been cancelled also"
+        # one log per linked event; write them all at once
+        with activity_log_buffer():
+            for event in self.events.all():
+                if event.max_participants != self.max_participants:
+                    event.max_participants = self.max_participants
+                if self.show_on_site != event.show_on_site:
+                    event.show_on_site = self.show_on_site
+                    log_activity(
+                        f"Course {self} updated; show_on_site for linked events has been adjusted to match",
+                        obj=self, action="updated"
+                    )
+                if self.cancelled and not event.cancelled:
+                    # Only cancel events if course is cancelled.  Don't reset cancelled events to the course status if the
+                    # course is still open
+                    event.cancelled = True
+                event.save()
+            if self.events.exists():
+                log_activity(
+                    f"Course {self} updated; show_on_site and max participants for linked events have been adjusted to match",
+                    obj=self, action="updated"
                 )
+                if self.cancelled:
+                    log_activity(
+                        f"Course {self} cancelled; linked events have been cancelled also", obj=self, action="cancelled"
+                    )
 
 
 class Event(models.Model):
@@ -289,12 +348,19 @@ class Event(models.Model):
         help_text="Zoom/Video URL available after class is past (for online classes only)"
     )
     show_on_site = models.BooleanField(default=False)
+    # Denormalized booking counts, so we can tell if an event is full without querying bookings.
+    # These are only ever updated in the database, with F expressions, when bookings change; see
+    # update_event_booking_counters.  Use the reconcile_event_counters command to check for drift
+    open_booking_count = models.IntegerField(default=0, editable=False, help_text="Open bookings, including no-shows")
+    open_no_show_count = models.IntegerField(default=0, editable=False, help_text="Open bookings that are no-shows")
 
     class Meta:
         ordering = ['-start']
         indexes = [
             models.Index(fields=['event_type', 'start', 'cancelled']),
             models.Index(fields=['event_type', 'name', 'start', 'cancelled']),
+            # keyset pagination of the schedule
+            models.Index(fields=['start', 'id']),
         ]
 
     @property
@@ -303,11 +369,10 @@ class Event(models.Model):
 
     @property
     def spaces_left(self):
-        if self.course:
-            # No-shows count for course event spaces
-            booked_number = self.bookings.filter(status='OPEN').count()
-        else:
-            booked_number = self.bookings.filter(status='OPEN', no_show=False).count()
+        booked_number = self.open_booking_count
+        if not self.course_id:
+            # No-shows count for course event spaces only
+            booked_number -= self.open_no_show_count
         return self.max_participants - booked_number
 
     @property
@@ -335,7 +400,7 @@ class Event(models.Model):
         # made within a day or two (depending on cancellation time) of event date 
         cancellation_period = self.event_type.cancellation_period
         if now.month in [3, 10]:
-            local_tz = pytz.timezone("Europe/London")
+            local_tz = get_timezone("Europe/London")
             now_local = now.astimezone(local_tz)
             event_date_local = self.start.astimezone(local_tz)
             # find the difference in DST offset between now and the event date (in hours)
@@ -350,6 +415,11 @@ class Event(models.Model):
         return time_until_event > cancellation_period
 
     def course_order(self):
+        occupancy = getattr(self.course, "_occupancy", None) if self.course_id else None
+        if occupancy is not None:
+            if not self.cancelled:
+                return f"{occupancy['event_order'][self.id]}/{len(occupancy['events'])}"
+            return "-"
         if self.course and self.course.events.exists():
             if not self.cancelled:
                 events_in_order = self.course.uncancelled_events.values_list("id", flat=True)
@@ -394,7 +464,7 @@ class Event(models.Model):
 
     @property
     def name_and_date(self):
-        return f"{self.name} - {self.start.astimezone(pytz.timezone('Europe/London')).strftime('%d %b %Y, %H:%M')}"
+        return f"{self.name} - {self.start.astimezone(get_timezone('Europe/London')).strftime('%d %b %Y, %H:%M')}"
 
     @property
     def cost_str(self):
@@ -413,7 +483,7 @@ class Event(models.Model):
 
     def __str__(self):
         course_str = f" ({self.course.name})" if self.course else ""
-        return f"{self.name}{course_str} - {self.start.astimezone(pytz.timezone('Europe/London')).strftime('%d %b %Y, %H:%M')} " \
+        return f"{self.name}{course_str} - {self.start.astimezone(get_timezone('Europe/London')).strftime('%d %b %Y, %H:%M')} " \
                f"({self.event_type.track})"
 
     def clean(self):
@@ -427,15 +497,56 @@ class Event(models.Model):
         if self.course:
             if self.max_participants != self.course.max_participants:
                 self.max_participants = self.course.max_participants
-                ActivityLog.objects.create(
-                    log=f"Event {self} max participants does not match course; event has been adjusted to match course"
+                log_activity(
+                    f"Event {self} max participants does not match course; event has been adjusted to match course",
+                    obj=self, action="updated"
                 )
             if self.show_on_site != self.course.show_on_site:
                 self.show_on_site = self.course.show_on_site
-                ActivityLog.objects.create(
-                    log=f"Event {self} show_on_course does not match course; event has been adjusted to match course"
+                log_activity(
+                    f"Event {self} show_on_course does not match course; event has been adjusted to match course",
+                    obj=self, action="updated"
                 )
-        super().save()
+        if self._state.adding or self.pk is None:
+            # new (or cloned) event, which can't have any bookings yet
+            self.open_booking_count = self.open_no_show_count = 0
+            super().save()
+        else:
+            # Never write the booking counters back from the instance; they may be stale
+            super().save(update_fields=[
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in EVENT_BOOKING_COUNTER_FIELDS
+            ])
+
+
+EVENT_BOOKING_COUNTER_FIELDS = ("open_booking_count", "open_no_show_count")
+
+
+def update_event_booking_counters(event_id, open_change, no_show_change):
+    """Adjust an event's booking counters by the given amounts, in the database"""
+    if open_change or no_show_change:
+        Event.objects.filter(pk=event_id).update(
+            open_booking_count=F("open_booking_count") + open_change,
+            open_no_show_count=F("open_no_show_count") + no_show_change,
+        )
+
+
+def recount_event_booking_counters(events):
+    """
+    Reset the booking counters on an Event queryset from the actual bookings.
+    Lock the events first to make sure we count bookings made concurrently
+    """
+    with transaction.atomic():
+        event_ids = list(events.select_for_update().values_list("id", flat=True))
+        open_bookings = Booking.objects.filter(event=OuterRef("pk"), status="OPEN")
+        return Event.objects.filter(id__in=event_ids).update(
+            open_booking_count=Coalesce(Subquery(_count_subquery(open_bookings)), 0),
+            open_no_show_count=Coalesce(Subquery(_count_subquery(open_bookings.filter(no_show=True))), 0),
+        )
+
+
+def _count_subquery(queryset):
+    return queryset.order_by().values("event").annotate(count=Count("id")).values("count")
 
 
 class BlockConfigManager(models.Manager):
@@ -601,6 +712,17 @@ class TotalVoucher(BaseVoucher):
         return Invoice.objects.filter(paid=True, total_voucher_code=self.code).count()
 
 
+class BlockQuerySet(models.QuerySet):
+
+    def active(self):
+        """Paid, unexpired blocks that aren't full; the SQL version of Block.active_block"""
+        return self.filter(paid=True).filter(
+            models.Q(expiry_date__isnull=True) | models.Q(expiry_date__gte=timezone.now())
+        ).filter(
+            models.Q(used_count=0) | models.Q(used_count__lt=F("block_config__size"))
+        )
+
+
 class Block(models.Model):
     """
     Block booking
@@ -621,6 +743,12 @@ class Block(models.Model):
     # Flag to set when cart total is checked to avoid deleting when payment activity may be in progress
     time_checked = models.DateTimeField(blank=True, null=True)
 
+    # Denormalized count of bookings made with this block; like the event booking counters, this is only
+    # updated in the database when bookings change.  Use the reconcile_block_used_counts command to check for drift
+    used_count = models.IntegerField(default=0, editable=False, help_text="Bookings made with this block")
+
+    objects = BlockQuerySet.as_manager()
+
     class Meta:
         ordering = ['user__username']
         indexes = [
@@ -685,9 +813,7 @@ class Block(models.Model):
 
     @property
     def full(self):
-        if self.bookings.exists():
-            return self.bookings.count() >= self.block_config.size
-        return False
+        return self.used_count > 0 and self.used_count >= self.block_config.size
 
     @property
     def active_block(self):
@@ -699,7 +825,7 @@ class Block(models.Model):
 
     @property
     def remaining_count(self):
-        return self.block_config.size - self.bookings.count()
+        return self.block_config.size - self.used_count
 
     def _valid_and_active_for_event(self, event):
         # hasn't started yet OR event is within block date range
@@ -715,7 +841,7 @@ class Block(models.Model):
             valid_for_course = self.valid_for_course(course=event.course, event=event)
             if valid_for_course:
                 return True
-        if not self.block_config.course and self.block_config.event_type == event.event_type:
+        if not self.block_config.course and self.block_config.event_type_id == event.event_type_id:
             # We still get here for an event that's part of a course if this is a non-course block,
             # in case of a course that allows drop-in booking for individual classes
             if event.course and not event.course.allow_drop_in:
@@ -729,7 +855,7 @@ class Block(models.Model):
         if not self.active_block:
             return False
         valid_for_course = False
-        if self.block_config.course and self.block_config.event_type == course.event_type:
+        if self.block_config.course and self.block_config.event_type_id == course.event_type_id:
             # it's valid for courses, event type matches
             # check the number of events
             # It's always valid if it's for the full course
@@ -741,15 +867,20 @@ class Block(models.Model):
             # For partial course blocks we can still just check the first uncancelled event;
             # _valid_and_active_for_event only checks that the block expiry date is after the start of the first
             # course event
-            event = event or course.uncancelled_events.first()
+            start = event.start if event else course.start
             valid_for_event = True
-            if event:
+            if start:
                 # If there's no uncancelled events yet, the block is so far valid for the course in general
-                valid_for_event = self._valid_and_active_for_event(event)
+                valid_for_event = self.expiry_date is None or start < self.expiry_date
 
             if valid_for_event:
                 # make sure it hasn't been used to book events on a different course
-                has_bookings_on_other_courses = self.bookings.exclude(event__course=course).exists()
+                booked_course_ids = getattr(self, "_booked_course_ids", None)
+                if booked_course_ids is not None:
+                    # set by booking.entitlements.UserEntitlements
+                    has_bookings_on_other_courses = any(course_id != course.id for course_id in booked_course_ids)
+                else:
+                    has_bookings_on_other_courses = self.bookings.exclude(event__course=course).exists()
                 return not has_bookings_on_other_courses
         return False
 
@@ -758,71 +889,69 @@ class Block(models.Model):
         self.save()
 
     @classmethod
-    def cleanup_expired_blocks(cls, user=None, use_cache=False):
-        if use_cache:
-            # check cache to see if we cleaned up recently
-            if cache.get("expired_blocks_cleaned"):
-                logger.info("Expired blocks cleaned up within past 2 mins; no cleanup required")
-                return
-
-        # timeout defaults to 15 mins
-        timeout = settings.CART_TIMEOUT_MINUTES
+    def expired_cart_blocks_filter(cls):
+        """
+        Unpaid blocks with bookings (i.e. bookings added directly to the cart) expire after
+        CART_TIMEOUT_MINUTES (for use on a queryset annotated with count=Count("bookings__id"))
+        """
+        cutoff = timezone.now() - timedelta(seconds=60 * settings.CART_TIMEOUT_MINUTES)
+        return models.Q(paid=False, count__gt=0, created_date__lt=cutoff)
+
+    @classmethod
+    def cleanup_expired_blocks(cls, user=None):
+        """
+        Delete expired unpaid blocks and their bookings.  Run by the cart sweeper (booking.cart_sweeper);
+        pages that show cart items just filter them out.
+        Returns the number of blocks deleted.
+        """
         if user:
-            # If we have a user, we're at the checkout, so get all unpaid purchases for
-            # this user only
-            unpaid_blocks = Block.objects.filter(
-                user__in=user.managed_users_including_self, paid=False
-            )
+            unpaid_blocks = Block.objects.filter(user__in=user.managed_users_including_self)
         else:
-            # no user, doing a general cleanup.  Don't delete anything that was time-checked
+            # general cleanup.  Don't delete anything that was time-checked
             # (done at final checkout stage) within the past 5 mins, in case we delete something
             # that's in the process of being paid
-            unpaid_blocks = cls.objects.filter(paid=False).filter(
+            unpaid_blocks = cls.objects.filter(
                 models.Q(time_checked__lt=timezone.now() - timedelta(seconds=60 * 5)) | models.Q(time_checked__isnull=True)
             )
-        # filter unpaid blocks to those created before the allowed timeout
-        expired_blocks = unpaid_blocks.filter(
-            created_date__lt=timezone.now() - timedelta(seconds=60 * timeout)
-        ).annotate(count=models.Count('bookings__id')).filter(count__gt=0)
-        
-        if expired_blocks.exists():
-            if user is not None:
-                ActivityLog.objects.create(
-                    log=f"{expired_blocks.count()} unpaid blocks with bookings in cart "
-                        f"(ids {','.join(str(block.id) for block in expired_blocks.all())} "
-                        f"for user {user} expired and were deleted"
-                )
-            else:
-                ActivityLog.objects.create(
-                    log=f"{expired_blocks.count()} unpaid blocks with bookings "
-                        f"(ids {','.join(str(block.id) for block in expired_blocks.all())} "
-                        f"expired and were deleted"
-                )
-            # delete individually to ensure save method is called and associated bookings are 
-            # deleted
-            for block in expired_blocks:
-                block.delete()
+        expired_block_ids = list(
+            unpaid_blocks.annotate(count=models.Count('bookings__id')).filter(cls.expired_cart_blocks_filter())
+            .values_list("id", flat=True)
+        )
+        if not expired_block_ids:
+            return 0
 
-        if use_cache:
-            logger.info("Expired blocks with bookings cleaned up")
-            # cache for 2 mins
-            cache.set("expired_blocks_cleaned", True, timeout=60*2)
+        # delete the bookings and then the blocks as sets, rather than calling delete on each block
+        bookings = Booking.objects.filter(block_id__in=expired_block_ids)
+        booking_ids = list(bookings.values_list("id", flat=True))
+        bookings.delete()
+        cls.objects.filter(id__in=expired_block_ids).delete()
+        log_activity(
+            f"{len(expired_block_ids)} unpaid blocks with bookings in cart "
+            f"(ids {','.join(str(block_id) for block_id in expired_block_ids)}) "
+            f"{f'for user {user} ' if user is not None else ''}expired and were deleted, "
+            f"with bookings (ids {','.join(str(booking_id) for booking_id in booking_ids)})",
+            action="expired"
+        )
+        return len(expired_block_ids)
 
     def delete(self, *args, **kwargs):
         bookings = self.bookings.all() if hasattr(self, "bookings") else []
         if not self.paid:
             booking_ids = "".join([str(bk_id) for bk_id in bookings.values_list("id", flat=True)])
             bookings.delete()
-            ActivityLog.objects.create(
-                log=f'Booking ids {booking_ids} booked with deleted unpaid block {self.id} have been deleted'
+            log_activity(
+                f'Booking ids {booking_ids} booked with deleted unpaid block {self.id} have been deleted',
+                obj=self, action="deleted"
             )
         else:
-            for booking in bookings:
-                booking.block = None
-                booking.save()
-                ActivityLog.objects.create(
-                    log=f'Booking id {booking.id} booked with deleted block {self.id} has been reset'
-                )
+            with activity_log_buffer():
+                for booking in bookings:
+                    booking.block = None
+                    booking.save()
+                    log_activity(
+                        f'Booking id {booking.id} booked with deleted block {self.id} has been reset',
+                        obj=booking, action="updated"
+                    )
         super().delete(*args, **kwargs)
 
     def save(self, *args, **kwargs):
@@ -842,7 +971,32 @@ class Block(models.Model):
         # start date is set to the first date the block is used and used to generate expiry date
         if self.start_date:
             self.expiry_date = self.get_expiry_date()
-        super().save(*args, **kwargs)
+        if self._state.adding or self.pk is None:
+            self.used_count = 0
+            super().save(*args, **kwargs)
+        else:
+            # Never write used_count back from the instance; it may be stale
+            kwargs.setdefault("update_fields", [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "used_count"
+            ])
+            super().save(*args, **kwargs)
+
+
+def update_block_used_count(block_id, change):
+    """Adjust a block's used_count by the given amount, in the database"""
+    if block_id and change:
+        Block.objects.filter(pk=block_id).update(used_count=F("used_count") + change)
+
+
+def recount_block_used_counts(blocks):
+    """Reset used_count on a Block queryset from the actual bookings, locking the blocks first"""
+    with transaction.atomic():
+        block_ids = list(blocks.select_for_update().values_list("id", flat=True))
+        block_bookings = Booking.objects.filter(block=OuterRef("pk")).order_by().values("block").annotate(
+            count=Count("id")
+        ).values("count")
+        return Block.objects.filter(id__in=block_ids).update(used_count=Coalesce(Subquery(block_bookings), 0))
 
 
 class WaitingListUser(models.Model):
@@ -1256,53 +1410,10 @@ class SubscriptionConfig(models.Model):
             return self.start_date if not next else None
         # replace expiry date with very end of day in local time
         if self.start_options == "start_date":
-            # TODO this is a workaround for Delorean, which currently can't deal with
-            # latest tzinfo
-            # https://github.com/myusuf3/delorean/issues/110
-            naive_now = timezone.now().replace(tzinfo=None)
-            # find most recent matching start date from config
-            if self.duration_units == "weeks":
-                # recurs on the same day of the week
-                weekday = self.start_date.weekday()
-                if timezone.now().weekday() == weekday:
-                    if next:
-                        calculated_start = getattr(
-                            Delorean(naive_now, timezone="utc"), f"{'next'}_{calendar.day_name[weekday].lower()}"
-                        )()
-                        calculated_start = start_of_day_in_utc(calculated_start.datetime)
-                    else:
-                        calculated_start = start_of_day_in_utc(Delorean(timezone.now().replace(tzinfo=pytz.utc), timezone="utc").datetime)
-                else:
-                    weekday_method = f"{'next' if next else 'last'}_{calendar.day_name[weekday].lower()}"
-                    calculated_start = getattr(Delorean(naive_now, timezone="utc"), weekday_method)()
-                    calculated_start = start_of_day_in_utc(calculated_start.datetime)
-                # get time in weeks between calculated weekday and start
-                time_diff = (calculated_start - self.start_date).days / 7
-                remainder = time_diff % self.duration
-                if next:
-                    # we calculated the next weekday already
-                    if self.duration > 1:
-                        remainder = self.duration - remainder
-                    result = calculated_start + timedelta(weeks=remainder)
-                else:
-                    result = calculated_start - timedelta(weeks=remainder)
-            else:
-                # recurs monthly
-                now = timezone.now()
-                day_of_month = self.start_date.day
-                datetime_this_month = datetime(day=day_of_month, month=now.month, year=now.year, tzinfo=dt_timezone.utc)
-                if now.day >= day_of_month:
-                    calculated_start = datetime_this_month + relativedelta(months=1) if next else datetime_this_month
-                else:
-                    calculated_start = datetime_this_month if next else datetime_this_month - relativedelta(months=1)
-                calculated_start = start_of_day_in_utc(calculated_start)
-                time_diff = relativedelta(calculated_start, self.start_date)
-                remainder = time_diff.months % self.duration
-                if next:
-                    result = calculated_start + relativedelta(months=remainder)
-                else:
-                    result = calculated_start - relativedelta(months=remainder)
-            return result if result >= self.start_date else None
+            # find most recent (or next) matching start date from config; this only changes daily
+            return subscription_period_start_date(
+                self.start_date, self.duration, self.duration_units, timezone.now().date(), next=next
+            )
 
     def calculate_current_period_cost_as_of_today(self):
         if self.start_options == "start_date" and self.partial_purchase_allowed:
@@ -1383,64 +1494,15 @@ class Subscription(models.Model):
             dates_string = "not started yet"
         return f"{self.user.username} -- {self.config.name} -- {dates_string} ({'paid' if self.paid else 'unpaid'})"
 
+    def usage_ledger(self):
+        """
+        A SubscriptionUsage for this subscription, to check usage for many events without querying
+        for each one
+        """
+        return SubscriptionUsage(self)
+
     def valid_for_event(self, event):
-        if event.course:
-            return False
-        if not self.paid:
-            return False
-        if self.config.bookable_event_types:
-            bookable_event_type = self.config.bookable_event_types.get(str(event.event_type.id))
-            if not bookable_event_type:
-                # jsonfield keys should always be strings, but check for the int anyway, just in case
-                bookable_event_type = self.config.bookable_event_types.get(event.event_type.id)
-            if bookable_event_type:
-                # check event date is within subscription dates
-                if self.start_date and self.start_date > event.start:
-                    # subscription starts after event
-                    return False
-                if self.expiry_date and self.expiry_date < event.start:
-                    # subscription expires before event
-                    return False
-                # check usages
-                allowed_number = bookable_event_type.get("allowed_number")
-                if not allowed_number:  # can be None or empty string
-                    # no max
-                    return True
-
-                this_event_booking = self.bookings.filter(event_id=event.id).first()
-                # An OPEN, not no-show booking for this event already is automatically valid
-                if this_event_booking is not None and this_event_booking.status == "OPEN" and not this_event_booking.no_show:
-                    return True
-
-                allowed_unit = bookable_event_type["allowed_unit"]
-                # find existing open bookings on this subscription for same event type
-                # OPEN and NOT no-show
-                # We include bookings for the current event here - we'll already have returned above if an existing
-                # booking is fully open, and we want to keep any no-show/cancelled ones in the counts for usage checks
-                existing_open_bookings = self.bookings.filter(event__event_type=event.event_type, status="OPEN")
-                # If no existing open bookings, no-show or no no-show, then it's definitely valid
-                if not existing_open_bookings.exists():
-                    return True
-
-                # If DON'T include no-shows in usage (the default), we remove the no-shows here before we
-                # count uses
-                existing_bookings = existing_open_bookings
-                if not self.config.include_no_shows_in_usage:
-                    existing_bookings = existing_open_bookings.filter(no_show=False)
-
-                if event.id in existing_bookings.values_list("event_id", flat=True):
-                    allowed_number += 1
-
-                if allowed_unit == "day":
-                    # find bookings on same day
-                    existing_bookings = existing_bookings.filter(event__start__date=event.start.date())
-                    return len(existing_bookings) < allowed_number
-                else:
-                    start, end = self.subscription_usage_period_dates_for_event(event.start, allowed_unit)
-                    # find bookings within dates
-                    existing_bookings = existing_bookings.filter(event__start__gte=start, event__start__lt=end)
-                    return len(existing_bookings) < allowed_number
-        return False
+        return self.usage_ledger().valid_for_event(event)
 
     def subscription_usage_period_dates_for_event(self, event_start_date, allowed_unit):
         if allowed_unit == "week":
@@ -1469,30 +1531,7 @@ class Subscription(models.Model):
             return usage.get("allowed_number"), usage.get("allowed_unit")
 
     def usage_for_event_type_and_date(self, event_type, event_date):
-        bookable_event_type = self.config.bookable_event_types.get(str(event_type.id))
-        existing_open_bookings = self.bookings.filter(event__event_type=event_type, status="OPEN", no_show=False)
-        # If no existing fully open bookings at all then usage is 0
-        if not existing_open_bookings.exists():
-            return 0
-
-        # If DON'T include no-shows in usage (the default), we remove the no-shows here before we
-        # count uses
-        existing_bookings = existing_open_bookings
-        if not self.config.include_no_shows_in_usage:
-            existing_bookings = existing_open_bookings.filter(no_show=False)
-        if not existing_bookings.exists():
-            return 0
-
-        allowed_number = bookable_event_type.get("allowed_number")
-        allowed_unit = bookable_event_type.get("allowed_unit")
-        if allowed_unit == "day":
-            # find bookings on same day
-            existing_bookings = existing_bookings.filter(event__start__date=event_date.date())
-        else:
-            start, end = self.subscription_usage_period_dates_for_event(event_date, allowed_unit)
-            # find bookings within dates
-            existing_bookings = existing_bookings.filter(event__start__gte=start, event__start__lt=end)
-        return existing_bookings.count()
+        return self.usage_ledger().usage(event_type.id, event_date)
 
     def set_start_date_from_bookings(self):
         """For subscriptions that start on the date of first booking"""
@@ -1558,6 +1597,87 @@ class Subscription(models.Model):
         super().save(*args, **kwargs)
 
 
+# Sent after bookings are updated in bulk (which doesn't send post_save), with the ids of their
+# users and events, so pages built from bookings can be refreshed (see booking.conditional_get and
+# booking.schedule_cache)
+bookings_updated = Signal()
+
+
+class BookingQuerySet(models.QuerySet):
+
+    def update(self, **kwargs):
+        """
+        Keep the event booking counters up to date when bookings are opened/cancelled/marked as no-show in bulk,
+        e.g. course_user.bookings.filter(event__course=course).update(status="CANCELLED"), and the
+        block used counts when bookings are added to or removed from blocks
+        """
+        # before the update, which may change what the queryset matches
+        user_and_event_ids = list(self.order_by().values_list("user_id", "event_id").distinct())
+        updated = self._update_with_counters(**kwargs)
+        if user_and_event_ids:
+            user_ids = {user_id for user_id, _ in user_and_event_ids}
+            event_ids = {event_id for _, event_id in user_and_event_ids}
+            new_event = kwargs.get("event", kwargs.get("event_id"))
+            if new_event is not None:
+                event_ids.add(getattr(new_event, "pk", new_event))
+            bookings_updated.send(sender=self.model, user_ids=user_ids, event_ids=event_ids)
+        return updated
+
+    def _update_with_counters(self, **kwargs):
+        if "block" not in kwargs and "block_id" not in kwargs:
+            return self._update_event_counters(**kwargs)
+        with transaction.atomic():
+            block_ids = set(self.filter(block__isnull=False).values_list("block_id", flat=True))
+            updated = self._update_event_counters(**kwargs)
+            new_block = kwargs.get("block", kwargs.get("block_id"))
+            if new_block is not None:
+                block_ids.add(getattr(new_block, "pk", new_block))
+            recount_block_used_counts(Block.objects.filter(id__in=block_ids))
+        return updated
+
+    def _update_event_counters(self, **kwargs):
+        if "event" in kwargs or "event_id" in kwargs:
+            # bookings moved to another event; just recount the old and new events
+            with transaction.atomic():
+                event_ids = set(self.values_list("event_id", flat=True))
+                updated = super().update(**kwargs)
+                new_event = kwargs.get("event", kwargs.get("event_id"))
+                event_ids.add(getattr(new_event, "pk", new_event))
+                recount_event_booking_counters(Event.objects.filter(id__in=event_ids))
+            return updated
+        if "status" not in kwargs and "no_show" not in kwargs:
+            return super().update(**kwargs)
+
+        with transaction.atomic():
+            # Lock the bookings, and count what each event's counters include now
+            booking_ids = list(self.select_for_update(of=("self",)).order_by().values_list("id", flat=True))
+            bookings = self.model.objects.filter(id__in=booking_ids)
+            counts = bookings.order_by().values("event_id").annotate(
+                total_count=Count("id"),
+                open_count=Count("id", filter=Q(status="OPEN")),
+                no_show_count=Count("id", filter=Q(no_show=True)),
+                open_no_show_count=Count("id", filter=Q(status="OPEN", no_show=True)),
+            )
+            counts = list(counts)
+            updated = super(BookingQuerySet, bookings).update(**kwargs)
+            status = kwargs.get("status")
+            no_show = kwargs.get("no_show")
+            for count in counts:
+                # what each event's counters should include after the update
+                if status is None:
+                    new_open = count["open_count"]
+                    new_open_no_show = count["open_no_show_count"] if no_show is None else (new_open if no_show else 0)
+                elif status == "OPEN":
+                    new_open = count["total_count"]
+                    new_open_no_show = count["no_show_count"] if no_show is None else (new_open if no_show else 0)
+                else:
+                    new_open = new_open_no_show = 0
+                update_event_booking_counters(
+                    count["event_id"], new_open - count["open_count"], new_open_no_show - count["open_no_show_count"]
+                )
+        return updated
+
+
 class Booking(models.Model):
     STATUS_CHOICES = (
         ('OPEN', 'Open'),
@@ -1585,6 +1705,8 @@ class Booking(models.Model):
     no_show = models.BooleanField(default=False, help_text='Student booked but did not attend, or cancelled after the allowed cancellation period')
     notes = models.CharField(max_length=255, null=True, blank=True)
 
+    objects = BookingQuerySet.as_manager()
+
     class Meta:
         unique_together = ('user', 'event')
         permissions = (
@@ -1630,8 +1752,12 @@ class Booking(models.Model):
                 self.block = active_block
 
     def _old_booking(self):
-        if self.pk:
-            return Booking.objects.get(pk=self.pk)
+        # the saved booking, as locked in save(), so it's only fetched again when called outside
+        # save(), e.g. validating a form
+        old_booking = getattr(self, "_locked_old_booking", None)
+        if old_booking is None and self.pk:
+            old_booking = Booking.objects.get(pk=self.pk)
+        return old_booking
 
     def _is_new_booking(self):
         if not self.pk:
@@ -1640,8 +1766,9 @@ class Booking(models.Model):
     def _is_rebooking(self):
         if not self.pk:
             return False
-        was_cancelled = self._old_booking().status == 'CANCELLED' and self.status == 'OPEN'
-        was_no_show = self._old_booking().no_show and not self.no_show
+        old_booking = self._old_booking()
+        was_cancelled = old_booking.status == 'CANCELLED' and self.status == 'OPEN'
+        was_no_show = old_booking.no_show and not self.no_show
         return was_cancelled or was_no_show
 
     def _is_cancellation(self):
@@ -1654,14 +1781,17 @@ class Booking(models.Model):
             # Booking should never be both cancelled and no-show; reset no-show before clean
             self.no_show = False
 
+        # Check spaces on the event locked in save(), if we have it, so we count bookings made
+        # concurrently for the same event
+        event = getattr(self, "_locked_event", None) or self.event
         if self._is_rebooking():
-            if self.event.spaces_left == 0 and not self.event.course:
+            if event.spaces_left <= 0 and not event.course:
                 raise ValidationError(
                     _('Attempting to reopen booking for full event %s' % self.event.id)
                 )
 
         if self._is_new_booking() and self.status != "CANCELLED" and \
-                self.event.spaces_left == 0:
+                event.spaces_left <= 0:
                     raise ValidationError(
                         _('Attempting to create booking for full event %s (id %s)' % (str(self.event), self.event.id))
                     )
@@ -1670,16 +1800,34 @@ class Booking(models.Model):
             raise ValidationError(_('Booking cannot be both attended and no-show'))
 
     def save(self, *args, **kwargs):
-        self.full_clean()
-        if self._is_cancellation() and not self.event.course:
-            # cancelling a drop in booking removes it from the block
-            self.block = None
-            old_block = self._old_booking().block
-        else:
-            old_block = None
-        if self._is_rebooking():
-            self.date_rebooked = timezone.now()
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            # Lock the event row until the booking is saved; concurrent bookings for the same
+            # event wait here, so the spaces check in clean() can't let two of them take the last space.
+            # Always the event first, then the booking, so a concurrent cancellation and rebooking
+            # can't deadlock.  (A booking moved to another event in the admin locks the old event
+            # when its counters are updated.)
+            self._locked_event = Event.objects.select_for_update().get(pk=self.event_id)
+            if not Booking.event.is_cached(self):
+                self.event = self._locked_event
+            # lock the current booking row too, so concurrent updates to it adjust the event counters in turn
+            old_booking = Booking.objects.select_for_update().filter(pk=self.pk).order_by().first() if self.pk else None
+            self._locked_old_booking = old_booking
+            try:
+                self.full_clean()
+                if self._is_cancellation() and not self._locked_event.course_id:
+                    # cancelling a drop in booking removes it from the block
+                    self.block = None
+                    old_block = old_booking.block
+                else:
+                    old_block = None
+                if self._is_rebooking():
+                    self.date_rebooked = timezone.now()
+                super().save(*args, **kwargs)
+            finally:
+                self._locked_event = None
+                self._locked_old_booking = None
+            self._update_event_booking_counters(old_booking)
+            self._update_block_used_counts(old_booking)
         # if there is a block on the booking, make sure its start date is updated
         # if no block, and we cancelled, update the start date on the old block
         if self.block:
@@ -1692,6 +1840,49 @@ class Booking(models.Model):
             self.subscription.set_start_date_from_bookings()
 
 
+    def _counter_values(self):
+        """What this booking contributes to its event's open booking and no-show counters"""
+        is_open = self.status == "OPEN"
+        return int(is_open), int(is_open and self.no_show)
+
+    def _update_event_booking_counters(self, old_booking=None):
+        open_count, no_show_count = self._counter_values()
+        if old_booking is not None:
+            old_open_count, old_no_show_count = old_booking._counter_values()
+            if old_booking.event_id != self.event_id:
+                update_event_booking_counters(old_booking.event_id, -old_open_count, -old_no_show_count)
+            else:
+                open_count -= old_open_count
+                no_show_count -= old_no_show_count
+        update_event_booking_counters(self.event_id, open_count, no_show_count)
+        self._refresh_event_booking_counters(open_count, no_show_count)
+
+    def _refresh_event_booking_counters(self, open_change, no_show_change):
+        # make sure the event instance we have reflects the change
+        if (open_change or no_show_change) and Booking.event.is_cached(self):
+            self.event.refresh_from_db(fields=EVENT_BOOKING_COUNTER_FIELDS)
+
+    def _update_block_used_counts(self, old_booking=None):
+        old_block_id = old_booking.block_id if old_booking is not None else None
+        if old_block_id != self.block_id:
+            update_block_used_count(old_block_id, -1)
+            update_block_used_count(self.block_id, 1)
+            self._refresh_block_used_count()
+
+    def _refresh_block_used_count(self):
+        if self.block_id and Booking.block.is_cached(self):
+            self.block.refresh_from_db(fields=["used_count"])
+
+
+@receiver(post_delete, sender=Booking)
+def update_counters_on_booking_delete(sender, instance, **kwargs):
+    open_count, no_show_count = instance._counter_values()
+    update_event_booking_counters(instance.event_id, -open_count, -no_show_count)
+    instance._refresh_event_booking_counters(open_count, no_show_count)
+    update_block_used_count(instance.block_id, -1)
+    instance._refresh_block_used_count()
+
+
 # Model-related utils
 def valid_course_block_configs(course, active_only=True):
     if not course.has_started:
@@ -1722,37 +1913,96 @@ def valid_dropin_block_configs(
     return all_block_configs.order_by("-active", "-id")
 
 
+def cached_block_configs(event_type_id, course, size=None, active_only=True):
+    """
+    Like valid_course_block_configs/valid_dropin_block_configs, but from the cached list of enabled
+    block configs, so doesn't query the db.  Returns a list, active ones first, then latest first.
+    """
+    return [
+        config for config in enabled_block_configs()
+        if config.course == course and config.event_type_id == event_type_id
+        and (size is None or config.size == size) and (config.active or not active_only)
+    ]
+
+
 def add_to_cart_course_block_config(course):
     # get all block configs valid for the course, whether active or not
     # we want to return an active one first, if possible
-    valid_block_configs = valid_course_block_configs(course, active_only=False)
-    return valid_block_configs.first()
+    if course.has_started:
+        return None
+    valid_block_configs = cached_block_configs(
+        course.event_type_id, course=True, size=course.number_of_events, active_only=False
+    )
+    return valid_block_configs[0] if valid_block_configs else None
 
 
 def add_to_cart_drop_in_block_config(event):
     # get all block configs valid for the event, whether active or not
     # find the ones that have size=1
     # we want to return an active one first, if possible
-    valid_block_configs = valid_dropin_block_configs(
-        event, active_only=False, size=1
-    )
-    return valid_block_configs.first()
+    valid_block_configs = cached_block_configs(event.event_type_id, course=False, size=1, active_only=False)
+    return valid_block_configs[0] if valid_block_configs else None
+
+
+# Cached reference data; see common.reference_data
+@reference_data("default_track", models=[Track])
+def default_track():
+    # the default track, or the first one, or None
+    return Track.objects.filter(default=True).first() or Track.objects.first()
+
+
+@reference_data("event_types", models=[EventType])
+def event_types_by_id():
+    return {event_type.id: event_type for event_type in EventType.objects.all()}
+
+
+@reference_data("enabled_block_configs", models=[BlockConfig, DisabledBlockConfig])
+def enabled_block_configs():
+    return list(BlockConfig.objects.enabled().order_by("-active", "-id"))
+
+
+@reference_data("active_subscription_configs", models=[SubscriptionConfig])
+def active_subscription_configs():
+    return list(SubscriptionConfig.objects.filter(active=True))
+
+
+@reference_data("upcoming_tracks", models=[Track, EventType, Event], timeout=60)
+def upcoming_tracks():
+    # Only tracks that have upcoming events (that are visible and not cancelled), or the default one
+    tracks_with_events = Event.objects.filter(
+        start__gt=timezone.now() - timedelta(minutes=15), show_on_site=True, cancelled=False
+    ).order_by().distinct("event_type__track").values_list("event_type__track_id")
+    tracks = list(Track.objects.filter(id__in=tracks_with_events))
+    return tracks or list(Track.objects.filter(default=True))
+
+
+@reference_data("gift_vouchers_available", models=[GiftVoucherConfig])
+def gift_vouchers_available():
+    return GiftVoucherConfig.objects.filter(active=True).exists()
+
+
+def cart_item_count_cache_key(user_id):
+    return f"user_{user_id}_cart_item_count"
+
+
+def _active_user_blocks(user):
+    return user.blocks.active().select_related("block_config")
 
 
 def has_available_block(user, event, dropin_only=False):
     if event.course and not event.course.allow_drop_in and not dropin_only:
-        return any(True for block in user.blocks.all() if block.valid_for_course(event.course))
+        return any(True for block in _active_user_blocks(user) if block.valid_for_course(event.course))
     else:
         if dropin_only:
             return any(
-                True for block in user.blocks.all()
+                True for block in _active_user_blocks(user)
                 if not block.block_config.course and block.valid_for_event(event)
             )
-        return any(True for block in user.blocks.all() if block.valid_for_event(event))
+        return any(True for block in _active_user_blocks(user) if block.valid_for_event(event))
 
 
 def has_available_course_block(user, course):
-    return any(True for block in user.blocks.all() if block.valid_for_course(course))
+    return any(True for block in _active_user_blocks(user) if block.valid_for_course(course))
 
 
 def get_active_user_block(user, event, dropin_only=True):
@@ -1766,14 +2016,14 @@ def get_active_user_block(user, event, dropin_only=True):
         if valid_course_block is not None or not event.course.allow_drop_in:
             return valid_course_block
 
-    blocks = user.blocks.filter(
+    blocks = _active_user_blocks(user).filter(
         block_config__course=False, block_config__event_type=event.event_type
     ).order_by("expiry_date", "purchase_date")
     return next((block for block in blocks if block.valid_for_event(event)), None)
 
 
 def get_active_user_course_block(user, course):
-    blocks = user.blocks.filter(
+    blocks = _active_user_blocks(user).filter(
         block_config__course=True, block_config__event_type=course.event_type
     ).order_by("expiry_date", "purchase_date")
     valid_blocks = (block for block in blocks if block.valid_for_course(course))
@@ -1809,3 +2059,19 @@ def delete_related_voucher(sender, instance, **kwargs):
         if instance.voucher.basevoucher_ptr_id is None:
             instance.voucher.basevoucher_ptr_id = instance.voucher.id
         instance.voucher.delete()
+
+
+@receiver([post_save, post_delete], sender=Block)
+@receiver([post_save, post_delete], sender=Subscription)
+@receiver([post_save, post_delete], sender=GiftVoucher)
+@receiver([post_save, post_delete], sender="merchandise.ProductPurchase")
+def clear_cart_item_count_cache(sender, instance, **kwargs):
+    # Anything added to, removed from or paid for in the cart changes the cached cart count for the
+    # user and their manager (whose cart includes their managed users' items)
+    if sender is GiftVoucher:
+        # gift vouchers are in the cart of the user with the purchaser's email
+        purchaser_email = instance.purchaser_email
+        users = User.objects.filter(email=purchaser_email) if purchaser_email else []
+    else:
+        users = [instance.user, instance.user.manager_user]
+    shared_cache().delete_many([cart_item_count_cache_key(user.id) for user in users if user is not None])
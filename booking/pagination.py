@@ -0,0 +1,122 @@
+"""
+Keyset (cursor) pagination for the schedule and bookings lists
+
+Paginator counts the whole queryset and fetches each page with OFFSET, so a page gets slower the
+further into the schedule (or a user's booking history) it is.  KeysetPaginator instead orders by
+a datetime field plus id, and fetches the page after (or before) the last (or first) row of the
+current one, which the database can read straight from an index.  Pages are identified by a cursor
+token in the "page" querystring parameter; anything that isn't a valid cursor (e.g. "1" from the
+ajax views' redirects) gives the first page.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Q
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def encode_cursor(direction, value, pk):
+    # timestamps in whole microseconds, so the cursor round trips exactly
+    delta = value - _EPOCH
+    microseconds = (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+    return f"{direction}{microseconds}_{pk}"
+
+
+def decode_cursor(cursor):
+    """Return (direction, datetime, id) for a cursor token, or None if it isn't valid"""
+    if not cursor or cursor[0] not in "np":
+        return None
+    try:
+        microseconds, pk = cursor[1:].split("_")
+        return cursor[0], _EPOCH + timedelta(microseconds=int(microseconds)), int(pk)
+    except (ValueError, OverflowError):
+        return None
+
+
+class KeysetPage:
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __repr__(self):
+        return f"<KeysetPage of {len(self)} items>"
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset ordered by (field, id), or (-field, -id) with descending=True.
+    field can span relations (e.g. "event__start" for bookings).
+    """
+
+    def __init__(self, queryset, per_page, field="start", descending=False):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.field = field
+        self.descending = descending
+
+    def _key(self, obj):
+        value = obj
+        for attr in self.field.split("__"):
+            value = getattr(value, attr)
+        return value, obj.pk
+
+    def _fetch(self, after=None, before=None):
+        """Fetch up to per_page + 1 rows, in page order, after or before a (value, id) key"""
+        # fetching backwards is fetching forwards in the opposite order
+        reverse = self.descending != (before is not None)
+        key = after or before
+        queryset = self.queryset
+        if key is not None:
+            value, pk = key
+            lookup = "lt" if reverse else "gt"
+            queryset = queryset.filter(
+                Q(**{f"{self.field}__{lookup}": value}) | Q(**{self.field: value, f"pk__{lookup}": pk})
+            )
+        ordering = (f"-{self.field}", "-id") if reverse else (self.field, "id")
+        objects = list(queryset.order_by(*ordering)[:self.per_page + 1])
+        if before is not None:
+            # fetched nearest first; put the extra row (if any) first, and the rest in page order
+            objects.reverse()
+        return objects
+
+    def get_page(self, cursor=None):
+        decoded = decode_cursor(cursor)
+        if decoded is not None:
+            direction, value, pk = decoded
+            if direction == "p":
+                objects = self._fetch(before=(value, pk))
+                if len(objects) > self.per_page:
+                    object_list = objects[1:]
+                    return self._page(object_list, has_next=True, has_previous=True)
+                # back at the start; show a full first page rather than what's left of this one
+            else:
+                objects = self._fetch(after=(value, pk))
+                object_list = objects[:self.per_page]
+                return self._page(object_list, has_next=len(objects) > self.per_page, has_previous=True)
+        objects = self._fetch()
+        return self._page(objects[:self.per_page], has_next=len(objects) > self.per_page, has_previous=False)
+
+    def _page(self, object_list, has_next, has_previous):
+        if not object_list:
+            return KeysetPage(object_list)
+        next_cursor = encode_cursor("n", *self._key(object_list[-1])) if has_next else None
+        previous_cursor = encode_cursor("p", *self._key(object_list[0])) if has_previous else None
+        return KeysetPage(object_list, next_cursor=next_cursor, previous_cursor=previous_cursor)
@@ -0,0 +1,122 @@
+"""
+Shared cache for the rendered track schedule (booking:events)
+
+The parts of a schedule page that are the same for everyone (event cards, availability badges,
+pagination and the name filter) are rendered once and stored in the shared cache, keyed on the
+track's schedule version.  The version is bumped whenever an Event, Course or Booking in the track
+(or one of its event types) is saved or deleted, or bookings are updated in bulk, so changes show on
+the next request; cached pages also expire after SCHEDULE_CACHE_TIMEOUT seconds, as events drop off
+the schedule once they start.
+
+The user-specific parts of each event card (booking buttons, booked tick, video link) are left as
+placeholder comments in the cached html, and filled in with apply_overlay from the html for all the
+events on the page, which is rendered for each request (see EventListView.get_overlay).
+"""
+import hashlib
+import re
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from common.reference_data import shared_cache
+from .models import Booking, Course, Event, EventType, Track, bookings_updated, event_types_by_id
+
+
+OVERLAY_PARTS = ("video", "tick", "buttons")
+_OVERLAY_PLACEHOLDER = re.compile(r"<!--overlay:(\d+):(\w+)-->")
+
+
+def _version_key(track_id):
+    return f"schedule_{track_id}_version"
+
+
+def schedule_version(track_id):
+    version = shared_cache().get(_version_key(track_id))
+    if version is None:
+        # start from a timestamp, so a cleared cache can't restart at a version that's already been used
+        shared_cache().add(_version_key(track_id), time.time_ns(), timeout=None)
+        version = shared_cache().get(_version_key(track_id))
+    return version
+
+
+def bump_schedule_version(track_id):
+    try:
+        shared_cache().incr(_version_key(track_id))
+    except ValueError:
+        # not set yet
+        schedule_version(track_id)
+
+
+def get_cached_schedule(track_id, variant, render, **params):
+    """
+    Return the cached schedule for a track, or render and cache it.
+    variant: "anonymous" or "user"; params: anything else the page depends on (page, filters)
+    render: function returning the value to cache
+    """
+    params_hash = hashlib.md5(repr(sorted(params.items())).encode()).hexdigest()
+    key = f"schedule_{track_id}_v{schedule_version(track_id)}_{variant}_{params_hash}"
+    cached = shared_cache().get(key)
+    if cached is None:
+        cached = render()
+        shared_cache().set(key, cached, timeout=settings.SCHEDULE_CACHE_TIMEOUT)
+    return cached
+
+
+def apply_overlay(html, overlay):
+    """
+    Fill in the overlay placeholders in schedule html.
+    overlay: {event_id: {part: html}}; placeholders for events not in it are removed
+    """
+    return _OVERLAY_PLACEHOLDER.sub(lambda match: overlay.get(int(match[1]), {}).get(match[2], ""), html)
+
+
+def track_id_for_event_type(event_type_id):
+    event_type = event_types_by_id().get(event_type_id)
+    if event_type is None:
+        return EventType.objects.filter(id=event_type_id).values_list("track_id", flat=True).first()
+    return event_type.track_id
+
+
+def schedule_changed(track_id):
+    if track_id is None:
+        return
+    bump_schedule_version(track_id)
+    if transaction.get_connection().in_atomic_block:
+        # and again once it's committed, in case another request cached the old schedule in the meantime
+        transaction.on_commit(lambda: bump_schedule_version(track_id))
+
+
+@receiver([post_save, post_delete], sender=Event)
+@receiver([post_save, post_delete], sender=Course)
+def event_or_course_changed(sender, instance, **kwargs):
+    schedule_changed(track_id_for_event_type(instance.event_type_id))
+
+
+@receiver([post_save, post_delete], sender=Booking)
+def booking_changed(sender, instance, **kwargs):
+    try:
+        event = instance.event
+    except Event.DoesNotExist:
+        # deleted along with its event, which changes the schedule anyway
+        return
+    schedule_changed(track_id_for_event_type(event.event_type_id))
+
+
+@receiver(bookings_updated, sender=Booking)
+def bookings_bulk_updated(sender, event_ids, **kwargs):
+    event_type_ids = Event.objects.filter(id__in=event_ids).values_list("event_type_id", flat=True).distinct()
+    for track_id in {track_id_for_event_type(event_type_id) for event_type_id in event_type_ids}:
+        schedule_changed(track_id)
+
+
+@receiver([post_save, post_delete], sender=EventType)
+def event_type_changed(sender, instance, **kwargs):
+    schedule_changed(instance.track_id)
+
+
+@receiver(post_save, sender=Track)
+def track_changed(sender, instance, **kwargs):
+    schedule_changed(instance.id)
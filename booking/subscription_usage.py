@@ -0,0 +1,120 @@
+"""
+In-memory usage ledger for subscriptions
+
+Checking whether a subscription can be used for an event means counting its open bookings for
+the same event type in the event's usage window (a day, or a week/month starting on the
+subscription's start weekday/day).  SubscriptionUsage loads a subscription's open bookings once,
+and answers those checks for any number of events from memory.
+
+Like UserEntitlements, a ledger is a snapshot; create a new one after the subscription's
+bookings change.
+"""
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+
+class SubscriptionUsage:
+
+    def __init__(self, subscription):
+        self.subscription = subscription
+        self._loaded = False
+        # event ids with open, not no-show bookings; these events are always valid
+        self._fully_open_event_ids = set()
+        # event ids with open bookings that count towards usage limits
+        self._counted_event_ids = set()
+        # event type ids with any open bookings (including no-shows)
+        self._booked_event_type_ids = set()
+        # event starts of bookings that count towards usage limits, bucketed by event type, sorted.
+        # Usage counts for the subscription validity checks (which can include no-shows, depending on
+        # the config) and the usage counts shown to users/admins (which never include no-shows) are
+        # kept separately
+        self._counted_starts = defaultdict(list)
+        self._usage_starts = defaultdict(list)
+        # {(starts key, event type id): Counter of dates} and {(starts key, event type id, start, end): count},
+        # filled in as they're needed
+        self._day_counts = {}
+        self._window_counts = {}
+
+    def _load(self):
+        # only fetch the bookings once we need to count them
+        if self._loaded:
+            return
+        bookings = self.subscription.bookings.filter(status="OPEN").order_by().values_list(
+            "event_id", "event__event_type_id", "event__start", "no_show"
+        )
+        include_no_shows = self.subscription.config.include_no_shows_in_usage
+        for event_id, event_type_id, event_start, no_show in bookings:
+            self._booked_event_type_ids.add(event_type_id)
+            if not no_show:
+                self._fully_open_event_ids.add(event_id)
+                self._usage_starts[event_type_id].append(event_start)
+            if include_no_shows or not no_show:
+                self._counted_event_ids.add(event_id)
+                self._counted_starts[event_type_id].append(event_start)
+        for starts in [*self._counted_starts.values(), *self._usage_starts.values()]:
+            starts.sort()
+        self._loaded = True
+
+    def _bookable_event_type(self, event_type_id):
+        bookable_event_types = self.subscription.config.bookable_event_types or {}
+        # jsonfield keys should always be strings, but check for the int anyway, just in case
+        return bookable_event_types.get(str(event_type_id)) or bookable_event_types.get(event_type_id)
+
+    def _count(self, starts_key, event_type_id, event_start, allowed_unit):
+        starts = getattr(self, starts_key).get(event_type_id)
+        if not starts:
+            return 0
+        if allowed_unit == "day":
+            key = (starts_key, event_type_id)
+            if key not in self._day_counts:
+                self._day_counts[key] = Counter(start.date() for start in starts)
+            return self._day_counts[key][event_start.date()]
+        start, end = self.subscription.subscription_usage_period_dates_for_event(event_start, allowed_unit)
+        key = (starts_key, event_type_id, start, end)
+        if key not in self._window_counts:
+            self._window_counts[key] = bisect_left(starts, end) - bisect_left(starts, start)
+        return self._window_counts[key]
+
+    def usage(self, event_type_id, event_date):
+        """Number of open, not no-show bookings for this event type in the usage window for event_date"""
+        bookable_event_type = self._bookable_event_type(event_type_id)
+        if not bookable_event_type:
+            return 0
+        self._load()
+        return self._count("_usage_starts", event_type_id, event_date, bookable_event_type.get("allowed_unit"))
+
+    def valid_for_event(self, event):
+        subscription = self.subscription
+        if event.course_id or not subscription.paid:
+            return False
+        bookable_event_type = self._bookable_event_type(event.event_type_id)
+        if not bookable_event_type:
+            return False
+        # check event date is within subscription dates
+        if subscription.start_date and subscription.start_date > event.start:
+            # subscription starts after event
+            return False
+        if subscription.expiry_date and subscription.expiry_date < event.start:
+            # subscription expires before event
+            return False
+        # check usages
+        allowed_number = bookable_event_type.get("allowed_number")
+        if not allowed_number:  # can be None or empty string
+            # no max
+            return True
+        self._load()
+        # An OPEN, not no-show booking for this event already is automatically valid
+        if event.id in self._fully_open_event_ids:
+            return True
+        # If no existing open bookings for this event type, no-show or no no-show, then it's definitely valid
+        if event.event_type_id not in self._booked_event_type_ids:
+            return True
+        # This event's own (no-show) booking is already counted
+        if event.id in self._counted_event_ids:
+            allowed_number += 1
+        used = self._count("_counted_starts", event.event_type_id, event.start, bookable_event_type["allowed_unit"])
+        return used < allowed_number
+
+    def valid_for_events(self, events):
+        """{event_id: True/False} for a list of events"""
+        return {event.id: self.valid_for_event(event) for event in events}
@@ -1,8 +1,8 @@
 from django import template
-from django.db.models import Q, Count
+from django.db.models import Q
 from django.utils import timezone
 from common.utils import full_name, start_of_day_in_utc
-from ..models import EventType, WaitingListUser
+from ..models import WaitingListUser, event_types_by_id
 
 from ..utils import (
     get_block_status, user_subscription_info,
@@ -33,7 +33,7 @@ def user_block_info(block):
 @register.filter
 def unpaid_block_count(user, block_config):
     # unpaid block count for blocks with no associated bookings
-    return user.blocks.filter(block_config=block_config, paid=False).annotate(count=Count("bookings__id")).exclude(count__gt=0).count()
+    return user.blocks.filter(block_config=block_config, paid=False, used_count=0).count()
 
 
 @register.simple_tag
@@ -125,8 +125,9 @@ def format_subscription_config_start_options(subscription_config_dict):
 @register.inclusion_tag('booking/includes/bookable_event_types.html')
 def format_bookable_event_types(subscription_config):
     bookable_event_types = subscription_config.bookable_event_types or {}
+    event_types = event_types_by_id()
     formatted_bookable_event_types = {
-        EventType.objects.get(id=key): f"{value['allowed_number']} per {value['allowed_unit']}" if value["allowed_number"] else "unlimited"
+        event_types[int(key)]: f"{value['allowed_number']} per {value['allowed_unit']}" if value["allowed_number"] else "unlimited"
         for key, value in bookable_event_types.items()
     }
     return {"bookable_event_types": formatted_bookable_event_types}
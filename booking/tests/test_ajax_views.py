@@ -208,6 +208,7 @@ class BookingToggleAjaxViewTests(EventTestMixin, TestUsersMixin, TestCase):
         # user has cancelled booking
         booking = baker.make(Booking, event=self.course_event, status="CANCELLED", user=self.student_user)
         assert self.course_event.bookings.count() == bookings_count + 1
+        self.course_event.refresh_from_db()
         assert self.course_event.spaces_left == 0
         resp = self.client.post(self.url(self.course_event.id),
                                 data={"user_id": self.student_user.id})
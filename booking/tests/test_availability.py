@@ -0,0 +1,140 @@
+from datetime import timedelta
+
+from django.utils import timezone
+from model_bakery import baker
+
+import pytest
+
+from booking.availability import get_availability, get_course_occupancy, prefetch_availability, \
+    prefetch_course_occupancy
+from booking.models import Booking, Course, Event
+
+
+pytestmark = pytest.mark.django_db
+
+
+def _fresh_events(*events):
+    return list(Event.objects.select_related("event_type", "course").filter(
+        id__in=[event.id for event in events]
+    ).order_by("id"))
+
+
+def test_get_availability(event, course, django_assert_num_queries):
+    baker.make(Booking, event=event)
+    baker.make(Booking, event=event, no_show=True)
+    baker.make(Booking, event=event, status="CANCELLED")
+    course_event1, course_event2 = course.uncancelled_events
+    baker.make(Booking, event=course_event1, _quantity=2)
+    baker.make(Booking, event=course_event2, no_show=True)
+
+    events = _fresh_events(event, course_event2)
+    with django_assert_num_queries(1):
+        course_availability = get_availability(events)
+    # course booking count is the max on any uncancelled event, including events not in the list
+    assert course_availability == {
+        course.id: {"booking_count": 2, "start": course_event1.start}
+    }
+
+
+def test_get_availability_ignores_cancelled_course_events(course):
+    course_event1, course_event2 = course.uncancelled_events
+    baker.make(Booking, event=course_event1, _quantity=2)
+    course_event1.cancelled = True
+    course_event1.save()
+    course_availability = get_availability(_fresh_events(course_event2))
+    assert course_availability == {course.id: {"booking_count": 0, "start": course_event2.start}}
+
+
+def test_get_availability_no_events(event, django_assert_num_queries):
+    events = _fresh_events(event)
+    with django_assert_num_queries(0):
+        assert get_availability([]) == {}
+        # no courses, nothing to fetch
+        assert get_availability(events) == {}
+
+
+def test_prefetched_availability_matches_model_properties(event, course, django_assert_num_queries):
+    event.max_participants = 3
+    event.save()
+    baker.make(Booking, event=event)
+    baker.make(Booking, event=event, no_show=True)
+    course_event1, course_event2 = course.uncancelled_events
+    baker.make(Booking, event=course_event1, _quantity=2)
+    baker.make(Booking, event=course_event2, no_show=True)
+
+    def _availability(events):
+        return [
+            (ev.spaces_left, ev.full, ev.has_space, ev.is_bookable(booking_restricted=False))
+            for ev in events
+        ] + [(ev.course.full, ev.course.spaces_left, ev.course.start) for ev in events if ev.course]
+
+    expected = _availability(_fresh_events(event, course_event1, course_event2))
+    assert expected[:3] == [(2, False, True, True), (0, True, False, False), (1, False, True, False)]
+
+    events = _fresh_events(event, course_event1, course_event2)
+    prefetch_availability(events)
+    with django_assert_num_queries(0):
+        assert _availability(events) == expected
+
+
+def test_get_course_occupancy(course, django_assert_num_queries):
+    course_event1, course_event2 = course.uncancelled_events
+    baker.make(Booking, event=course_event1, _quantity=2)
+    baker.make(Booking, event=course_event2, no_show=True)
+    cancelled_event = baker.make_recipe(
+        "booking.future_event", event_type=course.event_type, course=course, cancelled=True
+    )
+    empty_course = baker.make(Course, max_participants=4)
+
+    with django_assert_num_queries(1):
+        occupancy = get_course_occupancy([course, empty_course])
+    assert occupancy == {
+        course.id: {
+            "events": [course_event1, course_event2],
+            "event_counts": {course_event1.id: 2, course_event2.id: 1},
+            "event_order": {course_event1.id: 1, course_event2.id: 2},
+            "booking_count": 2,
+            "spaces_left": course.max_participants - 2,
+            "start": course_event1.start,
+            "last_event_date": course_event2.start,
+            "total_event_count": 3,
+            "has_bookings": True,
+        },
+        empty_course.id: {
+            "events": [],
+            "event_counts": {},
+            "event_order": {},
+            "booking_count": 0,
+            "spaces_left": 4,
+            "start": None,
+            "last_event_date": None,
+            "total_event_count": 0,
+            "has_bookings": False,
+        }
+    }
+    assert cancelled_event.course_order() == "-"
+
+
+def test_prefetched_course_occupancy_matches_model_properties(course, django_assert_num_queries):
+    course_event1, course_event2 = course.uncancelled_events
+    course_event1.start = timezone.now() - timedelta(days=1)
+    course_event1.save()
+    baker.make(Booking, event=course_event1, _quantity=course.max_participants)
+    baker.make(Booking, event=course_event2, _quantity=course.max_participants - 1)
+
+    def _occupancy(course):
+        return (
+            course.booking_count(), course.spaces_left, course.full, course.start, course.last_event_date,
+            course.all_events_full, course.is_configured(), course.can_be_visible(), course.has_bookings,
+            [(event.id, event.course_order()) for event in course.uncancelled_event_list],
+        )
+
+    expected = _occupancy(Course.objects.get(id=course.id))
+    assert expected[-1] == [(course_event1.id, "1/2"), (course_event2.id, "2/2")]
+    # the past event is full, but the next one isn't
+    assert expected[5] is False
+
+    courses = list(Course.objects.filter(id=course.id))
+    prefetch_course_occupancy(courses)
+    with django_assert_num_queries(0):
+        assert _occupancy(courses[0]) == expected
@@ -0,0 +1,103 @@
+from datetime import timedelta
+
+from model_bakery import baker
+
+import pytest
+
+from django.utils import timezone
+
+from booking.models import Block, Booking, get_active_user_block
+
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def dropin_block(dropin_block):
+    dropin_block.block_config.size = 2
+    dropin_block.block_config.save()
+    yield dropin_block
+
+
+@pytest.fixture
+def events(event_type):
+    yield baker.make_recipe("booking.future_event", event_type=event_type, max_participants=10, _quantity=3)
+
+
+def _used_count(block):
+    return Block.objects.values_list("used_count", flat=True).get(id=block.id)
+
+
+def test_used_count_updated_on_booking_save(student_user, dropin_block, events):
+    booking = baker.make(Booking, user=student_user, event=events[0], block=dropin_block)
+    assert _used_count(dropin_block) == 1
+    # the booking's block instance is refreshed
+    assert booking.block.used_count == 1
+
+    # no-shows keep their block
+    booking.no_show = True
+    booking.save()
+    assert _used_count(dropin_block) == 1
+
+    # cancelling a drop in booking removes it from the block
+    booking.no_show = False
+    booking.status = "CANCELLED"
+    booking.save()
+    assert _used_count(dropin_block) == 0
+
+    booking.status = "OPEN"
+    booking.block = dropin_block
+    booking.save()
+    assert _used_count(dropin_block) == 1
+
+    booking.delete()
+    assert _used_count(dropin_block) == 0
+
+
+def test_used_count_updated_on_booking_moved_to_another_block(student_user, dropin_block, events):
+    other_block = baker.make(Block, user=student_user, block_config=dropin_block.block_config, paid=True)
+    booking = baker.make(Booking, user=student_user, event=events[0], block=dropin_block)
+    booking.block = other_block
+    booking.save()
+    assert (_used_count(dropin_block), _used_count(other_block)) == (0, 1)
+
+
+def test_used_count_updated_on_queryset_update_and_delete(student_user, dropin_block, events):
+    for event in events[:2]:
+        baker.make(Booking, user=student_user, event=event, block=dropin_block)
+    booking = baker.make(Booking, user=student_user, event=events[2])
+    assert _used_count(dropin_block) == 2
+
+    Booking.objects.filter(event=events[0]).update(block=None)
+    assert _used_count(dropin_block) == 1
+    Booking.objects.filter(id=booking.id).update(block=dropin_block)
+    assert _used_count(dropin_block) == 2
+    Booking.objects.filter(block=dropin_block).delete()
+    assert _used_count(dropin_block) == 0
+
+
+def test_block_save_does_not_overwrite_used_count(student_user, dropin_block, events):
+    stale_block = Block.objects.get(id=dropin_block.id)
+    baker.make(Booking, user=student_user, event=events[0], block=dropin_block)
+    stale_block.manual_expiry_date = timezone.now() + timedelta(days=30)
+    stale_block.save()
+    assert _used_count(dropin_block) == 1
+
+
+def test_active_queryset_matches_active_block(student_user, dropin_block, events, django_assert_num_queries):
+    full_block = baker.make(Block, user=student_user, block_config=dropin_block.block_config, paid=True)
+    for event in events[:2]:
+        baker.make(Booking, user=student_user, event=event, block=full_block)
+    expired_block = baker.make(
+        Block, user=student_user, block_config=dropin_block.block_config, paid=True,
+        manual_expiry_date=timezone.now() - timedelta(days=1)
+    )
+    unpaid_block = baker.make(Block, user=student_user, block_config=dropin_block.block_config)
+    baker.make(Booking, user=student_user, event=events[2], block=unpaid_block)
+
+    blocks = list(Block.objects.select_related("block_config"))
+    with django_assert_num_queries(0):
+        active_block_ids = {block.id for block in blocks if block.active_block}
+    assert active_block_ids == {dropin_block.id}
+    assert set(Block.objects.active().values_list("id", flat=True)) == active_block_ids
+    assert get_active_user_block(student_user, events[2]) == dropin_block
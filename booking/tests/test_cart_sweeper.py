@@ -0,0 +1,84 @@
+from datetime import timedelta
+
+import pytest
+
+from django.core.management import call_command
+from django.db import connections
+from django.utils import timezone
+from model_bakery import baker
+
+from activitylog.models import ActivityLog
+from booking.cart_sweeper import SWEEPER_LOCK_ID, sweep_expired_cart_items
+from booking.models import Block, Booking
+from booking.views.views_utils import get_unpaid_user_managed_blocks, get_unpaid_user_merchandise
+from merchandise.models import ProductPurchase
+from merchandise.tests.utils import make_purchase
+
+
+pytestmark = pytest.mark.django_db
+
+
+def _expired():
+    return timezone.now() - timedelta(minutes=30)
+
+
+def test_sweep_expired_cart_items(student_user, event):
+    expired_blocks = baker.make(Block, user=student_user, paid=False, _quantity=3)
+    other_event = baker.make_recipe("booking.future_event", event_type=event.event_type)
+    expired_bookings = [
+        baker.make(Booking, block=expired_blocks[0], user=student_user, event=event),
+        baker.make(Booking, block=expired_blocks[1], user=student_user, event=other_event),
+    ]
+    Block.objects.filter(id__in=[block.id for block in expired_blocks]).update(created_date=_expired())
+    # not expired yet
+    unexpired_block = baker.make(Block, user=student_user, paid=False)
+    baker.make(Booking, block=unexpired_block, user=student_user)
+    expired_purchase = make_purchase(created_at=_expired(), time_checked=_expired())
+    event.refresh_from_db()
+    assert event.open_booking_count == 1
+
+    # blocks without bookings don't expire
+    assert sweep_expired_cart_items() == (2, 1)
+    assert list(Block.objects.order_by("id")) == [expired_blocks[2], unexpired_block]
+    assert not Booking.objects.filter(id__in=[booking.id for booking in expired_bookings]).exists()
+    assert not ProductPurchase.objects.filter(id=expired_purchase.id).exists()
+    event.refresh_from_db()
+    assert event.open_booking_count == 0
+    assert ActivityLog.objects.filter(log__startswith="2 unpaid blocks with bookings in cart").exists()
+
+    assert sweep_expired_cart_items() == (0, 0)
+
+
+def test_read_paths_filter_out_expired_cart_items(student_user, event):
+    expired_block = baker.make(Block, user=student_user, paid=False)
+    baker.make(Booking, block=expired_block, user=student_user, event=event)
+    Block.objects.filter(id=expired_block.id).update(created_date=_expired())
+    block = baker.make(Block, user=student_user, paid=False)
+    expired_purchase = make_purchase(user=student_user, created_at=_expired())
+    purchase = make_purchase(user=student_user)
+
+    assert list(get_unpaid_user_managed_blocks(student_user)) == [block]
+    assert list(get_unpaid_user_merchandise(student_user)) == [purchase]
+    # nothing's deleted until the sweeper runs
+    assert Block.objects.filter(id=expired_block.id).exists()
+    assert ProductPurchase.objects.filter(id=expired_purchase.id).exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_sweep_skipped_if_already_running(student_user):
+    other_connection = connections.create_connection("default")
+    try:
+        with other_connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s)", [SWEEPER_LOCK_ID])
+        assert sweep_expired_cart_items() is None
+        with other_connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", [SWEEPER_LOCK_ID])
+        assert sweep_expired_cart_items() == (0, 0)
+    finally:
+        other_connection.close()
+
+
+def test_sweep_expired_cart_items_command(capsys):
+    make_purchase(created_at=_expired(), time_checked=_expired())
+    call_command("sweep_expired_cart_items")
+    assert "0 expired block(s) and 1 product purchase(s) deleted" in capsys.readouterr().out
@@ -0,0 +1,125 @@
+"""
+Stress tests for booking the last space on an event from many threads at once.
+These need real transactions (each thread has its own database connection), so they
+use transactional test databases and are slower than the rest of the booking tests.
+The throughput is logged; run with --log-cli-level=INFO to see it.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+
+from model_bakery import baker
+
+import pytest
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from booking.models import Block, Booking
+from common.test_utils import TestUsersMixin
+
+
+logger = logging.getLogger(__name__)
+
+THREADS = 12
+
+
+@pytest.fixture
+def students(django_user_model, dropin_cart_block_config):
+    mixin = TestUsersMixin()
+    students = []
+    for i in range(THREADS):
+        user = django_user_model.objects.create_user(
+            username=f"student{i}@test.com", email=f"student{i}@test.com", password="test"
+        )
+        mixin.make_data_privacy_agreement(user)
+        mixin.make_disclaimer(user)
+        baker.make(Block, user=user, block_config=dropin_cart_block_config, paid=True)
+        students.append(user)
+    yield students
+
+
+def _run_concurrently(func, items):
+    """Call func for each item in its own thread, releasing them all at once"""
+    barrier = threading.Barrier(len(items))
+
+    def _call(item):
+        try:
+            barrier.wait()
+            return func(item)
+        finally:
+            connection.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(items)) as executor:
+        results = list(executor.map(_call, items))
+    elapsed = time.perf_counter() - start
+    return results, elapsed
+
+
+def _report_throughput(label, count, elapsed):
+    logger.info("%s: %s concurrent attempts in %.2fs (%.1f/s)", label, count, elapsed, count / elapsed)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_ajax_bookings_for_last_space(event, students):
+    event.max_participants = 1
+    event.save()
+    url = reverse("booking:ajax_toggle_booking", args=(event.id,))
+    clients = {}
+    for student in students:
+        clients[student.id] = Client()
+        clients[student.id].force_login(student)
+
+    def _book(student):
+        return clients[student.id].post(url, {"user_id": student.id, "ref": "events"}).status_code
+
+    status_codes, elapsed = _run_concurrently(_book, students)
+    _report_throughput("ajax_toggle_booking", len(students), elapsed)
+
+    assert Booking.objects.filter(event=event, status="OPEN", no_show=False).count() == 1
+    assert sorted(status_codes) == [200] + [400] * (len(students) - 1)
+    event.refresh_from_db()
+    assert event.spaces_left == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_booking_saves_for_last_space(event, students):
+    event.max_participants = 1
+    event.save()
+
+    def _book(student):
+        try:
+            Booking.objects.create(user=student, event=event)
+        except ValidationError:
+            return False
+        return True
+
+    created, elapsed = _run_concurrently(_book, students)
+    _report_throughput("Booking.save", len(students), elapsed)
+
+    assert created.count(True) == 1
+    assert Booking.objects.filter(event=event).count() == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_cancel_and_rebook_dont_deadlock(event, student_user):
+    # Both lock the event before the booking; a deadlock here would raise an OperationalError
+    event.max_participants = 10
+    event.save()
+    booking = baker.make(Booking, user=student_user, event=event)
+
+    def _save(changes):
+        booking_to_save = Booking.objects.get(id=booking.id)
+        for field, value in changes.items():
+            setattr(booking_to_save, field, value)
+        booking_to_save.save()
+
+    for _ in range(5):
+        Booking.objects.filter(id=booking.id).update(status="OPEN", no_show=True)
+        _run_concurrently(_save, [{"status": "CANCELLED"}, {"no_show": False}])
+    event.refresh_from_db()
+    assert event.open_booking_count == Booking.objects.filter(event=event, status="OPEN").count()
@@ -0,0 +1,155 @@
+from datetime import timedelta
+
+from django.contrib import messages
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+
+import pytest
+
+from booking.conditional_get import ConditionalGetMixin, time_bucket, version
+from booking.models import Block, Booking, Event, WaitingListUser
+from booking.views import EventListView
+from merchandise.models import Product
+from timetable.models import TimetableSession
+
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def events(event_type):
+    return [
+        baker.make(Event, event_type=event_type, start=timezone.now() + timedelta(days=1 + i), show_on_site=True)
+        for i in range(3)
+    ]
+
+
+def _not_modified(client, url):
+    resp = client.get(url)
+    assert resp.status_code == 200
+    etag = resp.headers["ETag"]
+    resp = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == 304
+    return etag
+
+
+def _schedule_urls(event):
+    return [
+        reverse("booking:events", args=(event.event_type.track.slug,)),
+        reverse("booking:courses", args=(event.event_type.track.slug,)),
+        reverse("booking:event", args=(event.slug,)),
+    ]
+
+
+@pytest.mark.parametrize("logged_in", [True, False])
+def test_schedule_pages_not_modified(client, student_user, events, logged_in):
+    if logged_in:
+        client.login(username=student_user.username, password="test")
+    for url in _schedule_urls(events[0]):
+        etag = _not_modified(client, url)
+        resp = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert resp.status_code == 304
+        assert "no-cache" in resp.headers["Cache-Control"]
+        assert ("private" in resp.headers["Cache-Control"]) == logged_in
+
+
+def test_schedule_pages_modified_after_changes(client, student_user, events):
+    client.login(username=student_user.username, password="test")
+    etags = {url: _not_modified(client, url) for url in _schedule_urls(events[0])}
+
+    baker.make(Booking, event=events[0], user=student_user)
+    for url, etag in etags.items():
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+    schedule_url = _schedule_urls(events[0])[0]
+    etag = _not_modified(client, schedule_url)
+    events[0].name = "Renamed"
+    events[0].save()
+    assert client.get(schedule_url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+
+def test_etag_per_user(client, student_user, manager_user, events):
+    url = reverse("booking:events", args=(events[0].event_type.track.slug,))
+    client.login(username=student_user.username, password="test")
+    etag = _not_modified(client, url)
+    client.login(username=manager_user.username, password="test")
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+
+def test_user_changes_modify_page(client, student_user, events, dropin_cart_block_config):
+    url = reverse("booking:events", args=(events[0].event_type.track.slug,))
+    client.login(username=student_user.username, password="test")
+    etag = _not_modified(client, url)
+    # a new block changes the booking buttons
+    baker.make(Block, user=student_user, block_config=dropin_cart_block_config)
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+
+def test_waiting_list_changes_modify_page(client, student_user, events):
+    url = reverse("booking:events", args=(events[0].event_type.track.slug,))
+    client.login(username=student_user.username, password="test")
+    etag = _not_modified(client, url)
+    baker.make(WaitingListUser, user=student_user, event=events[0])
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+
+def test_bulk_booking_updates_modify_page(client, student_user, child_user, events):
+    baker.make(Booking, event=events[0], user=student_user)
+    baker.make(Booking, event=events[1], user=child_user)
+    url = reverse("booking:events", args=(events[0].event_type.track.slug,))
+    client.login(username=student_user.username, password="test")
+    etag = _not_modified(client, url)
+    Booking.objects.filter(user=student_user).update(status="CANCELLED")
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+    # managers' pages show their managed users' bookings
+    child_version = version(f"user_{child_user.id}")
+    manager_version = version(f"user_{child_user.manager_user.id}")
+    Booking.objects.filter(user=child_user).update(no_show=True)
+    assert version(f"user_{child_user.id}") != child_version
+    assert version(f"user_{child_user.manager_user.id}") != manager_version
+
+
+def test_default_etag_versions():
+    assert ConditionalGetMixin().get_etag_versions() == []
+
+    class TimedView(ConditionalGetMixin):
+        etag_versions = ("notices",)
+        etag_max_age = 60
+
+    assert TimedView().get_etag_versions() == [version("notices"), time_bucket(60)]
+
+
+def test_no_etag_with_pending_messages(rf, student_user, events):
+    request = rf.get("/")
+    request.user = student_user
+    request.session = {}
+    request._messages = CookieStorage(request)
+    view = EventListView()
+    view.setup(request, track=events[0].event_type.track.slug)
+    assert view.get_etag() is not None
+
+    messages.info(request, "Booking cancelled")
+    assert view.get_etag() is None
+
+
+def test_product_list_not_modified(client):
+    product = baker.make(Product, active=True)
+    url = reverse("merchandise:products")
+    etag = _not_modified(client, url)
+    product.name = "New name"
+    product.save()
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+
+def test_timetable_not_modified(client, manager_user, event_type):
+    manager_user.is_staff = True
+    manager_user.save()
+    baker.make(TimetableSession, event_type=event_type, day="0", time="10:00")
+    url = reverse("studioadmin:timetable")
+    client.login(username=manager_user.username, password="test")
+    etag = _not_modified(client, url)
+    baker.make(TimetableSession, event_type=event_type, day="1", time="10:00")
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
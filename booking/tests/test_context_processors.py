@@ -0,0 +1,70 @@
+from datetime import timedelta
+
+import pytest
+
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.cache import SessionStore
+from django.test import RequestFactory
+from django.utils import timezone
+from model_bakery import baker
+
+from booking.context_processors import booking
+from booking.models import Block, cart_item_count_cache_key
+from common.reference_data import shared_cache
+
+
+pytestmark = pytest.mark.django_db
+
+
+def _context(user):
+    request = RequestFactory().get("/")
+    request.user = user
+    request.session = SessionStore()
+    return booking(request)
+
+
+def test_context_values_are_lazy(django_assert_num_queries, student_user, event):
+    with django_assert_num_queries(0):
+        context = _context(student_user)
+    with django_assert_num_queries(1):
+        assert list(context["tracks"]) == [event.event_type.track]
+
+
+def test_cart_item_count_cached(django_assert_num_queries, student_user, dropin_cart_block_config):
+    baker.make(Block, user=student_user, block_config=dropin_cart_block_config, paid=False)
+    assert _context(student_user)["cart_item_count"] == 1
+    with django_assert_num_queries(0):
+        assert _context(student_user)["cart_item_count"] == 1
+
+    # changes to the cart clear the cached count
+    block = baker.make(Block, user=student_user, block_config=dropin_cart_block_config, paid=False)
+    assert _context(student_user)["cart_item_count"] == 2
+    block.paid = True
+    block.save()
+    assert _context(student_user)["cart_item_count"] == 1
+    block.delete()
+    assert _context(student_user)["cart_item_count"] == 1
+
+
+def test_cart_item_count_cached_in_shared_cache(student_user, dropin_cart_block_config):
+    # the count is shared between processes, so a change handled by any of them clears it for all
+    assert _context(student_user)["cart_item_count"] == 0
+    assert shared_cache().get(cart_item_count_cache_key(student_user.id)) == 0
+    baker.make(Block, user=student_user, block_config=dropin_cart_block_config, paid=False)
+    assert shared_cache().get(cart_item_count_cache_key(student_user.id)) is None
+    assert _context(student_user)["cart_item_count"] == 1
+
+
+def test_managed_user_cart_changes_clear_manager_cart_item_count(manager_user, child_user, dropin_cart_block_config):
+    assert _context(manager_user)["cart_item_count"] == 0
+    baker.make(Block, user=child_user, block_config=dropin_cart_block_config, paid=False)
+    assert _context(manager_user)["cart_item_count"] == 1
+
+
+def test_tracks_updated_when_events_change(event_type):
+    assert list(_context(AnonymousUser())["tracks"]) == []
+    event = baker.make_recipe("booking.future_event", event_type=event_type)
+    assert list(_context(AnonymousUser())["tracks"]) == [event_type.track]
+    event.start = timezone.now() - timedelta(days=1)
+    event.save()
+    assert list(_context(AnonymousUser())["tracks"]) == []
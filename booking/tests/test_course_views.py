@@ -3,12 +3,15 @@ from re import A
 from model_bakery import baker
 import pytest
 
+from django.db import connection
 from django.urls import reverse
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 from booking.utils import full_name
 from booking.models import BlockConfig, Course, Block, Event, Booking
+from common import reference_data
 from common.test_utils import TestUsersMixin, EventTestMixin
 
 
@@ -364,6 +367,34 @@ class CourseListViewTests(EventTestMixin, TestUsersMixin, TestCase):
         resp = self.client.get(self.url(self.adult_track))
         assert [course.id for course in resp.context_data["courses"]] == [self.course.id, course2.id, course1.id]
 
+    def test_courses_list_query_count_does_not_depend_on_number_of_courses(self):
+        def _make_courses(quantity):
+            for course in baker.make(
+                Course, event_type=self.aerial_event_type, show_on_site=True, number_of_events=2,
+                _quantity=quantity
+            ):
+                baker.make_recipe(
+                    "booking.future_event", event_type=self.aerial_event_type, course=course, _quantity=2
+                )
+
+        def _get_courses_list():
+            # reference data changed in the test transaction isn't cached until it's committed
+            reference_data.clear()
+            self.client.get(self.url(self.adult_track))  # warm up cached reference data
+            with CaptureQueriesContext(connection) as queries:
+                resp = self.client.get(self.url(self.adult_track))
+            return resp, queries
+
+        self.login(self.student_user)
+        _make_courses(2)
+        resp, few_courses_queries = _get_courses_list()
+        assert len(resp.context_data["courses"]) == 3
+
+        _make_courses(8)
+        resp, more_courses_queries = _get_courses_list()
+        assert len(resp.context_data["courses"]) == 11
+        assert len(more_courses_queries) == len(few_courses_queries)
+
 
 class CourseUnenrollViewTests(EventTestMixin, TestUsersMixin, TestCase):
 
@@ -0,0 +1,100 @@
+"""
+Property tests comparing common.date_utils with the Delorean/pytz implementations it replaced,
+over several years of dates, including DST transitions
+"""
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+import random
+
+import pytest
+import pytz
+
+from booking.management.commands.benchmark_date_math import (
+    legacy_end_of_day_in_local_time, legacy_end_of_day_in_utc, legacy_local_strftime,
+    legacy_start_of_day_in_utc, legacy_subscription_period_start_date, legacy_utc_adjusted_datetime,
+)
+from common import date_utils
+
+
+SEED = 20210328
+
+
+def _datetimes(start_year=2019, end_year=2025, step=timedelta(hours=3)):
+    """
+    Naive datetimes from start_year to end_year at `step` intervals, plus every 10 mins
+    on the UK DST transition days
+    """
+    current = datetime(start_year, 1, 1)
+    end = datetime(end_year, 1, 1)
+    while current < end:
+        yield current
+        current += step
+    for year in range(start_year, end_year):
+        for transition in [datetime(year, 3, 31), datetime(year, 10, 31)]:
+            # last Sunday in March/October
+            transition -= timedelta(days=(transition.weekday() + 1) % 7)
+            for minutes in range(0, 48 * 60, 10):
+                yield transition - timedelta(days=1) + timedelta(minutes=minutes)
+
+
+def _variants(naive):
+    # naive (treated as UTC), aware UTC, and aware in local time, with both tz libraries
+    yield naive
+    yield naive.replace(tzinfo=dt_timezone.utc)
+    yield naive.replace(tzinfo=dt_timezone.utc).astimezone(pytz.timezone("Europe/London"))
+    yield naive.replace(tzinfo=dt_timezone.utc).astimezone(date_utils.get_timezone("Europe/London"))
+
+
+def _result(func, *args, **kwargs):
+    # exceptions (e.g. a monthly start day that's not valid this month) have to match too
+    try:
+        return func(*args, **kwargs)
+    except Exception as e:
+        return type(e)
+
+
+def test_start_and_end_of_day_match_legacy():
+    for naive in _datetimes():
+        for dt in _variants(naive):
+            assert date_utils.start_of_day(dt) == legacy_start_of_day_in_utc(dt), dt
+            assert date_utils.end_of_day(dt) == legacy_end_of_day_in_utc(dt), dt
+
+
+def test_end_of_day_in_local_time_matches_legacy():
+    for naive in _datetimes():
+        for dt in _variants(naive):
+            assert date_utils.end_of_day_in_local_time(dt) == legacy_end_of_day_in_local_time(dt), dt
+
+
+def test_local_adjusted_datetime_matches_legacy():
+    for naive in _datetimes():
+        assert date_utils.local_adjusted_datetime(naive) == legacy_utc_adjusted_datetime(naive), naive
+
+
+def test_local_strftime_matches_legacy():
+    london = date_utils.get_timezone("Europe/London")
+    for naive in _datetimes():
+        dt = naive.replace(tzinfo=dt_timezone.utc)
+        assert dt.astimezone(london).strftime('%d %b %Y, %H:%M') == legacy_local_strftime(dt), dt
+
+
+@pytest.mark.parametrize("duration_units", ["weeks", "months"])
+@pytest.mark.parametrize("next", [False, True])
+def test_subscription_period_start_date_matches_legacy(duration_units, next):
+    rand = random.Random(SEED)
+    first_day = datetime(2019, 1, 1, tzinfo=dt_timezone.utc)
+    for _ in range(3000):
+        config_start_date = first_day + timedelta(days=rand.randrange(4 * 365))
+        if rand.random() < 0.2:
+            # occasionally a config start that's not at midnight
+            config_start_date += timedelta(minutes=rand.randrange(24 * 60))
+        if duration_units == "months" and rand.random() < 0.8:
+            # keep most monthly start days valid in every month
+            config_start_date = config_start_date.replace(day=min(config_start_date.day, 28))
+        duration = rand.randint(1, 6)
+        now = first_day + timedelta(minutes=rand.randrange(6 * 365 * 24 * 60))
+        assert _result(
+            date_utils.subscription_period_start_date, config_start_date, duration, duration_units, now.date(), next=next
+        ) == _result(
+            legacy_subscription_period_start_date, config_start_date, duration, duration_units, now, next=next
+        ), (config_start_date, duration, now)
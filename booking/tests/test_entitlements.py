@@ -0,0 +1,118 @@
+from datetime import timedelta
+
+from model_bakery import baker
+
+import pytest
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from booking.availability import prefetch_availability
+from booking.entitlements import UserEntitlements
+from booking.models import (
+    Block, Booking, Event, WaitingListUser, get_active_user_course_block, has_available_block,
+    has_available_course_block, has_available_subscription
+)
+from booking.views.button_utils import button_options_events_list
+
+
+pytestmark = pytest.mark.django_db
+
+
+def _fresh_events(*events):
+    return list(Event.objects.select_related("event_type", "course").filter(
+        id__in=[event.id for event in events]
+    ).order_by("id"))
+
+
+def test_bookings_and_waiting_list_loaded_once(student_user, event, course, django_assert_num_queries):
+    booking = baker.make(Booking, user=student_user, event=event)
+    course_event1, course_event2 = course.uncancelled_events
+    course_booking = baker.make(Booking, user=student_user, event=course_event2)
+    baker.make(WaitingListUser, user=student_user, event=course_event1)
+
+    events = _fresh_events(event, course_event1)
+    # one query for bookings, one for waiting list entries
+    with django_assert_num_queries(2):
+        entitlements = UserEntitlements(student_user, events=events)
+    with django_assert_num_queries(0):
+        assert entitlements.event_bookings(event) == [booking]
+        assert entitlements.event_bookings(course_event1) == []
+        # course bookings include events that aren't in the list
+        assert entitlements.course_bookings(course) == [course_booking]
+        assert entitlements.on_waiting_list(course_event1)
+        assert not entitlements.on_waiting_list(event)
+
+
+def test_blocks_loaded_once(student_user, event, dropin_block, course_block, course, django_assert_num_queries):
+    baker.make(Booking, user=student_user, event=event, block=dropin_block)
+    baker.make(Block, user=student_user, block_config=dropin_block.block_config, paid=False)
+    course_events = _fresh_events(*course.uncancelled_events)
+    prefetch_availability(course_events)
+    course = course_events[0].course
+    entitlements = UserEntitlements(student_user)
+    # one query for active blocks, one for the course blocks' bookings
+    with django_assert_num_queries(2):
+        blocks = entitlements.blocks
+    # the drop in block is full, and the unpaid block isn't active
+    assert {block.id for block in blocks} == {course_block.id}
+    with django_assert_num_queries(0):
+        assert entitlements.has_available_course_block(course)
+        assert entitlements.get_active_course_block(course) == course_block
+        remaining = {block.id: block.remaining_count for block in blocks}
+    assert remaining == {
+        block.id: block.remaining_count for block in Block.objects.filter(id__in=remaining)
+    }
+
+
+def test_expired_and_full_blocks(student_user, event, dropin_block):
+    dropin_block.block_config.size = 1
+    dropin_block.block_config.save()
+    other_event = baker.make(Event, event_type=event.event_type, start=event.start + timedelta(1))
+    entitlements = UserEntitlements(student_user)
+    assert entitlements.has_available_block(event)
+
+    baker.make(Booking, user=student_user, event=other_event, block=dropin_block)
+    assert not UserEntitlements(student_user).has_available_block(event)
+
+    Booking.objects.all().delete()
+    dropin_block.manual_expiry_date = timezone.now() - timedelta(1)
+    dropin_block.save()
+    assert not UserEntitlements(student_user).has_available_block(event)
+
+
+@pytest.mark.parametrize("allow_drop_in", [True, False])
+def test_matches_model_helpers(student_user, event, course, course_block, dropin_block, allow_drop_in):
+    course.allow_drop_in = allow_drop_in
+    course.save()
+    baker.make(Booking, user=student_user, event=course.uncancelled_events.first(), block=course_block)
+    events = _fresh_events(event, *course.uncancelled_events)
+    entitlements = UserEntitlements(student_user, events=events)
+    for ev in events:
+        assert entitlements.has_available_block(ev) == has_available_block(student_user, ev)
+        assert entitlements.has_available_block(ev, dropin_only=True) == \
+            has_available_block(student_user, ev, dropin_only=True)
+        assert entitlements.has_available_subscription(ev) == has_available_subscription(student_user, ev)
+    assert entitlements.has_available_course_block(course) == has_available_course_block(student_user, course)
+    assert entitlements.get_active_course_block(course) == get_active_user_course_block(student_user, course)
+
+
+def test_button_options_use_entitlements(student_user, event_type, dropin_block):
+    baker.make_recipe("booking.future_event", event_type=event_type, max_participants=10, _quantity=5)
+    events = _fresh_events(*Event.objects.all())
+    for ev in events:
+        baker.make(Booking, user=student_user, event=ev, status="CANCELLED")
+    prefetch_availability(events)
+    entitlements = UserEntitlements(student_user, events=events)
+    entitlements.blocks, entitlements.subscriptions
+
+    with CaptureQueriesContext(connection) as captured:
+        for ev in events:
+            options = button_options_events_list(student_user, ev, entitlements=entitlements)
+            assert options["buttons"] == ["toggle_booking"]
+    user_tables = ['"booking_block"', '"booking_booking"', '"booking_subscription"', '"booking_waitinglistuser"']
+    assert not [
+        query["sql"] for query in captured.captured_queries
+        if any(table in query["sql"] for table in user_tables)
+    ]
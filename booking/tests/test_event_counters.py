@@ -0,0 +1,114 @@
+from model_bakery import baker
+
+import pytest
+
+from booking.models import Booking, Event
+
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def event(event):
+    event.max_participants = 10
+    event.save()
+    yield event
+
+
+def _counters(event):
+    return Event.objects.values_list("open_booking_count", "open_no_show_count").get(id=event.id)
+
+
+def test_counters_updated_on_booking_save(event):
+    booking = baker.make(Booking, event=event)
+    assert _counters(event) == (1, 0)
+    # the booking's event instance is refreshed
+    assert (event.open_booking_count, event.open_no_show_count) == (1, 0)
+
+    booking.no_show = True
+    booking.save()
+    assert _counters(event) == (1, 1)
+
+    booking.status = "CANCELLED"
+    booking.save()
+    assert _counters(event) == (0, 0)
+
+    booking.status = "OPEN"
+    booking.save()
+    assert _counters(event) == (1, 0)
+
+    booking.delete()
+    assert _counters(event) == (0, 0)
+
+
+def test_counters_updated_on_booking_moved_to_another_event(event):
+    other_event = baker.make_recipe("booking.future_event", event_type=event.event_type)
+    booking = baker.make(Booking, event=event, no_show=True)
+    booking.event = other_event
+    booking.save()
+    assert _counters(event) == (0, 0)
+    assert _counters(other_event) == (1, 1)
+
+
+def test_counters_updated_on_queryset_delete(event):
+    baker.make(Booking, event=event, _quantity=2)
+    baker.make(Booking, event=event, no_show=True)
+    baker.make(Booking, event=event, status="CANCELLED")
+    assert _counters(event) == (3, 1)
+    Booking.objects.filter(no_show=False).delete()
+    assert _counters(event) == (1, 1)
+
+
+@pytest.mark.parametrize(
+    "update,expected",
+    [
+        ({"status": "CANCELLED", "no_show": False, "block": None}, (0, 0)),
+        ({"status": "OPEN"}, (4, 1)),
+        ({"status": "OPEN", "no_show": True}, (4, 4)),
+        ({"no_show": True}, (3, 3)),
+        ({"no_show": False}, (3, 0)),
+        ({"notes": "test"}, (3, 1)),
+    ]
+)
+def test_counters_updated_on_queryset_update(event, course, update, expected):
+    baker.make(Booking, event=event, _quantity=2)
+    baker.make(Booking, event=event, no_show=True)
+    baker.make(Booking, event=event, status="CANCELLED")
+    # bookings for another event aren't affected
+    course_event = course.uncancelled_events.first()
+    baker.make(Booking, event=course_event)
+
+    Booking.objects.filter(event=event).update(**update)
+    assert _counters(event) == expected
+    assert _counters(course_event) == (1, 0)
+
+
+def test_counters_updated_on_queryset_update_to_another_event(event):
+    other_event = baker.make_recipe("booking.future_event", event_type=event.event_type)
+    baker.make(Booking, event=event, _quantity=2)
+    Booking.objects.filter(event=event).update(event=other_event)
+    assert _counters(event) == (0, 0)
+    assert _counters(other_event) == (2, 0)
+
+
+def test_event_save_does_not_overwrite_counters(event):
+    stale_event = Event.objects.get(id=event.id)
+    baker.make(Booking, event=event)
+    stale_event.name = "renamed"
+    stale_event.save()
+    assert _counters(event) == (1, 0)
+    assert Event.objects.get(id=event.id).name == "renamed"
+
+
+def test_spaces_left_does_not_query(event, course, django_assert_num_queries):
+    baker.make(Booking, event=event)
+    baker.make(Booking, event=event, no_show=True)
+    course_event = course.uncancelled_events.first()
+    baker.make(Booking, event=course_event, no_show=True)
+
+    event = Event.objects.get(id=event.id)
+    course_event = Event.objects.get(id=course_event.id)
+    with django_assert_num_queries(0):
+        # no-shows don't take a space, except on course events
+        assert (event.spaces_left, event.full) == (9, False)
+        assert (course_event.spaces_left, course_event.full) == (1, False)
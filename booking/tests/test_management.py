@@ -1,10 +1,20 @@
+from datetime import timedelta
+import json
+from unittest.mock import patch
+
 import pytest
 
 from model_bakery import baker
 
+from django.contrib.auth.models import User
 from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils import timezone
 
-from booking.models import Block, Booking
+from activitylog.models import ActivityLog
+from booking.models import BaseVoucher, Block, BlockConfig, Booking, Course, Event, SubscriptionConfig
+from payments.models import Invoice
+from timetable.models import TimetableSession
 
 
 @pytest.mark.django_db
@@ -22,4 +32,131 @@ def test_cleanup_expired_blocks_unpaid_only(client, freezer):
     freezer.move_to('2017-05-21 10:30')
     call_command("cleanup_expired_blocks")
     assert Block.objects.count() == 1
-    assert Block.objects.first() == paid
\ No newline at end of file
+    assert Block.objects.first() == paid
+
+@pytest.mark.django_db
+def test_reconcile_event_counters(event, capsys):
+    event.max_participants = 10
+    event.save()
+    baker.make(Booking, event=event, _quantity=2)
+    baker.make(Booking, event=event, no_show=True)
+    other_event = baker.make_recipe("booking.future_event", event_type=event.event_type)
+    baker.make(Booking, event=other_event)
+    Event.objects.filter(id=event.id).update(open_booking_count=1, open_no_show_count=0)
+
+    call_command("reconcile_event_counters", "--dry-run")
+    event.refresh_from_db()
+    assert (event.open_booking_count, event.open_no_show_count) == (1, 0)
+    assert "1 event(s) with incorrect booking counters found (dry run)" in capsys.readouterr().out
+
+    call_command("reconcile_event_counters")
+    event.refresh_from_db()
+    assert (event.open_booking_count, event.open_no_show_count) == (3, 1)
+    assert ActivityLog.objects.filter(log__startswith="Booking counters fixed for 1 event(s)").exists()
+    other_event.refresh_from_db()
+    assert (other_event.open_booking_count, other_event.open_no_show_count) == (1, 0)
+
+    call_command("reconcile_event_counters")
+    assert "All event booking counters are correct" in capsys.readouterr().out
+
+
+@pytest.mark.django_db
+def test_reconcile_block_used_counts(dropin_block, event, capsys):
+    event.max_participants = 10
+    event.save()
+    baker.make(Booking, event=event, block=dropin_block)
+    unused_block = baker.make(Block, block_config=dropin_block.block_config, paid=True)
+    Block.objects.filter(id=dropin_block.id).update(used_count=0)
+    Block.objects.filter(id=unused_block.id).update(used_count=2)
+
+    call_command("reconcile_block_used_counts", "--dry-run")
+    dropin_block.refresh_from_db()
+    assert dropin_block.used_count == 0
+    assert "2 block(s) with incorrect used counts found (dry run)" in capsys.readouterr().out
+
+    call_command("reconcile_block_used_counts")
+    dropin_block.refresh_from_db()
+    unused_block.refresh_from_db()
+    assert (dropin_block.used_count, unused_block.used_count) == (1, 0)
+    assert ActivityLog.objects.filter(log__startswith="Used counts fixed for 2 block(s)").exists()
+
+    call_command("reconcile_block_used_counts")
+    assert "All block used counts are correct" in capsys.readouterr().out
+
+
+def _benchmark_data_summary():
+    return (
+        list(User.objects.order_by("id").values_list("username", flat=True)),
+        list(Event.objects.order_by("id").values_list("name", "start", "open_booking_count")),
+        list(Booking.objects.order_by("id").values_list("user__username", "event__start", "status", "block__block_config__name")),
+        list(Block.objects.order_by("id").values_list("user__username", "block_config__name", "paid", "used_count")),
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.freeze_time('2021-06-16 10:00')
+def test_generate_benchmark_data(capsys):
+    options = ["--users", "40", "--weeks", "4", "--activity-logs", "50"]
+    call_command("generate_benchmark_data", *options)
+    assert User.objects.filter(childuserprofile__isnull=False).exists()
+    # 19 weekly timetable sessions
+    assert Event.objects.count() == 19 * 4
+    # 5 of them run as 4 week courses
+    assert Event.objects.filter(course__isnull=False).count() == 5 * 4
+    assert Course.objects.count() == 5
+    assert Booking.objects.filter(block__isnull=False).exists()
+    assert Invoice.objects.filter(paid=True).count() == Block.objects.filter(paid=True).count()
+    assert Block.objects.filter(paid=False).exists()
+    # plus logs for the policies and staff users created
+    assert ActivityLog.objects.count() > 50
+    # denormalized counters are correct
+    call_command("reconcile_event_counters", "--dry-run")
+    call_command("reconcile_block_used_counts", "--dry-run")
+    output = capsys.readouterr().out
+    assert "All event booking counters are correct" in output
+    assert "All block used counts are correct" in output
+
+    # won't add data to a database that already has events
+    with pytest.raises(CommandError):
+        call_command("generate_benchmark_data", *options)
+
+    # the same seed generates the same data
+    summary = _benchmark_data_summary()
+    for model in [
+        ActivityLog, Booking, Block, Invoice, Event, Course, User, TimetableSession, BaseVoucher, BlockConfig,
+        SubscriptionConfig,
+    ]:
+        model.objects.all().delete()
+    call_command("generate_benchmark_data", *options)
+    assert _benchmark_data_summary() == summary
+
+
+@pytest.mark.django_db
+@patch("activitylog.backup.subprocess.run")
+def test_run_benchmarks(mock_run, tmp_path, capsys):
+    call_command("generate_benchmark_data", "--users", "30", "--weeks", "2", "--activity-logs", "10")
+    activity_log_count = ActivityLog.objects.count()
+    # some logs are old enough to be backed up and deleted
+    assert ActivityLog.objects.filter(timestamp__lt=timezone.now() - timedelta(days=366)).exists()
+    output_path = tmp_path / "results.json"
+    call_command("run_benchmarks", "--repeat", "1", "--output", str(output_path))
+    results = json.loads(output_path.read_text())
+    # delete_old_activitylogs backed up and deleted the old logs (more than just checking for them), locally
+    assert results["results"]["delete_old_activitylogs"]["queries"] > 1
+    mock_run.assert_not_called()
+    assert results["dataset"]["Event"] == 19 * 2
+    assert {"schedule_page", "basket", "register", "user_list", "cleanup_expired_blocks"} <= set(results["results"])
+    assert results["results"]["schedule_page"]["queries"] > 0
+    # benchmarks don't change the data
+    assert ActivityLog.objects.count() == activity_log_count
+
+    call_command(
+        "run_benchmarks", "--repeat", "1", "--only", "schedule_page", "--output", str(tmp_path / "results2.json"),
+        "--compare", str(output_path)
+    )
+    assert f"Compared with {output_path}" in capsys.readouterr().out
+
+
+def test_run_benchmarks_no_data(db):
+    with pytest.raises(CommandError, match="run generate_benchmark_data first"):
+        call_command("run_benchmarks")
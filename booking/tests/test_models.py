@@ -7,7 +7,9 @@ from unittest.mock import patch
 
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django.urls import reverse
 
@@ -312,6 +314,22 @@ class BookingTests(EventTestMixin, TestUsersMixin, TestCase):
         assert block.start_date.date() == self.event.start.date()
         assert block.expiry_date is not None
 
+    def test_save_selects_booking_once(self):
+        # the locked booking is used for the rebooking/cancellation checks, rather than fetching it again
+        block = baker.make(Block, dropin_block_config__size=4)
+        booking = baker.make(Booking, event=self.event, user=self.student_user, block=block)
+        for status in ["CANCELLED", "OPEN"]:
+            booking = Booking.objects.get(id=booking.id)
+            booking.status = status
+            with CaptureQueriesContext(connection) as queries:
+                booking.save()
+            booking_selects = [
+                query for query in queries.captured_queries
+                if query["sql"].startswith('SELECT "booking_booking"."id"')
+            ]
+            assert len(booking_selects) == 1
+        assert booking.date_rebooked is not None
+
 
 class TrackTests(TestCase):
 
@@ -0,0 +1,143 @@
+from datetime import timedelta
+
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+
+import pytest
+
+from booking.models import Booking, Event
+from booking.pagination import KeysetPaginator, decode_cursor, encode_cursor
+
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def events(event_type):
+    now = timezone.now()
+    # 25 events, with pairs at the same time to check the id tie-break
+    return [
+        baker.make(Event, event_type=event_type, start=now + timedelta(days=1 + day, microseconds=17), show_on_site=True)
+        for day in range(20)
+        for _ in range(1 if day % 4 else 2)
+    ]
+
+
+def _all_pages(paginator, cursor_attr="next_cursor"):
+    pages = [paginator.get_page()]
+    while getattr(pages[-1], cursor_attr):
+        pages.append(paginator.get_page(getattr(pages[-1], cursor_attr)))
+    return pages
+
+
+def test_cursor_round_trip():
+    start = timezone.now().replace(microsecond=123456)
+    assert decode_cursor(encode_cursor("n", start, 12)) == ("n", start, 12)
+    assert decode_cursor(encode_cursor("p", start, 12)) == ("p", start, 12)
+
+
+@pytest.mark.parametrize("cursor", [None, "", "1", "2", "n", "n12", "nfoo_1", "x123_4", "p1_2_3"])
+def test_invalid_cursor(cursor):
+    assert decode_cursor(cursor) is None
+
+
+def test_pages_forward(events):
+    ordered = sorted(events, key=lambda event: (event.start, event.id))
+    paginator = KeysetPaginator(Event.objects.all(), 10)
+    pages = _all_pages(paginator)
+    assert [len(page) for page in pages] == [10, 10, 5]
+    assert [event for page in pages for event in page] == ordered
+    assert not pages[0].has_previous()
+    assert pages[1].has_previous()
+    assert not pages[2].has_next()
+
+    # and back again
+    previous_page = paginator.get_page(pages[2].previous_cursor)
+    assert previous_page.object_list == pages[1].object_list
+    assert previous_page.has_next() and previous_page.has_previous()
+    first_page = paginator.get_page(previous_page.previous_cursor)
+    assert first_page.object_list == pages[0].object_list
+    assert not first_page.has_previous()
+
+
+def test_pages_descending(events):
+    ordered = sorted(events, key=lambda event: (event.start, event.id), reverse=True)
+    paginator = KeysetPaginator(Event.objects.all(), 10, descending=True)
+    pages = _all_pages(paginator)
+    assert [event for page in pages for event in page] == ordered
+    assert paginator.get_page(pages[2].previous_cursor).object_list == pages[1].object_list
+
+
+def test_previous_page_near_start_is_full_first_page(events):
+    paginator = KeysetPaginator(Event.objects.all(), 10)
+    ordered = sorted(events, key=lambda event: (event.start, event.id))
+    # previous page from the 4th event only has 3 events before it
+    cursor = encode_cursor("p", ordered[3].start, ordered[3].id)
+    page = paginator.get_page(cursor)
+    assert page.object_list == ordered[:10]
+    assert not page.has_previous()
+
+
+def test_page_query_count_is_constant(events, django_assert_num_queries):
+    paginator = KeysetPaginator(Event.objects.all(), 5)
+    page = paginator.get_page()
+    for _ in range(4):
+        # one query per page; no COUNT
+        with django_assert_num_queries(1):
+            page = paginator.get_page(page.next_cursor)
+
+
+def test_event_list_pages(client, student_user, events, event_type):
+    client.login(username=student_user.username, password="test")
+    url = reverse("booking:events", args=(event_type.track.slug,))
+    resp = client.get(url)
+    page_obj = resp.context_data["page_obj"]
+    assert len(page_obj) == 10
+    assert f'href="?page={page_obj.next_cursor}"' in resp.content.decode()
+
+    resp = client.get(url + f"?page={page_obj.next_cursor}")
+    assert resp.context_data["page_obj"].object_list[0] == sorted(events, key=lambda e: (e.start, e.id))[10]
+
+    # page numbers (e.g. from ajax redirects) show the first page
+    resp = client.get(url + "?page=2")
+    assert resp.context_data["page_obj"].object_list == page_obj.object_list
+
+
+def test_booking_list_pages_grouped_by_date(client, student_user, events):
+    for event in events:
+        baker.make(Booking, user=student_user, event=event)
+    client.login(username=student_user.username, password="test")
+    url = reverse("booking:bookings")
+    resp = client.get(url)
+    bookings_by_date = resp.context_data["bookings_by_date"]
+    assert sum(len(bookings) for bookings in bookings_by_date.values()) == 20
+    # dates with 2 events have both bookings in the same group
+    first_date = timezone.localtime(events[0].start).date()
+    assert [booking.event for booking in bookings_by_date[first_date]] == events[:2]
+
+    resp = client.get(url + f"?page={resp.context_data['page_obj'].next_cursor}")
+    assert sum(len(bookings) for bookings in resp.context_data["bookings_by_date"].values()) == 5
+
+
+def test_booking_history_pages(client, student_user, event_type):
+    now = timezone.now()
+    events = [
+        baker.make(Event, event_type=event_type, start=now - timedelta(days=day // 2, hours=1 + day % 2))
+        for day in range(30)
+    ]
+    for event in events:
+        baker.make(Booking, user=student_user, event=event)
+    client.login(username=student_user.username, password="test")
+    url = reverse("booking:past_bookings")
+    resp = client.get(url)
+    page_obj = resp.context_data["page_obj"]
+    # most recent first
+    assert [booking.event for booking in page_obj] == sorted(events, key=lambda e: e.start, reverse=True)[:20]
+    # but each day is in time order
+    for bookings in resp.context_data["bookings_by_date"].values():
+        starts = [booking.event.start for booking in bookings]
+        assert starts == sorted(starts)
+
+    resp = client.get(url + f"?page={page_obj.next_cursor}")
+    assert len(resp.context_data["page_obj"]) == 10
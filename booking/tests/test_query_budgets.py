@@ -0,0 +1,228 @@
+"""
+Query budgets for the busiest views, with realistic amounts of data, so N+1 regressions fail
+here rather than showing up as slow pages in production.  Budgets are in settings.QUERY_BUDGETS,
+and are also used by QueryBudgetMiddleware to log over-budget requests.
+"""
+from datetime import timedelta
+import logging
+
+from model_bakery import baker
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+import pytest
+
+from booking.models import Block, BlockConfig, Booking, Course, Event, Subscription, SubscriptionConfig
+from common import reference_data
+from common.query_budget import record_request_stats, view_name
+from common.test_utils import EventTestMixin, TestUsersMixin, assert_within_query_budget
+from merchandise.tests.utils import make_purchase
+
+
+pytestmark = pytest.mark.django_db
+
+
+class QueryBudgetTests(EventTestMixin, TestUsersMixin, TestCase):
+
+    def setUp(self):
+        self.create_users()
+        self.create_admin_users()
+        self.create_tracks_and_event_types()
+        for user in [self.student_user, self.manager_user, self.child_user, self.instructor_user, self.staff_user]:
+            self.make_data_privacy_agreement(user)
+            self.make_disclaimer(user)
+
+        now = timezone.now()
+        # a month of classes: 3 a day on the adult track
+        self.events = [
+            baker.make(
+                Event, event_type=event_type, start=now + timedelta(days=day, hours=hour),
+                max_participants=12, show_on_site=True
+            )
+            for day in range(1, 11)
+            for hour, event_type in [(1, self.aerial_event_type), (3, self.floor_event_type), (5, self.aerial_event_type)]
+        ]
+        # and 6 four-week courses
+        for i in range(6):
+            course = baker.make(
+                Course, event_type=self.aerial_event_type, number_of_events=4, max_participants=10,
+                show_on_site=True
+            )
+            baker.make(
+                Event, event_type=self.aerial_event_type, course=course, max_participants=10, show_on_site=True,
+                start=now + timedelta(days=i, hours=8), _quantity=4,
+            )
+
+        # other students booked into the events
+        other_students = baker.make(User, _quantity=10)
+        for user in other_students:
+            self.make_disclaimer(user)
+        for event in self.events[:12]:
+            for user in other_students:
+                baker.make(Booking, user=user, event=event)
+        # the student has a few blocks and bookings, and a subscription
+        dropin_config = baker.make(BlockConfig, event_type=self.aerial_event_type, size=10, active=True, cost=80)
+        self.block = baker.make(Block, block_config=dropin_config, user=self.student_user, paid=True)
+        for event in self.events[:15:3]:
+            baker.make(Booking, user=self.student_user, event=event, block=self.block)
+        baker.make(
+            Subscription, user=self.student_user, paid=True, start_date=now - timedelta(days=1),
+            config__bookable_event_types={str(self.floor_event_type.id): {"allowed_number": 2, "allowed_unit": "week"}},
+        )
+        # and some things in their basket
+        baker.make(Block, block_config=dropin_config, user=self.student_user, paid=False, _quantity=2)
+        baker.make(Block, block_config__course=True, block_config__cost=100, user=self.student_user, paid=False)
+        baker.make(Subscription, config=baker.make(SubscriptionConfig, cost=50), user=self.student_user, paid=False)
+        make_purchase(user=self.student_user, paid=False)
+        make_purchase(product_name="T-shirt", user=self.student_user, paid=False, size="M")
+
+        # cached reference data created in this test's transaction isn't cached until it's committed
+        reference_data.clear()
+
+    def _assert_get_within_budget(self, view_name, url):
+        # the first request fills the process caches
+        self.client.get(url)
+        with assert_within_query_budget(view_name):
+            resp = self.client.get(url)
+        assert resp.status_code == 200
+        return resp
+
+    def _query_count(self, url):
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url)
+        return len(context)
+
+    def test_event_list_view(self):
+        self.login(self.student_user)
+        resp = self._assert_get_within_budget("EventListView", reverse("booking:events", args=(self.adult_track.slug,)))
+        # a full page
+        assert len(resp.context_data["page_obj"].object_list) == 10
+
+    def test_course_list_view(self):
+        self.login(self.student_user)
+        resp = self._assert_get_within_budget(
+            "CourseListView", reverse("booking:courses", args=(self.adult_track.slug,))
+        )
+        assert len(resp.context_data["courses"]) == 6
+
+    def test_booking_list_view(self):
+        self.login(self.student_user)
+        resp = self._assert_get_within_budget("BookingListView", reverse("booking:bookings"))
+        assert len(resp.context_data["bookings"]) == 5
+
+    def test_booking_list_view_queries_dont_increase_with_bookings(self):
+        self.login(self.student_user)
+        url = reverse("booking:bookings")
+        query_count = self._query_count(url)
+        for event in self.events[15:20]:
+            baker.make(Booking, user=self.student_user, event=event, block=self.block)
+        assert self._query_count(url) == query_count
+
+    def test_shopping_basket(self):
+        self.login(self.student_user)
+        resp = self._assert_get_within_budget("shopping_basket", reverse("booking:shopping_basket"))
+        assert len(resp.context_data["unpaid_block_info"]) == 3
+
+    def test_register_view(self):
+        self.login(self.staff_user)
+        resp = self._assert_get_within_budget("register_view", reverse("studioadmin:register", args=(self.events[0].id,)))
+        # the other students, and student_user
+        assert len(resp.context["bookings"]) == 11
+
+    def test_register_view_queries_dont_increase_with_bookings(self):
+        self.login(self.staff_user)
+        event = self.events[0]
+        url = reverse("studioadmin:register", args=(event.id,))
+        query_count = self._query_count(url)
+
+        Event.objects.filter(id=event.id).update(max_participants=20)
+        new_students = baker.make(User, _quantity=6)
+        for i, user in enumerate(new_students):
+            self.make_disclaimer(user)
+            block = baker.make(Block, block_config=self.block.block_config, user=user, paid=True)
+            # some bookings paid with a block, some with a block available but not assigned, some with none
+            if i % 3 == 0:
+                baker.make(Booking, user=user, event=event, block=block)
+            elif i % 3 == 1:
+                baker.make(Booking, user=user, event=event)
+            else:
+                block.delete()
+                baker.make(Booking, user=user, event=event)
+        resp = self.client.get(url)
+        assert len(resp.context["bookings"]) == 17
+        assert "WARNING: USER'S SUBSCRIPTION/BLOCK NOT ASSIGNED" in resp.content.decode()
+        assert "WARNING: USER HAS NO SUBSCRIPTION/BLOCK" in resp.content.decode()
+        assert self._query_count(url) == query_count
+
+    def test_ajax_toggle_booking(self):
+        self.login(self.student_user)
+        url = reverse("booking:ajax_toggle_booking", args=(self.events[2].id,))
+        with assert_within_query_budget("ajax_toggle_booking"):
+            resp = self.client.post(url, {"user_id": self.student_user.id})
+        assert resp.status_code == 200
+        assert Booking.objects.get(user=self.student_user, event=self.events[2]).block == self.block
+        with assert_within_query_budget("ajax_toggle_booking"):
+            # and cancel it again
+            resp = self.client.post(url, {"user_id": self.student_user.id})
+        assert resp.status_code == 200
+
+
+def test_assert_within_query_budget_fails_over_budget():
+    with pytest.raises(AssertionError, match="test_view ran 2 queries, over its budget of 1"):
+        with assert_within_query_budget("test_view", budget=1):
+            list(User.objects.all())
+            list(User.objects.all())
+
+
+def test_record_request_stats():
+    with record_request_stats() as stats:
+        list(User.objects.all())
+    assert stats.queries == 1
+    assert stats.db_time > 0
+    # nothing recorded outside the block
+    list(User.objects.all())
+    assert stats.queries == 1
+
+
+def test_view_name(rf):
+    request = rf.get("/")
+    assert view_name(request) is None
+    request.resolver_match = resolve(reverse("booking:events", args=("adults",)))
+    assert view_name(request) == "EventListView"
+    request.resolver_match = resolve(reverse("booking:shopping_basket"))
+    assert view_name(request) == "shopping_basket"
+
+
+@override_settings(QUERY_BUDGET_MONITORING=True, QUERY_BUDGETS={"EventListView": 0})
+def test_middleware_logs_requests_over_budget(client, student_user, event_type, caplog):
+    baker.make_recipe("booking.future_event", event_type=event_type)
+    client.login(username=student_user.username, password="test")
+    with caplog.at_level(logging.DEBUG, logger="common.middleware"):
+        resp = client.get(reverse("booking:events", args=(event_type.track.slug,)))
+    stats = resp.wsgi_request.query_stats
+    assert stats.queries > 0
+    assert stats.template_time > 0
+    assert stats.cache_hits + stats.cache_misses > 0
+    assert f"Query budget exceeded for EventListView (GET /{event_type.track.slug}/): {stats.queries} queries" in caplog.text
+
+
+@override_settings(QUERY_BUDGET_MONITORING=True, QUERY_BUDGETS={}, QUERY_BUDGET_DEFAULT=1000)
+def test_middleware_logs_stats_within_budget(client, student_user, caplog):
+    client.login(username=student_user.username, password="test")
+    with caplog.at_level(logging.DEBUG, logger="common.middleware"):
+        resp = client.get(reverse("booking:bookings"))
+    assert resp.wsgi_request.query_stats.queries > 0
+    assert "Query budget exceeded" not in caplog.text
+    assert "BookingListView (GET /bookings/)" in caplog.text
+
+
+def test_middleware_not_used_by_default(client, student_user):
+    client.login(username=student_user.username, password="test")
+    resp = client.get(reverse("booking:bookings"))
+    assert not hasattr(resp.wsgi_request, "query_stats")
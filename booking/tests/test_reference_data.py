@@ -0,0 +1,89 @@
+from decimal import Decimal
+
+import pytest
+
+from django.db import transaction
+from model_bakery import baker
+
+from accounts.models import DisclaimerContent, has_active_disclaimer
+from booking.models import Track, add_to_cart_drop_in_block_config
+from common import reference_data
+
+
+pytestmark = pytest.mark.django_db
+
+
+def test_default_track_cached(django_assert_num_queries):
+    baker.make(Track, name="Adults", default=False)
+    kids = baker.make(Track, name="Kids", default=True)
+    reference_data.clear()
+
+    with django_assert_num_queries(1):
+        assert Track.get_default() == kids
+        assert Track.get_default() == kids
+    assert reference_data.stats()["default_track"] == {"local_hit": 1, "shared_hit": 0, "miss": 1}
+
+
+def test_cached_value_shared_between_processes(django_assert_num_queries):
+    kids = baker.make(Track, name="Kids", default=True)
+    reference_data.clear()
+    assert Track.get_default() == kids
+
+    # another process has nothing in memory, but gets the value from the shared cache
+    reference_data._local.clear()
+    with django_assert_num_queries(0):
+        assert Track.get_default() == kids
+    assert reference_data.stats()["default_track"] == {"local_hit": 0, "shared_hit": 1, "miss": 1}
+
+
+def test_cached_value_invalidated_on_save_and_delete():
+    adults = baker.make(Track, name="Adults", default=True)
+    reference_data.clear()
+    assert Track.get_default() == adults
+
+    kids = baker.make(Track, name="Kids", default=True)
+    assert Track.get_default() == kids
+    kids.delete()
+    assert Track.get_default() == adults
+
+
+@pytest.mark.django_db(transaction=True)
+def test_uncommitted_changes_not_cached():
+    adults = baker.make(Track, name="Adults", default=True)
+    assert Track.get_default() == adults
+
+    with pytest.raises(ValueError):
+        with transaction.atomic():
+            baker.make(Track, name="Kids", default=True)
+            assert Track.get_default().name == "Kids"
+            raise ValueError
+    assert Track.get_default() == adults
+    # cached again once the transaction is over
+    Track.get_default()
+    assert reference_data.stats()["default_track"]["local_hit"] == 1
+
+
+def test_block_configs_cached(django_assert_num_queries, event, dropin_cart_block_config):
+    block_config = dropin_cart_block_config
+    reference_data.clear()
+    with django_assert_num_queries(1):
+        assert add_to_cart_drop_in_block_config(event) == block_config
+        assert add_to_cart_drop_in_block_config(event) == block_config
+
+    block_config.disabled = True
+    block_config.save()
+    assert add_to_cart_drop_in_block_config(event) is None
+
+
+def test_disclaimer_version_cached(django_assert_num_queries, student_user):
+    reference_data.clear()
+    current_version = DisclaimerContent.current_version()
+    assert has_active_disclaimer(student_user)
+    with django_assert_num_queries(0):
+        assert DisclaimerContent.current_version() == current_version
+        # the active disclaimer check is cached too, keyed by the current version
+        assert has_active_disclaimer(student_user)
+
+    baker.make(DisclaimerContent, version=current_version + 1, disclaimer_terms="New terms")
+    assert DisclaimerContent.current_version() == current_version + Decimal(1)
+    assert not has_active_disclaimer(student_user)
@@ -0,0 +1,115 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+
+import pytest
+
+from booking.models import Booking, Event
+from booking.schedule_cache import apply_overlay, schedule_version
+
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def events(event_type):
+    return [
+        baker.make(
+            Event, event_type=event_type, start=timezone.now() + timedelta(days=1 + i), show_on_site=True,
+            max_participants=10
+        )
+        for i in range(3)
+    ]
+
+
+def _url(event_type):
+    return reverse("booking:events", args=(event_type.track.slug,))
+
+
+def test_apply_overlay():
+    html = "<p><!--overlay:1:tick--></p><p><!--overlay:2:tick--></p><!--overlay:1:buttons-->"
+    assert apply_overlay(html, {1: {"tick": "T", "buttons": "B"}}) == "<p>T</p><p></p>B"
+
+
+def test_version_bumped_on_changes(events, student_user):
+    track_id = events[0].event_type.track_id
+    version = schedule_version(track_id)
+    events[0].name = "Renamed"
+    events[0].save()
+    assert schedule_version(track_id) > version
+
+    version = schedule_version(track_id)
+    booking = baker.make(Booking, event=events[1], user=student_user)
+    assert schedule_version(track_id) > version
+
+    version = schedule_version(track_id)
+    booking.delete()
+    assert schedule_version(track_id) > version
+
+
+def test_version_bumped_on_bulk_booking_updates(events, student_user):
+    track_id = events[0].event_type.track_id
+    baker.make(Booking, event=events[0], user=student_user)
+    version = schedule_version(track_id)
+    Booking.objects.filter(user=student_user).update(status="CANCELLED")
+    assert schedule_version(track_id) > version
+
+    # nothing to update
+    version = schedule_version(track_id)
+    Booking.objects.filter(user=student_user, status="OPEN").update(status="CANCELLED")
+    assert schedule_version(track_id) == version
+
+
+def test_anonymous_schedule_cached(client, events):
+    url = _url(events[0].event_type)
+    resp = client.get(url)
+    assert resp.status_code == 200
+    schedule = resp.context_data["schedule"]
+    assert all(event.name in schedule for event in events)
+
+    # no events or bookings fetched for the schedule on the next request
+    with CaptureQueriesContext(connection) as queries:
+        resp = client.get(url)
+    assert resp.context_data["schedule"] == schedule
+    assert not [
+        query for query in queries.captured_queries
+        if query["sql"].startswith(('SELECT "booking_event"', 'SELECT "booking_booking"'))
+    ]
+
+
+def test_cached_schedule_updated_on_change(client, events):
+    url = _url(events[0].event_type)
+    client.get(url)
+    events[0].name = "Renamed class"
+    events[0].save()
+    assert "Renamed class" in client.get(url).content.decode()
+
+
+def test_cached_schedule_shared_but_buttons_per_user(client, events, student_user, manager_user):
+    baker.make(Booking, event=events[0], user=student_user)
+    url = _url(events[0].event_type)
+
+    client.login(username=student_user.username, password="test")
+    resp = client.get(url)
+    assert resp.context_data["button_options"][events[0].id]["has_open_booking"]
+
+    client.login(username=manager_user.username, password="test")
+    resp = client.get(url)
+    assert not resp.context_data["button_options"][events[0].id]["has_open_booking"]
+    assert "<!--overlay:" not in resp.content.decode()
+
+
+def test_overlay_view(client, events, student_user):
+    baker.make(Booking, event=events[0], user=student_user)
+    client.login(username=student_user.username, password="test")
+    url = reverse("booking:schedule_overlay", args=(events[0].event_type.track.slug,))
+    resp = client.get(url, {"event": [events[0].id, events[1].id, "foo"]})
+    data = resp.json()["events"]
+    assert set(data) == {str(events[0].id), str(events[1].id)}
+    assert set(data[str(events[0].id)]) == {"video", "tick", "buttons"}
+    assert "hidden" not in data[str(events[0].id)]["tick"]
+    assert "hidden" in data[str(events[1].id)]["tick"]
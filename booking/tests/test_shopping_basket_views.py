@@ -151,10 +151,9 @@ class ShoppingBasketViewTests(TestUsersMixin, TestCase):
         )
         variant.delete()
         resp = self.client.get(self.url)
-        # purchase without current matching variant is deleted and doesn't get included in cart
+        # purchase without current matching variant doesn't get included in cart
         assert [pp.id for pp in resp.context_data["unpaid_merchandise"]] == [p2.id]
         assert resp.context_data["total_cost"] == 10
-        assert ProductPurchase.objects.count() == 1
 
     def test_merchandise_expired_purchase(self):
         baker.make(
@@ -166,10 +165,10 @@ class ShoppingBasketViewTests(TestUsersMixin, TestCase):
             cost=self.variant.cost, size=None, paid=False
         )
         resp = self.client.get(self.url)
-        # expired purchase is deleted and doesn't get included in cart
+        # expired purchase doesn't get included in cart; it's left for the cart sweeper to delete
         assert [pp.id for pp in resp.context_data["unpaid_merchandise"]] == [p2.id]
         assert resp.context_data["total_cost"] == 10
-        assert ProductPurchase.objects.count() == 1
+        assert ProductPurchase.objects.count() == 2
 
     def test_shows_user_managed_unpaid_blocks_and_subscriptions_and_merch(self):
         self.login(self.manager_user)
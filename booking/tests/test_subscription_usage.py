@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+import pytest
+
+from model_bakery import baker
+
+from booking.entitlements import UserEntitlements
+from booking.models import Booking, Event, EventType, Subscription
+
+
+pytestmark = pytest.mark.django_db
+
+
+def _subscription(user, event_type, allowed_unit, allowed_number=2, **kwargs):
+    return baker.make(
+        Subscription, user=user, paid=True,
+        config__bookable_event_types={str(event_type.id): {"allowed_number": allowed_number, "allowed_unit": allowed_unit}},
+        config__duration=1,
+        config__duration_units="months",
+        config__start_date=datetime(2020, 8, 1, 0, 0, tzinfo=dt_timezone.utc),
+        # a Wednesday
+        start_date=datetime(2020, 9, 2, 0, 0, tzinfo=dt_timezone.utc),
+        **kwargs
+    )
+
+
+def _events(event_type, *starts):
+    return [baker.make(Event, event_type=event_type, start=start) for start in starts]
+
+
+def _start(day, hour=10):
+    return datetime(2020, 9, day, hour, 0, tzinfo=dt_timezone.utc)
+
+
+@pytest.mark.parametrize(
+    "allowed_unit,expected_valid,expected_usage",
+    [
+        ("day", [True, True, True, True, False, True, True, False], [2, 2, 1, 0, 2, 0, 0, 2]),
+        # subscription weeks start on Wednesdays (the window for an event on a Tuesday is the following week)
+        ("week", [True, True, True, False, False, True, True, False], [3, 3, 0, 3, 3, 0, 0, 3]),
+        # subscription months start on the 2nd
+        ("month", [True, True, True, False, False, False, False, False], [3, 3, 3, 3, 3, 3, 3, 3]),
+    ]
+)
+def test_ledger_checks_many_events_from_one_query(
+    student_user, event_type, django_assert_num_queries, allowed_unit, expected_valid, expected_usage
+):
+    other_event_type = baker.make(EventType, name="other", track=event_type.track)
+    subscription = _subscription(student_user, event_type, allowed_unit)
+    # two bookings on Thurs 3rd, one on Tues 8th, and a no-show on Fri 4th
+    booked = _events(event_type, _start(3), _start(3, 18), _start(8))
+    for event in booked:
+        baker.make(Booking, user=student_user, event=event, subscription=subscription)
+    no_show_event, = _events(event_type, _start(4))
+    baker.make(Booking, user=student_user, event=no_show_event, subscription=subscription, no_show=True)
+    events = [
+        *booked, no_show_event, *_events(event_type, _start(3, 20), _start(9), _start(20)),
+        *_events(other_event_type, _start(3)),
+    ]
+
+    ledger = subscription.usage_ledger()
+    with django_assert_num_queries(1):
+        assert ledger.valid_for_events(events) == dict(zip([event.id for event in events], expected_valid))
+        assert [ledger.usage(event_type.id, event.start) for event in events] == expected_usage
+    # the model methods give the same answers
+    assert [subscription.valid_for_event(event) for event in events] == expected_valid
+    assert [subscription.usage_for_event_type_and_date(event_type, event.start) for event in events] == expected_usage
+
+
+def test_ledger_usage_windows(student_user, event_type):
+    subscription = _subscription(student_user, event_type, "week")
+    booked = _events(event_type, _start(3), _start(8))
+    for event in booked:
+        baker.make(Booking, user=student_user, event=event, subscription=subscription)
+    same_week, next_week = _events(event_type, _start(5), _start(9))
+    ledger = subscription.usage_ledger()
+    # booked events are always valid
+    assert ledger.valid_for_events(booked) == {booked[0].id: True, booked[1].id: True}
+    # 2 already used in the week starting Weds 2nd
+    assert ledger.usage(event_type.id, same_week.start) == 2
+    assert ledger.valid_for_event(same_week) is False
+    assert ledger.usage(event_type.id, next_week.start) == 0
+    assert ledger.valid_for_event(next_week) is True
+
+
+def test_ledger_no_shows(student_user, event_type):
+    subscription = _subscription(student_user, event_type, "day", allowed_number=1)
+    no_show_event, event = _events(event_type, _start(3), _start(3, 18))
+    baker.make(Booking, user=student_user, event=no_show_event, subscription=subscription, no_show=True)
+    # no-shows aren't counted by default
+    assert subscription.usage_ledger().valid_for_event(event) is True
+
+    subscription.config.include_no_shows_in_usage = True
+    subscription.config.save()
+    ledger = subscription.usage_ledger()
+    assert ledger.valid_for_event(event) is False
+    # the no-show event itself can be rebooked
+    assert ledger.valid_for_event(no_show_event) is True
+    # usage shown to users never includes no-shows
+    assert ledger.usage(event_type.id, event.start) == 0
+
+
+def test_entitlements_load_subscription_usage_once(student_user, event_type, django_assert_num_queries):
+    subscription = _subscription(student_user, event_type, "day", expiry_date=None)
+    events = _events(event_type, *[_start(3) + timedelta(days=i) for i in range(10)])
+    baker.make(Booking, user=student_user, event=events[0], subscription=subscription)
+    entitlements = UserEntitlements(student_user)
+    entitlements.subscriptions
+    with django_assert_num_queries(1):
+        assert all(entitlements.has_available_subscription(event) for event in events)
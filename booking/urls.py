@@ -4,7 +4,7 @@ from booking.views import (
     ajax_cart_item_delete, ajax_course_booking, ajax_toggle_booking, ajax_toggle_waiting_list,
     CourseEventsListView, BookingListView, BlockListView, BookingHistoryListView,
     disclaimer_required, home, terms_and_conditions,
-    EventListView, EventDetailView,
+    EventListView, EventDetailView, ScheduleOverlayView,
     permission_denied, event_purchase_view,
     course_purchase_view, purchase_view,
     ajax_block_purchase, shopping_basket, ajax_checkout, BlockDetailView,
@@ -75,6 +75,7 @@ urlpatterns = [
     path('vouchers/<str:voucher_code>', voucher_details, name='voucher_details'),
 
     # EVENTS LIST: needs to go last, catches everything else
+    path('<slug:track>/overlay/', ScheduleOverlayView.as_view(), name='schedule_overlay'),
     path('<slug:track>/', EventListView.as_view(), name='events'),
 
     path('', RedirectView.as_view(url='/schedule/', permanent=True)),
@@ -2,6 +2,7 @@ from decimal import Decimal
 from django.contrib.auth.models import User
 
 
+from booking.entitlements import UserEntitlements
 from booking.models import get_active_user_block, get_active_user_course_block, \
     get_available_user_subscription, has_available_subscription, has_available_block, \
     has_available_course_block
@@ -30,9 +31,7 @@ def get_view_as_user(request):
 
 
 def get_block_status(block):
-    blocks_used = block.bookings.count()
-    total_blocks = block.block_config.size
-    return blocks_used, total_blocks
+    return block.used_count, block.block_config.size
 
 
 def calculate_user_cart_total(
@@ -112,11 +111,14 @@ def can_rebook(user_booking, event):
     return status == "no_show" and event.course
 
 
-def _can_action_waiting_list(user, event, user_booking, action):
+def _can_action_waiting_list(user, event, user_booking, action, entitlements=None):
     # ignore waiting list for course events that don't allow drop-in
     # if event.course and not event.course.allow_drop_in:
     #     return False
-    on_waiting_list = user.waitinglists.filter(event=event).exists()
+    if entitlements is not None:
+        on_waiting_list = entitlements.on_waiting_list(event)
+    else:
+        on_waiting_list = user.waitinglists.filter(event=event).exists()
     status = user_booking_status(user_booking)
 
     if event.full and status != "open":
@@ -124,12 +126,12 @@ def _can_action_waiting_list(user, event, user_booking, action):
     return False
 
 
-def can_join_waiting_list(user, event, user_booking):
-    return _can_action_waiting_list(user, event, user_booking, "join")
+def can_join_waiting_list(user, event, user_booking, entitlements=None):
+    return _can_action_waiting_list(user, event, user_booking, "join", entitlements)
 
 
-def can_leave_waiting_list(user, event, user_booking):
-    return _can_action_waiting_list(user, event, user_booking, "leave")
+def can_leave_waiting_list(user, event, user_booking, entitlements=None):
+    return _can_action_waiting_list(user, event, user_booking, "leave", entitlements)
 
 
 def user_can_book_or_cancel(event=None, user_booking=None, booking_restricted=None):
@@ -161,7 +163,7 @@ def user_subscription_info(subscription, event=None, include_user=True):
         return f"{base_text}; not started</span>"
 
 
-def show_warning(event, user_booking, has_available_payment_method=None):
+def show_warning(event, user_booking, has_available_payment_method=None, entitlements=None):
     """Should we show the warning on booking/rebooking/cancelling?"""
     if event.course and not event.course.allow_drop_in:
         # for course events that don't allow drop in
@@ -180,9 +182,10 @@ def show_warning(event, user_booking, has_available_payment_method=None):
             # cancelled bookings, check if there is an available payment method
             # If we didn't pass it in, find whether a payment method is available
             if has_available_payment_method is None:
+                entitlements = entitlements or UserEntitlements(user_booking.user)
                 has_available_payment_method = any(
-                    [has_available_block(user_booking.user, event),
-                     has_available_subscription(user_booking.user, event)]
+                    [entitlements.has_available_block(event),
+                     entitlements.has_available_subscription(event)]
                 )
 
     if not event.event_type.allow_booking_cancellation:
@@ -192,7 +195,7 @@ def show_warning(event, user_booking, has_available_payment_method=None):
     return not event.can_cancel
 
 
-def get_user_booking_info(user, event):
+def get_user_booking_info(user, event, entitlements=None):
     # display options for non-course event
     """
     Book - class not full, currently cancelled booking, has available block
@@ -202,63 +205,53 @@ def get_user_booking_info(user, event):
     Join waiting list - class full, not on waiting list
     Leave waiting list - class full, on waiting list
     """
+    entitlements = entitlements or UserEntitlements(user, events=[event])
+    event_bookings = entitlements.event_bookings(event)
     if event.course and not event.course.allow_drop_in:
         # Events for a full course booking (i.e. one booked with a course block) are never
         # fully cancelled, only set to no-show.  If they are fully cancelled, it's because
         # an admin has updated it, for the whole course, so we don't show rebook buttons.
         # The exception is when a course allows drop-in; then we can allow users with
         # fully cancelled bookings to rebook single classes.
-        user_booking = user.bookings.filter(event=event, status="OPEN").first()
+        user_booking = next((booking for booking in event_bookings if booking.status == "OPEN"), None)
     else:
-        user_booking = user.bookings.filter(event=event).first()
+        user_booking = next(iter(event_bookings), None)
 
     return {
-        "show_warning": show_warning(event, user_booking),
-        "on_waiting_list": can_leave_waiting_list(user, event, user_booking)
+        "show_warning": show_warning(event, user_booking, entitlements=entitlements),
+        "on_waiting_list": can_leave_waiting_list(user, event, user_booking, entitlements=entitlements)
     }
 
 
-def user_course_booking_type(user, course, bookings=None):
+def user_course_booking_type(user, course, entitlements=None):
     # check this against PAID bookings only
     # if there are no paid bookings, check for bookings with no block - these are single
     # bookings added by admins, so are considered dropin
-    if bookings is None:
-        bookings = user.bookings.filter(event__course=course, status="OPEN", block__paid=True)
-    if bookings:
-        booking = bookings.first()
-        if booking.block and booking.block.block_config.course:
-            return "course"
-        else:
-            return "dropin"
-    else:
-        # no paid bookings, check for bookings without block, we consider these dropin also
-        if user.bookings.filter(event__course=course, status="OPEN", block__isnull=True).exists():
-            return "dropin"
-
+    entitlements = entitlements or UserEntitlements(user)
+    return entitlements.course_booking_type(course)
 
 
-def get_user_course_booking_info(user, course):
-    bookings = user.bookings.filter(event__course=course, status="OPEN")
+def get_user_course_booking_info(user, course, entitlements=None):
+    entitlements = entitlements or UserEntitlements(user)
+    course_bookings = entitlements.course_bookings(course)
+    bookings = [booking for booking in course_bookings if booking.status == "OPEN"]
     # booking type for PAID bookings only
-    booking_type = user_course_booking_type(user, course)
+    booking_type = entitlements.course_booking_type(course)
     has_booked = booking_type == "course"
     # open booked events includes unpaid, in-basket
-    open_booked_events = bookings.filter(no_show=False).values_list("event_id", flat=True)
-    booked_events = bookings.values_list("event_id", flat=True)
-    in_basket_event_ids = [booking.event.id for booking in bookings if booking.is_in_basket()]
+    open_booked_events = [booking.event_id for booking in bookings if not booking.no_show]
+    in_basket_event_ids = [booking.event_id for booking in bookings if booking.is_in_basket()]
     items_in_basket = bool(in_basket_event_ids)
 
     info = {
         "has_booked_course": has_booked,
         "has_booked_dropin": booking_type == "dropin",
-        "has_booked_all": booked_events.count() == course.uncancelled_events.count(),
+        "has_booked_all": len(bookings) == len(course.uncancelled_event_list),
         "items_in_basket": items_in_basket,
         "in_basket_event_ids": in_basket_event_ids,
         "booked_event_ids": open_booked_events,
     }
     if has_booked:
-        iter_used_blocks = (
-            booking.block for booking in user.bookings.filter(event__course=course) if booking.block is not None
-        )
+        iter_used_blocks = (booking.block for booking in course_bookings if booking.block is not None)
         info.update({"used_block": next(iter_used_blocks, None)})
     return info
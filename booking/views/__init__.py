@@ -11,7 +11,7 @@ from .gift_vouchers import GiftVoucherPurchaseView, GiftVoucherUpdateView, GiftV
 from .payment_option_views import event_purchase_view, course_purchase_view, purchase_view
 from .subscription_views import SubscriptionListView, SubscriptionDetailView
 from .booking_views import BookingListView, BookingHistoryListView
-from .event_views import CourseEventsListView, EventDetailView, EventListView, home
+from .event_views import CourseEventsListView, EventDetailView, EventListView, ScheduleOverlayView, home
 from .misc_views import disclaimer_required, permission_denied, terms_and_conditions
 from .shopping_basket_views import shopping_basket, ajax_checkout, stripe_checkout, \
     check_total, guest_shopping_basket
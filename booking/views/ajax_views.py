@@ -6,6 +6,7 @@ import logging
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
+from django.db import transaction
 from django.db.models import Q
 from django.http import HttpResponseBadRequest, JsonResponse
 from django.views.decorators.http import require_http_methods
@@ -15,12 +16,13 @@ from django.template.loader import render_to_string
 from django.utils import timezone
 
 from accounts.models import has_active_disclaimer
-from activitylog.models import ActivityLog
+from activitylog.buffer import log_activity
 from booking.views.button_utils import booking_list_button
 from booking.views.event_views import button_options_events_list
 from merchandise.models import ProductPurchase
 
-from common.utils import full_name, start_of_day_in_utc
+from common.utils import full_name, retry_on_lock_contention, start_of_day_in_utc
+from ..entitlements import UserEntitlements
 from ..models import Booking, Block, Course, Event, WaitingListUser, BlockConfig, Subscription, \
     SubscriptionConfig, GiftVoucher, add_to_cart_course_block_config, add_to_cart_drop_in_block_config, valid_course_block_configs, valid_dropin_block_configs
 from ..utils import (
@@ -66,7 +68,7 @@ def has_subscription_availability_changed(booking, action, subscription_use_pre_
         # OR
         # we've cancelled and the usage was previuosly at max
         # check if the subscription use was at max prior to booking
-        subscription_use = booking.subscription.usage_for_event_type_and_date(event.event_type, event.start)
+        subscription_use = booking.subscription.usage_ledger().usage(event.event_type_id, event.start)
         check_usage = False
 
         if action in ["opened", "reopened"] and subscription_use == allowed_number:
@@ -109,6 +111,7 @@ def _get_ref_url(event=None, course=None, ref=None):
 
 @login_required
 @require_http_methods(['POST'])
+@retry_on_lock_contention
 def ajax_toggle_booking(request, event_id):
     """
     This view should only be used for booking, rebooking or cancelling, where the
@@ -129,120 +132,125 @@ def ajax_toggle_booking(request, event_id):
         url = reverse('booking:disclaimer_required', args=(user_id,))
         return JsonResponse({"redirect": True, "url": url})
 
-    event = Event.objects.get(id=event_id)
-    event_was_full = not event.course and event.spaces_left == 0
-    block_availability_changed = False
-    subscription_availability_changed = False
-    subscription_use_pre_change = None
-    available_subscription = get_available_user_subscription(user, event)
-    if available_subscription:
-        subscription_use_pre_change = available_subscription.usage_for_event_type_and_date(event.event_type, event.start)
-
-    try:
-        existing_booking = Booking.objects.get(user=user, event=event)
-    except Booking.DoesNotExist:
-        existing_booking = None
-
-    if existing_booking is None:
-        requested_action = "opened"
-    else:
-        requested_action = REQUESTED_ACTIONS[(existing_booking.status, existing_booking.no_show)]
+    with transaction.atomic():
+        # Lock the event until the booking is updated, so that concurrent requests for the same event
+        # check its spaces one at a time
+        event = Event.objects.select_for_update().get(id=event_id)
+        event_was_full = not event.course and event.spaces_left == 0
+        block_availability_changed = False
+        subscription_availability_changed = False
+        subscription_use_pre_change = None
+        available_subscription = get_available_user_subscription(user, event)
+        if available_subscription:
+            subscription_use_pre_change = available_subscription.usage_for_event_type_and_date(event.event_type, event.start)
 
-    host = f'http://{request.META.get("HTTP_HOST")}'
+        try:
+            existing_booking = Booking.objects.get(user=user, event=event)
+        except Booking.DoesNotExist:
+            existing_booking = None
 
-    if requested_action in ["opened", "reopened"]:
-        # OPENING/REOPENING
-        # make sure the event isn't full or cancelled
-        if event.spaces_left <= 0 or event.cancelled:
-            # redirect if:
-            # - non-course event
-            # - course event and user has no booking
-            # - course event and user has fully cancelled booking
-            # (course events with no-show bookings can rebook)
-            redirect400 = True
-            if event.course and existing_booking and existing_booking.no_show:
-                # Course no-shows are allowed to rebook, only fully cancelled ones count
-                # in the booking count
-                redirect400 = False
-
-            if redirect400:
-                logger.error('Attempt to book %s class',
-                             'cancelled' if event.cancelled else 'full')
-                return HttpResponseBadRequest(
-                    "Sorry, this event {}".format(
-                        "has been cancelled" if event.cancelled else "is now full")
+        if existing_booking is None:
+            requested_action = "opened"
+        else:
+            requested_action = REQUESTED_ACTIONS[(existing_booking.status, existing_booking.no_show)]
+
+        if requested_action in ["opened", "reopened"]:
+            # OPENING/REOPENING
+            # make sure the event isn't full or cancelled
+            if event.spaces_left <= 0 or event.cancelled:
+                # redirect if:
+                # - non-course event
+                # - course event and user has no booking
+                # - course event and user has fully cancelled booking
+                # (course events with no-show bookings can rebook)
+                redirect400 = True
+                if event.course and existing_booking and existing_booking.no_show:
+                    # Course no-shows are allowed to rebook, only fully cancelled ones count
+                    # in the booking count
+                    redirect400 = False
+
+                if redirect400:
+                    logger.error('Attempt to book %s class',
+                                 'cancelled' if event.cancelled else 'full')
+                    return HttpResponseBadRequest(
+                        "Sorry, this event {}".format(
+                            "has been cancelled" if event.cancelled else "is now full")
+                    )
+
+            # get drop-in and subscription payment methods only; course bookings are done from
+            # the course page (apart from no_show course bookings)
+            has_payment_method = has_available_block(user, event, dropin_only=True) or has_available_subscription(user, event)
+            no_show_course_booking = event.course and existing_booking and existing_booking.no_show
+            if not no_show_course_booking and not has_payment_method:
+                # rebooking, no block on booking (i.e. was fully cancelled) and no block available
+                # refresh current page
+                messages.error(request, "No payment method available")
+                return JsonResponse({"redirect": True, "url": _get_ref_url(event=event, ref=ref) + f"?page={page}"})
+
+            # Update/create the booking; a new one is saved once, below, with its block or subscription
+            if existing_booking is None:
+                booking = Booking(user=user, event=event)
+            else:
+                booking = existing_booking
+
+            existing_no_show_with_block = booking.block is not None and booking.no_show
+            booking.status = 'OPEN'
+            booking.no_show = False
+            if not existing_no_show_with_block:
+                # if this was already a no-show, with a block assigned, we just keep that block
+                # Otherwise, assign next block; if it's new course event bookking, use a drop in block
+                # if both course/dropin are available
+                # full course bookings are only done from the course page
+                booking.assign_next_available_subscription_or_block(dropin_only=True)
+            booking.save()
+            if booking.block and booking.block.full:
+                block_availability_changed = True
+            if booking.subscription:
+                subscription_availability_changed = has_subscription_availability_changed(booking, requested_action, subscription_use_pre_change)
+
+            try:
+                waiting_list_user = WaitingListUser.objects.get(user=booking.user, event=booking.event)
+                waiting_list_user.delete()
+                log_activity(
+                    f'User {user.username} removed from waiting list for {event}', obj=event,
+                    action="waiting_list_removed"
                 )
+            except WaitingListUser.DoesNotExist:
+                pass
 
-        # get drop-in and subscription payment methods only; course bookings are done from
-        # the course page (apart from no_show course bookings)
-        has_payment_method = has_available_block(user, event, dropin_only=True) or has_available_subscription(user, event)
-        no_show_course_booking = event.course and existing_booking and existing_booking.no_show
-        if not no_show_course_booking and not has_payment_method:
-            # rebooking, no block on booking (i.e. was fully cancelled) and no block available
-            # refresh current page
-            messages.error(request, "No payment method available")
-            return JsonResponse({"redirect": True, "url": _get_ref_url(event=event, ref=ref) + f"?page={page}"})
-
-        # Update/create the booking
-        if existing_booking is None:
-            booking = Booking.objects.create(user=user, event=event)
         else:
             booking = existing_booking
+            block_pre_cancel = booking.block
+            block_pre_cancel_was_full = block_pre_cancel.full if block_pre_cancel else False
 
-        existing_no_show_with_block = booking.block is not None and booking.no_show
-        booking.status = 'OPEN'
-        booking.no_show = False
-        if not existing_no_show_with_block:
-            # if this was already a no-show, with a block assigned, we just keep that block
-            # Otherwise, assign next block; if it's new course event bookking, use a drop in block
-            # if both course/dropin are available
-            # full course bookings are only done from the course page
-            booking.assign_next_available_subscription_or_block(dropin_only=True)
-        booking.save()
-        if booking.block and booking.block.full:
-            block_availability_changed = True
-        if booking.subscription:
-            subscription_availability_changed = has_subscription_availability_changed(booking, requested_action, subscription_use_pre_change)
-
-        try:
-            waiting_list_user = WaitingListUser.objects.get(user=booking.user, event=booking.event)
-            waiting_list_user.delete()
-            ActivityLog.objects.create(
-                log=f'User {user.username} removed from waiting list for {event}'
-            )
-        except WaitingListUser.DoesNotExist:
-            pass
-
-    else:
-        booking = existing_booking
-        block_pre_cancel = booking.block
-        block_pre_cancel_was_full = block_pre_cancel.full if block_pre_cancel else False
-
-        if event.course and booking.block and booking.block.block_config.course:
-            # only course events booked with course blocks get set to no-show
-            booking.no_show = True
-        elif not event.event_type.allow_booking_cancellation:
-            booking.no_show = True
-        else:
-            if event.can_cancel:
-                booking.block = None
-                booking.status = "CANCELLED"
-            else:
+            if event.course and booking.block and booking.block.block_config.course:
+                # only course events booked with course blocks get set to no-show
                 booking.no_show = True
-        booking.save()
-        if block_pre_cancel_was_full:
-            if not block_pre_cancel.full:
-                block_availability_changed = True
-        elif booking.subscription:
-            subscription_availability_changed = has_subscription_availability_changed(booking, requested_action, subscription_use_pre_change)
+            elif not event.event_type.allow_booking_cancellation:
+                booking.no_show = True
+            else:
+                if event.can_cancel:
+                    booking.block = None
+                    booking.status = "CANCELLED"
+                else:
+                    booking.no_show = True
+            booking.save()
+            if block_pre_cancel_was_full:
+                block_pre_cancel.refresh_from_db(fields=["used_count"])
+                if not block_pre_cancel.full:
+                    block_availability_changed = True
+            elif booking.subscription:
+                subscription_availability_changed = has_subscription_availability_changed(booking, requested_action, subscription_use_pre_change)
 
-        if event_was_full:
-            waiting_list_users = WaitingListUser.objects.filter(event=event)
-            send_waiting_list_email(event, waiting_list_users, host)
+    host = f'http://{request.META.get("HTTP_HOST")}'
+    if requested_action == "cancelled" and event_was_full:
+        waiting_list_users = WaitingListUser.objects.filter(event=event)
+        send_waiting_list_email(event, waiting_list_users, host)
 
-    ActivityLog.objects.create(
-            log=f'Booking {booking.id} {requested_action} for "{event}" (user {user.first_name} {user.last_name}) by user {request.user.username}'
-        )
+    log_activity(
+        f'Booking {booking.id} {requested_action} for "{event}" (user {user.first_name} {user.last_name}) by user {request.user.username}',
+        obj=booking, action=requested_action
+    )
 
     # email context
     ctx = {
@@ -275,13 +283,14 @@ def ajax_toggle_booking(request, event_id):
         messages.success(request, f"{event}: {alert_message['message']}")
         return JsonResponse({"redirect": True, "url": _get_ref_url(event=event, ref=ref) + f"?page={page}"})
 
-    user_info = get_user_booking_info(user, event)
+    entitlements = UserEntitlements(user, events=[event])
+    user_info = get_user_booking_info(user, event, entitlements)
     if ref == "course":
-        button_info = button_options_events_list(user, event, course=True)
+        button_info = button_options_events_list(user, event, course=True, entitlements=entitlements)
     elif ref == "events":
-        button_info = button_options_events_list(user, event)
+        button_info = button_options_events_list(user, event, entitlements=entitlements)
     elif ref == "bookings":
-        button_info = booking_list_button(booking)
+        button_info = booking_list_button(booking, entitlements=entitlements)
     context = {
         "booking": booking,
         "event": event,
@@ -378,9 +387,10 @@ def ajax_course_booking(request, course_id):
             # to shopping basket; we're replacing them with a course block
             old_block.delete()
 
-    ActivityLog.objects.create(
-        log=f'Course {course} (start {course.start.strftime("%d-%m-%Y")} for {user.first_name} {user.last_name} '
-            f'booked by user {request.user.username}'
+    log_activity(
+        f'Course {course} (start {course.start.strftime("%d-%m-%Y")} for {user.first_name} {user.last_name} '
+        f'booked by user {request.user.username}',
+        obj=course, action="booked"
     )
 
     # email context
@@ -562,6 +572,7 @@ def process_subscription_purchase(request, subscription, new, subscription_confi
 
 @login_required
 @require_http_methods(['POST'])
+@retry_on_lock_contention
 def ajax_add_booking_to_basket(request):
     """
     Add a booking to basket
@@ -584,53 +595,56 @@ def ajax_add_booking_to_basket(request):
         user = request.user
     else:
         user = get_object_or_404(User, id=user_id)
-    event = get_object_or_404(Event, pk=request.POST["event_id"])
-    # we could get here from the events list or course events list 
-    ref = request.POST["ref"]
-    
-    ######################################
-    # check event isn't full or cancelled, return error
-    # check user isn't already (open) booked, return error
-    # get booking if one already exists (could have been previously cancelled)
-    if not has_active_disclaimer(request.user):
-        url = reverse('booking:disclaimer_required', args=(request.user.id,))
-        return JsonResponse({"redirect": True, "url": url})
-    
-    try:
-        existing_booking = Booking.objects.get(user=user, event=event)
-    except Booking.DoesNotExist:
-        existing_booking = None
-
-    if existing_booking:
-        # redirect if user already has open booking, or if they have a no-show course booking
-        if existing_booking.status == "OPEN" and existing_booking.no_show is False:
-            if existing_booking.block:
-                return HttpResponseBadRequest("Already added to cart")
-            logger.error('Attempt to add to cart with existing open booking for event %s, user %s', event.id, user.username)
-            return HttpResponseBadRequest("Open booking already exists")
-        if event.course and existing_booking.block and existing_booking.no_show:
-            logger.error('Attempt to add to cart with existing no-show course booking for event %s, user %s', event.id, user.username)
-            return HttpResponseBadRequest("Booking can be reopened")
-
-    if event.spaces_left <= 0 or event.cancelled:
-        # redirect if full or cancelled:
-        logger.error('Attempt to add to cart for %s event', 'cancelled' if event.cancelled else 'full')
-        return HttpResponseBadRequest(
-            "Sorry, this event {}".format(
-                "has been cancelled" if event.cancelled else "is now full")
-        )
+    with transaction.atomic():
+        # Lock the event until the booking is added, so that concurrent requests for the same event
+        # check its spaces one at a time
+        event = get_object_or_404(Event.objects.select_for_update(), pk=request.POST["event_id"])
+        # we could get here from the events list or course events list 
+        ref = request.POST["ref"]
+
+        ######################################
+        # check event isn't full or cancelled, return error
+        # check user isn't already (open) booked, return error
+        # get booking if one already exists (could have been previously cancelled)
+        if not has_active_disclaimer(request.user):
+            url = reverse('booking:disclaimer_required', args=(request.user.id,))
+            return JsonResponse({"redirect": True, "url": url})
 
-    ######################################
-    # create booking
-    booking, _ = Booking.objects.update_or_create(
-        user=user, event=event, defaults={"status": "OPEN", "no_show": False}
-    )
-    # create block
-    single_block_config = add_to_cart_drop_in_block_config(event)
-    block = Block.objects.create(block_config=single_block_config, user=user, paid=False)
-    # assign unpaid block to booking
-    booking.block = block
-    booking.save()
+        try:
+            existing_booking = Booking.objects.get(user=user, event=event)
+        except Booking.DoesNotExist:
+            existing_booking = None
+
+        if existing_booking:
+            # redirect if user already has open booking, or if they have a no-show course booking
+            if existing_booking.status == "OPEN" and existing_booking.no_show is False:
+                if existing_booking.block:
+                    return HttpResponseBadRequest("Already added to cart")
+                logger.error('Attempt to add to cart with existing open booking for event %s, user %s', event.id, user.username)
+                return HttpResponseBadRequest("Open booking already exists")
+            if event.course and existing_booking.block and existing_booking.no_show:
+                logger.error('Attempt to add to cart with existing no-show course booking for event %s, user %s', event.id, user.username)
+                return HttpResponseBadRequest("Booking can be reopened")
+
+        if event.spaces_left <= 0 or event.cancelled:
+            # redirect if full or cancelled:
+            logger.error('Attempt to add to cart for %s event', 'cancelled' if event.cancelled else 'full')
+            return HttpResponseBadRequest(
+                "Sorry, this event {}".format(
+                    "has been cancelled" if event.cancelled else "is now full")
+            )
+
+        ######################################
+        # create booking
+        booking, _ = Booking.objects.update_or_create(
+            user=user, event=event, defaults={"status": "OPEN", "no_show": False}
+        )
+        # create block
+        single_block_config = add_to_cart_drop_in_block_config(event)
+        block = Block.objects.create(block_config=single_block_config, user=user, paid=False)
+        # assign unpaid block to booking
+        booking.block = block
+        booking.save()
 
     #######################################
     context = {}
@@ -32,12 +32,11 @@ class BlockListView(DataPolicyAgreementRequiredMixin, LoginRequiredMixin, ListVi
 
     def get_queryset(self):
         view_as_user = get_view_as_user(self.request)
-        user_blocks = view_as_user.blocks.filter(paid=True).order_by("-purchase_date", "expiry_date")
-        if not self.request.GET.get("include-expired"):
-            user_blocks = [
-                block for block in user_blocks if block.active_block
-            ]
-        return user_blocks
+        if self.request.GET.get("include-expired"):
+            user_blocks = view_as_user.blocks.filter(paid=True)
+        else:
+            user_blocks = view_as_user.blocks.active()
+        return user_blocks.select_related("block_config").order_by("-purchase_date", "expiry_date")
 
     def get_context_data(self, **kwargs):
         # Call the base implementation first to get a context
@@ -1,7 +1,5 @@
 from datetime import timedelta
 
-from django.core.paginator import Paginator
-from django.db.models import Count
 from django.utils import timezone
 from django.shortcuts import HttpResponseRedirect
 from django.views.generic import ListView
@@ -9,8 +7,10 @@ from django.urls import reverse
 
 from braces.views import LoginRequiredMixin
 
+from ..entitlements import UserEntitlements
 from ..forms import AvailableUsersForm
 from ..models import Booking
+from ..pagination import KeysetPaginator
 from ..utils import get_view_as_user
 from .button_utils import booking_list_button
 from .views_utils import DataPolicyAgreementRequiredMixin
@@ -39,26 +39,30 @@ class BookingListView(DataPolicyAgreementRequiredMixin, LoginRequiredMixin, List
         return view_as_user.bookings.filter(event__start__gt=cutoff_time)\
             .exclude(block__isnull=False, block__paid=False)\
             .exclude(event__course__isnull=False, status="CANCELLED")\
-            .order_by('event__start__date', 'event__start__time')
+            .select_related("event__event_type", "event__course", "block", "user")\
+            .order_by("event__start", "id")
+
+    def get_keyset_paginator(self, queryset):
+        return KeysetPaginator(queryset, 20, field="event__start")
+
+    def group_by_date(self, page_bookings):
+        bookings_by_date = {}
+        for booking in page_bookings:
+            bookings_by_date.setdefault(timezone.localtime(booking.event.start).date(), []).append(booking)
+        return bookings_by_date
 
     def _get_button_options(self, page_bookings):
+        entitlements = UserEntitlements(get_view_as_user(self.request))
         return {
-            booking.id: booking_list_button(booking) for booking in page_bookings
+            booking.id: booking_list_button(booking, entitlements=entitlements) for booking in page_bookings
         }
 
     def get_context_data(self, **kwargs):
         # Call the base implementation first to get a context
         context = super().get_context_data(**kwargs)
-        all_bookings = self.get_queryset()
+        page_bookings = self.get_keyset_paginator(self.object_list).get_page(self.request.GET.get('page'))
+        bookings_by_date = self.group_by_date(page_bookings.object_list)
 
-        page = self.request.GET.get('page', 1)
-        all_paginator = Paginator(all_bookings, 20)
-        page_bookings = all_paginator.get_page(page)
-        booking_ids_by_date = page_bookings.object_list.values('event__start__date').annotate(count=Count('id')).values('event__start__date', 'id')
-        bookings_by_date = {}
-        for booking_info in booking_ids_by_date:
-            bookings_by_date.setdefault(booking_info["event__start__date"], []).append(all_bookings.get(id=booking_info["id"]))
-        
         context["button_options"] = self._get_button_options(page_bookings)
 
         context["page_obj"] = page_bookings
@@ -79,7 +83,18 @@ class BookingHistoryListView(BookingListView):
         # exclude fully cancelled course bookings - these will have only been cancelled by an admin
         return view_as_user.bookings.filter(event__start__lte=cutoff_time)\
             .exclude(event__course__isnull=False, status="CANCELLED")\
-            .order_by('-event__start__date', 'event__start__time')
+            .select_related("event__event_type", "event__course", "block", "user")\
+            .order_by("-event__start", "-id")
+
+    def get_keyset_paginator(self, queryset):
+        return KeysetPaginator(queryset, 20, field="event__start", descending=True)
+
+    def group_by_date(self, page_bookings):
+        # most recent days first, but each day's bookings in time order
+        bookings_by_date = super().group_by_date(page_bookings)
+        for bookings in bookings_by_date.values():
+            bookings.reverse()
+        return bookings_by_date
 
     def _get_button_options(self, page_bookings):
         return {
@@ -6,25 +6,33 @@ from django.utils.safestring import mark_safe
 
 from common.utils import full_name
 
-from ..models import add_to_cart_course_block_config, add_to_cart_drop_in_block_config, has_available_block, has_available_course_block, get_active_user_course_block, has_available_subscription, valid_course_block_configs, valid_dropin_block_configs
-from ..utils import can_book, can_cancel, can_rebook, user_can_book_or_cancel, user_course_booking_type
+from ..entitlements import UserEntitlements
+from ..models import add_to_cart_course_block_config, add_to_cart_drop_in_block_config, cached_block_configs
+from ..utils import can_book, can_cancel, can_rebook, user_can_book_or_cancel
 
 
 class UserEventInfo:
 
-    def __init__(self, user, event):
+    def __init__(self, user, event, entitlements=None):
         self.user = user
         self.event = event
         self.course = event.course
+        self.entitlements = entitlements or UserEntitlements(user, events=[event])
 
         if self.course:
-            self.user_bookings = user.bookings.filter(event=event, status="OPEN")
-            self.user_course_bookings = user.bookings.filter(event__course=self.course, status="OPEN")
+            self.user_bookings = [
+                booking for booking in self.entitlements.event_bookings(event) if booking.status == "OPEN"
+            ]
+            self.user_course_bookings = [
+                booking for booking in self.entitlements.course_bookings(self.course) if booking.status == "OPEN"
+            ]
         else:
-            self.user_bookings = user.bookings.filter(event=event)
+            self.user_bookings = self.entitlements.event_bookings(event)
             self.user_course_bookings = None
-        self.user_booking = self.user_bookings.first()
-        self.has_open_booking =  self.user_bookings.filter(status="OPEN", no_show=False).exists()
+        self.user_booking = next(iter(self.user_bookings), None)
+        self.has_open_booking = any(
+            booking.status == "OPEN" and not booking.no_show for booking in self.user_bookings
+        )
         self.open = not (self.event.cancelled or self.event.is_past) 
         self.booking_restricted = event.booking_restricted_pre_start()
         self.booking_in_basket = self.has_open_booking and self.user_booking.is_in_basket()
@@ -61,15 +69,15 @@ class UserEventInfo:
         self.can_book = can_book(
             self.user_booking, self.event, booking_restricted=self.booking_restricted
         )
-        self.has_available_drop_in_block = has_available_block(self.user, self.event, dropin_only=True)
+        self.has_available_drop_in_block = self.entitlements.has_available_block(self.event, dropin_only=True)
         if self.course:
-            self.has_available_course_block = has_available_course_block(self.user, self.event.course)
-            self.has_booked_dropin = user_course_booking_type(self.user, self.event.course) == "dropin"
+            self.has_available_course_block = self.entitlements.has_available_course_block(self.event.course)
+            self.has_booked_dropin = self.entitlements.course_booking_type(self.event.course) == "dropin"
         self.has_available_block = self.has_available_drop_in_block or self.has_available_course_block
-        self.has_available_subscription = has_available_subscription(self.user, self.event)
+        self.has_available_subscription = self.entitlements.has_available_subscription(self.event)
 
         if include_course_data and self.has_available_course_block:
-            self.available_course_block = get_active_user_course_block(self.user, self.course)
+            self.available_course_block = self.entitlements.get_active_course_block(self.course)
 
         if self.event.course:
             if add_to_cart_course_block_config(self.event.course) is not None \
@@ -82,18 +90,26 @@ class UserEventInfo:
             self.can_add_drop_in_to_basket = True
 
         if not self.event.course or self.event.course.allow_drop_in:
-            if valid_dropin_block_configs(self.event).exists():
+            if cached_block_configs(self.event.event_type_id, course=False):
                 self.has_payment_options = True
         elif self.event.course:
-            self.has_payment_options = valid_course_block_configs(self.event.course).exists()
+            self.has_payment_options = not self.event.course.has_started and bool(
+                cached_block_configs(
+                    self.event.course.event_type_id, course=True, size=self.event.course.number_of_events
+                )
+            )
 
     def update_course_booking_status(self):
-        self.course_booked = self.user_course_bookings.filter(block__paid=True).count() == self.course.uncancelled_events.count()
-        self.course_in_basket = not self.course_booked and self.user_course_bookings.count() == self.course.uncancelled_events.count()
-        self.booked_for_course_events = self.user_course_bookings.filter(block__paid=True, no_show=False).exists()
+        paid_bookings = [
+            booking for booking in self.user_course_bookings if booking.block and booking.block.paid
+        ]
+        uncancelled_events_count = len(self.course.uncancelled_event_list)
+        self.course_booked = len(paid_bookings) == uncancelled_events_count
+        self.course_in_basket = not self.course_booked and len(self.user_course_bookings) == uncancelled_events_count
+        self.booked_for_course_events = any(not booking.no_show for booking in paid_bookings)
 
         if self.course_booked:
-            date_course_first_booked = self.user_course_bookings.first().date_booked
+            date_course_first_booked = self.user_course_bookings[0].date_booked
             unenrollment_time = date_course_first_booked + timedelta(hours=24)
             within_unenrollment_time = timezone.now() < unenrollment_time
             self.can_unenroll = not self.course.has_started and within_unenrollment_time
@@ -120,16 +136,17 @@ def _default_button_options(user_event_info):
 
 
 # EVENTS/COURSE EVENTS LIST: Book/cancel/payment options/waiting list for individual classes
-def button_options_events_list(user, event, course=False):
+def button_options_events_list(user, event, course=False, entitlements=None):
     """
     Determine button/payment options that should be shown for a given user and event
+    Pass a UserEntitlements to share the user's data across all the events on a page
     """
     # Has user booked already?
     # Has user booked and cancelled?
     # Is event cancelled?
     # Is event full?
     # Can event be booked?
-    user_event_info = UserEventInfo(user, event)
+    user_event_info = UserEventInfo(user, event, entitlements)
     options = _default_button_options(user_event_info)
     if not user_event_info.open:
         # event is cancelled or past
@@ -217,8 +234,8 @@ def button_options_events_list(user, event, course=False):
 
 
 # Main course book button on course events page
-def button_options_book_course_button(user, course):
-    user_event_info = UserEventInfo(user, course.uncancelled_events.first())
+def button_options_book_course_button(user, course, entitlements=None):
+    user_event_info = UserEventInfo(user, next(iter(course.uncancelled_event_list), None), entitlements)
     user_event_info.update_course_booking_status()
 
     options = {
@@ -301,7 +318,7 @@ def button_options_book_course_button(user, course):
 
 
 # Courses list; book button for full course
-def course_list_button_info(user, course, user_info):
+def course_list_button_info(user, course, user_info, entitlements=None):
     options = {"button": "", "text": ""}
 
     if user_info["has_booked_all"] and not user_info["items_in_basket"]:
@@ -339,7 +356,8 @@ def course_list_button_info(user, course, user_info):
         return {"button": "", "text": text}
 
     # Not started and not already booked
-    if has_available_course_block(user, course):
+    entitlements = entitlements or UserEntitlements(user)
+    if entitlements.has_available_course_block(course):
         options["button"] = "book"
         if course.allow_drop_in:
             options["text"] = "Course and drop-in booking is available, see course details."
@@ -352,7 +370,7 @@ def course_list_button_info(user, course, user_info):
     return options
 
 
-def booking_list_button(booking, history=False):
+def booking_list_button(booking, history=False, entitlements=None):
     options = {"button": "", "text": "", "styling": ""}
     if booking.event.cancelled:
         options["text"] = f"{booking.event.event_type.label.upper()} CANCELLED"
@@ -375,7 +393,8 @@ def booking_list_button(booking, history=False):
             options["button"] = "toggle_booking"
             options["toggle_option"] = "rebook"
         elif can_book(booking, booking.event):
-            if has_available_block(booking.user, booking.event) or has_available_subscription(booking.user, booking.event):
+            entitlements = entitlements or UserEntitlements(booking.user)
+            if entitlements.has_available_block(booking.event) or entitlements.has_available_subscription(booking.event):
                 options["button"] = "toggle_booking"
                 options["toggle_option"] = "book"
             else:
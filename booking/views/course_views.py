@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
@@ -9,16 +10,20 @@ from django.views.generic import ListView
 
 from studioadmin.views.utils import get_current_courses
 
-from activitylog.models import ActivityLog
+from activitylog.buffer import log_activity
 
+from ..availability import prefetch_course_occupancy
+from ..conditional_get import ConditionalGetMixin, time_bucket
+from ..entitlements import UserEntitlements
 from ..forms import AvailableUsersForm
 from ..models import Course, Track
+from ..schedule_cache import schedule_version
 from ..utils import get_view_as_user, get_user_course_booking_info, full_name
 from .button_utils import course_list_button_info
-from .views_utils import DataPolicyAgreementRequiredMixin, CleanUpBlocksMixin
+from .views_utils import DataPolicyAgreementRequiredMixin
 
 
-class CourseListView(CleanUpBlocksMixin, DataPolicyAgreementRequiredMixin, ListView):
+class CourseListView(DataPolicyAgreementRequiredMixin, ConditionalGetMixin, ListView):
 
     model = Course
     context_object_name = 'courses'
@@ -30,9 +35,16 @@ class CourseListView(CleanUpBlocksMixin, DataPolicyAgreementRequiredMixin, ListV
         self.request.session["user_id"] = int(view_as_user)
         return HttpResponseRedirect(reverse("booking:courses", args=(self.kwargs["track"],)))
 
+    def get_etag_versions(self):
+        track_id = Track.objects.filter(slug=self.kwargs["track"]).values_list("id", flat=True).first()
+        # courses change with the track's schedule (see booking/schedule_cache.py)
+        return [schedule_version(track_id), time_bucket(settings.SCHEDULE_CACHE_TIMEOUT)]
+
     def get_queryset(self):
         track = get_object_or_404(Track, slug=self.kwargs["track"])
-        queryset = super().get_queryset().filter(event_type__track=track, cancelled=False, show_on_site=True)
+        queryset = super().get_queryset().filter(
+            event_type__track=track, cancelled=False, show_on_site=True
+        ).select_related("event_type")
         return get_current_courses(queryset)
 
     def get_context_data(self, **kwargs):
@@ -41,18 +53,26 @@ class CourseListView(CleanUpBlocksMixin, DataPolicyAgreementRequiredMixin, ListV
         track = Track.objects.get(slug=self.kwargs["track"])
         context['title'] = track.name
         context['track'] = track
+        # only the courses on this page; fetch their events and booking counts in one go
+        courses = context["courses"]
+        prefetch_course_occupancy(courses)
 
         if self.request.user.is_authenticated:
             # Add in the booked_events
             # All user bookings for events in this list view (may be cancelled)
             view_as_user = get_view_as_user(self.request)
+            entitlements = UserEntitlements(view_as_user)
+            entitlements.load_courses(courses)
             user_course_booking_info = {
-                course.id: get_user_course_booking_info(view_as_user, course) for course in self.object_list
+                course.id: get_user_course_booking_info(view_as_user, course, entitlements)
+                for course in courses
             }
 
             context["button_options"] = {
-                course.id: course_list_button_info(view_as_user, course, user_course_booking_info[course.id]) 
-                for course in self.object_list
+                course.id: course_list_button_info(
+                    view_as_user, course, user_course_booking_info[course.id], entitlements
+                )
+                for course in courses
             }
             context["user_course_booking_info"] = user_course_booking_info
             context["available_users_form"] = AvailableUsersForm(request=self.request, view_as_user=view_as_user)
@@ -70,8 +90,9 @@ def unenroll(request):
         messages.error(request, f"{full_name(course_user)} is not booked on this course, cannot unenroll")
     else:
         course_bookings.update(status="CANCELLED", no_show=False, block=None)
-        ActivityLog.objects.create(
-            log=f"User {full_name(course_user)} unenrolled from course {course} by user {request.user}"
+        log_activity(
+            f"User {full_name(course_user)} unenrolled from course {course} by user {request.user}",
+            obj=course, action="unenrolled"
         )
         messages.success(request, f"{full_name(course_user)} unenrolled from {course}")
     if ref == "course":
@@ -1,20 +1,32 @@
 from datetime import timedelta
 
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.conf import settings
 from django.db.models import Count
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, HttpResponseRedirect, HttpResponse
+from django.template.context_processors import csrf
+from django.template.loader import get_template, render_to_string
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from django.utils.safestring import mark_safe
 from django.views.generic import ListView, DetailView
 
+from ..availability import prefetch_availability, prefetch_course_occupancy
+from ..conditional_get import ConditionalGetMixin, time_bucket
+from ..entitlements import UserEntitlements
 from ..forms import AvailableUsersForm, EventNameFilterForm
-from ..models import Course, Event, Track, get_active_user_course_block
+from ..models import Course, Event, Track
+from ..pagination import KeysetPaginator
+from ..schedule_cache import (
+    OVERLAY_PARTS, apply_overlay, get_cached_schedule, schedule_version, track_id_for_event_type
+)
 from ..utils import get_view_as_user, get_user_booking_info
 from .button_utils import (
     button_options_events_list, 
     button_options_book_course_button
 )
-from .views_utils import DataPolicyAgreementRequiredMixin, CleanUpBlocksMixin
+from .views_utils import DataPolicyAgreementRequiredMixin
 
 
 def home(request):
@@ -24,11 +36,14 @@ def home(request):
     return HttpResponseRedirect(reverse("booking:events", args=(track.slug,)))
 
 
-class EventListView(CleanUpBlocksMixin, DataPolicyAgreementRequiredMixin, ListView):
+class EventListView(DataPolicyAgreementRequiredMixin, ConditionalGetMixin, ListView):
 
     model = Event
     context_object_name = 'events_by_date'
     template_name = 'booking/events.html'
+    paginate_events_by = 10
+    # cache the shared parts of the page (see booking/schedule_cache.py)
+    cache_schedule = True
     _ref_obj = None
 
     def get_ref_obj(self):
@@ -50,9 +65,9 @@ class EventListView(CleanUpBlocksMixin, DataPolicyAgreementRequiredMixin, ListVi
 
     def get_queryset(self):
         cutoff_time = timezone.now() - timedelta(minutes=10)
-        events = Event.objects.select_related("event_type").filter(
+        events = Event.objects.select_related("event_type", "course").filter(
             event_type__track=self.ref_obj, start__gt=cutoff_time, show_on_site=True, cancelled=False
-        ).order_by('start__date', 'start__time', "id")
+        ).order_by("start", "id")
         event_name = self.request.GET.get("event_name")
         if event_name:
             events = events.filter(name__iexact=event_name)
@@ -61,9 +76,16 @@ class EventListView(CleanUpBlocksMixin, DataPolicyAgreementRequiredMixin, ListVi
     def get_title(self):
         return self.ref_obj.name
 
-    def _get_button_info(self, user, events):
+    def get_track_id(self):
+        return self.ref_obj.id
+
+    def get_etag_versions(self):
+        # the schedule changes with the track's events and bookings, and as events start
+        return [schedule_version(self.get_track_id()), time_bucket(settings.SCHEDULE_CACHE_TIMEOUT)]
+
+    def _get_button_info(self, user, events, entitlements):
         return {
-            event.id: button_options_events_list(user, event) for event in events
+            event.id: button_options_events_list(user, event, entitlements=entitlements) for event in events
         }
 
     def _extra_context(self, **kwargs):
@@ -80,46 +102,132 @@ class EventListView(CleanUpBlocksMixin, DataPolicyAgreementRequiredMixin, ListVi
             extra_ctx["name_filter_form"] = EventNameFilterForm(track=self.ref_obj)
         return extra_ctx
 
+    def get_page(self, all_events):
+        page_events = KeysetPaginator(all_events, self.paginate_events_by).get_page(self.request.GET.get('page'))
+        # fetch booking counts for all events and courses on this page in one go
+        prefetch_availability(page_events.object_list)
+        return page_events
+
+    def get_schedule_context(self):
+        return {"track": self.ref_obj}
+
+    def get_shared_context(self, all_events, page_events, overlay=None):
+        """
+        The parts of the page that are the same for every user, for caching.  With an overlay, the
+        user-specific parts of the schedule are filled in too (for anonymous users, whose are all the same)
+        """
+        shared_context = self._extra_context(all_events=all_events)
+        if "name_filter_form" in shared_context:
+            shared_context["name_filter_form"] = str(shared_context["name_filter_form"])
+        schedule = render_to_string(
+            "booking/includes/schedule.html", {"page_obj": page_events, **self.get_schedule_context()}
+        )
+        shared_context["schedule"] = schedule if overlay is None else apply_overlay(schedule, overlay)
+        return shared_context
+
+    def get_cached_shared_context(self, variant, render):
+        if not self.cache_schedule:
+            return render()
+        return get_cached_schedule(self.get_track_id(), variant, render, path=self.request.get_full_path())
+
+    def get_user_context(self, events):
+        # All user bookings for events in this list view (may be cancelled)
+        view_as_user = get_view_as_user(self.request)
+        # fetch the user's bookings, blocks etc once for all the events on this page
+        entitlements = UserEntitlements(view_as_user, events=events)
+        return {
+            "view_as_user": view_as_user,
+            "entitlements": entitlements,
+            "user_booking_info": {
+                event.id: get_user_booking_info(view_as_user, event, entitlements) for event in events
+            },
+            "button_options": self._get_button_info(view_as_user, events, entitlements),
+        }
+
+    def get_overlay(self, events, user_context):
+        """The user-specific parts of each event on the page, {event_id: {part: html}}"""
+        templates = {part: get_template(f"booking/includes/event_overlay_{part}.html") for part in OVERLAY_PARTS}
+        context = {"request": self.request, **csrf(self.request), **self.get_schedule_context(), **user_context}
+        button_options = user_context.get("button_options", {})
+        user_booking_info = user_context.get("user_booking_info", {})
+        overlay = {}
+        for event in events:
+            event_context = {
+                **context, "event": event, "button_info": button_options.get(event.id),
+                "user_info": user_booking_info.get(event.id),
+            }
+            overlay[event.id] = {part: template.render(event_context) for part, template in templates.items()}
+        return overlay
+
     def get_context_data(self, **kwargs):
         # Call the base implementation first to get a context
         context = super().get_context_data(**kwargs)
         all_events = self.get_queryset()
-
-        all_paginator = Paginator(all_events, 10)
-        page = self.request.GET.get('page', 1)
-        try:
-            page = all_paginator.validate_number(page)
-        except PageNotAnInteger:
-            page = 1
-        except EmptyPage:
-            page = int(page)
-            page = 1 if page < 1 else all_paginator.num_pages
-        page_events = all_paginator.get_page(page)
-        context["page_obj"] = page_events
-        context["page_range"] = all_paginator.get_elided_page_range(number=page, on_each_side=2)
         context['title'] = self.get_title()
-        context.update(self._extra_context(all_events=all_events))
+
         if self.request.user.is_authenticated:
-            # Add in the booked_events
-            # All user bookings for events in this list view (may be cancelled)
-            view_as_user = get_view_as_user(self.request)
-            user_booking_info = {
-                event.id: get_user_booking_info(view_as_user, event) for event in page_events.object_list
-            }
-            context["user_booking_info"] = user_booking_info
-            context["available_users_form"] = AvailableUsersForm(request=self.request, view_as_user=view_as_user)
-            context["button_options"] = self._get_button_info(view_as_user, page_events.object_list)
+            # the shared parts of the schedule are cached, with the user's buttons etc added for each request
+            page_events = self.get_page(all_events)
+            shared_context = self.get_cached_shared_context(
+                "user", lambda: self.get_shared_context(all_events, page_events)
+            )
+            user_context = self.get_user_context(page_events.object_list)
+            overlay = self.get_overlay(page_events.object_list, user_context)
+            context.update(user_context)
+            context["available_users_form"] = AvailableUsersForm(
+                request=self.request, view_as_user=user_context["view_as_user"]
+            )
+            schedule = apply_overlay(shared_context["schedule"], overlay)
+        else:
+            # anonymous users all see the same page, so the whole schedule is cached
+            def render():
+                page_events = self.get_page(all_events)
+                return self.get_shared_context(all_events, page_events, self.get_overlay(page_events, {}))
+
+            shared_context = self.get_cached_shared_context("anonymous", render)
+            # only fetched if it's used
+            page_events = SimpleLazyObject(lambda: self.get_page(all_events))
+            schedule = shared_context["schedule"]
+
+        context.update(shared_context)
+        context["page_obj"] = page_events
+        context["schedule"] = mark_safe(schedule)
+        if "name_filter_form" in shared_context:
+            context["name_filter_form"] = mark_safe(shared_context["name_filter_form"])
         return context
 
 
-class EventDetailView(DataPolicyAgreementRequiredMixin, DetailView):
+class ScheduleOverlayView(EventListView):
+    """
+    The user-specific parts of the schedule (booking buttons, booked ticks, video links) for a
+    list of events, as json {"events": {event_id: {part: html}}}; used to refresh them on a page that
+    the browser's shown from its cache
+    """
+
+    def get(self, request, *args, **kwargs):
+        event_ids = [event_id for event_id in request.GET.getlist("event") if event_id.isdigit()]
+        events = list(self.get_queryset().filter(id__in=event_ids[:self.paginate_events_by]))
+        prefetch_availability(events)
+        user_context = self.get_user_context(events) if request.user.is_authenticated else {}
+        return JsonResponse({"events": self.get_overlay(events, user_context)})
+
+
+class EventDetailView(DataPolicyAgreementRequiredMixin, ConditionalGetMixin, DetailView):
 
     model = Event
     context_object_name = 'event'
     template_name = 'booking/event.html'
+    _event = None
 
     def get_object(self):
-        return get_object_or_404(Event, slug=self.kwargs['slug'])
+        # also needed for the etag
+        if self._event is None:
+            self._event = get_object_or_404(Event, slug=self.kwargs['slug'])
+        return self._event
+
+    def get_etag_versions(self):
+        track_id = track_id_for_event_type(self.get_object().event_type_id)
+        return [schedule_version(track_id), time_bucket(settings.SCHEDULE_CACHE_TIMEOUT)]
 
     def get_context_data(self, **kwargs):
         # Call the base implementation first to get a context
@@ -133,33 +241,48 @@ class EventDetailView(DataPolicyAgreementRequiredMixin, DetailView):
 
 class CourseEventsListView(EventListView):
 
+    cache_schedule = False
+
     def get_ref_obj(self):
         return get_object_or_404(Course, slug=self.kwargs["course_slug"])
 
     def get_title(self):
         return self.ref_obj.name
 
+    def get_track_id(self):
+        return track_id_for_event_type(self.ref_obj.event_type_id)
+
     def _redirect_url(self):
         return reverse("booking:course_events", args=(self.kwargs["course_slug"],))
 
     def get_queryset(self):
         course_slug = self.kwargs["course_slug"]
-        return Event.objects.filter(course__slug=course_slug).order_by('start__date', 'start__time')
+        return Event.objects.select_related("event_type", "course").filter(
+            course__slug=course_slug
+        ).order_by("start", "id")
 
-    def _get_button_info(self, user, events):
+    def _get_button_info(self, user, events, entitlements):
         return {
-            event.id: button_options_events_list(user, event, course=True) for event in events
+            event.id: button_options_events_list(user, event, course=True, entitlements=entitlements)
+            for event in events
         }
 
     def _extra_context(self, **kwargs):
         return {}
 
+    def get_schedule_context(self):
+        return {"course": self.ref_obj}
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         course = self.ref_obj
+        prefetch_course_occupancy([course])
         context["course"] = course
         if self.request.user.is_authenticated:
             view_as_user = get_view_as_user(self.request)
-            context["available_course_block"] = get_active_user_course_block(view_as_user, course)
-            context["book_course_button_options"] = button_options_book_course_button(view_as_user, course)
+            entitlements = context["entitlements"]
+            context["available_course_block"] = entitlements.get_active_course_block(course)
+            context["book_course_button_options"] = button_options_book_course_button(
+                view_as_user, course, entitlements
+            )
         return context
@@ -6,7 +6,7 @@ from django.utils import timezone
 
 from common.utils import start_of_day_in_utc
 from ..models import Block, BlockConfig, Course, Event, Subscription, \
-    SubscriptionConfig, valid_course_block_configs, valid_dropin_block_configs
+    active_subscription_configs, valid_course_block_configs, valid_dropin_block_configs
 from .views_utils import data_privacy_required
 
 
@@ -14,7 +14,7 @@ logger = logging.getLogger(__name__)
 
 
 def active_user_managed_blocks(core_user, order_by_fields=("purchase_date",)):
-    return [block for block in Block.objects.filter(user__in=core_user.managed_users).order_by(*order_by_fields) if block.active_block]
+    return list(Block.objects.active().filter(user__in=core_user.managed_users).order_by(*order_by_fields))
 
 
 def active_user_managed_subscriptions(core_user, order_by_fields=("purchase_date",)):
@@ -101,7 +101,7 @@ def allowed_start_dates(subscription_config):
 def subscription_config_context(request, event_type=None):
     context = {}
     subscription_configs = [
-        config for config in SubscriptionConfig.objects.filter(active=True) if config.is_purchaseable()
+        config for config in active_subscription_configs() if config.is_purchaseable()
     ]
     if event_type is not None:
         subscription_configs = [
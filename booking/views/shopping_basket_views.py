@@ -309,8 +309,8 @@ def _check_items_and_get_updated_invoice(request, mark_items_checked=False):
     invoice = _get_matching_invoice(invoices)
 
     if invoice is None:
-        invoice = Invoice.objects.create(
-            invoice_id=Invoice.generate_invoice_id(), amount=Decimal(total), username=username,
+        invoice = Invoice.create_with_invoice_id(
+            amount=Decimal(total), username=username,
             total_voucher_code=total_voucher.code if total_voucher is not None else None
         )
         for block in unpaid_blocks:
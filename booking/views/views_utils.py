@@ -1,12 +1,14 @@
-from datetime import timedelta
 
-from django.db.models import Count
+from functools import wraps
+
+from django.db.models import Count, Exists, OuterRef, Value
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 from django.shortcuts import HttpResponseRedirect
-from django.utils import timezone
 
 from accounts.models import DataPrivacyPolicy, has_active_data_privacy_agreement
-from booking.models import Block, Subscription, GiftVoucher
+from booking.models import Block, Subscription, GiftVoucher, cart_item_count_cache_key
+from common.reference_data import shared_cache
 from merchandise.models import ProductPurchase, ProductVariant
 
 
@@ -22,15 +24,8 @@ class DataPolicyAgreementRequiredMixin:
         return super().dispatch(request, *args, **kwargs)
 
 
-class CleanUpBlocksMixin:
-
-    def dispatch(self, request, *args, **kwargs):
-        # Cleanup blocks so user is looking at updated class/course availablility
-        Block.cleanup_expired_blocks(use_cache=True)
-        return super().dispatch(request, *args, **kwargs)
-
-
 def data_privacy_required(view_func):
+    @wraps(view_func)
     def wrap(request, *args, **kwargs):
         if (
             DataPrivacyPolicy.current_version() > 0
@@ -45,6 +40,7 @@ def data_privacy_required(view_func):
 
 
 def redirect_to_voucher_cart(view_func):
+    @wraps(view_func)
     def wrap(request, *args, **kwargs):
         if not request.user.is_authenticated and request.session.get("purchases", {}).get("gift_vouchers"):
             return HttpResponseRedirect(reverse('booking:guest_shopping_basket'))
@@ -53,13 +49,15 @@ def redirect_to_voucher_cart(view_func):
 
 
 def get_unpaid_user_managed_blocks(user):
-    # clean up expired blocks that have associated bookings (i.e. bookings added directly to cart)
-    Block.cleanup_expired_blocks(user=user)
+    # exclude expired blocks that have associated bookings (i.e. bookings added directly to cart);
+    # they're deleted by the cart sweeper
     # order by bookings count then user id
     # this puts all direct purchases (single blocks with associated bookings) first
     return Block.objects.filter(
         user__in=user.managed_users_including_self, paid=False
-    ).annotate(count=Count('bookings__id')).order_by("-count", 'user_id', "id")
+    ).annotate(count=Count('bookings__id')).exclude(
+        Block.expired_cart_blocks_filter()
+    ).order_by("-count", 'user_id', "id")
 
 
 def get_unpaid_user_managed_subscriptions(user):
@@ -75,24 +73,15 @@ def get_unpaid_user_gift_vouchers(user):
 
 
 def get_unpaid_user_merchandise(user):
-    ProductPurchase.cleanup_expired_purchases(user=user)
-    unpaid_purchases = ProductPurchase.objects.filter(user=user, paid=False)
-
-    # remove any without valid variants, in case a cost has been updated since
-    deleted = False
-    for unpaid_purchase in unpaid_purchases:
-        variant = ProductVariant.objects.filter(
-            size=unpaid_purchase.size, cost=unpaid_purchase.cost, product=unpaid_purchase.product
-        )
-        if not variant.exists():
-            unpaid_purchase.delete()
-            deleted = True
-    if deleted:
-        unpaid_purchases = unpaid_purchases.filter(
-            created_at__gte=timezone.now() - timedelta(seconds=60 * 30)
-        )
-
-    return unpaid_purchases
+    # exclude expired purchases (deleted by the cart sweeper), and any without valid variants, in case a
+    # cost has been updated since
+    # (sizes can be None, so compare them with coalesce)
+    valid_variants = ProductVariant.objects.annotate(size_or_blank=Coalesce("size", Value(""))).filter(
+        size_or_blank=Coalesce(OuterRef("size"), Value("")), cost=OuterRef("cost"), product=OuterRef("product")
+    )
+    return ProductPurchase.objects.filter(user=user, paid=False).exclude(
+        ProductPurchase.expired_cart_purchases_filter()
+    ).filter(Exists(valid_variants))
 
 
 def get_unpaid_user_managed_items(user):
@@ -105,7 +94,19 @@ def get_unpaid_user_managed_items(user):
 
 
 def total_unpaid_item_count(user):
-    return sum([queryset.count() for queryset in get_unpaid_user_managed_items(user).values()])
+    count = sum([queryset.count() for queryset in get_unpaid_user_managed_items(user).values()])
+    # anything that changes the cart clears the cached count (see booking.models.clear_cart_item_count_cache);
+    # the timeout is so that items that have expired but haven't been cleaned up yet drop off the count.
+    # It's in the shared cache, so a change handled by one process clears it for all of them
+    shared_cache().set(cart_item_count_cache_key(user.id), count, timeout=60)
+    return count
+
+
+def cached_unpaid_item_count(user):
+    count = shared_cache().get(cart_item_count_cache_key(user.id))
+    if count is None:
+        count = total_unpaid_item_count(user)
+    return count
 
 
 def get_unpaid_gift_vouchers_from_session(request):
@@ -0,0 +1,111 @@
+"""
+Date and timezone arithmetic, using the stdlib zoneinfo
+
+These replace the Delorean-based helpers that used to build a Delorean object (and look up the pytz
+timezone) on every call.  Timezone objects are cached, and subscription period start dates, which only
+depend on the subscription config and today's date, are cached per day.
+
+Results are the same as the old implementations, including across DST transitions; see
+booking/tests/test_date_utils.py, and the benchmark_date_math management command.
+"""
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+from dateutil.relativedelta import relativedelta
+
+
+LOCAL_TIMEZONE = "Europe/London"
+
+
+@lru_cache(maxsize=None)
+def get_timezone(name):
+    return ZoneInfo(name)
+
+
+def _aware(input_datetime):
+    # naive datetimes are treated as UTC; aware ones keep their own tzinfo
+    if input_datetime.tzinfo is None:
+        return input_datetime.replace(tzinfo=dt_timezone.utc)
+    return input_datetime
+
+
+def start_of_day(input_datetime):
+    return _aware(input_datetime).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def end_of_day(input_datetime):
+    return _aware(input_datetime).replace(hour=23, minute=59, second=59, microsecond=999999)
+
+
+def utcoffset_in_timezone(input_datetime, timezone_name=LOCAL_TIMEZONE):
+    """UTC offset in timezone_name at the time of input_datetime (naive datetimes are UTC)"""
+    return _aware(input_datetime).astimezone(get_timezone(timezone_name)).utcoffset()
+
+
+def end_of_day_in_local_time(input_datetime, local_timezone=LOCAL_TIMEZONE):
+    # Return localtime end of day in UTC
+    return end_of_day(input_datetime) - utcoffset_in_timezone(input_datetime, local_timezone)
+
+
+def local_adjusted_datetime(naive_datetime, local_timezone=LOCAL_TIMEZONE):
+    """
+    naive_datetime is a local (wall clock) time; return the UTC datetime, using the local
+    UTC offset at naive_datetime-as-UTC
+    """
+    utc_datetime = naive_datetime.replace(tzinfo=dt_timezone.utc)
+    return utc_datetime - utcoffset_in_timezone(utc_datetime, local_timezone)
+
+
+def _days_to_weekday(current_weekday, target_weekday, next):
+    # next: days forward to the next target weekday; last: days back to the previous one.
+    # Never 0; on the target weekday itself, this moves a whole week
+    if next:
+        return (target_weekday - current_weekday) % 7 or 7
+    return (current_weekday - target_weekday) % 7 or 7
+
+
+@lru_cache(maxsize=1024)
+def subscription_period_start_date(config_start_date, duration, duration_units, today, next=False):
+    """
+    Start date of the current (or next) period of a recurring subscription that starts on
+    config_start_date and recurs every `duration` weeks/months.
+    today: today's date in UTC; the result only changes from day to day, so it's cached by date.
+    Returns None if the period would start before config_start_date.
+    """
+    midnight_today = datetime(today.year, today.month, today.day, tzinfo=dt_timezone.utc)
+    if duration_units == "weeks":
+        # recurs on the same day of the week
+        weekday = config_start_date.weekday()
+        if today.weekday() == weekday and not next:
+            calculated_start = midnight_today
+        else:
+            days = _days_to_weekday(today.weekday(), weekday, next)
+            calculated_start = midnight_today + timedelta(days=days if next else -days)
+        # get time in weeks between calculated weekday and start
+        time_diff = (calculated_start - config_start_date).days / 7
+        remainder = time_diff % duration
+        if next:
+            # we calculated the next weekday already
+            if duration > 1:
+                remainder = duration - remainder
+            result = calculated_start + timedelta(weeks=remainder)
+        else:
+            result = calculated_start - timedelta(weeks=remainder)
+    else:
+        # recurs monthly
+        day_of_month = config_start_date.day
+        datetime_this_month = datetime(day=day_of_month, month=today.month, year=today.year, tzinfo=dt_timezone.utc)
+        if today.day >= day_of_month:
+            calculated_start = datetime_this_month + relativedelta(months=1) if next else datetime_this_month
+        else:
+            calculated_start = datetime_this_month if next else datetime_this_month - relativedelta(months=1)
+        calculated_start = start_of_day(calculated_start)
+        time_diff = relativedelta(calculated_start, config_start_date)
+        remainder = time_diff.months % duration
+        if next:
+            result = calculated_start + relativedelta(months=remainder)
+        else:
+            result = calculated_start - relativedelta(months=remainder)
+    return result if result >= config_start_date else None
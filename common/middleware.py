@@ -1,5 +1,14 @@
+import logging
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
 from django.utils import timezone
 
+from .query_budget import query_budget, record_request_stats, view_name
+
+
+logger = logging.getLogger(__name__)
+
 
 class TimezoneMiddleware:
     def __init__(self, get_response):
@@ -10,3 +19,32 @@ class TimezoneMiddleware:
         tzname = "Europe/London"
         timezone.activate(tzname)
         return self.get_response(request)
+
+
+class QueryBudgetMiddleware:
+    """
+    Record query count, DB time, cache hits/misses and template render time for each request,
+    and log requests that run more queries than their view's budget.  Only used if
+    settings.QUERY_BUDGET_MONITORING is True.
+    """
+    def __init__(self, get_response):
+        if not settings.QUERY_BUDGET_MONITORING:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with record_request_stats() as stats:
+            response = self.get_response(request)
+        name = view_name(request)
+        if name is None:
+            return response
+        request.query_stats = stats
+        budget = query_budget(name)
+        if stats.queries > budget:
+            logger.warning(
+                "Query budget exceeded for %s (%s %s): %s queries (budget %s) %s",
+                name, request.method, request.path, stats.queries, budget, stats.as_dict()
+            )
+        else:
+            logger.debug("%s (%s %s): %s", name, request.method, request.path, stats.as_dict())
+        return response
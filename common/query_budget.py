@@ -0,0 +1,157 @@
+"""
+Per-request query budget instrumentation
+
+QueryBudgetMiddleware (enabled with settings.QUERY_BUDGET_MONITORING) records the number of SQL
+queries, total DB time, cache hits/misses and template render time for each request, against the
+resolved view's name, and logs a warning for any request that runs more queries than the view's
+budget (settings.QUERY_BUDGETS, or settings.QUERY_BUDGET_DEFAULT).
+
+Cache and template timings are collected by wrapping the cache backends' get/get_many and the
+Django template backend's render; the wrappers only record anything while a request is being
+monitored, in the thread that's handling it.
+"""
+from contextlib import ExitStack
+from functools import wraps
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+
+
+_local = threading.local()
+_installed = False
+_install_lock = threading.Lock()
+_MISSING = object()
+
+
+class RequestStats:
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_time = 0
+        self._template_depth = 0
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - start
+
+    def as_dict(self):
+        return {
+            "queries": self.queries,
+            "db_time_ms": round(self.db_time * 1000, 1),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "template_time_ms": round(self.template_time * 1000, 1),
+        }
+
+
+def current_stats():
+    return getattr(_local, "stats", None)
+
+
+class record_request_stats:
+    """Context manager that collects RequestStats for the code it wraps, in this thread"""
+
+    def __enter__(self):
+        install_instrumentation()
+        self.stats = RequestStats()
+        self._previous = current_stats()
+        _local.stats = self.stats
+        self._exit_stack = ExitStack()
+        for connection in connections.all():
+            self._exit_stack.enter_context(connection.execute_wrapper(self.stats.record_query))
+        return self.stats
+
+    def __exit__(self, *exc_info):
+        self._exit_stack.close()
+        _local.stats = self._previous
+
+
+def view_name(request):
+    """Name of the view that the request resolved to (class name for class-based views), or None"""
+    resolver_match = getattr(request, "resolver_match", None)
+    if resolver_match is None:
+        return None
+    view = getattr(resolver_match.func, "view_class", resolver_match.func)
+    return getattr(view, "__name__", resolver_match.view_name)
+
+
+def query_budget(name):
+    return settings.QUERY_BUDGETS.get(name, settings.QUERY_BUDGET_DEFAULT)
+
+
+def _instrument_cache_get(get):
+    @wraps(get)
+    def wrapper(cache, key, default=None, version=None):
+        stats = current_stats()
+        if stats is None:
+            return get(cache, key, default=default, version=version)
+        value = get(cache, key, default=_MISSING, version=version)
+        if value is _MISSING:
+            stats.cache_misses += 1
+            return default
+        stats.cache_hits += 1
+        return value
+    return wrapper
+
+
+def _instrument_cache_get_many(get_many):
+    @wraps(get_many)
+    def wrapper(cache, keys, version=None):
+        stats = current_stats()
+        if stats is None:
+            return get_many(cache, keys, version=version)
+        keys = list(keys)
+        # the default get_many calls get for each key; don't count those twice
+        _local.stats = None
+        try:
+            values = get_many(cache, keys, version=version)
+        finally:
+            _local.stats = stats
+        stats.cache_hits += len(values)
+        stats.cache_misses += len(keys) - len(values)
+        return values
+    return wrapper
+
+
+def _instrument_template_render(render):
+    @wraps(render)
+    def wrapper(template, *args, **kwargs):
+        stats = current_stats()
+        if stats is None:
+            return render(template, *args, **kwargs)
+        # only time the outermost render; templates rendered from inside a template are included in it
+        stats._template_depth += 1
+        start = time.perf_counter()
+        try:
+            return render(template, *args, **kwargs)
+        finally:
+            stats._template_depth -= 1
+            if not stats._template_depth:
+                stats.template_time += time.perf_counter() - start
+    return wrapper
+
+
+def install_instrumentation():
+    """Wrap the configured cache backends and the template backend, once per process"""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        from django.template.backends.django import Template
+
+        backend_classes = {import_string(config["BACKEND"]) for config in settings.CACHES.values()}
+        for backend_class in backend_classes:
+            backend_class.get = _instrument_cache_get(backend_class.get)
+            backend_class.get_many = _instrument_cache_get_many(backend_class.get_many)
+        Template.render = _instrument_template_render(Template.render)
+        _installed = True
@@ -0,0 +1,152 @@
+"""
+Caching for small, rarely changing reference data (tracks, event types, block/subscription configs,
+policy versions) that's needed on most page views.
+
+Each cached value has a version, stored in the shared cache and bumped by post_save/post_delete on the
+models it's built from.  A process keeps the value in memory along with the version it was built from, and
+only rechecks the version every REFERENCE_DATA_VERSION_CHECK_SECONDS.  Values are also stored in the
+shared cache, keyed by version, so a change only has to be reloaded from the db by one process.
+
+Usage:
+
+    @reference_data("default_track", models=["booking.Track"])
+    def default_track():
+        return Track.objects.filter(default=True).first()
+
+default_track() then returns the cached value.  Anything returned must be picklable, and shouldn't be
+modified by the caller.
+"""
+import time
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+
+# in-process cache, {name: (version, value, last checked, expires)}
+_local = {}
+# {name: (loader, timeout)}
+_loaders = {}
+# names changed in a transaction that's not been committed yet
+_pending = set()
+# hit/miss counts for this process, keyed by (name, "local_hit" | "shared_hit" | "miss")
+_stats = Counter()
+
+VALUE_TIMEOUT = 60 * 60 * 24
+
+
+def shared_cache():
+    return caches["shared"]
+
+
+def _version_key(name):
+    return f"reference_data_{name}_version"
+
+
+def _value_key(name, version):
+    return f"reference_data_{name}_v{version}"
+
+
+def _current_version(name):
+    version = shared_cache().get(_version_key(name))
+    if version is None:
+        # versions are timestamps rather than counters, so a cleared cache can't restart
+        # at a version that's still held (with out of date data) by another process
+        shared_cache().add(_version_key(name), time.time_ns(), timeout=None)
+        version = shared_cache().get(_version_key(name))
+    return version
+
+
+def get_reference_data(name):
+    if name in _pending:
+        if transaction.get_connection().in_atomic_block:
+            # changed in the current transaction; don't cache anything until it's committed (or rolled back)
+            _stats[(name, "miss")] += 1
+            return _loaders[name][0]()
+        # the transaction was rolled back
+        _pending.discard(name)
+        invalidate(name)
+
+    now = time.monotonic()
+    local = _local.get(name)
+    if local is not None and (local[3] is None or now < local[3]):
+        version, value, checked, expires = local
+        if now - checked < settings.REFERENCE_DATA_VERSION_CHECK_SECONDS or version == _current_version(name):
+            _local[name] = (version, value, now, expires)
+            _stats[(name, "local_hit")] += 1
+            return value
+
+    loader, timeout = _loaders[name]
+    version = _current_version(name)
+    # values are wrapped in a tuple so a cached None can be distinguished from a miss
+    cached = shared_cache().get(_value_key(name, version))
+    if cached is None:
+        _stats[(name, "miss")] += 1
+        value = loader()
+        shared_cache().set(_value_key(name, version), (value,), timeout=timeout or VALUE_TIMEOUT)
+    else:
+        _stats[(name, "shared_hit")] += 1
+        value = cached[0]
+    _local[name] = (version, value, now, None if timeout is None else now + timeout)
+    return value
+
+
+def invalidate(name):
+    _local.pop(name, None)
+    shared_cache().set(_version_key(name), time.time_ns(), timeout=None)
+
+
+def clear():
+    """Clear all cached reference data and counts (used in tests)"""
+    for name in _loaders:
+        invalidate(name)
+    _pending.clear()
+    _stats.clear()
+
+
+def stats():
+    """
+    Hit/miss counts for this process, {name: {"local_hit": n, "shared_hit": n, "miss": n}}
+    """
+    counts = {name: {"local_hit": 0, "shared_hit": 0, "miss": 0} for name in _loaders}
+    for (name, kind), count in _stats.items():
+        counts[name][kind] = count
+    return counts
+
+
+def reference_data(name, models, timeout=None):
+    """
+    Decorator to register a loader function for cached reference data.  models are the models
+    (or "app_label.ModelName" strings) that the data is built from; saving or deleting any of them
+    invalidates it.  timeout (seconds) is for data that also goes out of date with time, e.g. data
+    that depends on which events are upcoming.
+    """
+    def _committed():
+        _pending.discard(name)
+        # invalidate again, in case another process reloaded it before the change was committed
+        invalidate(name)
+
+    def _invalidate(sender, **kwargs):
+        invalidate(name)
+        if transaction.get_connection().in_atomic_block:
+            _pending.add(name)
+            transaction.on_commit(_committed)
+
+    def decorator(loader):
+        _loaders[name] = (loader, timeout)
+        for model in models:
+            model_name = model if isinstance(model, str) else model._meta.label
+            for signal, action in [(post_save, "save"), (post_delete, "delete")]:
+                signal.connect(
+                    _invalidate, sender=model, weak=False, dispatch_uid=f"reference_data_{name}_{model_name}_{action}"
+                )
+
+        @wraps(loader)
+        def wrapper():
+            return get_reference_data(name)
+        wrapper.invalidate = lambda: invalidate(name)
+        return wrapper
+    return decorator
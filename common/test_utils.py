@@ -1,9 +1,12 @@
+from contextlib import contextmanager
 from datetime import datetime
 from datetime import timezone as dt_timezone
 
 import random
 
 from django.contrib.auth.models import User, Group
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django.shortcuts import reverse
 
@@ -15,6 +18,7 @@ from accounts.models import (
     UserProfile, ChildUserProfile, ArchivedDisclaimer
 )
 from booking.models import Event, EventType, Course, Track
+from common.query_budget import query_budget
 
 
 def make_disclaimer_content(**kwargs):
@@ -85,6 +89,20 @@ def make_archived_disclaimer(**kwargs):
     return ArchivedDisclaimer.objects.create(**data)
 
 
+@contextmanager
+def assert_within_query_budget(view_name, budget=None):
+    """
+    Fail if the code in the with block runs more queries than view_name's budget
+    (settings.QUERY_BUDGETS, as used by QueryBudgetMiddleware)
+    """
+    budget = budget if budget is not None else query_budget(view_name)
+    with CaptureQueriesContext(connection) as context:
+        yield context
+    if len(context) > budget:
+        queries = "\n".join(f"{i}. {query['sql']}" for i, query in enumerate(context.captured_queries, start=1))
+        raise AssertionError(f"{view_name} ran {len(context)} queries, over its budget of {budget}:\n{queries}")
+
+
 class TestUsersMixin:
 
     def create_admin_users(self):
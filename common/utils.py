@@ -1,20 +1,42 @@
-from delorean import Delorean
+from functools import wraps
+import logging
 
+from django.db import OperationalError
+
+from .date_utils import end_of_day, end_of_day_in_local_time, start_of_day  # noqa: F401
 
-def full_name(user):
-    return f"{user.first_name} {user.last_name}"
 
+logger = logging.getLogger(__name__)
 
-def start_of_day_in_utc(input_datetime):
-    return Delorean(input_datetime, timezone="utc").start_of_day
+# postgres error codes for transactions aborted because of lock contention:
+# serialization failure, deadlock detected, lock not available
+LOCK_CONTENTION_ERROR_CODES = {"40001", "40P01", "55P03"}
+LOCK_CONTENTION_RETRIES = 3
 
 
-def end_of_day_in_utc(input_datetime):
-    return Delorean(input_datetime, timezone="utc").end_of_day
+def full_name(user):
+    return f"{user.first_name} {user.last_name}"
 
 
-def end_of_day_in_local_time(input_datetime, local_timezone="Europe/London"):
-    # Return localtime end of day in UTC
-    end_of_day_utc = end_of_day_in_utc(input_datetime)
-    utc_offset_at_input_datetime = Delorean(input_datetime, timezone="utc").shift(local_timezone).datetime.utcoffset()
-    return end_of_day_utc - utc_offset_at_input_datetime
+# Naive datetimes are treated as UTC; see common.date_utils
+start_of_day_in_utc = start_of_day
+end_of_day_in_utc = end_of_day
+
+
+def retry_on_lock_contention(func):
+    """
+    Retry func if the database aborts it because of lock contention (e.g. a deadlock
+    between concurrent bookings).  func must do its database work in a transaction, and
+    mustn't send emails etc before that work is done, so that it's safe to run again.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(1, LOCK_CONTENTION_RETRIES + 1):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as e:
+                pgcode = getattr(e.__cause__, "pgcode", None)
+                if pgcode not in LOCK_CONTENTION_ERROR_CODES or attempt == LOCK_CONTENTION_RETRIES:
+                    raise
+                logger.warning("Lock contention in %s (attempt %s), retrying", func.__name__, attempt)
+    return wrapper
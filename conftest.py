@@ -10,12 +10,20 @@ from model_bakery import baker
 from accounts.models import UserProfile, ChildUserProfile
 from booking.models import Block, BlockConfig, Booking, Course, EventType
 from booking.tests.test_course_views import CourseListViewTests
+from common import reference_data
 from common.test_utils import TestUsersMixin
 
 
 pytestmark = pytest.mark.django_db
 
 
+@pytest.fixture(autouse=True)
+def clear_reference_data():
+    # cached reference data outlives each test's db transaction
+    reference_data.clear()
+    yield
+
+
 def make_agreements(user):
     mixin = TestUsersMixin()
     mixin.make_data_privacy_agreement(user)
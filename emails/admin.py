@@ -0,0 +1,34 @@
+from django.contrib import admin
+
+from emails.models import BulkEmail, QueuedEmail
+
+
+class QueuedEmailAdmin(admin.ModelAdmin):
+    list_display = ('id', 'subject', 'status', 'attempts', 'created', 'sent', 'next_attempt')
+    list_filter = ('status',)
+    search_fields = ('subject', 'to', 'bcc')
+    readonly_fields = ('attempts', 'last_error', 'created', 'sent')
+    actions = ('requeue',)
+
+    @admin.action(description="Requeue selected emails")
+    def requeue(self, request, queryset):
+        for queued_email in queryset:
+            queued_email.requeue()
+
+
+class BulkEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'recipient_count', 'created', 'progress_formatted')
+    actions = ('resume',)
+
+    def progress_formatted(self, obj):
+        return ", ".join(f"{count} {status}" for status, count in obj.progress().items())
+    progress_formatted.short_description = "Chunks"
+
+    @admin.action(description="Resume selected bulk emails (requeue failed chunks)")
+    def resume(self, request, queryset):
+        for bulk_email in queryset:
+            bulk_email.resume()
+
+
+admin.site.register(BulkEmail, BulkEmailAdmin)
+admin.site.register(QueuedEmail, QueuedEmailAdmin)
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from emails.models import QueuedEmail
+from emails.utils import send_queued_emails
+
+
+class Command(BaseCommand):
+    help = "Send queued emails.  Run it regularly (e.g. every minute), or use --poll to keep it running as a worker"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Number of emails to lock and send at a time (defaults to settings.EMAIL_QUEUE_BATCH_SIZE)'
+        )
+        parser.add_argument(
+            '--poll',
+            type=int,
+            help='Keep running, checking for new emails every POLL seconds'
+        )
+        parser.add_argument(
+            '--requeue-failed',
+            action='store_true',
+            help='Requeue emails that have failed too many times before sending'
+        )
+
+    def handle(self, *args, **options):
+        if options["requeue_failed"]:
+            failed_emails = QueuedEmail.objects.filter(status="failed")
+            for queued_email in failed_emails:
+                queued_email.requeue()
+            self.stdout.write(f"{len(failed_emails)} failed email(s) requeued")
+
+        while True:
+            sent_count, failed_count = send_queued_emails(batch_size=options["batch_size"])
+            if sent_count or failed_count:
+                self.stdout.write(f"{sent_count} email(s) sent, {failed_count} failed")
+            if not options["poll"]:
+                break
+            time.sleep(options["poll"])
@@ -0,0 +1,131 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail.message import EmailMultiAlternatives
+from django.db import models
+from django.utils import timezone
+
+
+class BulkEmail(models.Model):
+    """
+    An email to a lot of people, queued by emails.utils.queue_bulk_email as QueuedEmail chunks of
+    BULK_EMAIL_CHUNK_SIZE bcc recipients each
+    """
+    subject = models.TextField()
+    recipient_count = models.PositiveIntegerField(default=0)
+    created = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ("-created",)
+
+    def __str__(self):
+        return f"{self.subject} ({self.recipient_count} recipients)"
+
+    def progress(self):
+        """Number of chunks by status"""
+        progress = {status: 0 for status, _ in QueuedEmail.STATUS_CHOICES}
+        for status, count in self.chunks.order_by().values_list("status").annotate(count=models.Count("id")):
+            progress[status] = count
+        return progress
+
+    def resume(self):
+        """Requeue any chunks that failed; chunks that have already been sent aren't sent again"""
+        failed_chunks = self.chunks.filter(status="failed")
+        for chunk in failed_chunks:
+            chunk.requeue()
+        return len(failed_chunks)
+
+
+class QueuedEmail(models.Model):
+    """
+    An email saved by emails.utils.queue_email, to be sent by the send_queued_emails command.
+    Emails that still fail after EMAIL_QUEUE_MAX_ATTEMPTS are marked as failed and left for an admin to
+    requeue.
+    """
+    STATUS_CHOICES = (
+        ("queued", "Queued"),
+        ("sent", "Sent"),
+        ("failed", "Failed"),
+    )
+    subject = models.TextField()
+    body = models.TextField()
+    html_body = models.TextField(blank=True, default="")
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField(default=list)
+    cc = models.JSONField(default=list)
+    bcc = models.JSONField(default=list)
+    reply_to = models.JSONField(default=list)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="queued")
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default="")
+    created = models.DateTimeField(default=timezone.now)
+    sent = models.DateTimeField(null=True, blank=True)
+
+    bulk_email = models.ForeignKey(
+        BulkEmail, null=True, blank=True, on_delete=models.CASCADE, related_name="chunks"
+    )
+
+    class Meta:
+        ordering = ("id",)
+        indexes = [
+            models.Index(fields=["status", "next_attempt"]),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} ({', '.join(self.recipients())}) - {self.status}"
+
+    def recipients(self):
+        return self.to + self.cc + self.bcc
+
+    @classmethod
+    def from_message(cls, msg):
+        """An (unsaved) QueuedEmail for a django EmailMessage"""
+        html_body = next(
+            (content for content, mimetype in getattr(msg, "alternatives", []) if mimetype == "text/html"), ""
+        )
+        return cls(
+            subject=msg.subject,
+            body=msg.body,
+            html_body=html_body,
+            from_email=msg.from_email,
+            to=list(msg.to),
+            cc=list(msg.cc),
+            bcc=list(msg.bcc),
+            reply_to=list(msg.reply_to),
+        )
+
+    def to_message(self, connection=None):
+        msg = EmailMultiAlternatives(
+            self.subject, self.body, self.from_email,
+            to=self.to, cc=self.cc, bcc=self.bcc, reply_to=self.reply_to,
+            connection=connection,
+        )
+        if self.html_body:
+            msg.attach_alternative(self.html_body, "text/html")
+        return msg
+
+    def mark_sent(self):
+        self.status = "sent"
+        self.sent = timezone.now()
+        self.attempts += 1
+        self.last_error = ""
+        self.save()
+
+    def mark_failed_attempt(self, error):
+        """Schedule a retry with exponential backoff, or give up once we've used all the attempts"""
+        self.attempts += 1
+        self.last_error = str(error)
+        if self.attempts >= settings.EMAIL_QUEUE_MAX_ATTEMPTS:
+            self.status = "failed"
+        else:
+            delay = settings.EMAIL_QUEUE_RETRY_DELAY_SECONDS * 2 ** (self.attempts - 1)
+            self.next_attempt = timezone.now() + timedelta(seconds=delay)
+        self.save()
+
+    def requeue(self):
+        self.status = "queued"
+        self.attempts = 0
+        self.next_attempt = timezone.now()
+        self.save()
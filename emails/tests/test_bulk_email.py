@@ -0,0 +1,119 @@
+from smtplib import SMTPException
+from unittest.mock import patch
+
+import pytest
+
+from django.core import mail
+from django.core.mail import get_connection
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.mail.message import EmailMultiAlternatives
+from django.urls import reverse
+
+from activitylog.models import ActivityLog
+from booking.email_helpers import send_bcc_emails
+from common.test_utils import TestUsersMixin
+from emails.models import BulkEmail, QueuedEmail
+from emails.utils import queue_bulk_email, send_queued_emails
+
+
+pytestmark = pytest.mark.django_db
+
+
+def _message(**kwargs):
+    return EmailMultiAlternatives("Bulk", "text body", "from@test.com", **kwargs)
+
+
+def _recipients(count):
+    return [f"user{i}@test.com" for i in range(count)]
+
+
+def test_bulk_email_split_into_chunks(settings):
+    settings.QUEUE_EMAILS = True
+    bulk_email = queue_bulk_email(_message(cc=["studio@test.com"]), _recipients(5), chunk_size=2)
+    assert bulk_email.recipient_count == 5
+    chunks = list(bulk_email.chunks.all())
+    assert [chunk.bcc for chunk in chunks] == [_recipients(5)[:2], _recipients(5)[2:4], _recipients(5)[4:]]
+    # only the first chunk is cc'd
+    assert [chunk.cc for chunk in chunks] == [["studio@test.com"], [], []]
+    assert bulk_email.progress() == {"queued": 3, "sent": 0, "failed": 0}
+    assert mail.outbox == []
+
+    with patch("emails.utils.get_connection", wraps=get_connection) as mock_get_connection:
+        assert send_queued_emails() == (3, 0)
+    assert mock_get_connection.call_count == 1
+    assert [msg.bcc for msg in mail.outbox] == [chunk.bcc for chunk in chunks]
+    assert bulk_email.progress() == {"queued": 0, "sent": 3, "failed": 0}
+
+
+def test_bulk_email_with_no_recipients(settings):
+    settings.QUEUE_EMAILS = True
+    bulk_email = queue_bulk_email(_message(), [])
+    assert not bulk_email.chunks.exists()
+
+
+def test_bulk_email_failed_chunk_resumed(settings):
+    settings.QUEUE_EMAILS = True
+    settings.EMAIL_QUEUE_MAX_ATTEMPTS = 1
+    bulk_email = queue_bulk_email(_message(), _recipients(4), chunk_size=2)
+    failing_chunk = bulk_email.chunks.last()
+
+    original_send_messages = EmailBackend.send_messages
+
+    def send_messages(backend, messages):
+        if messages[0].bcc == failing_chunk.bcc:
+            raise SMTPException("Too many recipients")
+        return original_send_messages(backend, messages)
+
+    with patch.object(EmailBackend, "send_messages", send_messages):
+        assert send_queued_emails() == (1, 1)
+    assert bulk_email.progress() == {"queued": 0, "sent": 1, "failed": 1}
+
+    # resuming only sends the failed chunk
+    assert bulk_email.resume() == 1
+    assert send_queued_emails() == (1, 0)
+    assert bulk_email.progress() == {"queued": 0, "sent": 2, "failed": 0}
+    assert [msg.bcc for msg in mail.outbox] == [_recipients(4)[:2], _recipients(4)[2:]]
+
+
+def test_send_bcc_emails_chunks_recipients(settings):
+    settings.QUEUE_EMAILS = False
+    settings.BULK_EMAIL_CHUNK_SIZE = 2
+    send_bcc_emails(
+        {"host": "http://test.com", "message": "Test message"}, _recipients(3), "Test subject",
+        "studioadmin/email/email_users", reply_to="studio@test.com", cc=True
+    )
+    assert BulkEmail.objects.count() == 1
+    assert QueuedEmail.objects.filter(status="sent").count() == 2
+    assert [(msg.bcc, msg.cc) for msg in mail.outbox] == [
+        (_recipients(3)[:2], ["studio@test.com"]), (_recipients(3)[2:], [])
+    ]
+    assert mail.outbox[1].reply_to == ["studio@test.com"]
+    assert "Test message" in mail.outbox[1].alternatives[0][0]
+
+
+def test_email_users_view_queues_bulk_email(settings, client, django_user_model):
+    settings.QUEUE_EMAILS = True
+    settings.BULK_EMAIL_CHUNK_SIZE = 2
+    staff_user = django_user_model.objects.create_user(
+        username="staff@test.com", email="staff@test.com", password="test", is_staff=True
+    )
+    TestUsersMixin().make_data_privacy_agreement(staff_user)
+    users = [
+        django_user_model.objects.create_user(username=email, email=email, password="test")
+        for email in _recipients(3)
+    ]
+    client.force_login(staff_user)
+    session = client.session
+    session["users_to_email"] = [user.id for user in users]
+    session.save()
+
+    resp = client.post(
+        reverse("studioadmin:email_users_view"),
+        {"subject": "Test", "from_address": "studio@test.com", "cc": True, "message": "Test message"}
+    )
+    assert resp.status_code == 302
+    bulk_email = BulkEmail.objects.get()
+    assert bulk_email.recipient_count == 3
+    assert [(chunk.cc, len(chunk.bcc)) for chunk in bulk_email.chunks.all()] == [(["studio@test.com"], 2), ([], 1)]
+    assert ActivityLog.objects.filter(log__startswith='Bulk email with subject "Test').count() == 2
+    assert mail.outbox == []
@@ -0,0 +1,145 @@
+from datetime import timedelta
+from smtplib import SMTPException
+from unittest.mock import patch
+
+import pytest
+
+from django.core import mail
+from django.core.mail import get_connection
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.core.mail.message import EmailMultiAlternatives
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from activitylog.models import ActivityLog
+from booking.models import Booking
+from common.test_utils import TestUsersMixin
+from emails.models import QueuedEmail
+from emails.utils import queue_email, send_queued_emails
+
+
+pytestmark = pytest.mark.django_db
+
+
+def _message(subject="Test", **kwargs):
+    msg = EmailMultiAlternatives(subject, "text body", "from@test.com", **kwargs)
+    msg.attach_alternative("<p>html body</p>", "text/html")
+    return msg
+
+
+def _failing_send_messages(fail_subjects):
+    original_send_messages = EmailBackend.send_messages
+
+    def send_messages(backend, messages):
+        if any(message.subject in fail_subjects for message in messages):
+            raise SMTPException("Server unavailable")
+        return original_send_messages(backend, messages)
+    return send_messages
+
+
+def test_queue_email_sends_immediately_if_not_queueing(settings):
+    settings.QUEUE_EMAILS = False
+    queued_email = queue_email(_message(to=["a@test.com"], bcc=["b@test.com"], reply_to=["c@test.com"]))
+    assert len(mail.outbox) == 1
+    assert mail.outbox[0].bcc == ["b@test.com"]
+    assert mail.outbox[0].reply_to == ["c@test.com"]
+    assert mail.outbox[0].alternatives == [("<p>html body</p>", "text/html")]
+    queued_email.refresh_from_db()
+    assert queued_email.status == "sent"
+
+
+def test_queued_emails_sent_by_worker_in_batches(settings):
+    settings.QUEUE_EMAILS = True
+    for i in range(5):
+        queue_email(_message(f"Test {i}", to=[f"{i}@test.com"]))
+    assert mail.outbox == []
+
+    with patch("emails.utils.get_connection", wraps=get_connection) as mock_get_connection:
+        assert send_queued_emails(batch_size=2) == (5, 0)
+    # one connection for all the batches
+    assert mock_get_connection.call_count == 1
+    assert [msg.subject for msg in mail.outbox] == [f"Test {i}" for i in range(5)]
+    assert mail.outbox[0].alternatives == [("<p>html body</p>", "text/html")]
+    assert QueuedEmail.objects.filter(status="sent").count() == 5
+
+    # nothing left to send
+    assert send_queued_emails() == (0, 0)
+    assert len(mail.outbox) == 5
+
+
+def test_queued_email_discarded_if_transaction_rolled_back(settings):
+    settings.QUEUE_EMAILS = True
+    with pytest.raises(ValueError):
+        with transaction.atomic():
+            queue_email(_message(to=["a@test.com"]))
+            raise ValueError
+    assert not QueuedEmail.objects.exists()
+
+
+def test_failed_emails_retried_with_backoff(settings, freezer):
+    settings.QUEUE_EMAILS = True
+    settings.EMAIL_QUEUE_MAX_ATTEMPTS = 3
+    settings.EMAIL_QUEUE_RETRY_DELAY_SECONDS = 60
+    queue_email(_message("Fails", to=["a@test.com"]))
+    queue_email(_message("Succeeds", to=["b@test.com"]))
+
+    with patch.object(EmailBackend, "send_messages", _failing_send_messages({"Fails"})):
+        # a failure doesn't stop the rest of the batch
+        assert send_queued_emails() == (1, 1)
+        failed_email = QueuedEmail.objects.get(subject="Fails")
+        assert (failed_email.status, failed_email.attempts) == ("queued", 1)
+        assert failed_email.last_error == "Server unavailable"
+        assert failed_email.next_attempt == timezone.now() + timedelta(seconds=60)
+
+        # not due yet
+        assert send_queued_emails() == (0, 0)
+        freezer.move_to(timezone.now() + timedelta(seconds=60))
+        assert send_queued_emails() == (0, 1)
+        failed_email.refresh_from_db()
+        assert failed_email.next_attempt == timezone.now() + timedelta(seconds=120)
+
+        # gives up after the max attempts
+        freezer.move_to(timezone.now() + timedelta(seconds=120))
+        assert send_queued_emails() == (0, 1)
+        failed_email.refresh_from_db()
+        assert (failed_email.status, failed_email.attempts) == ("failed", 3)
+        assert ActivityLog.objects.filter(log__contains=f"Email {failed_email.id} (Fails) could not be sent").exists()
+        freezer.move_to(timezone.now() + timedelta(days=1))
+        assert send_queued_emails() == (0, 0)
+
+    assert [msg.subject for msg in mail.outbox] == ["Succeeds"]
+
+    # failed emails can be requeued
+    call_command("send_queued_emails", "--requeue-failed")
+    failed_email.refresh_from_db()
+    assert (failed_email.status, failed_email.attempts) == ("sent", 1)
+    assert [msg.subject for msg in mail.outbox] == ["Succeeds", "Fails"]
+
+
+def test_send_queued_emails_command(settings, capsys):
+    settings.QUEUE_EMAILS = True
+    queue_email(_message(to=["a@test.com"]))
+    call_command("send_queued_emails", "--batch-size", "1")
+    assert "1 email(s) sent, 0 failed" in capsys.readouterr().out
+    assert len(mail.outbox) == 1
+
+
+def test_booking_succeeds_if_mail_server_is_down(settings, client, student_user, event, dropin_block):
+    settings.QUEUE_EMAILS = True
+    mixin = TestUsersMixin()
+    mixin.make_data_privacy_agreement(student_user)
+    mixin.make_disclaimer(student_user)
+    client.force_login(student_user)
+
+    url = reverse("booking:ajax_toggle_booking", args=(event.id,))
+    with patch.object(EmailBackend, "send_messages", side_effect=SMTPException("Server unavailable")):
+        resp = client.post(url, {"user_id": student_user.id, "ref": "events"})
+    assert resp.status_code == 200
+    assert Booking.objects.filter(user=student_user, event=event, status="OPEN").exists()
+    # the booking email is waiting in the outbox
+    assert mail.outbox == []
+    assert QueuedEmail.objects.filter(status="queued").count() == 1
+    assert send_queued_emails() == (1, 0)
+    assert mail.outbox[0].to == [student_user.email]
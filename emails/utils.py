@@ -0,0 +1,117 @@
+import logging
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from activitylog.models import ActivityLog
+from .models import BulkEmail, QueuedEmail
+
+
+logger = logging.getLogger(__name__)
+
+
+def queue_email(msg):
+    """
+    Save an EmailMessage to the outbox instead of sending it now; it's saved in the current transaction, so it
+    is only sent (by the send_queued_emails command) if the change that triggered it is committed.
+    If settings.QUEUE_EMAILS is False, send it straight away, like msg.send(fail_silently=False)
+    """
+    queued_email = QueuedEmail.from_message(msg)
+    queued_email.save()
+    if not settings.QUEUE_EMAILS:
+        _send_now([queued_email])
+    return queued_email
+
+
+def queue_bulk_email(msg, bcc, chunk_size=None):
+    """
+    Queue an email to a lot of people.  msg is rendered once, and the bcc recipients are split into chunks of
+    chunk_size (defaults to settings.BULK_EMAIL_CHUNK_SIZE); each chunk is a QueuedEmail, so progress is tracked
+    (and failures retried) per chunk.  Any to/cc recipients on msg only get the first chunk.
+    """
+    chunk_size = chunk_size or settings.BULK_EMAIL_CHUNK_SIZE
+    bcc = list(bcc)
+    bcc_chunks = [bcc[i:i + chunk_size] for i in range(0, len(bcc), chunk_size)] or [[]]
+    with transaction.atomic():
+        bulk_email = BulkEmail.objects.create(subject=msg.subject, recipient_count=len(bcc))
+        chunks = []
+        for i, bcc_chunk in enumerate(bcc_chunks):
+            chunk = QueuedEmail.from_message(msg)
+            chunk.bulk_email = bulk_email
+            chunk.bcc = bcc_chunk
+            if i > 0:
+                chunk.to = chunk.cc = []
+            if chunk.recipients():
+                chunks.append(chunk)
+        chunks = QueuedEmail.objects.bulk_create(chunks)
+    if not settings.QUEUE_EMAILS:
+        _send_now(chunks)
+    return bulk_email
+
+
+def _send_now(queued_emails):
+    # send over one connection; errors are raised, as with EmailMessage.send(fail_silently=False)
+    with get_connection() as connection:
+        for queued_email in queued_emails:
+            queued_email.to_message(connection=connection).send(fail_silently=False)
+            queued_email.mark_sent()
+
+
+def _reset_connection(connection):
+    # close the connection after an error, in case it was the connection that failed; the
+    # backend opens a new one for the next message
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+def send_queued_emails(batch_size=None):
+    """
+    Send all queued emails that are due, batch_size at a time, over one email connection.
+    Each batch is locked until it's been sent (skipping any emails another worker has already locked), so
+    it's safe to run more than one worker at a time.
+    Returns the number of emails sent and the number that failed
+    """
+    batch_size = batch_size or settings.EMAIL_QUEUE_BATCH_SIZE
+    sent_count = failed_count = 0
+    connection = get_connection()
+    try:
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    QueuedEmail.objects.select_for_update(skip_locked=True).filter(
+                        status="queued", next_attempt__lte=timezone.now()
+                    )[:batch_size]
+                )
+                if not batch:
+                    break
+                for queued_email in batch:
+                    try:
+                        connection.send_messages([queued_email.to_message(connection=connection)])
+                    except Exception as error:
+                        _reset_connection(connection)
+                        queued_email.mark_failed_attempt(error)
+                        failed_count += 1
+                        if queued_email.status == "failed":
+                            logger.error(
+                                "Queued email %s failed after %s attempts, giving up: %s",
+                                queued_email.id, queued_email.attempts, error
+                            )
+                            ActivityLog.objects.create(
+                                log=f"Email {queued_email.id} ({queued_email.subject}) could not be sent after "
+                                    f"{queued_email.attempts} attempts"
+                            )
+                        else:
+                            logger.warning(
+                                "Queued email %s failed (attempt %s), will retry: %s",
+                                queued_email.id, queued_email.attempts, error
+                            )
+                    else:
+                        queued_email.mark_sent()
+                        sent_count += 1
+    finally:
+        _reset_connection(connection)
+    return sent_count, failed_count
@@ -31,7 +31,15 @@ env = environ.Env(
     USE_CDN=(bool, False),
     MERCHANDISE_CART_TIMEOUT_MINUTES=(int, 15),
     CART_TIMEOUT_MINUTES=(int, 15),
+    CART_SWEEPER_INTERVAL_SECONDS=(int, 60),
     TESTING=(bool, False),
+    EMAIL_QUEUE_BATCH_SIZE=(int, 50),
+    EMAIL_QUEUE_MAX_ATTEMPTS=(int, 5),
+    QUERY_BUDGET_MONITORING=(bool, False),
+    QUERY_BUDGET_DEFAULT=(int, 50),
+    SCHEDULE_CACHE_TIMEOUT=(int, 60),
+    ACTIVITYLOG_BACKUP_BACKEND=(str, "activitylog.backup.S3Backup"),
+    ACTIVITYLOG_BACKUP_LOCAL_DIR=(str, "activitylog_backups"),
 )
 
 
@@ -99,6 +107,7 @@ INSTALLED_APPS = [
     'accounts',
     'activitylog',
     'booking',
+    'emails',
     'merchandise',
     'timetable',
     'studioadmin',
@@ -111,32 +120,65 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, so that its stats include the queries run by the other middleware
+    'common.middleware.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'activitylog.middleware.ActivityLogBufferMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'common.middleware.TimezoneMiddleware',
 ]
 
+# Query budget monitoring (see common/query_budget.py): log requests that run more than their
+# view's budget of SQL queries
+QUERY_BUDGET_MONITORING = env("QUERY_BUDGET_MONITORING")
+QUERY_BUDGET_DEFAULT = env("QUERY_BUDGET_DEFAULT")
+# max queries per request for views that need a tighter budget than the default, keyed by view
+# name (the class name for class-based views).  These are checked with realistic data in
+# booking/tests/test_query_budgets.py; lower them as views are optimised, and don't raise them without
+# finding out why the view needs more queries
+QUERY_BUDGETS = {
+    "EventListView": 18,
+    "CourseListView": 21,
+    "BookingListView": 14,
+    "shopping_basket": 32,
+    "register_view": 12,
+    "ajax_toggle_booking": 51,
+}
+
 if TESTING or env('LOCAL'):  # use local cache for tests
     CACHES = {
         'default': {
             'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
             'LOCATION': 'test-fof',
-        }
+        },
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'test-fof-shared',
+        },
     }
 else:
     CACHES = {
         'default': {
             'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
             'LOCATION': 'fof',
-        }
+        },
+        # shared between worker processes; used for cached reference data (see common/reference_data.py)
+        'shared': env.cache_url('SHARED_CACHE_URL', default='filecache:///tmp/freedom_of_flight_cache'),
     }
 
+# How often each process checks whether its in-memory reference data is still current
+REFERENCE_DATA_VERSION_CHECK_SECONDS = 0 if TESTING else 5
+
+# Rendered track schedules are cached in the shared cache (see booking/schedule_cache.py); they're
+# invalidated by changes to the track's events, but also expire after this long, as events start
+SCHEDULE_CACHE_TIMEOUT = env("SCHEDULE_CACHE_TIMEOUT")
+
 
 AUTHENTICATION_BACKENDS = (
     # Needed to login by username in Django admin, regardless of `allauth`
@@ -254,6 +296,16 @@ DEFAULT_STUDIO_EMAIL = 'freedomofflightaerial@gmail.com'
 SEND_ALL_STUDIO_EMAILS = env("SEND_ALL_STUDIO_EMAILS")
 SUPPORT_EMAIL = 'rebkwok@gmail.com'
 
+# Emails are saved to the outbox and sent by the send_queued_emails command, so requests don't wait
+# on the mail server.  Send them immediately in tests.
+QUEUE_EMAILS = env.bool("QUEUE_EMAILS", default=not TESTING)
+EMAIL_QUEUE_BATCH_SIZE = env("EMAIL_QUEUE_BATCH_SIZE")
+EMAIL_QUEUE_MAX_ATTEMPTS = env("EMAIL_QUEUE_MAX_ATTEMPTS")
+# first retry after 1 min, doubling with each attempt
+EMAIL_QUEUE_RETRY_DELAY_SECONDS = 60
+# max bcc recipients per email for bulk emails
+BULK_EMAIL_CHUNK_SIZE = 99
+
 
 # #####LOGGING######
 LOG_FOLDER = env('LOG_FOLDER')
@@ -287,6 +339,11 @@ if env('CI') or env('LOCAL'):  # pragma: no cover
                 'level': 'INFO',
                 'propogate': True,
             },
+            'emails': {
+                'handlers': ['console'],
+                'level': 'INFO',
+                'propogate': True,
+            },
             'merchandise': {
                 'handlers': ['console'],
                 'level': 'INFO',
@@ -364,6 +421,11 @@ else:  # pragma: no cover
                 'level': 'INFO',
                 'propagate': False,
             },
+            'emails': {
+                'handlers': ['console', 'file_app', 'mail_admins'],
+                'level': 'INFO',
+                'propagate': False,
+            },
             'merchandise': {
                 'handlers': ['console', 'file_app', 'mail_admins'],
                 'level': 'INFO',
@@ -439,6 +501,10 @@ DATA_UPLOAD_MAX_NUMBER_FIELDS = 8000
 
 S3_LOG_BACKUP_PATH = "s3://backups.polefitstarlet.co.uk/freedomofflight_activitylogs"
 S3_LOG_BACKUP_ROOT_FILENAME = "freedomofflight_activity_logs_backup"
+# Where delete_old_activitylogs uploads backups to (see activitylog/backup.py); use
+# activitylog.backup.LocalBackup to copy them to ACTIVITYLOG_BACKUP_LOCAL_DIR instead
+ACTIVITYLOG_BACKUP_BACKEND = env("ACTIVITYLOG_BACKUP_BACKEND")
+ACTIVITYLOG_BACKUP_LOCAL_DIR = env("ACTIVITYLOG_BACKUP_LOCAL_DIR")
 
 SITE_ID=1
 
@@ -490,3 +556,6 @@ STRIPE_ENDPOINT_SECRET = env("STRIPE_ENDPOINT_SECRET")
 
 MERCHANDISE_CART_TIMEOUT_MINUTES = env("MERCHANDISE_CART_TIMEOUT_MINUTES")
 CART_TIMEOUT_MINUTES = env("CART_TIMEOUT_MINUTES")
+# Expired cart items are deleted by a thread in each web process this often; set to 0 to turn it off
+# (and run the sweep_expired_cart_items command instead)
+CART_SWEEPER_INTERVAL_SECONDS = env("CART_SWEEPER_INTERVAL_SECONDS")
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'freedom_of_flight.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.CART_SWEEPER_INTERVAL_SECONDS:
+    from booking.cart_sweeper import start_sweeper_thread  # noqa: E402
+    start_sweeper_thread()
@@ -1,11 +1,14 @@
 
 from django.core.management.base import BaseCommand
 
+from activitylog.buffer import activity_log_buffer
+
 from merchandise.models import ProductPurchase
 
 
 class Command(BaseCommand):
     help = "Delete product purchases that have expired"
 
+    @activity_log_buffer()
     def handle(self, *args, **options):
         ProductPurchase.cleanup_expired_purchases()
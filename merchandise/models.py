@@ -5,7 +5,6 @@ import logging
 from django.db import models
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.db.models.signals import post_delete
@@ -14,7 +13,8 @@ from django.dispatch import receiver
 from imagekit.models import ImageSpecField, ProcessedImageField
 from imagekit.processors import ResizeToFill
 
-from activitylog.models import ActivityLog
+from activitylog.buffer import log_activity
+from common.reference_data import reference_data
 from payments.models import Invoice
 
 
@@ -175,48 +175,38 @@ class ProductPurchase(models.Model):
         self.save()
 
     @classmethod
-    def cleanup_expired_purchases(cls, user=None, use_cache=False):
-        if use_cache:
-            # check cache to see if we cleaned up recently
-            if cache.get("expired_purchases_cleaned"):
-                logger.info("Expired purchases cleaned up within past 2 mins; no cleanup required")
-                return
-
-        # timeout defaults to 15 mins
-        timeout = settings.MERCHANDISE_CART_TIMEOUT_MINUTES
+    def expired_cart_purchases_filter(cls):
+        # unpaid purchases expire after MERCHANDISE_CART_TIMEOUT_MINUTES
+        cutoff = timezone.now() - timedelta(seconds=60 * settings.MERCHANDISE_CART_TIMEOUT_MINUTES)
+        return models.Q(paid=False, created_at__lt=cutoff)
+
+    @classmethod
+    def cleanup_expired_purchases(cls, user=None):
+        """
+        Delete expired unpaid purchases (which returns them to stock).  Run by the cart sweeper
+        (booking.cart_sweeper); pages that show cart items just filter them out.
+        Returns the number of purchases deleted.
+        """
         if user:
-            # If we have a user, we're at the checkout, so get all unpaid purchases for
-            # this user only
-            unpaid_purchases = cls.objects.filter(user=user, paid=False)
+            unpaid_purchases = cls.objects.filter(user=user)
         else:
-            # no user, doing a general cleanup.  Don't delete anything that was time-checked
+            # general cleanup.  Don't delete anything that was time-checked
             # (done at final checkout stage) within the past 5 mins, in case we delete something
             # that's in the process of being paid
-            unpaid_purchases = cls.objects.filter(
-                paid=False, time_checked__lt=timezone.now() - timedelta(seconds=60 * 5)
-            )
-        expired_purchases = unpaid_purchases.filter(
-            created_at__lt=timezone.now() - timedelta(seconds=60 * timeout)
+            unpaid_purchases = cls.objects.filter(time_checked__lt=timezone.now() - timedelta(seconds=60 * 5))
+        expired_purchase_ids = list(
+            unpaid_purchases.filter(cls.expired_cart_purchases_filter()).values_list("id", flat=True)
         )
-        if expired_purchases.exists():
-            if user is not None:
-                ActivityLog.objects.create(
-                    log=f"{expired_purchases.count()} product cart items "
-                        f"(ids {','.join(str(purchase.id) for purchase in expired_purchases.all())} "
-                        f"for user {user} expired and were deleted"
-                )
-            else:
-                ActivityLog.objects.create(
-                    log=f"{expired_purchases.count()} product cart items "
-                        f"(ids {','.join(str(purchase.id) for purchase in expired_purchases.all())} "
-                        f"expired and were deleted"
-                )
-            expired_purchases.delete()
-
-        if use_cache:
-            logger.info("Expired purchases cleaned up")
-            # cache for 2 mins
-            cache.set("expired_purchases_cleaned", True, timeout=60*2)
+        if not expired_purchase_ids:
+            return 0
+        cls.objects.filter(id__in=expired_purchase_ids).delete()
+        log_activity(
+            f"{len(expired_purchase_ids)} product cart items "
+            f"(ids {','.join(str(purchase_id) for purchase_id in expired_purchase_ids)}) "
+            f"{f'for user {user} ' if user is not None else ''}expired and were deleted",
+            action="expired"
+        )
+        return len(expired_purchase_ids)
 
     def save(self, *args, **kwargs):
         if self.product and self.cost and self.size:
@@ -254,6 +244,11 @@ class ProductPurchase(models.Model):
         return super().save(*args, **kwargs)
 
 
+@reference_data("merchandise_available", models=[Product])
+def merchandise_available():
+    return Product.objects.filter(active=True).exists()
+
+
 @receiver(post_delete, sender=ProductPurchase)
 def update_stock(sender, instance, **kwargs):
     stock = ProductPurchase.get_stock(instance)
@@ -1,7 +1,6 @@
 from datetime import datetime, timedelta
 from datetime import timezone as dt_timezone
 
-from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 
@@ -194,9 +193,11 @@ def test_product_purchase_update_stock(user, product, product_variants):
 
 
 @pytest.mark.django_db
-def test_product_purchase_cleanup_with_cache(user, product, product_variants):
+def test_product_purchase_cleanup(user, product, product_variants):
     variant = product_variants[0]
-    purchase1 = baker.make(
+    variant.refresh_from_db()
+    stock = variant.current_stock
+    baker.make(
         ProductPurchase, user=user, product=product, size=variant.size,
         cost=variant.cost, paid=False, created_at=timezone.now() - timedelta(minutes=16),
         time_checked=timezone.now() - timedelta(minutes=10)
@@ -206,20 +207,11 @@ def test_product_purchase_cleanup_with_cache(user, product, product_variants):
         cost=variant.cost, paid=False, created_at=timezone.now() - timedelta(minutes=14),
         time_checked=timezone.now() - timedelta(minutes=10)
     )
-    assert cache.get("expired_purchases_cleaned") is None
-
-    # purchase 1 is deleted
-    ProductPurchase.cleanup_expired_purchases(use_cache=True)
-    assert ProductPurchase.objects.count() == 1
-    assert cache.get("expired_purchases_cleaned")
-
-    # make purchase 2 expired
-    purchase2.created_at = timezone.now() - timedelta(minutes=16)
-    purchase2.save()
-    # not deleted, because cache hasn't expired
-    ProductPurchase.cleanup_expired_purchases(use_cache=True)
-    assert ProductPurchase.objects.count() == 1
-
-    # it does get deleted if we don't use the cache
-    ProductPurchase.cleanup_expired_purchases(use_cache=False)
-    assert ProductPurchase.objects.exists() is False
+    # purchase 1 is deleted, and returned to stock
+    assert ProductPurchase.cleanup_expired_purchases() == 1
+    assert list(ProductPurchase.objects.all()) == [purchase2]
+    variant.refresh_from_db()
+    assert variant.current_stock == stock - 1
+
+    # nothing else expired
+    assert ProductPurchase.cleanup_expired_purchases() == 0
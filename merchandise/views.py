@@ -12,21 +12,21 @@ from braces.views import LoginRequiredMixin
 from activitylog.models import ActivityLog
 from common.utils import start_of_day_in_utc, end_of_day_in_utc, end_of_day_in_local_time
 from payments.models import Invoice
+from booking.conditional_get import ConditionalGetMixin
 from booking.views.views_utils import DataPolicyAgreementRequiredMixin
 
 from .forms import ProductPurchaseForm
 from .models import Product, ProductPurchase, ProductCategory
 
 
-class ProductListView(ListView):
+class ProductListView(ConditionalGetMixin, ListView):
     model = Product
     queryset = Product.objects.filter(active=True)
     template_name = "merchandise/product_list.html"
     context_object_name = "products"
+    etag_versions = ("merchandise",)
 
     def dispatch(self, request, *args, **kwargs):
-        # Cleanup purchases so user is looking at updated stock count
-        ProductPurchase.cleanup_expired_purchases(use_cache=True)
         self.selected_category = None
         selected_category_id = self.request.GET.get("category")
         if selected_category_id is not None:
@@ -70,8 +70,6 @@ def product_purchase_view(request, product_id):
             messages.success(request, f"{product.name} added to cart")
             return HttpResponseRedirect(reverse("merchandise:product", args=(product.id,)))
     else:
-        # Cleanup purchases so user is looking at updated stock count
-        ProductPurchase.cleanup_expired_purchases(use_cache=True)
         form = ProductPurchaseForm(product=product)
 
     context = {"product": product, "form": form}
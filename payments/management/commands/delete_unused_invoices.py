@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand
 
-from activitylog.models import ActivityLog
+from activitylog.buffer import log_activity
 from payments.models import Invoice, StripePaymentIntent
 
 
@@ -14,7 +14,7 @@ class Command(BaseCommand):
             for invoice in unused_invoices:
                 payment_intent = StripePaymentIntent.objects.filter(invoice_id=invoice.id).delete()
                 invoice.delete()
-            ActivityLog.objects.create(log=log)
+            log_activity(log, action="deleted")
             self.stdout.write(log)
         else:
             self.stdout.write("No unpaid unused invoices to delete")
@@ -0,0 +1,98 @@
+# Generated by Django 4.1.2 on 2026-10-17 12:39
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import IntegrityError, migrations, models
+
+
+MAX_DUPLICATES_REPORTED = 20
+
+
+def check_unique(table, column):
+    """
+    Fail with a list of the duplicated values if the column isn't unique yet, rather than with
+    the index build error; they need sorting out by hand (they may be paid)
+    """
+    def check(apps, schema_editor):
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT {column}, COUNT(*) FROM {table} GROUP BY {column} HAVING COUNT(*) > 1 ORDER BY {column}"
+            )
+            duplicates = cursor.fetchall()
+        if duplicates:
+            report = ", ".join(f"{value!r} ({count} rows)" for value, count in duplicates[:MAX_DUPLICATES_REPORTED])
+            if len(duplicates) > MAX_DUPLICATES_REPORTED:
+                report += f" and {len(duplicates) - MAX_DUPLICATES_REPORTED} more"
+            raise IntegrityError(
+                f"{table}.{column} can't be made unique; {len(duplicates)} values are duplicated: {report}"
+            )
+    return migrations.RunPython(check, migrations.RunPython.noop)
+
+
+def unique_concurrently(table, column):
+    """
+    Build the unique index concurrently (so the table isn't locked against writes while it's built),
+    then use it for the unique constraint, which is then only a quick catalog change.
+    A failed concurrent build leaves an invalid index behind, so if the migration is run again
+    after failing part way, drop the constraint or index it left first.
+    """
+    name = f"{table}_{column}_key"
+    return migrations.RunSQL(
+        [
+            f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {name}",
+            f"DROP INDEX CONCURRENTLY IF EXISTS {name}",
+            f"CREATE UNIQUE INDEX CONCURRENTLY {name} ON {table} ({column})",
+            f"ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX {name}",
+        ],
+        f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {name}",
+    )
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('payments', '0013_data_migration_final_metadata'),
+    ]
+
+    operations = [
+        # check both before building anything
+        check_unique("payments_invoice", "invoice_id"),
+        check_unique("payments_stripepaymentintent", "payment_intent_id"),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[unique_concurrently("payments_invoice", "invoice_id")],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='invoice',
+                    name='invoice_id',
+                    field=models.CharField(max_length=255, unique=True),
+                ),
+            ],
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[unique_concurrently("payments_stripepaymentintent", "payment_intent_id")],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='stripepaymentintent',
+                    name='payment_intent_id',
+                    field=models.CharField(max_length=255, unique=True),
+                ),
+            ],
+        ),
+        AddIndexConcurrently(
+            model_name='invoice',
+            index=models.Index(condition=models.Q(('paid', True)), fields=['username', '-date_paid'], name='invoice_paid_user_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='invoice',
+            index=models.Index(condition=models.Q(('paid', False)), fields=['username'], name='invoice_unpaid_user_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='invoice',
+            index=models.Index(condition=models.Q(('paid', True), ('total_voucher_code__isnull', False)), fields=['total_voucher_code'], name='invoice_voucher_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='invoice',
+            index=models.Index(condition=models.Q(('stripe_payment_intent_id__isnull', False)), fields=['stripe_payment_intent_id'], name='invoice_stripe_pi_idx'),
+        ),
+    ]
@@ -3,7 +3,8 @@ from os import environ
 from django.contrib.auth.models import User
 from django.contrib.sites.models import Site
 from django.conf import settings
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Q
 from django.utils import timezone
 
 from hashlib import sha512
@@ -13,7 +14,7 @@ from shortuuid import ShortUUID
 class Invoice(models.Model):
     # username rather than FK; in case we delete the user later, we want to keep financial info
     username = models.CharField(max_length=255)
-    invoice_id = models.CharField(max_length=255)
+    invoice_id = models.CharField(max_length=255, unique=True)
     transaction_id = models.CharField(max_length=255, null=True, blank=True)
     amount = models.DecimalField(decimal_places=2, max_digits=8)
     business_email = models.CharField(max_length=255, null=True, blank=True)
@@ -30,16 +31,42 @@ class Invoice(models.Model):
 
     class Meta:
         ordering = ("-date_paid",)
+        indexes = [
+            # a user's paid invoices (UserInvoiceListView)
+            models.Index(fields=["username", "-date_paid"], condition=Q(paid=True), name="invoice_paid_user_idx"),
+            # a user's unpaid invoices, checked at checkout
+            models.Index(fields=["username"], condition=Q(paid=False), name="invoice_unpaid_user_idx"),
+            # total voucher uses
+            models.Index(
+                fields=["total_voucher_code"], condition=Q(paid=True, total_voucher_code__isnull=False),
+                name="invoice_voucher_idx"
+            ),
+            models.Index(
+                fields=["stripe_payment_intent_id"], condition=Q(stripe_payment_intent_id__isnull=False),
+                name="invoice_stripe_pi_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.invoice_id} - {self.username} - £{self.amount}{' (paid)' if self.paid else ''}"
 
     @classmethod
     def generate_invoice_id(cls):
-        invoice_id = ShortUUID().random(length=22)
-        while Invoice.objects.filter(invoice_id=invoice_id).exists():
-            invoice_id = ShortUUID().random(length=22)
-        return invoice_id
+        return ShortUUID().random(length=22)
+
+    @classmethod
+    def create_with_invoice_id(cls, attempts=5, **kwargs):
+        """
+        Create an invoice with a new random invoice_id.  invoice_id is unique, so rather than checking
+        for an existing one first, just try again with a new id in the (very unlikely) event of a clash
+        """
+        for attempt in range(attempts):
+            try:
+                with transaction.atomic():
+                    return cls.objects.create(invoice_id=cls.generate_invoice_id(), **kwargs)
+            except IntegrityError:
+                if attempt == attempts - 1:
+                    raise
 
     def signature(self):
         return sha512((self.invoice_id + environ["INVOICE_KEY"]).encode("utf-8")).hexdigest()
@@ -153,7 +180,7 @@ class Seller(models.Model):
 
 
 class StripePaymentIntent(models.Model):
-    payment_intent_id = models.CharField(max_length=255)
+    payment_intent_id = models.CharField(max_length=255, unique=True)
     amount = models.PositiveIntegerField()
     description = models.CharField(max_length=255)
     status = models.CharField(max_length=255)
@@ -4,6 +4,7 @@ from unittest.mock import patch
 from hashlib import sha512
 
 import pytest
+from django.db import IntegrityError
 from django.test import TestCase
 
 from model_bakery import baker
@@ -36,13 +37,28 @@ class TestModels(TestCase):
 
     @patch("payments.models.ShortUUID.random")
     def test_generate_invoice_id(self, short_uuid_random):
-        short_uuid_random.side_effect = ["foo123", "foo234", "foo567"]
+        short_uuid_random.side_effect = ["foo123"]
         # inv id generated from random shortuuid
         assert Invoice.generate_invoice_id() == "foo123"
 
-        # if an invoice already exists with that id, try again until we get a unique one
+    @patch("payments.models.ShortUUID.random")
+    def test_create_with_invoice_id(self, short_uuid_random):
+        short_uuid_random.side_effect = ["foo123", "foo234", "foo567"]
+        assert Invoice.create_with_invoice_id(amount=10, username="test").invoice_id == "foo123"
+
+        # if an invoice already exists with that id, try again with a new one
         baker.make(Invoice, invoice_id="foo234")
-        assert Invoice.generate_invoice_id() == "foo567"
+        invoice = Invoice.create_with_invoice_id(amount=10, username="test")
+        assert invoice.invoice_id == "foo567"
+        assert Invoice.objects.filter(username="test").count() == 2
+
+    @patch("payments.models.ShortUUID.random")
+    def test_create_with_invoice_id_gives_up(self, short_uuid_random):
+        short_uuid_random.return_value = "foo123"
+        baker.make(Invoice, invoice_id="foo123")
+        with pytest.raises(IntegrityError):
+            Invoice.create_with_invoice_id(amount=10, username="test")
+        assert short_uuid_random.call_count == 5
 
     @pytest.mark.usefixtures("invoice_keyenv")
     def test_signature(self):
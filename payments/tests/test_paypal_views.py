@@ -417,8 +417,8 @@ class PaypalReturnViewTests(TestUsersMixin, TestCase):
 
         ]
 
-        for (invoice_values, pdt_values, valid) in tests:
-            invoice = baker.make(Invoice, invoice_id="foo", username=self.student_user.username, **invoice_values)
+        for i, (invoice_values, pdt_values, valid) in enumerate(tests):
+            invoice = baker.make(Invoice, invoice_id=f"foo{i}", username=self.student_user.username, **invoice_values)
             baker.make_recipe(
                 'booking.dropin_block', paid=False, invoice=invoice, user=self.student_user
             )
@@ -12,6 +12,7 @@ from model_bakery import baker
 
 from booking.models import Subscription, GiftVoucher
 from common.test_utils import TestUsersMixin
+from emails.models import QueuedEmail
 from merchandise.tests.utils import make_purchase
 from ..models import Invoice, Seller, StripePaymentIntent
 
@@ -543,6 +544,25 @@ class StripeWebhookTests(TestUsersMixin, TestCase):
         assert "WARNING: Something went wrong with a payment!" in mail.outbox[0].subject
         assert "Failed payment intent id: mock-intent-id; invoice id foo" in mail.outbox[0].body
 
+    @override_settings(QUEUE_EMAILS=True)
+    @patch("payments.views.stripe.Webhook")
+    def test_webhook_payment_failed_queues_email(self, mock_webhook):
+        # the webhook doesn't wait on the mail server
+        metadata = {
+            "invoice_id": "foo",
+            "invoice_signature": self.invoice.signature(),
+            **self.invoice.items_metadata(),
+        }
+        mock_webhook.construct_event.return_value = get_mock_webhook_event(
+            webhook_event_type="payment_intent.payment_failed", metadata=metadata
+        )
+        resp = self.client.post(self.url, data={}, HTTP_STRIPE_SIGNATURE="foo")
+        assert resp.status_code == 200
+        assert len(mail.outbox) == 0
+        queued_email = QueuedEmail.objects.get()
+        assert queued_email.to == [settings.SUPPORT_EMAIL]
+        assert queued_email.subject == "WARNING: Something went wrong with a payment!"
+
     @patch("payments.views.stripe.Webhook")
     def test_webhook_payment_requires_action(self, mock_webhook):
         metadata = {
@@ -1,7 +1,8 @@
 import logging
+from django.db import transaction
 from django.urls import reverse
 
-from activitylog.models import ActivityLog
+from activitylog.buffer import log_activity
 from .emails import send_processed_payment_emails
 from .exceptions import PayPalProcessingError, StripeProcessingError, UnknownTransactionError
 from .forms import PayPalPaymentsFormWithId
@@ -205,27 +206,30 @@ def check_stripe_data(payment_intent, invoice):
 
 
 def process_invoice_items(invoice, payment_method, transaction_id=None):
-    for block in invoice.blocks.all():
-        block.paid = True
-        block.save()
-    for subscription in invoice.subscriptions.all():
-        subscription.paid = True
-        subscription.save()
-    for gift_voucher in invoice.gift_vouchers.all():
-        gift_voucher.paid = True
-        gift_voucher.save()
-        gift_voucher.activate()
-    for product_purchase in invoice.product_purchases.all():
-        product_purchase.paid = True
-        product_purchase.save()
-    if transaction_id:
-        invoice.transaction_id = transaction_id
-    invoice.paid = True
-    invoice.save()
-    # SEND EMAILS
-    send_processed_payment_emails(invoice)
-    for gift_voucher in invoice.gift_vouchers.all():
-        gift_voucher.send_voucher_email()
-    ActivityLog.objects.create(
-        log=f"Invoice {invoice.invoice_id} (user {invoice.username}) paid by {payment_method}"
-    )
+    # the emails are queued in the same transaction, so they're only sent if the payment is recorded
+    with transaction.atomic():
+        for block in invoice.blocks.all():
+            block.paid = True
+            block.save()
+        for subscription in invoice.subscriptions.all():
+            subscription.paid = True
+            subscription.save()
+        for gift_voucher in invoice.gift_vouchers.all():
+            gift_voucher.paid = True
+            gift_voucher.save()
+            gift_voucher.activate()
+        for product_purchase in invoice.product_purchases.all():
+            product_purchase.paid = True
+            product_purchase.save()
+        if transaction_id:
+            invoice.transaction_id = transaction_id
+        invoice.paid = True
+        invoice.save()
+        # SEND EMAILS
+        send_processed_payment_emails(invoice)
+        for gift_voucher in invoice.gift_vouchers.all():
+            gift_voucher.send_voucher_email()
+        log_activity(
+            f"Invoice {invoice.invoice_id} (user {invoice.username}) paid by {payment_method}",
+            obj=invoice, action="paid"
+        )
@@ -14,7 +14,7 @@ from braces.views import LoginRequiredMixin
 from paypal.standard.pdt.views import process_pdt
 import stripe
 
-from activitylog.models import ActivityLog
+from activitylog.buffer import log_activity
 from .emails import send_failed_payment_emails, send_processed_refund_emails
 from .exceptions import PayPalProcessingError, StripeProcessingError, UnknownTransactionError
 from .models import Invoice, Seller, StripePaymentIntent
@@ -82,9 +82,7 @@ def paypal_test(request):
         username = "paypal_test"
     else:
         username = request.user.username
-    invoice = Invoice.objects.create(
-        invoice_id=Invoice.generate_invoice_id(), amount=Decimal(1.0), username=username
-    )
+    invoice = Invoice.create_with_invoice_id(amount=Decimal(1.0), username=username)
     paypal_form = get_paypal_form(request, invoice, paypal_test=True)
     return render(request, 'payments/paypal_test.html', {"form": paypal_form})
 
@@ -205,7 +203,7 @@ def stripe_webhook(request):
                 seller.site = None
                 seller.save()
                 logger.info(f"Stripe account disconnected: %s", seller.stripe_user_id)
-                ActivityLog.objects.create(log=f"Stripe account disconnected: {seller.stripe_user_id}")
+                log_activity(f"Stripe account disconnected: {seller.stripe_user_id}", obj=seller, action="disconnected")
         return HttpResponse(status=200)
 
     try:
@@ -0,0 +1,40 @@
+/*
+  The schedule's event cards are cached and shared between users; the user-specific parts of each card
+  (booking buttons and the booked tick) are filled in by the server.  When the browser shows the page
+  from its back/forward cache they may be out of date (e.g. after booking from another page), so fetch
+  them again for all the events on the page in one request.
+
+  Must be imported after events_booking_ajax and add_to_basket_ajax, whose click handlers are
+  attached to the new buttons.
+*/
+var bindScheduleButtons = function($container) {
+  $container.find('.ajax_events_btn').click(_.debounce(processBookingToggleRequest, MILLS_TO_IGNORE, true));
+  $container.find('.ajax_events_waiting_list_btn').click(_.debounce(toggleWaitingList, MILLS_TO_IGNORE, true));
+  $container.find('.ajax_book_course_events_btn').click(_.debounce(processCourseBookingRequest, MILLS_TO_IGNORE, true));
+  $container.find('.ajax_add_to_basket_btn').click(_.debounce(processBookingAddToBasket, MILLS_TO_IGNORE, true));
+  $container.find('.ajax_add_course_to_basket_btn').click(_.debounce(processCourseBookingAddToBasket, MILLS_TO_IGNORE, true));
+};
+
+var refreshScheduleOverlay = function() {
+  var $schedule = $('#schedule');
+  var event_ids = $schedule.find('[id^=user_event_]').map(function() {
+    return $(this).attr('id').replace('user_event_', '');
+  }).get();
+  if (!$schedule.data('overlay_url') || !event_ids.length) {
+    return;
+  }
+  $.get($schedule.data('overlay_url'), $.param({event: event_ids}, true)).done(function(data) {
+    $.each(data.events, function(event_id, parts) {
+      $('#booked_tick_' + event_id).replaceWith(parts.tick);
+      var $buttons = $('#user_event_' + event_id);
+      $buttons.html(parts.buttons);
+      bindScheduleButtons($buttons);
+    });
+  });
+};
+
+$(window).on('pageshow', function(event) {
+  if (event.originalEvent.persisted) {
+    refreshScheduleOverlay();
+  }
+});
@@ -3,6 +3,9 @@ from datetime import timedelta, datetime
 from datetime import timezone as dt_timezone
 
 from django import forms
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.core import mail
 from django.test import TestCase
@@ -13,7 +16,10 @@ from model_bakery import baker
 import pytest
 
 from booking.models import EventType, Booking, Course, Event
+from common import reference_data
 from common.test_utils import TestUsersMixin, EventTestMixin
+from studioadmin.views.utils import get_current_courses, get_not_yet_started_courses, \
+    get_current_and_started_courses, get_past_courses
 
 
 class CourseAdminListViewTests(EventTestMixin, TestUsersMixin, TestCase):
@@ -631,3 +637,83 @@ class CourseUpdateViewTests(EventTestMixin, TestUsersMixin, TestCase):
         self.course.refresh_from_db()
         assert self.course.events.count() == 2
         assert self.course.is_configured()
+
+
+def _make_course_with_events(event_type, *days_from_now):
+    course = baker.make(Course, event_type=event_type, number_of_events=len(days_from_now))
+    for days in days_from_now:
+        baker.make(Event, event_type=event_type, course=course, start=timezone.now() + timedelta(days=days))
+    return course
+
+
+@pytest.mark.django_db
+def test_course_lists_filtered_and_sorted_in_db(event_type, django_assert_num_queries):
+    not_started = _make_course_with_events(event_type, 10, 17)
+    started = _make_course_with_events(event_type, -7, 1)
+    no_events = baker.make(Course, event_type=event_type)
+    past = _make_course_with_events(event_type, -14, -7)
+    older_past = _make_course_with_events(event_type, -30, -20)
+    # cancelled events are ignored
+    cancelled_events = _make_course_with_events(event_type, -2, 2)
+    cancelled_events.events.filter(start__gt=timezone.now()).update(cancelled=True)
+
+    with django_assert_num_queries(1):
+        current = list(get_current_courses())
+        current_starts = [course.start for course in current]
+    assert current == [no_events, started, not_started]
+    assert current_starts == [None, started.start, not_started.start]
+    assert list(get_not_yet_started_courses()) == [no_events, not_started]
+    assert list(get_current_and_started_courses()) == [started, not_started]
+    assert list(get_past_courses()) == [cancelled_events, past, older_past]
+
+    # annotations are used for the course dates and booking counts
+    started_last_event_date = started.last_event_date
+    with django_assert_num_queries(0):
+        assert current[1].last_event_date == started_last_event_date
+        assert current[1].booking_count() == 0
+
+
+@pytest.mark.django_db
+def test_course_admin_list_paginated_in_db(client, event_type):
+    staff_user = baker.make(User, is_staff=True)
+    client.force_login(staff_user)
+    for _ in range(12):
+        _make_course_with_events(event_type, 1, 8)
+    client.get(reverse("studioadmin:courses"))  # warm up cached staff and reference data
+    with CaptureQueriesContext(connection) as page_queries:
+        resp = client.get(reverse("studioadmin:courses"))
+    assert len(resp.context_data["track_courses"][0]["page_obj"].object_list) == 10
+    assert resp.context_data["track_courses"][0]["page_obj"].paginator.count == 12
+
+    # only the courses on the page are fetched, so queries don't increase with the total number of courses
+    for _ in range(12):
+        _make_course_with_events(event_type, 1, 8)
+    with CaptureQueriesContext(connection) as more_courses_page_queries:
+        resp = client.get(reverse("studioadmin:courses"))
+    assert resp.context_data["track_courses"][0]["page_obj"].paginator.count == 24
+    assert len(more_courses_page_queries) == len(page_queries)
+
+
+@pytest.mark.django_db
+def test_course_admin_list_query_count_does_not_depend_on_courses_on_page(client, event_type):
+    staff_user = baker.make(User, is_staff=True)
+    client.force_login(staff_user)
+
+    def _get_course_list():
+        reference_data.clear()
+        client.get(reverse("studioadmin:courses"))  # warm up cached staff and reference data
+        with CaptureQueriesContext(connection) as queries:
+            resp = client.get(reverse("studioadmin:courses"))
+        return resp, queries
+
+    for _ in range(2):
+        _make_course_with_events(event_type, 1, 8)
+    resp, few_courses_queries = _get_course_list()
+    assert len(resp.context_data["track_courses"][0]["page_obj"].object_list) == 2
+
+    for _ in range(6):
+        course = _make_course_with_events(event_type, 1, 8)
+        baker.make(Booking, event=course.events.first())
+    resp, more_courses_queries = _get_course_list()
+    assert len(resp.context_data["track_courses"][0]["page_obj"].object_list) == 8
+    assert len(more_courses_queries) == len(few_courses_queries)
@@ -6,10 +6,12 @@ from model_bakery import baker
 from django import forms
 from django.urls import reverse
 from django.core import mail
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
-from booking.models import Event, Booking, EventType
+from booking.models import Course, Event, Booking, EventType
 from common.test_utils import TestUsersMixin, EventTestMixin
 
 
@@ -106,6 +108,40 @@ class EventAdminListViewTests(EventTestMixin, TestUsersMixin, TestCase):
         assert len(resp.context_data["track_events"][1]["page_obj"].object_list) == 20
 
 
+    def _make_events_with_bookings(self, track, quantity, course=False):
+        event_type = baker.make(EventType, track=track)
+        events = baker.make_recipe(
+            'booking.future_event', event_type=event_type, _quantity=quantity,
+            course=baker.make(Course, event_type=event_type, number_of_events=quantity) if course else None,
+        )
+        for event in events:
+            baker.make(Booking, event=event)
+        return events
+
+    def test_number_of_queries_is_fixed(self):
+        self.login(self.staff_user)
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as initial_queries:
+            resp = self.client.get(self.url)
+        assert resp.status_code == 200
+
+        # more events (with bookings), event types and courses on each track
+        self._make_events_with_bookings(self.adult_track, 10)
+        self._make_events_with_bookings(self.adult_track, 5, course=True)
+        self._make_events_with_bookings(self.kids_track, 5, course=True)
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(self.url)
+        assert len(queries) == len(initial_queries)
+        adult_events = resp.context_data["track_events"][0]
+        assert len(adult_events["page_obj"].object_list) == 20
+        # grouped by date, in start order
+        grouped_events = [event for events in adult_events["events_by_date"].values() for event in events]
+        assert grouped_events == adult_events["page_obj"].object_list
+        for event_date, events in adult_events["events_by_date"].items():
+            assert all(timezone.localtime(event.start).date() == event_date for event in events)
+        assert {event.booking_count for event in grouped_events} == {0, 1}
+
+
 class PastEventAdminListViewTests(EventTestMixin, TestUsersMixin, TestCase):
 
     def setUp(self):
@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
 from datetime import timedelta
+from io import BytesIO
 from model_bakery import baker
+from openpyxl import load_workbook
 
 from django.core import mail
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from django.test import TestCase
@@ -44,6 +48,27 @@ class EventRegisterListViewTests(EventTestMixin, TestUsersMixin, TestCase):
         assert "Click for register" in resp.rendered_content
 
 
+    def test_number_of_queries_is_fixed(self):
+        self.login(self.staff_user)
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as initial_queries:
+            self.client.get(self.url)
+
+        events = baker.make_recipe(
+            "booking.future_event", event_type=self.aerial_event_type, _quantity=10,
+            course=baker.make(Course, event_type=self.aerial_event_type, number_of_events=10)
+        )
+        for event in events:
+            baker.make(Booking, event=event)
+            baker.make(WaitingListUser, event=event, _quantity=2)
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(self.url)
+        assert len(queries) == len(initial_queries)
+        page_events = resp.context_data["track_events"][0]["page_obj"].object_list
+        assert len(page_events) == 10
+        assert {event.waiting_list_count for event in page_events} == {0, 2}
+
+
 class RegisterViewTests(TestUsersMixin, TestCase):
 
     def setUp(self):
@@ -239,4 +264,32 @@ class AjaxUpdateBookingNotesTests(TestUsersMixin, TestCase):
         self.client.post(self.url, data={"notes": "new note"})
         self.booking.refresh_from_db()
         assert self.booking.notes == "new note"
-    
\ No newline at end of file
+    
+
+class DownloadRegisterTests(EventTestMixin, TestUsersMixin, TestCase):
+
+    def setUp(self):
+        self.create_test_setup()
+        self.create_users()
+        self.create_admin_users()
+        self.event = self.aerial_events[0]
+        for user in [self.student_user, self.student_user1]:
+            self.make_disclaimer(user)
+            baker.make(Booking, event=self.event, user=user)
+        self.url = reverse("studioadmin:download_register", args=(self.event.id,))
+        self.login(self.staff_user)
+
+    def test_download_register(self):
+        resp = self.client.get(self.url)
+        assert resp.streaming
+        sheet = load_workbook(BytesIO(b"".join(resp.streaming_content))).active
+        rows = list(sheet.values)
+        assert rows[0][0] == "Name"
+        assert {row[0] for row in rows[1:]} == {"Student User", "Student1 User"}
+        assert sheet.column_dimensions["A"].width == 20
+
+    def test_download_register_csv(self):
+        resp = self.client.get(self.url + "?format=csv")
+        content = b"".join(resp.streaming_content).decode()
+        assert resp["Content-Type"] == "text/csv"
+        assert len(content.splitlines()) == 3
@@ -1,6 +1,9 @@
+import csv
 from datetime import timedelta
+from io import BytesIO
 
 from model_bakery import baker
+from openpyxl import load_workbook
 
 from django.contrib.auth.models import User
 from django.core import mail
@@ -993,3 +996,32 @@ class DeleteUserBlockViewTests(EventTestMixin, TestUsersMixin, TestCase):
         resp = self.client.post(self.url, args=(self.block.id,))
         assert resp.status_code == 400
         assert self.student_user.blocks.exists() is True
+
+
+class ExportUsersTests(TestUsersMixin, TestCase):
+
+    def setUp(self):
+        self.create_admin_users()
+        self.create_users()
+        self.login(self.staff_user)
+        self.url = reverse("studioadmin:export_users")
+
+    def test_export_xlsx(self):
+        resp = self.client.get(self.url)
+        assert resp.streaming
+        workbook = load_workbook(BytesIO(b"".join(resp.streaming_content)))
+        rows = list(workbook["Students"].values)
+        assert rows[0] == ("First Name", "Last Name", "Email", "Managed Users")
+        # users without emails (child users) aren't exported
+        exported_emails = {row[2] for row in rows[1:]}
+        assert exported_emails == set(
+            User.objects.filter(is_active=True).exclude(email="").values_list("email", flat=True)
+        )
+
+    def test_export_csv(self):
+        resp = self.client.get(self.url + "?format=csv")
+        assert resp.streaming
+        assert resp["Content-Disposition"] == "attachment; filename=students.csv"
+        rows = list(csv.reader(b"".join(resp.streaming_content).decode().splitlines()))
+        assert rows[0] == ["First Name", "Last Name", "Email", "Managed Users"]
+        assert len(rows) == User.objects.filter(is_active=True).exclude(email="").count() + 1
@@ -14,6 +14,7 @@ from django.urls import reverse
 from braces.views import LoginRequiredMixin
 
 from activitylog.models import ActivityLog
+from booking.availability import prefetch_course_occupancy
 from booking.email_helpers import send_bcc_emails
 from booking.models import Booking, Course, Event, Track, EventType
 from common.utils import full_name
@@ -62,12 +63,12 @@ class CourseAdminListView(LoginRequiredMixin, StaffUserMixin, ListView):
         track_courses = []
         check_tab = False
         for i, track in enumerate(tracks):
-            track_queryset = [course for course in all_courses if course.event_type.track == track]
-            if track_queryset:
+            track_queryset = all_courses.filter(event_type__track=track).select_related("event_type")
+            track_paginator = Paginator(track_queryset, self.custom_paginate_by)
+            # Don't add the track tab if there are no events to display
+            if track_paginator.count:
                 if i == tab:
                     check_tab = True
-                # Don't add the track tab if there are no events to display
-                track_paginator = Paginator(track_queryset, self.custom_paginate_by)
                 page = 1
                 if "tab" in self.request.GET and tab == i:
                     try:
@@ -75,6 +76,7 @@ class CourseAdminListView(LoginRequiredMixin, StaffUserMixin, ListView):
                     except ValueError:
                         pass
                 page_obj = track_paginator.get_page(page)
+                prefetch_course_occupancy(page_obj.object_list)
                 track_obj = {
                     'index': i,
                     'page_obj': page_obj,
@@ -6,6 +6,7 @@ from math import ceil
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 
+from django.conf import settings
 from django.contrib import messages
 from django.core.mail.message import EmailMultiAlternatives
 from django.db.models import Q
@@ -16,6 +17,7 @@ from django.shortcuts import HttpResponseRedirect
 from django.utils.safestring import mark_safe
 
 from booking.models import Event, Booking, Course
+from emails.utils import queue_bulk_email
 
 from studioadmin.forms.email_users_forms import EmailUsersForm, ChooseUsersFormSet, UserFilterForm
 from studioadmin.views.utils import staff_required, url_with_querystring
@@ -140,48 +142,33 @@ def email_users_view(request, template_name='studioadmin/email_users_form.html')
                 # bcc recipients
                 email_addresses = [user.contact_email for user in users_to_email]
                 email_count = len(email_addresses)
-                number_of_emails = ceil(email_count / 99)
-
-                if test_email:
-                    email_lists = [[from_address]]
-                else:
-                    email_lists = [email_addresses]  # will be a list of lists
-                    # split into multiple emails of 99 bcc plus 1 cc
-                    if email_count > 99:
-                        email_lists = [
-                            email_addresses[i : i + 99]
-                            for i in range(0, email_count, 99)
-                            ]
+                number_of_emails = ceil(email_count / settings.BULK_EMAIL_CHUNK_SIZE)
 
                 host = 'http://{}'.format(request.META.get('HTTP_HOST'))
+                ctx = {
+                          'subject': subject,
+                          'message': message,
+                          'number_of_emails': number_of_emails,
+                          'email_count': email_count,
+                          'is_test': test_email,
+                          'host': host,
+                      }
+                # render once; the bulk email is split into chunks of bcc recipients (the first chunk
+                # is also cc'd to the sender) and sent in the background
+                msg = EmailMultiAlternatives(
+                    subject,
+                    get_template('studioadmin/email/email_users.txt').render(ctx),
+                    cc=[from_address] if (cc and not test_email) else [],
+                    reply_to=[from_address]
+                    )
+                bulk_email = queue_bulk_email(msg, [from_address] if test_email else email_addresses)
 
-                for i, email_list in enumerate(email_lists):
-                    ctx = {
-                              'subject': subject,
-                              'message': message,
-                              'number_of_emails': number_of_emails,
-                              'email_count': email_count,
-                              'is_test': test_email,
-                              'host': host,
-                          }
-                    msg = EmailMultiAlternatives(
-                        subject,
-                        get_template(
-                            'studioadmin/email/email_users.txt').render(
-                                ctx
-                            ),
-                        bcc=email_list,
-                        cc=[from_address]
-                        if (i == 0 and cc and not test_email) else [],
-                        reply_to=[from_address]
-                        )
-                    msg.send(fail_silently=False)
-
-                    if not test_email:
+                if not test_email:
+                    for chunk in bulk_email.chunks.all():
                         ActivityLog.objects.create(
                             log='Bulk email with subject "{}" sent to users {} by'
                                 ' admin user {}'.format(
-                                    subject, ', '.join(email_list),
+                                    subject, ', '.join(chunk.bcc),
                                     request.user.username
                                 )
                         )
@@ -5,67 +5,71 @@ from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from django.db.models import Count, QuerySet
+from django.db.models import Count
 from django.template.response import TemplateResponse
 from django.shortcuts import get_object_or_404, render, HttpResponseRedirect
 from django.views.generic import ListView, CreateView, UpdateView
 from django.utils import timezone
+from django.utils.functional import cached_property
 from django.urls import reverse
 
 from braces.views import LoginRequiredMixin
 
 from activitylog.models import ActivityLog
 from booking.email_helpers import send_bcc_emails
+from booking.availability import prefetch_availability
 from booking.models import Booking, Event, Track, EventType
 
 from ..forms.forms import EventCreateUpdateForm
 from .utils import is_instructor_or_staff, staff_required, StaffUserMixin, InstructorOrStaffUserMixin
 
 
+class CountedPaginator(Paginator):
+    """Paginator for a queryset whose count is already known, so it doesn't need a COUNT query"""
+
+    def __init__(self, object_list, per_page, count):
+        super().__init__(object_list, per_page)
+        self._count = count
+
+    @cached_property
+    def count(self):
+        return self._count
+
+
 class TrackEventPaginationMixin:
-    def paginate_by_date_for_track(self, track_queryset, page):
-        track_paginator = Paginator(track_queryset, self.custom_paginate_by)
+    """
+    Paginate a list view's queryset separately for each track, in a fixed number of queries:
+    one aggregate query for the number of items in each track (tracks with none don't get a tab),
+    and one query per track for its current page, which is grouped (by date, by default) in memory.
+    """
+    custom_paginate_by = 20
+    group_context_name = "events_by_date"
+
+    def get_page_number(self, paginator, page):
         try:
-            page = track_paginator.validate_number(page)
+            return paginator.validate_number(page)
         except PageNotAnInteger:
-            page = 1
+            return 1
         except EmptyPage:
             page = int(page)
-            page = 1 if page < 1 else track_paginator.num_pages
-        page_obj = track_paginator.get_page(page)
-        if not isinstance(page_obj.object_list, QuerySet):
-            paginated_ids = [event.id for event in page_obj.object_list]
-            paginated_events = track_queryset.filter(id__in=paginated_ids)
-        else:  # pragma: no cover
-            paginated_events = page_obj.object_list
-        event_ids_by_date = paginated_events.values('start__date').annotate(count=Count('id')).values('start__date', 'id')
-        events_by_date = {}
-        for event_info in event_ids_by_date:
-            events_by_date.setdefault(event_info["start__date"], []).append(paginated_events.get(id=event_info["id"]))
-        
-        page_range = track_paginator.get_elided_page_range(number=page, on_each_side=2)
-        return page_obj, page_range, events_by_date
-
+            return 1 if page < 1 else paginator.num_pages
 
-class BaseEventAdminListView(TrackEventPaginationMixin, ListView):
-    model = Event
-    custom_paginate_by = 20
+    def get_page_queryset(self, track_queryset):
+        return track_queryset
 
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        start_of_today = datetime.combine(timezone.now().date(), datetime.min.time(), tzinfo=dt_timezone.utc)
-        return queryset.filter(start__gte=start_of_today).order_by("start")
+    def group_page(self, page_items):
+        events_by_date = {}
+        for event in page_items:
+            events_by_date.setdefault(timezone.localtime(event.start).date(), []).append(event)
+        return events_by_date
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        all_events = self.get_queryset()
+    def paginate_by_track(self, queryset, context):
         track_id = self.request.GET.get('track')
-        requested_track = None
+        requested_track_id = None
         if track_id:
             try:
-                track_id = int(track_id)
-                requested_track = Track.objects.get(id=track_id)
-            except (ValueError, Track.DoesNotExist):
+                requested_track_id = int(track_id)
+            except ValueError:
                 pass
 
         # paginate each queryset
@@ -74,36 +78,56 @@ class BaseEventAdminListView(TrackEventPaginationMixin, ListView):
             tab = int(tab)
         except ValueError:  # value error if tab is not an integer, default to 0
             tab = 0
-
         context['tab'] = str(tab)
-        tracks = Track.objects.all()
-        track_events = []
-
-        for i, track in enumerate(tracks):
-            track_qs = all_events.filter(event_type__track=track)
-            # group by date before pagination
-            if track_qs:
-                # Don't add the track tab if there are no events to display
-                page = 1
-                if "tab" in self.request.GET and tab == i:
-                    # only get the page from the request for the current tab
-                    page = self.request.GET.get('page', 1)
-                page_obj, page_range, events_by_date = self.paginate_by_date_for_track(track_qs, page)
-                
-                track_obj = {
-                    'index': i,
-                    'page_obj': page_obj,
-                    'page_range': page_range,
-                    'events_by_date': events_by_date,
-                    'track': track.name
-                }
-                track_events.append(track_obj)
-
-                if requested_track and requested_track == track:
-                    # we returned here from another view that was on a particular track, we want to set the
-                    # tab to that track
-                    context["active_tab"] = i
 
+        track_counts = dict(
+            queryset.order_by().values_list("event_type__track").annotate(count=Count("id"))
+        )
+        track_pages = []
+        for i, track in enumerate(Track.objects.all()):
+            if not track_counts.get(track.id):
+                # Don't add the track tab if there is nothing to display
+                continue
+            paginator = CountedPaginator(
+                self.get_page_queryset(queryset.filter(event_type__track=track)), self.custom_paginate_by,
+                count=track_counts[track.id],
+            )
+            page = 1
+            if "tab" in self.request.GET and tab == i:
+                # only get the page from the request for the current tab
+                page = self.request.GET.get('page', 1)
+            page_obj = paginator.page(self.get_page_number(paginator, page))
+            page_obj.object_list = list(page_obj.object_list)
+            track_pages.append({
+                'index': i,
+                'page_obj': page_obj,
+                'page_range': paginator.get_elided_page_range(number=page_obj.number, on_each_side=2),
+                self.group_context_name: self.group_page(page_obj.object_list),
+                'track': track.name
+            })
+            if track.id == requested_track_id:
+                # we returned here from another view that was on a particular track, we want to set the
+                # tab to that track
+                context["active_tab"] = i
+        return track_pages
+
+
+class BaseEventAdminListView(TrackEventPaginationMixin, ListView):
+    model = Event
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        start_of_today = datetime.combine(timezone.now().date(), datetime.min.time(), tzinfo=dt_timezone.utc)
+        return queryset.filter(start__gte=start_of_today).order_by("start")
+
+    def get_page_queryset(self, track_queryset):
+        return track_queryset.select_related("event_type", "course")
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        track_events = self.paginate_by_track(self.get_queryset(), context)
+        # course start dates for all the pages at once
+        prefetch_availability([event for track_obj in track_events for event in track_obj["page_obj"].object_list])
         context['track_events'] = track_events
         return context
 
@@ -111,6 +135,9 @@ class BaseEventAdminListView(TrackEventPaginationMixin, ListView):
 class EventAdminListView(LoginRequiredMixin, StaffUserMixin, BaseEventAdminListView):
     template_name = "studioadmin/events.html"
 
+    def get_page_queryset(self, track_queryset):
+        return super().get_page_queryset(track_queryset).annotate(booking_count=Count("bookings"))
+
 
 class PastEventAdminListView(EventAdminListView):
     template_name = "studioadmin/events.html"
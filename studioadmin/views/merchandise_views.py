@@ -73,10 +73,6 @@ class ProductListView(LoginRequiredMixin, StaffUserMixin, ListView):
     context_object_name = 'products'
     paginate_by = 10
 
-    def dispatch(self, request, *args, **kwargs):
-        ProductPurchase.cleanup_expired_purchases(use_cache=True)
-        return super().dispatch(request, *args, **kwargs)
-
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["categories"] = ProductCategory.objects.all()
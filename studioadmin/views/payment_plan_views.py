@@ -16,7 +16,7 @@ from booking.models import EventType, BlockConfig, DisabledBlockConfig, Subscrip
 from common.utils import full_name
 
 from ..forms.forms import BlockConfigForm, SubscriptionConfigForm, BookableEventTypesForm
-from .utils import staff_required, StaffUserMixin, generate_workbook_response
+from .utils import staff_required, StaffUserMixin, generate_export_response
 
 
 
@@ -99,7 +99,9 @@ class BlockPurchaseList(LoginRequiredMixin, StaffUserMixin, ListView):
 @staff_required
 def download_block_config_purchases(request, block_config_id):
     block_config = get_object_or_404(BlockConfig, pk=block_config_id)
-    purchased_blocks = Block.objects.filter(block_config=block_config, paid=True).order_by("-purchase_date")
+    purchased_blocks = Block.objects.filter(block_config=block_config, paid=True).select_related(
+        "user", "voucher", "invoice"
+    ).order_by("-purchase_date")
 
     filename = f"{slugify(block_config.name)}_purchases_{timezone.now().isoformat()}.xlsx"
     sheet_name = slugify(block_config.name)[:31]
@@ -117,7 +119,7 @@ def download_block_config_purchases(request, block_config_id):
             block.invoice.invoice_id if block.invoice else ""
         ]
 
-    return generate_workbook_response(filename, sheet_name, header_info, purchased_blocks, block_to_row)
+    return generate_export_response(request, filename, sheet_name, header_info, purchased_blocks, block_to_row)
 
 
 @require_http_methods(['POST'])
@@ -2,6 +2,8 @@ from datetime import timedelta
 
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db import transaction
+from django.db.models import Count
 from django.http import HttpResponseBadRequest, JsonResponse, HttpResponse, HttpResponseRedirect
 from django.template.response import TemplateResponse
 from django.template.loader import render_to_string
@@ -13,19 +15,15 @@ from django.urls import reverse
 
 from braces.views import LoginRequiredMixin
 
-from openpyxl import Workbook
-from openpyxl.writer.excel import save_virtual_workbook
-from openpyxl.cell.cell import WriteOnlyCell
-from openpyxl.styles import Alignment, Font
-
 from activitylog.models import ActivityLog
 from booking.email_helpers import send_waiting_list_email
+from booking.entitlements import UserEntitlements
 from booking.models import Booking, Event, WaitingListUser
-from common.utils import full_name
+from common.utils import full_name, retry_on_lock_contention
 
 from ..forms.forms import AddRegisterBookingForm
 from .event_views import BaseEventAdminListView
-from .utils import is_instructor_or_staff, InstructorOrStaffUserMixin, generate_workbook_response
+from .utils import is_instructor_or_staff, InstructorOrStaffUserMixin, generate_export_response
 
 
 class RegisterListView(LoginRequiredMixin, InstructorOrStaffUserMixin, BaseEventAdminListView):
@@ -36,25 +34,48 @@ class RegisterListView(LoginRequiredMixin, InstructorOrStaffUserMixin, BaseEvent
         queryset = super().get_queryset()
         return queryset.filter(cancelled=False)
 
+    def get_page_queryset(self, track_queryset):
+        return super().get_page_queryset(track_queryset).annotate(waiting_list_count=Count("waitinglistusers"))
+
 
 @login_required
 @is_instructor_or_staff
+@retry_on_lock_contention
 def register_view(request, event_id):
     template = 'studioadmin/register.html'
     event = get_object_or_404(Event, pk=event_id)
     bookings = event.bookings.filter(status="OPEN").order_by('date_booked')
 
     if request.method == 'POST':
-        add_booking_form = AddRegisterBookingForm(request.POST, event=event)
-        if event.spaces_left > 0:
-            if add_booking_form.is_valid():
-                if add_booking_form.cleaned_data.get("user"):
-                    process_event_booking_updates(add_booking_form, event, request)       
-        else:
-            messages.error(request, 'Event is now full, booking could not be created.')
+        with transaction.atomic():
+            # Lock the event while we check for spaces and add the booking, so a booking made by
+            # a student at the same time can't take the same space
+            event = Event.objects.select_for_update().get(pk=event_id)
+            add_booking_form = AddRegisterBookingForm(request.POST, event=event)
+            if event.spaces_left > 0:
+                if add_booking_form.is_valid():
+                    if add_booking_form.cleaned_data.get("user"):
+                        process_event_booking_updates(add_booking_form, event, request)
+            else:
+                messages.error(request, 'Event is now full, booking could not be created.')
         return HttpResponseRedirect(reverse("studioadmin:register", args=(event_id,)))
     
     form = AddRegisterBookingForm(event=event)
+    bookings = list(
+        bookings.select_related(
+            "user__userprofile", "user__childuserprofile", "block__block_config", "subscription__config"
+        )
+    )
+    # for bookings with no block or subscription, check whether the user has one that could be used, with
+    # all the users' blocks and subscriptions fetched together rather than once per booking
+    unassigned_bookings = [
+        booking for booking in bookings if not (booking.block_id or booking.subscription_id or booking.no_show)
+    ]
+    entitlements = UserEntitlements.for_users({booking.user for booking in unassigned_bookings})
+    for booking in unassigned_bookings:
+        user_entitlements = entitlements[booking.user_id]
+        booking.has_available_payment = user_entitlements.has_available_subscription(event) \
+            or user_entitlements.has_available_block(event)
 
     return TemplateResponse(
         request, template, {
@@ -155,7 +176,9 @@ def ajax_toggle_attended(request, booking_id):
 @is_instructor_or_staff
 def download_register(request, event_id):
     event = get_object_or_404(Event, pk=event_id)
-    bookings = event.bookings.filter(status="OPEN", no_show=False)
+    bookings = event.bookings.filter(status="OPEN", no_show=False).select_related(
+        "user__userprofile", "user__childuserprofile"
+    )
 
     childrens_event = False
     if bookings.exists() and bookings.first().user.age < 17:
@@ -198,7 +221,7 @@ def download_register(request, event_id):
         ]
         return row
 
-    return generate_workbook_response(filename, worksheet_name, header_info, bookings, booking_to_row)
+    return generate_export_response(request, filename, worksheet_name, header_info, bookings, booking_to_row)
 
     
 @login_required
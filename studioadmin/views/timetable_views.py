@@ -2,8 +2,6 @@ from datetime import datetime, timedelta
 
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.paginator import Paginator
-from django.db.models import Count, QuerySet
 from django.http import JsonResponse
 from django.template.response import TemplateResponse
 from django.shortcuts import render, HttpResponseRedirect
@@ -13,86 +11,42 @@ from django.urls import reverse
 from braces.views import LoginRequiredMixin
 
 from activitylog.models import ActivityLog
+from booking.conditional_get import ConditionalGetMixin
 from booking.models import Event, Track, EventType
 from common.utils import full_name
 from timetable.models import TimetableSession
 
 from ..forms.forms import TimetableSessionCreateUpdateForm, UploadTimetableForm
 from .utils import staff_required, StaffUserMixin, utc_adjusted_datetime
-from .event_views import EventCreateView, EventUpdateView
+from .event_views import EventCreateView, EventUpdateView, TrackEventPaginationMixin
 
 
-class TimetableSessionListView(LoginRequiredMixin, StaffUserMixin, ListView):
+class TimetableSessionListView(
+    LoginRequiredMixin, StaffUserMixin, ConditionalGetMixin, TrackEventPaginationMixin, ListView
+):
 
     model = TimetableSession
     template_name = "studioadmin/timetable.html"
-    custom_paginate_by = 20
+    group_context_name = "sessions_by_day"
+
+    etag_versions = ("timetable",)
 
     def get_queryset(self):
         return super().get_queryset().order_by("day", "time")
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        all_sessions = self.get_queryset()
-
-        track_id = self.request.GET.get('track')
-        requested_track = None
-        if track_id:
-            try:
-                track_id = int(track_id)
-                requested_track = Track.objects.get(id=track_id)
-            except (ValueError, Track.DoesNotExist):
-                pass
-
-        # paginate each queryset
-        tab = self.request.GET.get('tab', 0)
-        try:
-            tab = int(tab)
-        except ValueError:  # value error if tab is not an integer, default to 0
-            tab = 0
-        context['tab'] = str(tab)
-
-        tracks = Track.objects.all()
-        track_sessions = []
+    def get_page_queryset(self, track_queryset):
+        return track_queryset.select_related("event_type")
 
+    def group_page(self, page_items):
         day_names = dict(TimetableSession.DAY_CHOICES)
-        for i, track in enumerate(tracks):
-            track_queryset = all_sessions.filter(event_type__track=track)
-            if track_queryset:
-                # Don't add the track tab if there are no sessions to display
-                track_paginator = Paginator(track_queryset, self.custom_paginate_by)
-                page = 1
-                if "tab" in self.request.GET and tab == i:
-                    try:
-                        page = int(self.request.GET.get('page', 1))
-                    except ValueError:
-                        pass
-                page_obj = track_paginator.get_page(page)
-                if not isinstance(page_obj.object_list, QuerySet):
-                    paginated_ids = [session.id for session in page_obj.object_list]
-                    paginated_sessions = track_queryset.filter(id__in=paginated_ids)
-                else:  # pragma: no cover
-                    paginated_sessions = page_obj.object_list
-                session_ids_by_day = paginated_sessions.values('day').annotate(count=Count('id')).values('day', 'id')
-                sessions_by_day = {}
-                for session_item in session_ids_by_day:
-                    sessions_by_day.setdefault(
-                        day_names[session_item["day"]], []
-                    ).append(track_queryset.get(id=session_item["id"]))
-                track_obj = {
-                    'index': i,
-                    'page_obj': page_obj,
-                    'sessions_by_day': sessions_by_day,
-                    'track': track.name
-                }
-                track_sessions.append(track_obj)
+        sessions_by_day = {}
+        for session in page_items:
+            sessions_by_day.setdefault(day_names[session.day], []).append(session)
+        return sessions_by_day
 
-                if requested_track and requested_track == track:
-                    # we returned here from another view that was on a particular track, we want to set the
-                    # tab to that track
-                    context["active_tab"] = i
-
-        context['track_sessions'] = track_sessions
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['track_sessions'] = self.paginate_by_track(self.get_queryset(), context)
         return context
 
 
@@ -25,7 +25,7 @@ from ..forms.forms import (
     EmailUsersForEventOrCourseForm, SearchForm, AddEditBookingForm, AddEditBlockForm, AddEditSubscriptionForm,
     CourseBookingAddChangeForm, EmailWaitingListUsersForm
 )
-from .utils import staff_required, is_instructor_or_staff, InstructorOrStaffUserMixin, generate_workbook_response
+from .utils import staff_required, is_instructor_or_staff, InstructorOrStaffUserMixin, generate_export_response
 
 
 @login_required
@@ -106,9 +106,7 @@ def process_form_and_send_email(request, form):
 def users_with_unused_blocks(request):
     unused_blocks_by_config = {}
     for block_config in BlockConfig.objects.all():
-        unused_blocks = [
-            block for block in Block.objects.filter(block_config=block_config, paid=True) if block.active_block and not block.bookings.exists()
-        ]
+        unused_blocks = list(Block.objects.active().filter(block_config=block_config, used_count=0))
         if unused_blocks:
             unused_blocks_by_config[block_config.name] = unused_blocks
     context = {"unused_blocks_by_config": unused_blocks_by_config}
@@ -139,7 +137,7 @@ def export_users(request):
                 ", ".join([full_name(managed_user) for managed_user in managed_users])
             ]
 
-    return generate_workbook_response(filename, sheet_title, header_info, users, user_to_row)
+    return generate_export_response(request, filename, sheet_title, header_info, users, user_to_row)
 
 
 class UserListView(LoginRequiredMixin, InstructorOrStaffUserMixin, ListView):
@@ -391,7 +389,7 @@ class BlockMixin:
     def form_valid(self, form):
         block = form.save(commit=False)
         if block.id:
-            if block.bookings.count() > block.block_config.size:
+            if block.used_count > block.block_config.size:
                 form.add_error("block_config", "Too many bookings already made against block; cannot change to this block type")
 
         if form.is_valid():
@@ -1,82 +1,63 @@
-from datetime import datetime
-from datetime import timezone as dt_timezone
 
+import csv
 from functools import wraps
+import tempfile
 from urllib.parse import urlencode
 
 from django.core.cache import cache
+from django.db.models import F, Q, QuerySet
 from django.contrib.auth.models import Group
-from django.http import HttpResponse
+from django.http import FileResponse, StreamingHttpResponse
 from django.urls import reverse
 from django.shortcuts import HttpResponseRedirect
 from django.utils import timezone
 
-from delorean import Delorean
-
 from openpyxl import Workbook
-from openpyxl.writer.excel import save_virtual_workbook
 from openpyxl.cell.cell import WriteOnlyCell
 from openpyxl.styles import Alignment, Font
+from openpyxl.utils import get_column_letter
 
 from booking.models import Course
+from common.date_utils import local_adjusted_datetime
 
 
-def _include_future_course(course, start_of_today):
-    if course.last_event_date is None:
-        return True
-    else:
-        return course.last_event_date >= start_of_today
-
-
-def _include_not_started_course(course, start_of_today):
-    if course.last_event_date is None:
-        return True
-    else:
-        return course.start >= start_of_today
-
-
-def _include_current_started_only(course, start_of_today):
-    if course.last_event_date is None:
-        return False
-    else:
-        return course.last_event_date >= start_of_today
-
-
-def _include_past_course(course, start_of_today):
-    if course.last_event_date is None:
-        return False
-    else:
-        return course.last_event_date < start_of_today
-
-
-def _get_courses(queryset, include_course_function):
+def _get_courses(queryset, *filters):
+    # Annotate first/last uncancelled event dates so we can filter and sort in the db; courses with no
+    # uncancelled events yet have null dates
     if queryset is None:
         queryset = Course.objects.all()
-    start_of_today = timezone.now().replace(hour=0, minute=0, microsecond=0)
-    return [course for course in queryset if include_course_function(course, start_of_today)]
+    return queryset.with_event_dates().filter(*filters)
 
 
-def _start_for_sort(course):
-    return course.start if course.start is not None else datetime.min.replace(tzinfo=dt_timezone.utc)
+def _start_of_today():
+    return timezone.now().replace(hour=0, minute=0, microsecond=0)
 
 
 def get_current_courses(queryset=None):
     # for future courses, courses with least one event in the future, or have no events yet
-    return sorted(_get_courses(queryset, _include_future_course), key=lambda course: _start_for_sort(course))
+    return _get_courses(
+        queryset, Q(last_event_start__isnull=True) | Q(last_event_start__gte=_start_of_today())
+    ).order_by(F("first_event_start").asc(nulls_first=True), "id")
 
 
 def get_not_yet_started_courses(queryset=None):
     # courses with all events in the future, or have no events yet
-    return sorted(_get_courses(queryset, _include_not_started_course), key=lambda course: _start_for_sort(course))
+    return _get_courses(
+        queryset, Q(last_event_start__isnull=True) | Q(first_event_start__gte=_start_of_today())
+    ).order_by(F("first_event_start").asc(nulls_first=True), "id")
 
 
 def get_current_and_started_courses(queryset=None):
-    return sorted(_get_courses(queryset, _include_current_started_only), key=lambda course: _start_for_sort(course))
+    return _get_courses(
+        queryset, Q(last_event_start__gte=_start_of_today())
+    ).order_by(F("first_event_start").asc(nulls_first=True), "id")
 
 
 def get_past_courses(queryset=None):
     # for past course, all events before the beginning of today
-    return sorted(_get_courses(queryset, _include_past_course), key=lambda course: course.start, reverse=True)
+    return _get_courses(
+        queryset, Q(last_event_start__lt=_start_of_today())
+    ).order_by("-first_event_start", "id")
 
 
 def staff_required(func):
@@ -143,30 +124,40 @@ def utc_adjusted_datetime(naive_target_datetime):
     # Target datetime is naive, a date combined with the naive time that it received from user input or from a
     # unaware timetable session in the DB.
     # Check if it has a UTC offset in Europe/London
-    naive_datetime_in_utc = Delorean(naive_target_datetime, timezone="UTC")
-    uk_datetime = naive_datetime_in_utc.shift("Europe/London")
-    utcoffset = uk_datetime.datetime.utcoffset()
-    # return a datetime obj, not the Delorean datetime
-    return naive_datetime_in_utc.datetime - utcoffset
+    return local_adjusted_datetime(naive_target_datetime, "Europe/London")
 
 
 def url_with_querystring(path, **kwargs):
     return path + '?' + urlencode(kwargs)
 
 
-def generate_workbook_response(filename, sheet_title, header_info, object_list, object_to_row):
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename={filename}'
+EXPORT_CHUNK_SIZE = 500
+
 
+def _export_rows(object_list, object_to_row):
+    # querysets are read in chunks, rather than all loaded into memory at once
+    if isinstance(object_list, QuerySet):
+        object_list = object_list.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    for obj in object_list:
+        row = object_to_row(obj)
+        if row:
+            yield row
+
+
+def generate_workbook_response(filename, sheet_title, header_info, object_list, object_to_row):
+    """
+    Export rows to an xlsx file.  The workbook is write-only, so rows are written out to a temporary
+    file as they're added, and the finished file is streamed from disk.
+    """
     header_font = Font(name='Calibri', size=12, bold=True)
     cell_font = Font(name='Calibri', size=11, bold=False)
     alignment = Alignment(wrap_text=True)
 
-    wb = Workbook()
-    sheet = wb.active
-    sheet.title = sheet_title
+    wb = Workbook(write_only=True)
+    sheet = wb.create_sheet(title=sheet_title)
+    # column widths have to be set before any rows are written
+    for i, width in enumerate(header_info.values(), start=1):
+        sheet.column_dimensions[get_column_letter(i)].width = width
 
     def _write_row(data, is_header=False):
         font = header_font if is_header else cell_font
@@ -179,16 +170,41 @@ def generate_workbook_response(filename, sheet_title, header_info, object_list,
         sheet.append(row)
 
     _write_row(header_info.keys(), is_header=True)
+    for row in _export_rows(object_list, object_to_row):
+        _write_row(row)
+
+    workbook_file = tempfile.TemporaryFile()
+    wb.save(workbook_file)
+    workbook_file.seek(0)
+    return FileResponse(
+        workbook_file, as_attachment=True, filename=filename,
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
 
-    for obj in object_list:
-        row = object_to_row(obj)
-        if row:
-            _write_row(row)
 
-    for i, column_cells in enumerate(sheet.columns):
-        sheet.column_dimensions[column_cells[0].column_letter].width = list(header_info.values())[i]
+class _Echo:
+    # csv writer "file" that just returns each line, for streaming
+    def write(self, value):
+        return value
+
+
+def generate_csv_response(filename, header_info, object_list, object_to_row):
+    """Export rows to a csv file, streamed as it's written; for exports too large for a workbook"""
+    writer = csv.writer(_Echo())
+
+    def _lines():
+        yield writer.writerow(header_info.keys())
+        for row in _export_rows(object_list, object_to_row):
+            yield writer.writerow(row)
 
-    workbook = save_virtual_workbook(wb)
-    container = [response.make_bytes(workbook)]
-    response.content = b''.join(container)
+    response = StreamingHttpResponse(_lines(), content_type="text/csv")
+    response['Content-Disposition'] = f'attachment; filename={filename}'
     return response
+
+
+def generate_export_response(request, filename, sheet_title, header_info, object_list, object_to_row):
+    """xlsx export, or csv with ?format=csv"""
+    if request.GET.get("format") == "csv":
+        filename = f"{filename.rsplit('.', 1)[0]}.csv"
+        return generate_csv_response(filename, header_info, object_list, object_to_row)
+    return generate_workbook_response(filename, sheet_title, header_info, object_list, object_to_row)